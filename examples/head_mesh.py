@@ -8,7 +8,7 @@ from pytracer import *
 from pytracer.shape import (Sphere, create_triangle_mesh)
 from pytracer.geometry import (Vector, Point)
 from pytracer.transform import (Transform, AnimatedTransform)
-from pytracer.aggregate import (BVH, GeometricPrimitive)
+from pytracer.aggregate import (BVH, GeometricPrimitive, MeshPrimitive)
 from pytracer.texture import ConstantTexture
 from pytracer.material import (MatteMaterial, UberMaterial)
 from pytracer.light import (SpotLight, DiffuseAreaLight, InfiniteAreaLight)
@@ -58,7 +58,7 @@ head_mat = UberMaterial(Kd, Ks, Kr, Kt, roughness, opacity, eta)
 
 head_trans = Transform.translate(Vector(-3, 6., -15))
 head_shape = create_triangle_mesh(head_trans, head_trans.inverse(), False, head_model)
-head = GeometricPrimitive(head_shape, head_mat)
+head = MeshPrimitive(head_shape, head_mat)
 
 ## Aggregation and Scene
 aggs = BVH([head, back])
@@ -10,10 +10,12 @@ Created by Jiayao on August 24, 2017
 """
 from __future__ import (division, absolute_import)
 from enum import Enum
+import threading
 import numpy as np
-from pytracer import (INT, UINT, FLOAT, util)
+from pytracer import (INT, UINT, FLOAT, EPS, util)
 import pytracer.geometry as geo
 from pytracer.aggregate.aggregate import Aggregate
+from pytracer.aggregate.primitive import (TransformedPrimitive, MeshPrimitive)
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
 	from pytracer.aggregate import (Primitive, Intersection)
@@ -22,11 +24,70 @@ __all__ = ['BVH']
 
 
 class BVH(Aggregate):
-	"""BVH Class"""
+	"""
+	BVH Class
+
+	Bounding volume hierarchy built
+	greedily by SAH. Passing `optimize`
+	as a positive number runs that many
+	tree rotation passes after the build
+	to further reduce the SAH cost.
+
+	With `method='sbvh'`, spatial splits
+	are also considered, c.f. Stich et al.,
+	Spatial Splits in BVHs, 2009. Primitive
+	references straddling a split plane are
+	duplicated, at most `dup_budget` times
+	the number of primitives in total.
+
+	If any `TransformedPrimitive` moves, nodes
+	store conservative bounds at both ends of
+	the shutter, which are interpolated at the
+	time of each ray during traversal.
+
+	With `lazy=True`, primitives that cannot
+	be intersected are not refined up front
+	but kept as proxies, which are refined into
+	a sub-BVH the first time a ray reaches them.
+
+	A `MeshPrimitive` is referenced once per
+	triangle, `items` holds the triangle ids
+	(-1 for other primitives). A BVH over a single
+	mesh can be stored with it, c.f. `to_arrays()`,
+	and is then loaded instead of built if it was
+	built with the same `build_params`.
+
+	Nodes are flattened in depth-first order into
+	the structured array `nodes`, c.f. `NODE_DTYPE`,
+	with the bounds at shutter close in `bounds1`.
+	SAH and middle splits are found from the bounds
+	of all references as arrays, without an object
+	per reference.
+	"""
+	# SAH cost constants, relative
+	# to a primitive intersection
+	TRAVERSAL_COST = .125
+	INTERSECT_COST = 1.
+	N_BUCKETS = 12
+	# spatial splits are only tried if the
+	# overlap of the children of the best object
+	# split exceeds `SBVH_ALPHA` of the root area
+	SBVH_ALPHA = 1e-5
+	# traversal stack holds 64 entries
+	SBVH_MAX_DEPTH = 48
+	# times sampled to fit linear motion bounds
+	MOTION_STEPS = 32
+	# flattened nodes, the second child of an interior
+	# node follows the first at `offset`, leaves hold
+	# `n_prim` references from `offset`
+	NODE_DTYPE = np.dtype([('bounds', FLOAT, (2, 3)), ('offset', np.int32),
+	                       ('n_prim', np.int32), ('axis', np.uint8)])
+
 	class SplitMethod(Enum):
 		MIDDLE = 0
 		# EQUAL_COUNTS = 1  # coming soon
 		SAH = 2
+		SBVH = 3
 
 	class _BVHPrimitive(object):
 		def __init__(self, idx: INT, bbox: 'geo.BBox'):
@@ -57,23 +118,75 @@ class BVH(Aggregate):
 			self.split_axis = axis
 			self.n_prim = 0
 	
-	class _LinearNode(object):
-		"""Flattened nodes for storage and quick look-up."""
-		def __init__(self, bounds: geo.BBox=None, offset: UINT=0, n_prim: UINT=0, axis: UINT=0):
-			self.bounds = bounds
-			self.offset = offset
-			self.n_prim = n_prim
-			self.axis = axis
-
-	def __init__(self, p: ['Primitive'], max_prim_per_node: UINT=4, method: str='sah'):
+	class _LazyPrimitive(Aggregate):
+		"""
+		Proxy of a primitive that cannot be intersected,
+		refined into a sub-BVH when first reached by a ray.
+		"""
+		def __init__(self, prim: 'Primitive', max_prim_per_node: UINT, method: str):
+			super().__init__()
+			self.primitive = prim
+			self.max_prim_per_node = max_prim_per_node
+			self.method = method
+			self.bounds = prim.world_bound()
+			self.accel = None
+			self.lock = threading.Lock()
+
+		def __repr__(self):
+			return "{}\nRefined: {}\n{}".format(self.__class__, self.accel is not None, self.primitive)
+
+		# locks cannot be pickled, each
+		# process refines its own copy
+		def __getstate__(self):
+			state = self.__dict__.copy()
+			del state['lock']
+			return state
+
+		def __setstate__(self, state):
+			self.__dict__.update(state)
+			self.lock = threading.Lock()
+
+		def _refined(self) -> 'BVH':
+			if self.accel is None:
+				with self.lock:
+					if self.accel is None:
+						self.accel = BVH([self.primitive], self.max_prim_per_node, self.method)
+			return self.accel
+
+		def intersect(self, ray: 'geo.Ray', isect: 'Intersection') -> bool:
+			return self._refined().intersect(ray, isect)
+
+		def intersect_p(self, ray: 'geo.Ray') -> bool:
+			return self._refined().intersect_p(ray)
+
+		def world_bound(self) -> 'geo.BBox':
+			return self.bounds
+
+		def can_intersect(self) -> bool:
+			return True
+
+		def refine(self, refined: ['Primitive']):
+			raise NotImplementedError('{}.refine(): Not implemented'.format(self.__class__))
+
+	def __init__(self, p: ['Primitive'], max_prim_per_node: UINT=4, method: str='sah', optimize: UINT=0,
+	             dup_budget: FLOAT=.3, lazy: bool=False):
 		super().__init__()
 		self.primitives = []
 		self.max_prim_per_node = max_prim_per_node
+		self.sah_cost = None
+		self.build_params = {'method': method.lower(), 'max_prim_per_node': int(max_prim_per_node),
+		                     'optimize': int(optimize), 'dup_budget': float(dup_budget), 'lazy': bool(lazy)}
+		self.reset_stats()
 		for prim in p:
-			prim.full_refine(self.primitives)
+			if lazy and not prim.can_intersect():
+				self.primitives.append(BVH._LazyPrimitive(prim, max_prim_per_node, method))
+			else:
+				prim.full_refine(self.primitives)
 
 		if method.lower() == 'sah':
 			self.split_method = BVH.SplitMethod.SAH
+		elif method.lower() == 'sbvh':
+			self.split_method = BVH.SplitMethod.SBVH
 		elif method.lower() == 'middle':
 			self.split_method = BVH.SplitMethod.MIDDLE
 		elif method.lower() == 'equal':
@@ -84,222 +197,648 @@ class BVH(Aggregate):
 
 		if len(self.primitives) == 0:
 			self.nodes = None
+			self.bounds1 = None
+			self.items = np.empty(0, dtype=np.int32)
+			self.motion_range = None
 			return
 
-		# building BVH
-		# init build_data
-		build_data = [BVH._BVHPrimitive(i, prim.world_bound()) for i, prim in enumerate(self.primitives)]
+		if len(self.primitives) == 1 and isinstance(self.primitives[0], MeshPrimitive) and \
+				self.primitives[0].mesh.bvh_cache is not None:
+			cache = self.primitives[0].mesh.bvh_cache
+			if cache.get('params') == self.build_params:
+				self._from_arrays(self.primitives[0], cache)
+				return
+			util.logging('Info', 'BVH cache built with {}, rebuilding.'.format(cache.get('params')))
 
-		# recursively build BVH
-		segment = [0, len(self.primitives), 0]
-		ordered_prims = []#[None] * len(self.primitives)
-		import sys
-		sys.setrecursionlimit(10000)
-		try:
-			root = self._recursive_build(build_data, segment, ordered_prims)
-		except RecursionError:
-			print("Length: ", len(self.primitives))
-			print("Recursion error: ", segment[2])
-		self.primitives = ordered_prims
-
-		# DFS of BVH
-		self.nodes = [BVH._LinearNode() for _ in range(segment[2])]
-		self._flatten_tree(root, [0])
+		# primitive references and their bounds,
+		# meshes are referenced by triangle
+		prims = []
+		items = []
+		bounds = []
+		for prim in self.primitives:
+			if isinstance(prim, MeshPrimitive):
+				b = prim.mesh.triangle_bounds()
+				prims.extend([prim] * len(b))
+				items.append(np.arange(len(b), dtype=np.int32))
+				bounds.append(np.asarray(b, dtype=FLOAT))
+			else:
+				b = prim.world_bound()
+				prims.append(prim)
+				items.append(np.full(1, -1, dtype=np.int32))
+				bounds.append(np.array([[b.pMin, b.pMax]], dtype=FLOAT))
+		self.primitives = prims
+		self.items = np.concatenate(items)
+		bounds = np.concatenate(bounds)
+
+		# shutter interval if anything moves
+		t0, t1 = np.inf, -np.inf
+		for prim in self.primitives:
+			if isinstance(prim, TransformedPrimitive) and prim.w2p.animated:
+				t0 = min(t0, prim.w2p.startTime)
+				t1 = max(t1, prim.w2p.endTime)
+		self.motion_range = (t0, t1) if t0 < t1 else None
+		self.bounds1 = None
+
+		if self.motion_range is not None:
+			# build with the bounds at the middle of the shutter
+			bounds0, bounds1 = bounds, bounds.copy()
+			for i, prim in enumerate(self.primitives):
+				if isinstance(prim, TransformedPrimitive) and prim.w2p.animated:
+					b0, b1 = BVH._linear_bounds(prim, t0, t1)
+					bounds0[i] = [b0.pMin, b0.pMax]
+					bounds1[i] = [b1.pMin, b1.pMax]
+			bounds = .5 * (bounds0 + bounds1)
+			if self.split_method == BVH.SplitMethod.SBVH:
+				util.logging('Warning', 'BVH spatial splits are not supported with motion, using SAH.')
+				self.split_method = BVH.SplitMethod.SAH
+
+		if self.split_method == BVH.SplitMethod.SBVH:
+			# references are split, hence objects
+			build_data = [BVH._BVHPrimitive(i, geo.BBox(geo.Point.from_arr(b[0]), geo.Point.from_arr(b[1])))
+			              for i, b in enumerate(bounds)]
+			segment = [0, len(self.primitives), 0]
+			ordered_prims = []
+			import sys
+			sys.setrecursionlimit(10000)
+			self._dup_left = INT(dup_budget * len(self.primitives))
+			root_bounds = geo.BBox()
+			for ref in build_data:
+				root_bounds.union(ref.bounds)
+			self._min_overlap = BVH.SBVH_ALPHA * root_bounds.surface_area()
+			root = self._recursive_build_sbvh(build_data, segment, ordered_prims, 0)
+			self._flatten(root, segment[2])
+			ordered_prims = np.array(ordered_prims, dtype=INT)
+		else:
+			ordered_prims = self._build(bounds)
+		self.primitives = [self.primitives[i] for i in ordered_prims]
+		self.items = self.items[ordered_prims]
+
+		# post-build optimization
+		if optimize > 0:
+			root = self._unflatten()
+			before = BVH._sah_cost(root)
+			n_pass = BVH._optimize(root, optimize)
+			self.sah_cost = BVH._sah_cost(root)
+			util.logging('Info', 'BVH SAH cost {:.4f} -> {:.4f} after {} rotation pass(es)'
+			             .format(before, self.sah_cost, n_pass))
+			self._flatten(root, len(self.nodes))
+
+		if self.motion_range is not None:
+			self._refit_motion(bounds0[ordered_prims], bounds1[ordered_prims])
 
 	@staticmethod
-	def _partition(data: ['BVH._BVHPrimitive'], start: INT, end: INT, mid: FLOAT, dim: INT):
-		assert start <= end
-		i = start
-		k = end - 1
-		while i < k:
-			if data[i].centroid[dim] < mid:
-				i += 1
+	def _area(bounds: 'np.ndarray') -> 'np.ndarray':
+		"""Surface areas of (..., 2, 3) bounds"""
+		d = bounds[..., 1, :] - bounds[..., 0, :]
+		return 2. * (d[..., 0] * d[..., 1] + d[..., 0] * d[..., 2] + d[..., 1] * d[..., 2])
+
+	def _build(self, bounds: 'np.ndarray') -> 'np.ndarray':
+		"""
+		Builds `nodes` top-down in depth-first order from the
+		(n, 2, 3) `bounds` of the references, returns the
+		references in the order they are stored by leaves
+		"""
+		centroids = .5 * (bounds[:, 0] + bounds[:, 1])
+		# a binary tree over n leaves has 2n - 1 nodes
+		nodes = np.zeros(max(2 * len(bounds) - 1, 1), dtype=BVH.NODE_DTYPE)
+		node_bounds, offsets, n_prims, axes = nodes['bounds'], nodes['offset'], nodes['n_prim'], nodes['axis']
+		ordered_prims = np.empty(len(bounds), dtype=INT)
+		n_nodes = 0
+		n_ordered = 0
+
+		# references of nodes to visit, and their
+		# parents if the second child
+		todo = [(np.arange(len(bounds)), -1)]
+		while len(todo) > 0:
+			idx, parent = todo.pop()
+			node = n_nodes
+			n_nodes += 1
+			if parent >= 0:
+				offsets[parent] = node
+			node_bounds[node, 0] = bounds[idx, 0].min(axis=0)
+			node_bounds[node, 1] = bounds[idx, 1].max(axis=0)
+
+			split = self._split(bounds, centroids, idx, node_bounds[node])
+			if split is None:
+				# leaf node
+				offsets[node] = n_ordered
+				n_prims[node] = len(idx)
+				ordered_prims[n_ordered:n_ordered + len(idx)] = idx
+				n_ordered += len(idx)
 			else:
-				data[i], data[k] = data[k], data[i]
-				k -= 1
-		return k
+				axes[node], c0, c1 = split
+				todo.append((c1, node))
+				todo.append((c0, -1))
 
-	@staticmethod
-	def _insertion_sort(data: ['BVH._BVHPrimitive'], start: INT, end: INT, dim: INT):
-		for i in range(start, end):
-			k = i
-			dk = data[k]
-			while k > start and dk.centroid[dim] < data[k-1].centroid[dim]:
-				data[k] = data[k-1]
-				k -= 1
-			data[k] = dk
+		self.nodes = nodes[:n_nodes].copy()
+		return ordered_prims
+
+	def _split(self, bounds: 'np.ndarray', centroids: 'np.ndarray', idx: 'np.ndarray',
+	           bbox: 'np.ndarray') -> [INT, 'np.ndarray', 'np.ndarray']:
+		"""
+		Splits references `idx` of a node bounded by `bbox`
+		into the two children, returns the split axis and
+		the references of each, `None` for a leaf
+		"""
+		n = len(idx)
+		if n == 1:
+			return None
+
+		# choose split dimension by the centroids
+		c = centroids[idx]
+		lo, hi = c.min(axis=0), c.max(axis=0)
+		d = hi - lo
+		dim = 0 if d[0] > d[1] and d[0] > d[2] else (1 if d[1] > d[2] else 2)
+		mid = n // 2
+		if hi[dim] == lo[dim]:
+			if n <= self.max_prim_per_node:
+				return None
+			return dim, idx[:mid], idx[mid:]
+
+		cd = c[:, dim]
+		if self.split_method == BVH.SplitMethod.MIDDLE:
+			left = cd < .5 * (lo[dim] + hi[dim])
+			n_left = np.count_nonzero(left)
+			if 0 < n_left < n:
+				return dim, idx[left], idx[~left]
+			# fall back to equally-sized subsets
+			idx = idx[np.argsort(cd, kind='stable')]
+			return dim, idx[:mid], idx[mid:]
+
+		# surface area heuristic
+		if n <= 4:
+			# partition into equally-sized subsets
+			idx = idx[np.argsort(cd, kind='stable')]
+			return dim, idx[:mid], idx[mid:]
+
+		# buckets
+		n_buckets = BVH.N_BUCKETS
+		b = np.minimum((n_buckets * ((cd - lo[dim]) / d[dim])).astype(INT), n_buckets - 1)
+		count = np.bincount(b, minlength=n_buckets)
+		b_lo = np.full((n_buckets, 3), np.inf, dtype=FLOAT)
+		b_hi = np.full((n_buckets, 3), -np.inf, dtype=FLOAT)
+		np.minimum.at(b_lo, b, bounds[idx, 0])
+		np.maximum.at(b_hi, b, bounds[idx, 1])
+
+		# costs of splitting after each bucket,
+		# empty sides have no area
+		c0 = np.cumsum(count)[:-1]
+		a0 = BVH._area(np.stack([np.minimum.accumulate(b_lo)[:-1], np.maximum.accumulate(b_hi)[:-1]], axis=1))
+		a1 = BVH._area(np.stack([np.minimum.accumulate(b_lo[::-1])[::-1][1:],
+		                         np.maximum.accumulate(b_hi[::-1])[::-1][1:]], axis=1))
+		with np.errstate(invalid='ignore', divide='ignore'):
+			costs = BVH.TRAVERSAL_COST + BVH.INTERSECT_COST * \
+			        (np.where(c0 > 0, c0 * a0, 0.) + np.where(c0 < n, (n - c0) * a1, 0.)) / \
+			        BVH._area(bbox)
+
+		# create leaf or split at bucket
+		min_cost_idx = np.argmin(costs)
+		if n > self.max_prim_per_node or costs[min_cost_idx] < n:
+			left = b <= min_cost_idx
+			idx = np.concatenate([idx[left], idx[~left]])
+			mid = min(max(np.count_nonzero(left), 1), n - 1)
+			return dim, idx[:mid], idx[mid:]
+		return None
 
 	@staticmethod
-	def _bucket_partition(data: ['BVH._BVHPrimitive'], start: INT, end: INT,
-	                      min_cost_idx: INT, n_buckets: INT, dim: INT, centroid_bounds: [geo.BBox]):
-		i = start
-		k = end - 1
-		diff = centroid_bounds.pMax[dim] - centroid_bounds.pMin[dim]
-		while i < k:
-			b = INT(n_buckets * ((data[i].centroid[dim] - centroid_bounds.pMin[dim]) / diff))
-			if b == n_buckets:
-				b -= 1
-
-			assert b >= 0 and b < n_buckets
-
-			if b <= min_cost_idx:
-				i += 1
+	def _clip(b: 'geo.BBox', dim: INT, lo: FLOAT, hi: FLOAT) -> 'geo.BBox':
+		"""Clips a `BBox` to the slab [lo, hi] along `dim`, None if empty."""
+		if b.pMax[dim] < lo or b.pMin[dim] > hi:
+			return None
+		ret = geo.BBox(b.pMin, b.pMax)
+		ret.pMin[dim] = max(lo, b.pMin[dim])
+		ret.pMax[dim] = min(hi, b.pMax[dim])
+		return ret
+
+	def _split_reference(self, ref: 'BVH._BVHPrimitive', dim: INT, pos: FLOAT) -> ['geo.BBox', 'geo.BBox']:
+		"""
+		Splits the bounds of a primitive reference
+		by the plane at `pos` along `dim`. Triangles
+		are clipped exactly, other primitives by
+		their bounds. Either side is None if empty.
+		"""
+		from pytracer.shape import Triangle
+		b = ref.bounds
+		prim = self.primitives[ref.prim_idx]
+		shape = getattr(prim, 'shape', None)
+		if isinstance(prim, MeshPrimitive):
+			shape = prim.mesh.triangle(self.items[ref.prim_idx])
+		elif not isinstance(shape, Triangle):
+			return BVH._clip(b, dim, -np.inf, pos), BVH._clip(b, dim, pos, np.inf)
+
+		left = geo.BBox()
+		right = geo.BBox()
+		for i in range(3):
+			v0 = shape[i]
+			v1 = shape[(i + 1) % 3]
+			if v0[dim] <= pos:
+				left.union(v0)
+			if v0[dim] >= pos:
+				right.union(v0)
+			if (v0[dim] < pos < v1[dim]) or (v1[dim] < pos < v0[dim]):
+				t = (pos - v0[dim]) / (v1[dim] - v0[dim])
+				v = geo.Point.from_arr(v0 + t * (v1 - v0))
+				v[dim] = pos
+				left.union(v)
+				right.union(v)
+
+		ret = []
+		for c in (left, right):
+			lo = np.maximum(c.pMin, b.pMin)
+			hi = np.minimum(c.pMax, b.pMax)
+			if np.any(lo > hi):
+				ret.append(None)
 			else:
-				data[i], data[k] = data[k], data[i]
-				k -= 1
-		return k
-
-	def _recursive_build(self, data: ['BVH._BVHPrimitive'], segment: [UINT], ordered_prims: ['BVH._BVHPrimitive']):
-		"""Recursively build BVH, segment: [start, end, total]"""
-		from pytracer.aggregate.accelerator.bvh import BVH
-		start, end = segment[0:2]
-		assert start < end
-		if not start < end:
-			a = 2
-			c = 3
-		if start == 1513 and end == 1519:
-			a = 2
+				ret.append(geo.BBox(geo.Point.from_arr(lo), geo.Point.from_arr(hi)))
+		return ret
+
+	@staticmethod
+	def _object_split(data: ['BVH._BVHPrimitive'], bbox: 'geo.BBox', centroid_bounds: 'geo.BBox'):
+		"""Best SAH object split by bucketing, returns (cost, dim, bucket, child overlap area) or None."""
+		dim = centroid_bounds.maximum_extent()
+		lo = centroid_bounds.pMin[dim]
+		diff = centroid_bounds.pMax[dim] - lo
+		if diff <= 0.:
+			return None
+		n_buckets = BVH.N_BUCKETS
+		counts = [0] * n_buckets
+		bounds = [geo.BBox() for _ in range(n_buckets)]
+		for ref in data:
+			b = min(INT(n_buckets * ((ref.centroid[dim] - lo) / diff)), n_buckets - 1)
+			counts[b] += 1
+			bounds[b].union(ref.bounds)
+
+		# sweep from the right for the bounds of the right children
+		right = [None] * n_buckets
+		acc = geo.BBox()
+		for i in range(n_buckets - 1, 0, -1):
+			acc = geo.BBox.Union(acc, bounds[i])
+			right[i] = acc
+
+		best = None
+		acc = geo.BBox()
+		c0 = 0
+		sa = bbox.surface_area()
+		for i in range(n_buckets - 1):
+			acc = geo.BBox.Union(acc, bounds[i])
+			c0 += counts[i]
+			c1 = len(data) - c0
+			if c0 == 0 or c1 == 0:
+				continue
+			b1 = right[i + 1]
+			cost = BVH.TRAVERSAL_COST + BVH.INTERSECT_COST * \
+			       (c0 * acc.surface_area() + c1 * b1.surface_area()) / sa
+			if best is None or cost < best[0]:
+				d = np.minimum(acc.pMax, b1.pMax) - np.maximum(acc.pMin, b1.pMin)
+				overlap = 0. if np.any(d < 0.) else 2. * (d[0] * d[1] + d[0] * d[2] + d[1] * d[2])
+				best = (cost, dim, i, overlap)
+		return best
+
+	def _spatial_split(self, data: ['BVH._BVHPrimitive'], bbox: 'geo.BBox'):
+		"""Best SAH spatial split by binning, returns (cost, dim, position, duplicates) or None."""
+		n_bins = BVH.N_BUCKETS
+		n_prim = len(data)
+		sa = bbox.surface_area()
+		best = None
+		for dim in range(3):
+			lo = bbox.pMin[dim]
+			width = (bbox.pMax[dim] - lo) / n_bins
+			if width <= 0.:
+				continue
+			enter = [0] * n_bins
+			leave = [0] * n_bins
+			bounds = [geo.BBox() for _ in range(n_bins)]
+			for ref in data:
+				b0 = min(max(INT((ref.bounds.pMin[dim] - lo) / width), 0), n_bins - 1)
+				b1 = min(max(INT((ref.bounds.pMax[dim] - lo) / width), b0), n_bins - 1)
+				enter[b0] += 1
+				leave[b1] += 1
+				rest = ref
+				for b in range(b0, b1):
+					l, r = self._split_reference(rest, dim, lo + (b + 1) * width)
+					if l is not None:
+						bounds[b].union(l)
+					if r is None:
+						break
+					rest = BVH._BVHPrimitive(ref.prim_idx, r)
+				else:
+					bounds[b1].union(rest.bounds)
+
+			right = [None] * n_bins
+			acc = geo.BBox()
+			for i in range(n_bins - 1, 0, -1):
+				acc = geo.BBox.Union(acc, bounds[i])
+				right[i] = acc
+
+			acc = geo.BBox()
+			c0 = 0
+			c1 = n_prim
+			for i in range(n_bins - 1):
+				acc = geo.BBox.Union(acc, bounds[i])
+				c0 += enter[i]
+				c1 -= leave[i]
+				if c0 == 0 or c1 == 0 or (c0 == n_prim and c1 == n_prim):
+					continue
+				cost = BVH.TRAVERSAL_COST + BVH.INTERSECT_COST * \
+				       (c0 * acc.surface_area() + c1 * right[i + 1].surface_area()) / sa
+				if best is None or cost < best[0]:
+					best = (cost, dim, lo + (i + 1) * width, c0 + c1 - n_prim)
+		return best
+
+	def _recursive_build_sbvh(self, data: ['BVH._BVHPrimitive'], segment: [UINT],
+	                          ordered_prims: [INT], depth: UINT) -> 'BVH._BVHNode':
+		"""Recursively build SBVH over primitive references, segment[2] counts the nodes"""
 		segment[2] += 1
 		node = BVH._BVHNode()
+		n_prim = len(data)
 
-		# compute bounds of primitives
 		bbox = geo.BBox()
-		for i in range(start, end):
-			bbox.union(data[i].bounds)
+		centroid_bounds = geo.BBox()
+		for ref in data:
+			bbox.union(ref.bounds)
+			centroid_bounds.union(ref.centroid)
 
-		n_prim = end - start
 		if n_prim == 1:
-			# leaf node
-			first = len(ordered_prims)
-			for i in range(start, end):
-				ordered_prims.append(self.primitives[data[i].prim_idx])
+			node.init_leaf(len(ordered_prims), n_prim, bbox)
+			ordered_prims.append(data[0].prim_idx)
+			return node
 
-			node.init_leaf(first, n_prim, bbox)
-		else:
-			# compute centroids, choose split dimension
-			mid = (start + end) // 2
-			centroid_bounds = geo.BBox()
-			for i in range(start, end):
-				centroid_bounds.union(data[i].centroid)
-			dim = centroid_bounds.maximum_extent()
+		obj = BVH._object_split(data, bbox, centroid_bounds)
+		spatial = None
+		if self._dup_left > 0 and depth < BVH.SBVH_MAX_DEPTH and \
+				(obj is None or obj[3] > self._min_overlap):
+			spatial = self._spatial_split(data, bbox)
+			if spatial is not None and spatial[3] > self._dup_left:
+				spatial = None
+
+		cost = min(c[0] for c in (obj, spatial) if c is not None) \
+			if obj is not None or spatial is not None else np.inf
+		if n_prim <= self.max_prim_per_node and cost >= BVH.INTERSECT_COST * n_prim:
+			node.init_leaf(len(ordered_prims), n_prim, bbox)
+			for ref in data:
+				ordered_prims.append(ref.prim_idx)
+			return node
 
-			# partition prims into two sets, build children
-			if centroid_bounds.pMax[dim] == centroid_bounds.pMin[dim]:
-				if n_prim <= self.max_prim_per_node:
-					# create leaf node
-					first = len(ordered_prims)
-					for i in range(start, end):
-						ordered_prims.append(self.primitives[data[i].prim_idx])
-					node.init_leaf(first, n_prim, bbox)
+		left, right = [], []
+		if spatial is not None and spatial[0] == cost:
+			_, dim, pos, _ = spatial
+			for ref in data:
+				if ref.bounds.pMax[dim] <= pos:
+					left.append(ref)
+				elif ref.bounds.pMin[dim] >= pos:
+					right.append(ref)
 				else:
-					assert not mid == end
-					assert not mid == start
-					segment[1] = mid
-					c0 = self._recursive_build(data, segment, ordered_prims)
-					segment[0:2] = [mid, end]
-					c1 = self._recursive_build(data, segment, ordered_prims)
-					node.init_inter(dim, c0, c1)
+					l, r = self._split_reference(ref, dim, pos)
+					if l is not None and r is not None:
+						left.append(BVH._BVHPrimitive(ref.prim_idx, l))
+						right.append(BVH._BVHPrimitive(ref.prim_idx, r))
+						self._dup_left -= 1
+					elif l is not None:
+						left.append(ref)
+					else:
+						right.append(ref)
 
-				return node
+		elif obj is not None:
+			_, dim, split, _ = obj
+			lo = centroid_bounds.pMin[dim]
+			diff = centroid_bounds.pMax[dim] - lo
+			for ref in data:
+				b = min(INT(BVH.N_BUCKETS * ((ref.centroid[dim] - lo) / diff)), BVH.N_BUCKETS - 1)
+				if b <= split:
+					left.append(ref)
+				else:
+					right.append(ref)
 
-			# partition based on split_method
-			if self.split_method == BVH.SplitMethod.MIDDLE:
-				pmid = .5 * (centroid_bounds.pMax[dim] + centroid_bounds.pMin[dim])
-				mid = BVH._partition(data, start, end, pmid, dim)
+		if len(left) == 0 or len(right) == 0:
+			# coincident centroids or degenerate split, halve
+			dim = centroid_bounds.maximum_extent()
+			mid = n_prim // 2
+			left, right = data[:mid], data[mid:]
 
+		c0 = self._recursive_build_sbvh(left, segment, ordered_prims, depth + 1)
+		c1 = self._recursive_build_sbvh(right, segment, ordered_prims, depth + 1)
+		node.init_inter(dim, c0, c1)
+		return node
+
+	@staticmethod
+	def _sah_cost(root: 'BVH._BVHNode') -> FLOAT:
+		"""SAH cost of the tree, normalized by the surface area of the root."""
+		cost = 0.
+		todo = [root]
+		while len(todo) > 0:
+			node = todo.pop()
+			if node.n_prim > 0:
+				cost += BVH.INTERSECT_COST * node.n_prim * node.bounds.surface_area()
 			else:
-				# surface area heuristic
-				if n_prim <= 4:
-					# partition into equally-sized subsets
-					mid = (start + end) // 2
-					BVH._insertion_sort(data, start, end, dim)
+				cost += BVH.TRAVERSAL_COST * node.bounds.surface_area()
+				todo.extend(node.children)
+		sa = root.bounds.surface_area()
+		return cost / sa if sa > 0. else cost
+
+	@staticmethod
+	def _set_children(node: 'BVH._BVHNode', c0: 'BVH._BVHNode', c1: 'BVH._BVHNode'):
+		"""Re-initialize an interior node, splitting along the axis separating the children most."""
+		d = (c1.bounds.pMin + c1.bounds.pMax) - (c0.bounds.pMin + c0.bounds.pMax)
+		axis = INT(np.argmax(np.fabs(d)))
+		if d[axis] < 0.:
+			c0, c1 = c1, c0
+		node.init_inter(axis, c0, c1)
+
+	@staticmethod
+	def _rotate(node: 'BVH._BVHNode') -> bool:
+		"""
+		Applies the rotation below `node` that reduces
+		the surface area of its children the most, c.f.
+		Kensler, Tree Rotations for Improving BVHs, 2008.
+		Returns whether a rotation was performed.
+		"""
+		l, r = node.children
+		sa_l = l.bounds.surface_area() if l.n_prim == 0 else 0.
+		sa_r = r.bounds.surface_area() if r.n_prim == 0 else 0.
+		best = EPS * node.bounds.surface_area()
+		best_move = None
+
+		# swap a child with a grandchild
+		for c, inter, other in ((0, r, l), (1, l, r)):
+			if inter.n_prim > 0:
+				continue
+			sa = sa_r if c == 0 else sa_l
+			for k in range(2):
+				gain = sa - geo.BBox.Union(other.bounds, inter.children[1 - k].bounds).surface_area()
+				if gain > best:
+					best = gain
+					best_move = (c, k, None)
+
+		# swap two grandchildren
+		if l.n_prim == 0 and r.n_prim == 0:
+			for i in range(2):
+				for j in range(2):
+					gain = sa_l + sa_r - \
+					       geo.BBox.Union(r.children[j].bounds, l.children[1 - i].bounds).surface_area() - \
+					       geo.BBox.Union(l.children[i].bounds, r.children[1 - j].bounds).surface_area()
+					if gain > best:
+						best = gain
+						best_move = (None, i, j)
+
+		if best_move is None:
+			return False
+
+		c, i, j = best_move
+		if c is None:
+			li, rj = l.children[i], r.children[j]
+			BVH._set_children(l, rj, l.children[1 - i])
+			BVH._set_children(r, li, r.children[1 - j])
+		elif c == 0:
+			ri = r.children[i]
+			BVH._set_children(r, l, r.children[1 - i])
+			BVH._set_children(node, ri, r)
+		else:
+			li = l.children[i]
+			BVH._set_children(l, r, l.children[1 - i])
+			BVH._set_children(node, l, li)
+		return True
+
+	@staticmethod
+	def _optimize(root: 'BVH._BVHNode', n_pass: UINT) -> UINT:
+		"""Bottom-up rotation passes until convergence or `n_pass` runs out, returns passes used."""
+		for p in range(n_pass):
+			inter = []
+			todo = [root]
+			while len(todo) > 0:
+				node = todo.pop()
+				if node.n_prim == 0:
+					inter.append(node)
+					todo.extend(node.children)
+
+			rotated = False
+			for node in reversed(inter):
+				if BVH._rotate(node):
+					rotated = True
+			if not rotated:
+				return p + 1
+		return n_pass
+
+	@staticmethod
+	def _lerp_bounds(b0: 'geo.BBox', b1: 'geo.BBox', s: FLOAT) -> 'geo.BBox':
+		ret = geo.BBox()
+		ret.pMin = ((1. - s) * b0.pMin + s * b1.pMin).view(geo.Point)
+		ret.pMax = ((1. - s) * b0.pMax + s * b1.pMax).view(geo.Point)
+		return ret
+
+	@staticmethod
+	def _linear_bounds(prim: 'Primitive', t0: FLOAT, t1: FLOAT) -> ['geo.BBox', 'geo.BBox']:
+		"""
+		Bounds at `t0` and `t1` whose linear interpolation
+		contains the primitive over [t0, t1]. Containment is
+		checked at `MOTION_STEPS` times, the bounds are padded
+		by how far the primitive can move between two of them.
+		"""
+		b0 = prim.world_bound_at(t0)
+		b1 = prim.world_bound_at(t1)
+		lo = np.zeros(3, dtype=FLOAT)
+		hi = np.zeros(3, dtype=FLOAT)
+		for i in range(1, BVH.MOTION_STEPS - 1):
+			s = i / (BVH.MOTION_STEPS - 1)
+			b = prim.world_bound_at(util.lerp(s, t0, t1))
+			bl = BVH._lerp_bounds(b0, b1, s)
+			lo = np.maximum(lo, bl.pMin - b.pMin)
+			hi = np.maximum(hi, b.pMax - bl.pMax)
+		w2p = prim.w2p
+		step = (t1 - t0) / ((BVH.MOTION_STEPS - 1) * (w2p.endTime - w2p.startTime))
+		pad = .5 * step * w2p.max_speed(prim.primitive.world_bound(), True)
+		lo += pad
+		hi += pad
+		return geo.BBox(geo.Point.from_arr(b0.pMin - lo), geo.Point.from_arr(b0.pMax + hi)), \
+		       geo.BBox(geo.Point.from_arr(b1.pMin - lo), geo.Point.from_arr(b1.pMax + hi))
+
+	def _refit_motion(self, bounds0: 'np.ndarray', bounds1: 'np.ndarray'):
+		"""
+		Bottom-up recomputation of node bounds at both ends
+		of the shutter from those of the references, (n, 2, 3)
+		arrays in the order they are stored by leaves
+		"""
+		nodes = self.nodes
+		self.bounds1 = np.empty_like(nodes['bounds'])
+		for node_bounds, ref_bounds in ((nodes['bounds'], bounds0), (self.bounds1, bounds1)):
+			# children follow their parents
+			for i in range(len(nodes) - 1, -1, -1):
+				offset, n_prim = nodes['offset'][i], nodes['n_prim'][i]
+				if n_prim > 0:
+					b = ref_bounds[offset:offset + n_prim]
 				else:
-					# buckets
-					n_buckets = 12
-					buckets = [[0, geo.BBox()] for _ in range(n_buckets)]  # bucket: [count: INT, bounds: BBox]
-					for i in range(start, end):
-						b = INT(n_buckets * ((data[i].centroid[dim] - centroid_bounds.pMin[dim]) /
-						                     (centroid_bounds.pMax[dim] - centroid_bounds.pMin[dim])))
-
-						if b == n_buckets:
-							b -= 1
-
-						assert b >= 0 and b < n_buckets
-
-						buckets[b][0] += 1
-						buckets[b][1].union(data[i].bounds)
-
-					# compute costs
-					costs = [0.] * (n_buckets - 1)
-					for i in range(n_buckets - 1):
-						b0 = geo.BBox()
-						b1 = geo.BBox()
-						c0, c1 = 0, 0
-						for j in range(0, i + 1):
-							b0.union(buckets[j][1])
-							c0 += buckets[j][0]
-						for j in range(i + 1, n_buckets):
-							b1.union(buckets[j][1])
-							c1 += buckets[j][0]
-						# cost for intersection: 1.
-						# cost for traversal: .125
-						costs[i] = .125 + (c0 * b0.surface_area() + c1 * b1.surface_area()) /\
-						                  bbox.surface_area()
-
-					# find bucket
-					min_cost_idx = np.argmin(costs)
-
-					# create leaf of split at bucket
-					if n_prim > self.max_prim_per_node or costs[min_cost_idx] < n_prim:
-						mid = BVH._bucket_partition(data, start, end, min_cost_idx, n_buckets, dim, centroid_bounds)
-						# mid = pmid + start
-						if mid == start:
-							mid += 1
-						elif mid == end:
-							mid -= 1
-					else:
-						first = len(ordered_prims)
-						for i in range(start, end):
-							ordered_prims.append(self.primitives[data[i]].prim_idx)
-						node.init_leaf(first, n_prim, bbox)
-						return node
-
-			assert not mid == end
-			assert not mid == start
-			segment[1] = mid
-			c0 = self._recursive_build(data, segment, ordered_prims)
-			segment[0:2] = [mid, end]
-			c1 = self._recursive_build(data, segment, ordered_prims)
-			node.init_inter(dim, c0, c1)
+					b = node_bounds[[i + 1, offset]]
+				node_bounds[i, 0] = b[:, 0].min(axis=0)
+				node_bounds[i, 1] = b[:, 1].max(axis=0)
+
+	def _flatten(self, root: 'BVH._BVHNode', n_nodes: UINT):
+		"""Flattens the tree of `root` into `nodes` by DFS"""
+		self.nodes = np.zeros(n_nodes, dtype=BVH.NODE_DTYPE)
+		self._flatten_tree(root, [0])
 
-		return node
-	
 	def _flatten_tree(self, node: 'BVH._BVHNode', offset: [UINT]):
 		# pre-traversal
-		linear_node = self.nodes[offset[0]]
-		linear_node.bounds = node.bounds
 		off = offset[0]
+		self.nodes['bounds'][off] = [node.bounds.pMin, node.bounds.pMax]
 		offset[0] += 1
 		if node.n_prim > 0:
 			assert node.children[0] is None and node.children[1] is None
-			linear_node.offset = node.first_offset
-			linear_node.n_prim = node.n_prim
+			self.nodes['offset'][off] = node.first_offset
+			self.nodes['n_prim'][off] = node.n_prim
 		else:
-			linear_node.axis = node.split_axis
-			linear_node.n_prim = 0
+			self.nodes['axis'][off] = node.split_axis
+			self.nodes['n_prim'][off] = 0
 			self._flatten_tree(node.children[0], offset)
-			linear_node.offset = self._flatten_tree(node.children[1], offset)
-		
+			self.nodes['offset'][off] = self._flatten_tree(node.children[1], offset)
+
 		return off
-	
+
+	def _unflatten(self) -> 'BVH._BVHNode':
+		"""Returns the tree of `nodes`, e.g., to be rotated"""
+		tree = [BVH._BVHNode() for _ in range(len(self.nodes))]
+		for i in range(len(self.nodes) - 1, -1, -1):
+			b, offset, n_prim, axis = self.nodes[i].item()
+			if n_prim > 0:
+				tree[i].init_leaf(offset, n_prim, geo.BBox(geo.Point.from_arr(b[0]), geo.Point.from_arr(b[1])))
+			else:
+				tree[i].init_inter(axis, tree[i + 1], tree[offset])
+		return tree[0]
+
+	def to_arrays(self) -> {str: 'np.ndarray'}:
+		"""
+		Returns the flattened nodes as arrays
+		to be stored with the mesh, only for
+		BVHs over a single `MeshPrimitive`,
+		c.f. `build_params`
+		"""
+		if self.nodes is None or self.motion_range is not None or \
+				any(prim is not self.primitives[0] for prim in self.primitives) or \
+				not isinstance(self.primitives[0], MeshPrimitive):
+			raise RuntimeError('{}.to_arrays(): only static BVHs over a single '
+			                   '`MeshPrimitive` can be stored'.format(self.__class__))
+		return {'bvh_bounds': self.nodes['bounds'].copy(),
+		        'bvh_offset': self.nodes['offset'].copy(),
+		        'bvh_n_prim': self.nodes['n_prim'].copy(),
+		        'bvh_axis': self.nodes['axis'].copy(),
+		        'bvh_items': np.asarray(self.items, dtype=np.int32)}
+
+	def _from_arrays(self, prim: 'MeshPrimitive', arrays: {str: 'np.ndarray'}):
+		"""Loads nodes stored by `to_arrays()`"""
+		self.items = np.asarray(arrays['bvh_items'], dtype=np.int32)
+		self.primitives = [prim] * len(self.items)
+		self.motion_range = None
+		self.bounds1 = None
+		self.nodes = np.empty(len(arrays['bvh_offset']), dtype=BVH.NODE_DTYPE)
+		for name in ['bounds', 'offset', 'n_prim', 'axis']:
+			self.nodes[name] = arrays['bvh_' + name]
+
 	@staticmethod
-	def _intersect_p(bounds: geo.BBox, ray: geo.Ray, inv_dir: geo.Vector, dir_neg: [bool]) -> bool:
+	def _intersect_p(bounds: [[FLOAT]], ray: 'geo.Ray', o: [FLOAT], inv_dir: [FLOAT], dir_neg: [INT]) -> bool:
 		# ray intersection against x and y slabs
-		tmin = (bounds[dir_neg[0]].x - ray.o.x) * inv_dir.x
-		tmax = (bounds[1-dir_neg[0]].x - ray.o.x) * inv_dir.x
-		tmin_y = (bounds[dir_neg[1]].y - ray.o.y) * inv_dir.y
-		tmax_y = (bounds[1 - dir_neg[1]].y - ray.o.y) * inv_dir.y
-		
+		tmin = (bounds[dir_neg[0]][0] - o[0]) * inv_dir[0]
+		tmax = (bounds[1 - dir_neg[0]][0] - o[0]) * inv_dir[0]
+		tmin_y = (bounds[dir_neg[1]][1] - o[1]) * inv_dir[1]
+		tmax_y = (bounds[1 - dir_neg[1]][1] - o[1]) * inv_dir[1]
+
 		if tmin > tmax_y or tmin_y > tmax:
 			return False
 		if tmin_y > tmin:
@@ -307,8 +846,8 @@ class BVH(Aggregate):
 		if tmax_y < tmax:
 			tmax = tmax_y
 		# z slab
-		tmin_z = (bounds[dir_neg[2]].z - ray.o.z) * inv_dir.z
-		tmax_z = (bounds[1 - dir_neg[2]].z - ray.o.z) * inv_dir.z
+		tmin_z = (bounds[dir_neg[2]][2] - o[2]) * inv_dir[2]
+		tmax_z = (bounds[1 - dir_neg[2]][2] - o[2]) * inv_dir[2]
 
 		if tmin > tmax_z or tmin_z > tmax:
 			return False
@@ -316,88 +855,115 @@ class BVH(Aggregate):
 			tmin = tmin_z
 		if tmax_z < tmax:
 			tmax = tmax_z
-	
+
 		return tmin < ray.maxt and tmax > ray.mint
 
+	def _traversal(self, ray: 'geo.Ray') -> ['np.ndarray', [FLOAT], [FLOAT], [INT]]:
+		"""Node bounds at the time of `ray`, its origin, inverse direction and signs"""
+		bounds = self.nodes['bounds']
+		if self.bounds1 is not None:
+			t0, t1 = self.motion_range
+			s = min(max((ray.time - t0) / (t1 - t0), 0.), 1.)
+			bounds = (1. - s) * bounds + s * self.bounds1
+		with np.errstate(divide='ignore'):
+			inv_dir = (1. / np.asarray(ray.d, dtype=FLOAT)).tolist()
+		return bounds, np.asarray(ray.o, dtype=FLOAT).tolist(), inv_dir, (np.asarray(ray.d) < 0.).astype(int).tolist()
+
 	def intersect(self, ray: 'geo.Ray', isect: 'Intersection') -> bool:
-		from pytracer.aggregate.accelerator.bvh import BVH
 		if self.nodes is None:
 			return False
 		hit = False
-		inv_dir = 1. / ray.d
-		dir_neg = ray.d < 0.
-		
+		bounds, o, inv_dir, dir_neg = self._traversal(ray)
+		offsets, n_prims, axes = self.nodes['offset'], self.nodes['n_prim'], self.nodes['axis']
+		n_nodes = 0
+		n_tested = 0
+
 		todo_idx = 0
 		node_idx = 0
 		todo = [None] * 64
 		while True:
-			node = self.nodes[node_idx]
+			n_nodes += 1
 			# check intersection
-			if BVH._intersect_p(node.bounds, ray, inv_dir, dir_neg):
-				if node.n_prim > 0:
+			if BVH._intersect_p(bounds[node_idx].tolist(), ray, o, inv_dir, dir_neg):
+				n_prim = INT(n_prims[node_idx])
+				if n_prim > 0:
 					# intersect with primitives in the leaf
-					for i in range(node.n_prim):
-						if self.primitives[node.offset + i].intersect(ray, isect):
+					n_tested += n_prim
+					offset = INT(offsets[node_idx])
+					for i in range(offset, offset + n_prim):
+						if self.items[i] < 0:
+							if self.primitives[i].intersect(ray, isect):
+								hit = True
+						elif self.primitives[i].intersect_item(self.items[i], ray, isect):
 							hit = True
 					if todo_idx == 0:
 						break
 					todo_idx -= 1
 					node_idx = todo[todo_idx]
-				
+
 				else:
 					# advance to near node
-					if dir_neg[node.axis]:
+					if dir_neg[axes[node_idx]]:
 						todo[todo_idx] = node_idx + 1
 						todo_idx += 1
-						node_idx = node.offset
+						node_idx = INT(offsets[node_idx])
 
 					else:
-						todo[todo_idx] = node.offset
+						todo[todo_idx] = INT(offsets[node_idx])
 						todo_idx += 1
 						node_idx += 1
-			
+
 			else:
 				if todo_idx == 0:
 					break
 				todo_idx -= 1
 				node_idx = todo[todo_idx]
-		
+
+		self.n_rays += 1
+		self.n_nodes_visited += n_nodes
+		self.n_prims_tested += n_tested
 		return hit
 
 	def intersect_p(self, ray :'geo.Ray') -> bool:
-		from pytracer.aggregate.accelerator.bvh import BVH
 		if self.nodes is None:
 			return False
-		origin = ray(ray.mint)
-		inv_dir = 1. / ray.d
-		dir_neg = ray.d < 0.
+		hit = False
+		bounds, o, inv_dir, dir_neg = self._traversal(ray)
+		offsets, n_prims, axes = self.nodes['offset'], self.nodes['n_prim'], self.nodes['axis']
+		n_nodes = 0
+		n_tested = 0
 
 		todo_idx = 0
 		node_idx = 0
 		todo = [None] * 64
 		while True:
-			node = self.nodes[node_idx]
+			n_nodes += 1
 			# check intersection
-			if BVH._intersect_p(node.bounds, ray, inv_dir, dir_neg):
-				if node.n_prim > 0:
+			if BVH._intersect_p(bounds[node_idx].tolist(), ray, o, inv_dir, dir_neg):
+				n_prim = INT(n_prims[node_idx])
+				if n_prim > 0:
 					# intersect with primitives in the leaf
-					for i in range(node.n_prim):
-						if self.primitives[node.offset + i].intersect_p(ray):
-							return True
-					if todo_idx == 0:
+					offset = INT(offsets[node_idx])
+					for i in range(offset, offset + n_prim):
+						n_tested += 1
+						if self.primitives[i].intersect_p(ray) if self.items[i] < 0 else \
+								self.primitives[i].intersect_p_item(self.items[i], ray):
+							hit = True
+							break
+					if hit or todo_idx == 0:
 						break
 					todo_idx -= 1
 					node_idx = todo[todo_idx]
 
 				else:
 					# advance to near node
-					if dir_neg[node.axis]:
+					if dir_neg[axes[node_idx]]:
 						todo[todo_idx] = node_idx + 1
 						todo_idx += 1
-						node_idx = node.offset
+						node_idx = INT(offsets[node_idx])
 
 					else:
-						todo[todo_idx] = node.offset
+						todo[todo_idx] = INT(offsets[node_idx])
 						todo_idx += 1
 						node_idx += 1
 
@@ -407,13 +973,184 @@ class BVH(Aggregate):
 				todo_idx -= 1
 				node_idx = todo[todo_idx]
 
-		return False
+		self.n_rays += 1
+		self.n_nodes_visited += n_nodes
+		self.n_prims_tested += n_tested
+		return hit
+
+	def _traverse_batch(self, rays: 'geo.RayBatch', done: 'np.ndarray', ordered: bool):
+		"""
+		Yields the offset and size of the leaves reached
+		by the rays of a batch, each with the indices of
+		the rays overlapping it.
+		Rays are culled by their current `maxt` and
+		dropped once `done` is set by the caller. If
+		`ordered`, rays are split at each node s.t.
+		they visit the near child first, otherwise
+		the child near to most of them goes first.
+		"""
+		b0, b1 = self.nodes['bounds'], self.bounds1
+		with np.errstate(divide='ignore', invalid='ignore'):
+			inv_dir = 1. / rays.d
+		if b1 is not None:
+			t0, t1 = self.motion_range
+			s = np.clip((rays.time - t0) / (t1 - t0), 0., 1.)[:, np.newaxis, np.newaxis]
+
+		n_nodes = 0
+		todo = [(0, np.flatnonzero(~done))]
+		while len(todo) > 0:
+			node_idx, idx = todo.pop()
+			idx = idx[~done[idx]]
+			if len(idx) == 0:
+				continue
+			n_nodes += len(idx)
+			_, offset, n_prim, axis = self.nodes[node_idx].item()
+
+			# slab test of the node against all rays at once
+			bounds = b0[node_idx] if b1 is None else \
+				(1. - s[idx]) * b0[node_idx] + s[idx] * b1[node_idx]
+			with np.errstate(invalid='ignore'):
+				t_lo = (bounds[..., 0, :] - rays.o[idx]) * inv_dir[idx]
+				t_hi = (bounds[..., 1, :] - rays.o[idx]) * inv_dir[idx]
+			tmin = np.fmin(t_lo, t_hi).max(axis=1)
+			tmax = np.fmax(t_lo, t_hi).min(axis=1)
+			idx = idx[(tmin <= tmax) & (tmin < rays.maxt[idx]) & (tmax > rays.mint[idx])]
+			if len(idx) == 0:
+				continue
+
+			if n_prim > 0:
+				yield offset, n_prim, idx
+			else:
+				neg = rays.d[idx, axis] < 0.
+				if ordered:
+					# each ray visits the near child first
+					pos, neg = idx[~neg], idx[neg]
+					todo.extend([(offset, pos), (node_idx + 1, neg), (offset, neg), (node_idx + 1, pos)])
+				elif 2 * np.count_nonzero(neg) > len(idx):
+					todo.extend([(node_idx + 1, idx), (offset, idx)])
+				else:
+					todo.extend([(offset, idx), (node_idx + 1, idx)])
+
+		self.n_rays += len(rays)
+		self.n_nodes_visited += n_nodes
+
+	def intersect_batch(self, rays: 'geo.RayBatch', isects: ['Intersection']) -> 'np.ndarray':
+		"""
+		Intersects a batch of rays, traversing the
+		hierarchy once for all of them. Returns whether
+		each ray hit, `isects` and `rays.maxt` are
+		updated as by `intersect()`.
+		"""
+		hit = np.zeros(len(rays), dtype=bool)
+		if self.nodes is None or len(rays) == 0:
+			return hit
+		rs = [None] * len(rays)
+		for offset, n_prim, idx in self._traverse_batch(rays, np.zeros(len(rays), dtype=bool), True):
+			self.n_prims_tested += n_prim * len(idx)
+			for k in idx:
+				if rs[k] is None:
+					rs[k] = rays.ray(k)
+				ray = rs[k]
+				for i in range(offset, offset + n_prim):
+					if self.items[i] < 0:
+						if self.primitives[i].intersect(ray, isects[k]):
+							hit[k] = True
+					elif self.primitives[i].intersect_item(self.items[i], ray, isects[k]):
+						hit[k] = True
+				rays.maxt[k] = ray.maxt
+		return hit
+
+	def intersect_p_batch(self, rays: 'geo.RayBatch') -> 'np.ndarray':
+		"""Returns whether each ray of a batch hits anything"""
+		hit = np.zeros(len(rays), dtype=bool)
+		if self.nodes is None or len(rays) == 0:
+			return hit
+		for offset, n_prim, idx in self._traverse_batch(rays, hit, False):
+			for k in idx:
+				ray = rays.ray(k)
+				for i in range(offset, offset + n_prim):
+					self.n_prims_tested += 1
+					if self.primitives[i].intersect_p(ray) if self.items[i] < 0 else \
+							self.primitives[i].intersect_p_item(self.items[i], ray):
+						hit[k] = True
+						break
+		return hit
+
+	def reset_stats(self):
+		"""Resets the traversal counters reported by `stats()`."""
+		self.n_rays = 0
+		self.n_nodes_visited = 0
+		self.n_prims_tested = 0
+
+	def stats(self) -> dict:
+		"""
+		Reports the quality of the hierarchy:
+		node counts, depth (of leaves) and leaf
+		size histograms, SAH cost, an estimate of
+		the memory footprint in bytes and, if any
+		ray has been traced, the average number of
+		nodes visited and primitives tested per ray.
+		"""
+		import sys
+		ret = {
+			'nodes': 0,
+			'leaves': 0,
+			'interior': 0,
+			'primitives': len(self.primitives),
+			'max_depth': 0,
+			'depth_histogram': {},
+			'leaf_size_histogram': {},
+			'sah_cost': 0.,
+			'memory': sys.getsizeof(self.primitives) + self.items.nbytes,
+			'rays': self.n_rays,
+			'nodes_visited': self.n_nodes_visited,
+			'prims_tested': self.n_prims_tested,
+			'avg_nodes_visited': self.n_nodes_visited / self.n_rays if self.n_rays > 0 else 0.,
+			'avg_prims_tested': self.n_prims_tested / self.n_rays if self.n_rays > 0 else 0.,
+		}
+		if self.nodes is None:
+			return ret
+
+		ret['memory'] += self.nodes.nbytes + (self.bounds1.nbytes if self.bounds1 is not None else 0)
+		sa = BVH._area(self.nodes['bounds'])
+		offsets, n_prims = self.nodes['offset'].tolist(), self.nodes['n_prim'].tolist()
+		cost = 0.
+		todo = [(0, 0)]
+		while len(todo) > 0:
+			idx, depth = todo.pop()
+			n_prim = n_prims[idx]
+			ret['nodes'] += 1
+			if n_prim > 0:
+				ret['leaves'] += 1
+				ret['max_depth'] = max(ret['max_depth'], depth)
+				ret['depth_histogram'][depth] = ret['depth_histogram'].get(depth, 0) + 1
+				ret['leaf_size_histogram'][n_prim] = ret['leaf_size_histogram'].get(n_prim, 0) + 1
+				cost += BVH.INTERSECT_COST * n_prim * sa[idx]
+			else:
+				ret['interior'] += 1
+				cost += BVH.TRAVERSAL_COST * sa[idx]
+				todo.append((idx + 1, depth + 1))
+				todo.append((offsets[idx], depth + 1))
+
+		ret['sah_cost'] = cost / sa[0] if sa[0] > 0. else cost
+		return ret
 
 	def world_bound(self):
 		if self.nodes is not None:
-			return self.nodes[0].bounds
+			b = self.nodes['bounds'][0]
+			if self.bounds1 is not None:
+				b = np.array([np.minimum(b[0], self.bounds1[0, 0]), np.maximum(b[1], self.bounds1[0, 1])])
+			return geo.BBox(geo.Point.from_arr(b[0]), geo.Point.from_arr(b[1]))
 		return geo.BBox()
 
+	def world_bound_at(self, time: FLOAT) -> 'geo.BBox':
+		if self.nodes is not None and self.bounds1 is not None:
+			t0, t1 = self.motion_range
+			s = min(max((time - t0) / (t1 - t0), 0.), 1.)
+			b = (1. - s) * self.nodes['bounds'][0] + s * self.bounds1[0]
+			return geo.BBox(geo.Point.from_arr(b[0]), geo.Point.from_arr(b[1]))
+		return self.world_bound()
+
 	def can_intersect(self) -> bool:
 		return True
 
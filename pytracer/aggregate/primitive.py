@@ -11,13 +11,15 @@ Modified on Aug 13, 2017
 
 from __future__ import absolute_import
 from abc import (ABCMeta, abstractmethod)
+import numpy as np
+from pytracer import util
 import pytracer.geometry as geo
 import pytracer.transform as trans
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
 	from pytracer.aggregate import Intersection
 
-__all__ = ['Primitive', 'GeometricPrimitive', 'TransformedPrimitive']
+__all__ = ['Primitive', 'GeometricPrimitive', 'MeshPrimitive', 'TransformedPrimitive']
 
 
 class Primitive(object, metaclass=ABCMeta):
@@ -65,6 +67,25 @@ class Primitive(object, metaclass=ABCMeta):
 	def get_bssrdf(self, dg: 'geo.DifferentialGeometry', o2w: 'trans.Transform') -> 'BSSRDF':
 		raise NotImplementedError('{}.get_bssrdf(): Not implemented'.format(self.__class__))
 
+	def intersect_batch(self, rays: 'geo.RayBatch', isects: ['Intersection']) -> 'np.ndarray':
+		"""
+		Intersects each ray of a batch in turn, aggregates
+		may traverse for all rays at once instead.
+		"""
+		hit = np.zeros(len(rays), dtype=bool)
+		for k in range(len(rays)):
+			ray = rays.ray(k)
+			hit[k] = self.intersect(ray, isects[k])
+			rays.maxt[k] = ray.maxt
+		return hit
+
+	def intersect_p_batch(self, rays: 'geo.RayBatch') -> 'np.ndarray':
+		return np.array([self.intersect_p(rays.ray(k)) for k in range(len(rays))], dtype=bool)
+
+	def world_bound_at(self, time: 'FLOAT') -> 'geo.BBox':
+		"""Bounds at a given time, the same for static primitives."""
+		return self.world_bound()
+
 	def full_refine(self, refined: ['Primitive']):
 		todo = [self]
 		while len(todo) > 0:
@@ -133,15 +154,91 @@ class GeometricPrimitive(Primitive):
 		return self.material.get_bssrdf(dg, dgs)
 
 
+# Triangle meshes rendered directly
+class MeshPrimitive(Primitive):
+	"""
+	MeshPrimitive Class
+
+	Renders a `TriangleMesh` without refining it
+	into a `GeometricPrimitive` per triangle. The
+	`BVH` references it once per triangle and calls
+	`intersect_item()` with the triangle id. Material
+	and area light are shared by the whole mesh.
+	"""
+	def __init__(self, mesh: 'sh.TriangleMesh', m: 'Material', a: 'AreaLight' = None):
+		super().__init__()
+		self.mesh = mesh
+		self.material = m
+		self.areaLight = a
+
+	def __repr__(self):
+		return super().__repr__() + '\n{}'.format(self.mesh)
+
+	def intersect_item(self, i: 'INT', r: 'geo.Ray', isect: 'Intersection') -> bool:
+		is_intersect, thit, rEps, dg = self.mesh.intersect_triangle(i, r)
+		if not is_intersect:
+			return False
+
+		isect.dg = dg
+		isect.primitive = self
+		isect.w2o = self.mesh.w2o
+		isect.o2w = self.mesh.o2w
+		isect.shapeId = self.mesh.shapeId
+		isect.primitiveId = self.primitiveId
+		isect.rEps = rEps
+		r.maxt = thit
+		return True
+
+	def intersect_p_item(self, i: 'INT', r: 'geo.Ray') -> bool:
+		return self.mesh.intersect_p_triangle(i, r)
+
+	def intersect(self, r: 'geo.Ray', isect: 'Intersection') -> bool:
+		# brute force, meant to be
+		# indexed by an aggregate
+		hit = False
+		for i in range(self.mesh.ntris):
+			if self.intersect_item(i, r, isect):
+				hit = True
+		return hit
+
+	def intersect_p(self, r: 'geo.Ray') -> bool:
+		for i in range(self.mesh.ntris):
+			if self.mesh.intersect_p_triangle(i, r):
+				return True
+		return False
+
+	def world_bound(self) -> 'geo.BBox':
+		return self.mesh.world_bound()
+
+	def can_intersect(self) -> bool:
+		return True
+
+	def refine(self, refined: ['Primitive']):
+		for sh in self.mesh.refine():
+			refined.append(GeometricPrimitive(sh, self.material, self.areaLight))
+
+	def get_area_light(self):
+		return self.areaLight
+
+	# dg.shape is the `Triangle` hit
+	def get_bsdf(self, dg: 'geo.DifferentialGeometry', o2w: 'trans.Transform'):
+		dgs = dg.shape.get_shading_geometry(o2w, dg)
+		return self.material.get_bsdf(dg, dgs)
+
+	def get_bssrdf(self, dg: 'geo.DifferentialGeometry', o2w: 'trans.Transform'):
+		dgs = dg.shape.get_shading_geometry(o2w, dg)
+		return self.material.get_bssrdf(dg, dgs)
+
+
 # sh.Shapes with animated transfomration and object instancing
 class TransformedPrimitive(Primitive):
-	def __init__(self, prim: 'Primitive', w2p: 'Animatedtrans.Transform'):
+	def __init__(self, prim: 'Primitive', w2p: 'trans.AnimatedTransform'):
 		super().__init__()
 		self.primitive = prim
 		self.w2p = w2p
 
 	def __repr__(self):
-		return super().__repr__(self) + '\n{}'.format(self.prim)
+		return super().__repr__() + '\n{}'.format(self.primitive)
 
 	def intersect(self, r: 'geo.Ray', isect: 'Intersection') -> bool:
 		w2p = self.w2p.interpolate(r.time)
@@ -173,14 +270,40 @@ class TransformedPrimitive(Primitive):
 		return self.primitive.intersect_p(self.w2p(r))		
 
 	def world_bound(self) -> 'geo.BBox':
-		return self.w2p.motion_bounds(self.primitive.world_bound(), True)
+		if not self.w2p.animated:
+			return self.world_bound_at(self.w2p.startTime)
+		ret = geo.BBox()
+		steps = 128
+		for i in range(steps):
+			ret.union(self.world_bound_at(util.lerp(i / (steps - 1), self.w2p.startTime, self.w2p.endTime)))
+		# points move by at most half a step between samples
+		return ret.expand(.5 * self.w2p.max_speed(self.primitive.world_bound(), True) / (steps - 1))
+
+	def world_bound_at(self, time: 'FLOAT') -> 'geo.BBox':
+		# transform all corners, the bounds
+		# may be rotated into the world
+		p2w = self.w2p.interpolate(time).inverse()
+		b = self.primitive.world_bound()
+		ret = geo.BBox()
+		for i in range(8):
+			ret.union(p2w(geo.Point(b[i & 1].x, b[(i >> 1) & 1].y, b[(i >> 2) & 1].z)))
+		return ret
 
 	def can_intersect(self) -> bool:
-		return self.shape.can_intersect()
+		# the instanced primitive is assumed
+		# to be intersectable, e.g., an aggregate
+		return True
 
 	def refine(self, refined: ['Primitive']):
-		r = self.shape.refine()
-		for sh in r:
-			refined.append(GeometricPrimitive(sh, self.material, self.areaLight))
+		raise NotImplementedError('{}.refine(): Not implemented'.format(self.__class__))
+
+	# intersect() records the primitive
+	# instanced in the `Intersection`
+	def get_area_light(self):
+		return None
 
+	def get_bsdf(self, dg: 'geo.DifferentialGeometry', o2w: 'trans.Transform'):
+		raise RuntimeError('{}.get_bsdf(): Should not be called'.format(self.__class__))
 
+	def get_bssrdf(self, dg: 'geo.DifferentialGeometry', o2w: 'trans.Transform'):
+		raise RuntimeError('{}.get_bssrdf(): Should not be called'.format(self.__class__))
@@ -54,15 +54,13 @@ class Camera(object, metaclass=ABCMeta):
 		# find ray shift along x
 		from pytracer.sampler import CameraSample
 		
-		xshift = sample.duplicate(1)[0]
-		xshift.imageX += 1
+		xshift = CameraSample(sample.imageX + 1., sample.imageY, sample.lens_u, sample.lens_v, sample.time)
 		wtx, rx = self.generate_ray(xshift)
 		rd.rxOrigin = rx.o
 		rd.rxDirection = rx.d
 
 		# find ray shift along y
-		yshift = sample.duplicate(1)[0]
-		yshift.imageY += 1
+		yshift = CameraSample(sample.imageX, sample.imageY + 1., sample.lens_u, sample.lens_v, sample.time)
 		wty, ry = self.generate_ray(yshift)
 		rd.ryOrigin = ry.o
 		rd.ryDirection = ry.d
@@ -73,3 +71,13 @@ class Camera(object, metaclass=ABCMeta):
 		rd.has_differentials = True
 		return [wt, rd]
 
+	def generate_rays(self, samples: 'SampleBatch') -> ['np.ndarray', 'geo.RayBatch']:
+		"""
+		Generate ray differentials for a batch
+		of samples, returns weights (N,) and
+		a `geo.RayBatch`. Loops over
+		`generate_ray_differential()` unless
+		overridden.
+		"""
+		res = [self.generate_ray_differential(sample) for sample in samples]
+		return np.array([wt for wt, _ in res], dtype=FLOAT), geo.RayBatch.from_rays([r for _, r in res])
@@ -61,6 +61,22 @@ class ProjectiveCamera(Camera):
 	def generate_ray(self, sample: 'CameraSample') -> [FLOAT, 'geo.Ray']:
 		pass
 
+	def _lens_rays(self, cam: 'np.ndarray', o: 'np.ndarray', d: 'np.ndarray') -> ['np.ndarray', 'np.ndarray']:
+		"""
+		Thin lens model for (N, 3) camera space rays
+		given `SampleBatch.camera`, returns the points
+		on the lens and the directions to the focal plane
+		"""
+		from pytracer.montecarlo import concentric_sample_disk_batch
+		lens_u, lens_v = concentric_sample_disk_batch(cam[:, 2], cam[:, 3])
+		lens = np.column_stack([lens_u * self.lens_rad, lens_v * self.lens_rad, np.zeros(len(cam))])
+
+		# compute point on focal plane
+		ft = self.focal_dist / d[:, 2]
+		p_foc = o + d * ft[:, np.newaxis]
+		d = p_foc - lens
+		return lens, d / np.linalg.norm(d, axis=1)[:, np.newaxis]
+
 
 class OrthoCamera(ProjectiveCamera):
 	"""
@@ -117,15 +133,34 @@ class OrthoCamera(ProjectiveCamera):
 		wt, rd = self.generate_ray(sample)
 		rd = geo.RayDifferential.from_ray(rd)
 
-		# find ray shift along x
-		rd.rxOrigin = rd.o + self.dxCam
-		rd.ryOrigin = rd.o + self.dyCam
+		# find ray shift along x, `rd` is in world space
+		rd.rxOrigin = rd.o + self.c2w(rd.time, self.dxCam)
+		rd.ryOrigin = rd.o + self.c2w(rd.time, self.dyCam)
 		rd.rxDirection = rd.ryDirection = rd.d
 		rd.has_differentials = True
-		rd = self.c2w(rd)
 
 		return [wt, rd]
 
+	def generate_rays(self, samples: 'SampleBatch') -> ['np.ndarray', 'geo.RayBatch']:
+		"""
+		Generate ray differentials for a batch
+		of samples, c.f. `generate_ray_differential()`
+		"""
+		cam = samples.camera
+		n = len(cam)
+		o = self.r2c.transform_points(np.column_stack([cam[:, 0:2], np.zeros(n)]))
+		d = np.tile([0., 0., 1.], (n, 1))
+
+		# modify ray for dof
+		if self.lens_rad > 0.:
+			o, d = self._lens_rays(cam, o, d)
+
+		ray = geo.RayBatch(o, d, 0., np.inf, util.lerp(cam[:, 4], self.s_open, self.s_close))
+		ray.rxOrigin = o + self.dxCam
+		ray.ryOrigin = o + self.dyCam
+		ray.has_differentials = True
+		return np.ones(n, dtype=FLOAT), self.c2w(ray)
+
 
 class PerspectiveCamera(ProjectiveCamera):
 	"""
@@ -226,8 +261,36 @@ class PerspectiveCamera(ProjectiveCamera):
 			ray.ryDirection = geo.normalize(self.dyCam + p_cam)
 
 		ray.time = sample.time
-		ray = self.c2w(ray)
 		ray.has_differentials = True
+		ray = self.c2w(ray)
 
 		return [1., ray]
 
+	def generate_rays(self, samples: 'SampleBatch') -> ['np.ndarray', 'geo.RayBatch']:
+		"""
+		Generate ray differentials for a batch
+		of samples, c.f. `generate_ray_differential()`
+		"""
+		cam = samples.camera
+		n = len(cam)
+		p_cam = self.r2c.transform_points(np.column_stack([cam[:, 0:2], np.zeros(n)]))
+		o = np.zeros([n, 3])
+		d = p_cam / np.linalg.norm(p_cam, axis=1)[:, np.newaxis]
+		dx = p_cam + self.dxCam
+		dx /= np.linalg.norm(dx, axis=1)[:, np.newaxis]
+		dy = p_cam + self.dyCam
+		dy /= np.linalg.norm(dy, axis=1)[:, np.newaxis]
+
+		if self.lens_rad > 0.:
+			# depth of field, differentials through the same lens point
+			lens, d = self._lens_rays(cam, o, d)
+			_, dx = self._lens_rays(cam, o, dx)
+			_, dy = self._lens_rays(cam, o, dy)
+			o = lens
+
+		ray = geo.RayBatch(o, d, 0., np.inf, cam[:, 4])
+		ray.rxOrigin = ray.ryOrigin = o
+		ray.rxDirection, ray.ryDirection = dx, dy
+		ray.has_differentials = True
+		return np.ones(n, dtype=FLOAT), self.c2w(ray)
+
@@ -94,12 +94,14 @@ class ImageFilm(Film):
 		"""
 		Pixel Class
 
-		Inner class of `ImageFilm`
+		Inner class of `ImageFilm`, optionally
+		viewing the packed arrays of the film
 		"""
-		def __init__(self):
-			self.Lxyz = np.zeros(3, dtype=FLOAT)
-			self.splatXYZ = np.zeros(3, dtype=FLOAT)
-			self.weight_sum = 0.
+		def __init__(self, Lxyz: 'np.ndarray'=None, splatXYZ: 'np.ndarray'=None,
+		             weight_sum: 'np.ndarray'=None):
+			self.Lxyz = np.zeros(3, dtype=FLOAT) if Lxyz is None else Lxyz
+			self.splatXYZ = np.zeros(3, dtype=FLOAT) if splatXYZ is None else splatXYZ
+			self.weight_sum = 0. if weight_sum is None else weight_sum
 			self.lock = threading.Lock() # for multi-threading
 
 		def __repr__(self):
@@ -118,11 +120,15 @@ class ImageFilm(Film):
 		self.yPixel_start = INT(np.ceil(xr * crop[2]))
 		self.yPixel_cnt = np.maximum(1, INT(np.ceil(yr * crop[3])) - self.yPixel_start)
 
-		# allocate storage
+		# allocate storage, pixels are views
+		# of the packed arrays
+		self.Lxyz = np.zeros([self.xPixel_cnt, self.yPixel_cnt, 3], dtype=FLOAT)
+		self.splatXYZ = np.zeros([self.xPixel_cnt, self.yPixel_cnt, 3], dtype=FLOAT)
+		self.weight_sum = np.zeros([self.xPixel_cnt, self.yPixel_cnt], dtype=FLOAT)
 		self.pixels = np.empty([self.xPixel_cnt, self.yPixel_cnt], dtype=object)
 		for i in range(self.xPixel_cnt):
 			for j in range(self.yPixel_cnt):
-				self.pixels[i][j] = self.Pixel()
+				self.pixels[i][j] = self.Pixel(self.Lxyz[i, j], self.splatXYZ[i, j], self.weight_sum[i, j, ...])
 
 		# precompute filter table
 		# as an np array of np arrays
@@ -197,6 +203,46 @@ class ImageFilm(Film):
 						pxl.weight_sum += wt
 					# pxl.lock.release()
 
+	def add_samples(self, image_x: 'np.ndarray', image_y: 'np.ndarray', L: 'SpectrumBatch',
+	                wavelengths: 'SampledWavelengths' = None):
+		"""
+		Vectorized `add_sample()`, `image_x` and `image_y`
+		are the raster positions of N samples, `L` is a
+		`SpectrumBatch` or (N, 3) array of RGB values,
+		or (N, n) radiance at the `wavelengths` sampled.
+		Not synchronized.
+		"""
+		from pytracer.spectral import (rgb2xyz, SpectrumBatch)
+		if wavelengths is not None:
+			xyz = wavelengths.to_xyz(L)
+		elif isinstance(L, SpectrumBatch):
+			xyz = L.to_xyz()
+		else:
+			xyz = rgb2xyz(L)
+		dX = np.asarray(image_x, dtype=FLOAT) - .5
+		dY = np.asarray(image_y, dtype=FLOAT) - .5
+		x0 = np.ceil(dX - self.filter.xw).astype(INT)
+		y0 = np.ceil(dY - self.filter.yw).astype(INT)
+
+		# visit each offset of the filter footprint
+		for oy in range(INT(np.ceil(2. * self.filter.yw)) + 1):
+			y = y0 + oy
+			ify = np.minimum(FILTER_TABLE_SIZE - 1,
+			                 np.floor(np.fabs((y - dY) * FILTER_TABLE_SIZE * self.filter.ywInv)).astype(INT))
+			for ox in range(INT(np.ceil(2. * self.filter.xw)) + 1):
+				x = x0 + ox
+				mask = (x <= dX + self.filter.xw) & (y <= dY + self.filter.yw) & \
+				       (x >= self.xPixel_start) & (x < self.xPixel_start + self.xPixel_cnt) & \
+				       (y >= self.yPixel_start) & (y < self.yPixel_start + self.yPixel_cnt)
+				if not np.any(mask):
+					continue
+				ifx = np.minimum(FILTER_TABLE_SIZE - 1,
+				                 np.floor(np.fabs((x[mask] - dX[mask]) * FILTER_TABLE_SIZE * self.filter.xwInv)).astype(INT))
+				wt = self.filter_table[ify[mask], ifx]
+				idx = (x[mask] - self.xPixel_start, y[mask] - self.yPixel_start)
+				np.add.at(self.Lxyz, idx, wt[:, np.newaxis] * xyz[mask])
+				np.add.at(self.weight_sum, idx, wt)
+
 	def splat(self, sample: 'CameraSample', L: 'Spectrum'):
 		"""
 		Used to sum the contribution
@@ -240,19 +286,13 @@ class ImageFilm(Film):
 		"""
 		# convert to RGB and compute pixel values
 		from pytracer.spectral import xyz2rgb
-		rgb = np.empty([self.yPixel_cnt, self.xPixel_cnt, 3], dtype=FLOAT)
-
-		for y in range(self.yPixel_cnt):
-			for x in range(self.xPixel_cnt):
-				
-				rgb[y, x] = xyz2rgb(self.pixels[x][y].Lxyz)
-				ws = self.pixels[x][y].weight_sum
-
-				if not ws == 0.:
-					rgb[y, x] = np.maximum(0., rgb[y, x] / ws)
+		rgb = xyz2rgb(self.Lxyz)
+		ws = self.weight_sum[:, :, np.newaxis]
+		rgb = np.where(ws == 0., rgb, np.maximum(0., rgb / np.where(ws == 0., 1., ws)))
 
-				# add splat values
-				rgb[y, x] += splat_scale * xyz2rgb(self.pixels[x][y].splatXYZ)
+		# add splat values
+		rgb += splat_scale * xyz2rgb(self.splatXYZ)
+		rgb = np.ascontiguousarray(rgb.transpose(1, 0, 2))
 
 		# write image
 		return iio.write_image(self.filename, rgb, None,
@@ -378,6 +378,82 @@ class RayDifferential(Ray):
 		return self
 
 
+class RayBatch(object):
+	"""
+	RayBatch Class
+
+	N rays stored as arrays, origins `o` and
+	directions `d` (N, 3), `mint`, `maxt`,
+	`time` and `depth` (N,). Differentials,
+	if any, are (N, 3) arrays as well.
+	"""
+
+	def __init__(self, o: 'np.ndarray', d: 'np.ndarray', mint: FLOAT = 0., maxt: FLOAT = np.inf,
+	             time: FLOAT = 0., depth: INT = 0):
+		self.o = np.asarray(o, dtype=FLOAT).reshape(-1, 3)
+		self.d = np.asarray(d, dtype=FLOAT).reshape(-1, 3)
+		n = len(self.o)
+		self.mint = np.full(n, mint, dtype=FLOAT)
+		self.maxt = np.full(n, maxt, dtype=FLOAT)
+		self.time = np.full(n, time, dtype=FLOAT)
+		self.depth = np.full(n, depth, dtype=INT)
+		self.has_differentials = False
+		self.rxOrigin = self.ryOrigin = self.o
+		self.rxDirection = self.ryDirection = self.d
+
+	def __repr__(self):
+		return "{}\nRays: {}\nDifferentials: {}".format(self.__class__, len(self), self.has_differentials)
+
+	def __len__(self):
+		return len(self.o)
+
+	def __getitem__(self, idx) -> 'RayBatch':
+		"""The rays at `idx`, an index array or mask, as a new batch"""
+		ret = RayBatch(self.o[idx], self.d[idx])
+		ret.mint, ret.maxt = self.mint[idx], self.maxt[idx]
+		ret.time, ret.depth = self.time[idx], self.depth[idx]
+		if self.has_differentials:
+			ret.rxOrigin, ret.ryOrigin = self.rxOrigin[idx], self.ryOrigin[idx]
+			ret.rxDirection, ret.ryDirection = self.rxDirection[idx], self.ryDirection[idx]
+			ret.has_differentials = True
+		return ret
+
+	@classmethod
+	def from_rays(cls, rays: ['Ray']) -> 'RayBatch':
+		self = cls([r.o for r in rays], [r.d for r in rays], [r.mint for r in rays],
+		           [r.maxt for r in rays], [r.time for r in rays], [r.depth for r in rays])
+		if all(getattr(r, 'has_differentials', False) for r in rays):
+			self.rxOrigin = np.array([r.rxOrigin for r in rays], dtype=FLOAT)
+			self.ryOrigin = np.array([r.ryOrigin for r in rays], dtype=FLOAT)
+			self.rxDirection = np.array([r.rxDirection for r in rays], dtype=FLOAT)
+			self.ryDirection = np.array([r.ryDirection for r in rays], dtype=FLOAT)
+			self.has_differentials = True
+		return self
+
+	def ray(self, i: INT) -> 'RayDifferential':
+		"""The i-th ray as a `RayDifferential`"""
+		r = RayDifferential(Point.from_arr(self.o[i]), Vector.from_arr(self.d[i]), self.mint[i], self.maxt[i],
+		                    self.depth[i], self.time[i])
+		if self.has_differentials:
+			r.rxOrigin = Point.from_arr(self.rxOrigin[i])
+			r.ryOrigin = Point.from_arr(self.ryOrigin[i])
+			r.rxDirection = Vector.from_arr(self.rxDirection[i])
+			r.ryDirection = Vector.from_arr(self.ryDirection[i])
+			r.has_differentials = True
+		return r
+
+	def __call__(self, t: 'np.ndarray') -> 'np.ndarray':
+		"""Points at parameters `t`, (N,)"""
+		return self.o + self.d * np.asarray(t)[:, np.newaxis]
+
+	def scale_differential(self, s: FLOAT):
+		self.rxOrigin = self.o + (self.rxOrigin - self.o) * s
+		self.ryOrigin = self.o + (self.ryOrigin - self.o) * s
+		self.rxDirection = self.d + (self.rxDirection - self.d) * s
+		self.ryDirection = self.d + (self.ryDirection - self.d) * s
+		return self
+
+
 class BBox:
 	"""
 	BBox Class
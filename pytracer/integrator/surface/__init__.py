@@ -12,6 +12,7 @@ from pytracer.integrator.surface.surface import *
 from pytracer.integrator.surface.direct import *
 from pytracer.integrator.surface.whitted import *
 from pytracer.integrator.surface.path import *
+from pytracer.integrator.surface.wavefront import *
 
 __all__ = ['SurfaceIntegrator', 'LightStrategy', 'DirectLightingIntegrator',
-           'WhittedIntegrator', 'PathIntegrator']
\ No newline at end of file
+           'WhittedIntegrator', 'PathIntegrator', 'WavefrontPathIntegrator']
\ No newline at end of file
@@ -25,6 +25,7 @@ class LightStrategy(Enum):
 	"""
 	SAMPLE_ALL_UNIFORM = 1
 	SAMPLE_ONE_UNIFORM = 2
+	SAMPLE_ONE_TREE = 3  # by estimated contribution, c.f. `LightTree`
 
 
 class DirectLightingIntegrator(SurfaceIntegrator):
@@ -36,13 +37,19 @@ class DirectLightingIntegrator(SurfaceIntegrator):
 	def __init__(self, strategy: 'LightStrategy'=LightStrategy.SAMPLE_ALL_UNIFORM, max_depth: INT=5):
 		self.strategy = strategy
 		self.max_depth = max_depth
-		self.light_num_offset = 0
+		self.light_num_offset = -1
 		self.light_sample_offsets = None
 		self.bsdf_sample_offsets = None
+		self.light_tree = None
 
 	def __repr__(self):
 		return "{}\nStrategy: {}\n".format(self.__class__, self.strategy)
 
+	def preprocess(self, scene: 'Scene', camera: 'Camera', renderer: 'Renderer'):
+		if self.strategy == LightStrategy.SAMPLE_ONE_TREE:
+			from pytracer.light import LightTree
+			self.light_tree = LightTree(scene.lights, scene)
+
 	def request_samples(self, sampler: 'Sampler', sample: 'Sample', scene: 'Scene'):
 		from pytracer.light import LightSampleOffset
 		from pytracer.reflection import BSDFSampleOffset
@@ -64,9 +71,15 @@ class DirectLightingIntegrator(SurfaceIntegrator):
 			# sampling one light
 			n_lights = len(scene.lights)
 			self.light_sample_offsets = [LightSampleOffset(1, sample)]
-			self.light_num_offset = sample.add1d(1)
+			self.light_num_offset = sample.add_1d(1)
 			self.bsdf_sample_offsets = [BSDFSampleOffset(1, sample)]
 
+	def __one_light_offsets(self) -> ['LightSampleOffset', 'BSDFSampleOffset']:
+		"""Offsets of the single light sample, `None`s if not requested"""
+		if not self.light_sample_offsets:
+			return [None, None]
+		return [self.light_sample_offsets[0], self.bsdf_sample_offsets[0]]
+
 	def li(self, scene: 'Scene', renderer: 'Renderer', ray: 'geo.RayDifferential',
 			isect: 'Intersection', sample: 'Sample', rng=np.random.rand) -> 'Spectrum':
 		L = Spectrum(0.)
@@ -90,8 +103,17 @@ class DirectLightingIntegrator(SurfaceIntegrator):
 
 			elif self.strategy == LightStrategy.SAMPLE_ONE_UNIFORM:
 				from pytracer.integrator.utility import uniform_sample_one_light
+				light_offset, bsdf_offset = self.__one_light_offsets()
 				L += uniform_sample_one_light(scene, renderer, p, n, wo, isect.rEps, ray.time,
-						bsdf, sample, self.light_num_offset, self.light_sample_offsets, self.bsdf_sample_offsets, rng)
+						bsdf, sample, self.light_num_offset, light_offset, bsdf_offset, rng)
+
+			elif self.strategy == LightStrategy.SAMPLE_ONE_TREE:
+				from pytracer.integrator.utility import tree_sample_one_light
+				if self.light_tree is None:
+					self.preprocess(scene, None, renderer)
+				light_offset, bsdf_offset = self.__one_light_offsets()
+				L += tree_sample_one_light(scene, renderer, self.light_tree, p, n, wo, isect.rEps, ray.time,
+						bsdf, sample, self.light_num_offset, light_offset, bsdf_offset, rng)
 
 			else:
 				raise RuntimeError("Unknown LightStrategy")
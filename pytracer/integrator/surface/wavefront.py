@@ -0,0 +1,312 @@
+"""
+wavefront.py
+
+under pytracer.integrator.surface package
+
+Models path transport for
+batches of rays.
+"""
+from __future__ import absolute_import
+from pytracer import *
+import pytracer.geometry as geo
+from pytracer.integrator.surface import SurfaceIntegrator
+from pytracer.integrator.surface.path import PathIntegrator
+
+__all__ = ['WavefrontPathIntegrator']
+
+
+def _group(objs: list) -> [list, 'np.ndarray']:
+	"""
+	Distinct objects of `objs`, by identity, and the
+	index of each entry among them, -1 for `None`
+	"""
+	distinct, index = [], {}
+	idx = np.full(len(objs), -1, dtype=INT)
+	for k, o in enumerate(objs):
+		if o is None:
+			continue
+		if id(o) not in index:
+			index[id(o)] = len(distinct)
+			distinct.append(o)
+		idx[k] = index[id(o)]
+	return distinct, idx
+
+
+class WavefrontPathIntegrator(SurfaceIntegrator):
+	"""
+	WavefrontPathIntegrator
+
+	Path tracing as `PathIntegrator`, for a batch of
+	rays at once. The active paths are kept as arrays
+	and each bounce runs in stages over the whole pool:
+	intersection, emission, shading, shadow rays,
+	Russian roulette and compaction. Lights are sampled
+	by `Light.sample_l_many()`, BSDFs by `BSDFBatch`,
+	only BSDFs are made and media crossed path by path.
+
+	Direct lighting is weighted by MIS as in
+	`estimate_direct()`, but the BSDF sampled
+	direction is the continuation of the path
+	rather than an extra ray, also traced from the
+	last vertex. Samples of the first `SAMPLE_DEPTH`
+	bounces are taken from the sampler, later ones
+	from `rng`.
+
+	With `n_wavelengths` > 0, the hero wavelength mode,
+	radiance is carried at the `SampledWavelengths` of
+	each path instead of in RGB. Lights, BSDFs and
+	transmittance are still evaluated in RGB, their
+	values upsampled at the wavelengths by
+	`RGBToSpectrumTable`.
+	"""
+	SAMPLE_DEPTH = PathIntegrator.SAMPLE_DEPTH
+
+	def __init__(self, max_depth: INT=5, n_wavelengths: INT=0):
+		self.max_depth = max_depth
+		self.n_wavelengths = n_wavelengths
+		self.__light_num_offset = [0 for _ in range(WavefrontPathIntegrator.SAMPLE_DEPTH)]
+		self.__light_sample_offsets = [None for _ in range(WavefrontPathIntegrator.SAMPLE_DEPTH)]
+		self.__path_sample_offsets = [None for _ in range(WavefrontPathIntegrator.SAMPLE_DEPTH)]
+
+	def request_samples(self, sampler: 'Sampler', sample: 'Sample', scene: 'Scene'):
+		from pytracer.light import LightSampleOffset
+		from pytracer.reflection import BSDFSampleOffset
+		for i in range(self.SAMPLE_DEPTH):
+			self.__light_sample_offsets[i] = LightSampleOffset(1, sample)
+			self.__light_num_offset[i] = sample.add_1d(1)
+			self.__path_sample_offsets[i] = BSDFSampleOffset(1, sample)
+
+	def li(self, scene: 'Scene', renderer: 'Renderer', r: 'geo.RayDifferential',
+			isect: 'Intersection', sample: 'Sample', rng=np.random.rand) -> 'Spectrum':
+		from pytracer.sampler import SampleBatch
+		# the dimensions requested, if `sample` has them
+		samples = None
+		offset = self.__path_sample_offsets[-1]
+		if sample is not None and offset is not None and len(sample.twoD) > offset.offset_dir and \
+				all(d is not None for d in sample.oneD + sample.twoD):
+			samples = SampleBatch(sample, 1)
+			samples.fill([[sample.imageX, sample.imageY]], [[sample.lens_u, sample.lens_v]], [sample.time],
+			             [np.reshape(d, (1, -1)) for d in sample.oneD], [np.reshape(d, (1, -1, 2)) for d in sample.twoD])
+		rays = geo.RayBatch.from_rays([r])
+		return self.li_batch(scene, renderer, rays, samples, rng, [isect], np.ones(1, dtype=bool)).spectrum(0)
+
+	def path_samples(self, samples: 'SampleBatch', rows: 'np.ndarray', bounce: INT,
+	                 rng=np.random.rand) -> ['np.ndarray', 'np.ndarray', 'np.ndarray']:
+		"""
+		Random numbers of paths `rows` at `bounce`: (n,)
+		for choosing the light, (n, 3) for sampling it,
+		ordered as `LightSample`, and (n, 3) for the
+		next direction, ordered as `BSDFSample`
+		"""
+		if samples is None or bounce >= self.SAMPLE_DEPTH:
+			u = rng(len(rows), 7)
+			return [u[:, 0], u[:, 1:4], u[:, 4:7]]
+
+		lo = self.__light_sample_offsets[bounce]
+		po = self.__path_sample_offsets[bounce]
+		u_light = np.column_stack([samples.twoD(lo.offset_pos)[rows, 0], samples.oneD(lo.offset_com)[rows, 0]])
+		u_path = np.column_stack([samples.twoD(po.offset_dir)[rows, 0], samples.oneD(po.offset_com)[rows, 0]])
+		return [samples.oneD(self.__light_num_offset[bounce])[rows, 0], u_light, u_path]
+
+	def li_batch(self, scene: 'Scene', renderer: 'Renderer', rays: 'geo.RayBatch', samples: 'SampleBatch'=None,
+	             rng=np.random.rand, isects: ['Intersection']=None, hit: 'np.ndarray'=None,
+	             wavelengths: 'SampledWavelengths'=None) -> 'SpectrumBatch':
+		"""
+		li_batch()
+
+		Returns the radiance along each of `rays`, including
+		lights seen directly as `Renderer.li()` does. `samples`,
+		if given, are those of the rays, as requested by
+		`request_samples()`. First intersections are found
+		unless given as `isects` and `hit`, `rays.maxt` is
+		updated then. If `wavelengths` are given, one row per
+		ray, returns the radiance at them as an (N, n) array.
+		"""
+		from pytracer.aggregate import Intersection
+		from pytracer.montecarlo import power_heuristic
+		from pytracer.reflection import (BDFType, BSDFBatch)
+		from pytracer.spectral import SpectrumType
+		ILLUMINANT, REFLECTANCE = SpectrumType.ILLUMINANT, SpectrumType.REFLECTANCE
+		L = self.spectra(len(rays), wavelengths)
+		beta = self.spectra(len(rays), wavelengths, 1.)
+		lights = scene.lights
+		n_lights = len(lights)
+		media = getattr(renderer, 'vol_integrator', None) is not None
+		flags = BDFType(BDFType.ALL & ~BDFType.SPECULAR)
+
+		# active paths, by index into `L`,
+		# and their previous vertex
+		path = np.arange(len(rays))
+		specular = np.zeros(len(rays), dtype=bool)
+		bsdf_pdf = np.zeros(len(rays), dtype=FLOAT)
+		prev = np.zeros((len(rays), 3), dtype=FLOAT)
+
+		bounce = 0
+		while len(path) > 0:
+			m = len(path)
+			# intersect
+			if isects is None:
+				isects = [Intersection() for _ in path]
+				hit = scene.intersect_batch(rays, isects)
+			hit = np.asarray(hit, dtype=bool)
+			sh = np.flatnonzero(hit)
+			p_hit = np.array([isects[k].dg.p for k in sh], dtype=FLOAT).reshape(-1, 3)
+			n_hit = np.array([isects[k].dg.nn for k in sh], dtype=FLOAT).reshape(-1, 3)
+
+			# add emission, MIS weighted unless seen directly
+			# or by a specular bounce, as for lights sampled
+			# by `estimate_direct()`, only if their pdf > 0
+			direct = specular | (bounce == 0)
+			Le = self.spectra(m, wavelengths)
+			emitters, lid = _group([isects[k].primitive.get_area_light() for k in sh])
+			for j, light in enumerate(emitters):
+				rows = np.flatnonzero(lid == j)
+				k = sh[rows]
+				Le[k] = self.upsample(light.l_many(p_hit[rows], n_hit[rows], -rays.d[k]),
+				                      wavelengths, path[k], ILLUMINANT)
+				light_pdf = np.ones(len(k), dtype=FLOAT)
+				mis = ~direct[k]
+				if np.any(mis):
+					light_pdf[mis] = light.pdf_many(prev[k[mis]], rays.d[k[mis]],
+					                                [isects[i].dg.shape for i in k[mis]],
+					                                p_hit[rows[mis]], n_hit[rows[mis]])
+				Le[k] *= self.mis_weight(direct[k], bsdf_pdf[k], light_pdf)[:, np.newaxis]
+
+			miss = np.flatnonzero(~hit)
+			if len(miss) > 0:
+				escaped = rays[miss]
+				for light in lights:
+					le = light.le_many(escaped)
+					seen = np.flatnonzero(~le.is_black())
+					if len(seen) == 0:
+						continue
+					k = miss[seen]
+					light_pdf = np.ones(len(k), dtype=FLOAT)
+					mis = ~direct[k]
+					if np.any(mis):
+						light_pdf[mis] = light.pdf_many(prev[k[mis]], rays.d[k[mis]])
+					Le[k] += self.upsample(le[seen], wavelengths, path[k], ILLUMINANT) * \
+					         self.mis_weight(direct[k], bsdf_pdf[k], light_pdf)[:, np.newaxis]
+			# past the last vertex, only emission BSDF
+			# sampling adds to its direct lighting counts
+			if bounce > self.max_depth:
+				Le[np.flatnonzero(specular)] = 0.
+				L[path] += beta[path] * Le
+				break
+			L[path] += beta[path] * Le
+
+			# shade
+			if media and bounce > 1:
+				for k in sh:
+					beta[path[k]] *= self.upsample(renderer.transmittance(scene, rays.ray(k), None, rng),
+					                               wavelengths, path[k], REFLECTANCE)
+			bsdf = BSDFBatch([isects[k].get_bsdf(rays.ray(k)) for k in sh])
+			p, n = bsdf.p, bsdf.nn
+			wo = -rays.d[sh]
+			r_eps = np.array([isects[k].rEps for k in sh], dtype=FLOAT)
+			u_num, u_light, u_path = self.path_samples(samples, path[sh], bounce, rng)
+
+			# sample a light per path, lights in turn
+			Ld = self.spectra(m, wavelengths)
+			if n_lights > 0 and len(sh) > 0:
+				choice = np.minimum((u_num * n_lights).astype(INT), n_lights - 1)
+				Li = self.spectra(len(sh))
+				wi = np.zeros((len(sh), 3), dtype=FLOAT)
+				light_pdf = np.zeros(len(sh), dtype=FLOAT)
+				delta = np.zeros(len(sh), dtype=bool)
+				shadow = geo.RayBatch(np.zeros((len(sh), 3)), np.zeros((len(sh), 3)))
+				for j in np.unique(choice):
+					rows = np.flatnonzero(choice == j)
+					Li[rows], wi[rows], light_pdf[rows], srays = \
+						lights[j].sample_l_many(p[rows], r_eps[rows], u_light[rows], rays.time[sh[rows]])
+					delta[rows] = lights[j].is_delta_light()
+					shadow.o[rows], shadow.d[rows] = srays.o, srays.d
+					shadow.mint[rows], shadow.maxt[rows], shadow.time[rows] = srays.mint, srays.maxt, srays.time
+
+				lit = np.flatnonzero((light_pdf > 0.) & ~Li.is_black())
+				f = bsdf[lit].f(wo[lit], wi[lit], flags)
+				lit, f = lit[~f.is_black()], f[~f.is_black()]
+				wt = np.ones(len(lit), dtype=FLOAT)
+				mis = ~delta[lit]
+				if np.any(mis):
+					wt[mis] = power_heuristic(1, light_pdf[lit[mis]], 1,
+					                          bsdf[lit[mis]].pdf(wo[lit[mis]], wi[lit[mis]], BDFType.ALL))
+				cos = np.fabs(np.einsum('ij,ij->i', wi[lit], n[lit]))
+				Ld[sh[lit]] = n_lights * self.upsample(f, wavelengths, path[sh[lit]], REFLECTANCE) * \
+				              self.upsample(Li[lit], wavelengths, path[sh[lit]], ILLUMINANT) * \
+				              (cos * wt / light_pdf[lit])[:, np.newaxis]
+
+				# trace shadow rays
+				occluded = scene.intersect_p_batch(shadow[lit])
+				Ld[sh[lit[occluded]]] = 0.
+				if media:
+					for i in lit[~occluded]:
+						Ld[sh[i]] *= self.upsample(renderer.transmittance(scene, shadow.ray(i), None, rng),
+						                           wavelengths, path[sh[i]], REFLECTANCE)
+				L[path] += beta[path] * Ld
+
+			# sample the next direction
+			pdf, wi, spec, f = bsdf.sample_f(wo, u_path, BDFType.ALL)
+			alive = np.zeros(m, dtype=bool)
+			alive[sh] = ~f.is_black() & (pdf > 0.)
+			specular[sh], bsdf_pdf[sh], prev[sh] = spec, pdf, p
+			f_path = self.spectra(m, wavelengths)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				f_path[sh] = np.where(alive[sh, np.newaxis], self.upsample(f, wavelengths, path[sh], REFLECTANCE) *
+				                      (np.fabs(np.einsum('ij,ij->i', wi, n)) / pdf)[:, np.newaxis], 0.)
+			next_o = np.zeros((m, 3), dtype=FLOAT)
+			next_d = np.zeros((m, 3), dtype=FLOAT)
+			next_eps = np.zeros(m, dtype=FLOAT)
+			next_o[sh], next_d[sh], next_eps[sh] = p, wi, r_eps
+			beta[path] *= f_path
+
+			# possibly terminate
+			if WavefrontPathIntegrator.SAMPLE_DEPTH < bounce < self.max_depth:
+				# by the largest value at the wavelengths s.t.
+				# paths carrying any radiance may continue
+				cont_prob = np.minimum(.5, beta[path].y() if wavelengths is None else beta[path].max(axis=1))
+				alive &= rng(m) <= cont_prob
+				beta[path[alive]] /= cont_prob[alive, np.newaxis]
+
+			# compact the pool
+			path = path[alive]
+			specular, bsdf_pdf, prev = specular[alive], bsdf_pdf[alive], prev[alive]
+			time = rays.time[alive]
+			rays = geo.RayBatch(next_o[alive], next_d[alive], depth=bounce + 1)
+			rays.mint, rays.time = next_eps[alive], time
+			isects = None
+			bounce += 1
+
+		return L
+
+	@staticmethod
+	def spectra(n: INT, wavelengths: 'SampledWavelengths'=None, v: FLOAT=0.) -> 'SpectrumBatch':
+		"""`n` spectra valued `v`, in RGB or at `wavelengths`"""
+		from pytracer.spectral import SpectrumBatch
+		if wavelengths is None:
+			return SpectrumBatch(n, v=v)
+		return np.full((n, wavelengths.n_wavelengths), v, dtype=FLOAT)
+
+	@staticmethod
+	def upsample(s: 'SpectrumBatch', wavelengths: 'SampledWavelengths', rows: 'np.ndarray',
+	             tp: 'SpectrumType') -> 'np.ndarray':
+		"""
+		RGB spectra `s`, e.g., of lights or BSDFs, at the
+		`wavelengths` of paths `rows`, as is without
+		"""
+		if wavelengths is None:
+			return s
+		ret = wavelengths[rows].from_rgb(s, tp)
+		return ret[0] if np.ndim(s) == 1 else ret
+
+	@staticmethod
+	def mis_weight(direct: 'np.ndarray', bsdf_pdf: 'np.ndarray', light_pdf: 'np.ndarray') -> 'np.ndarray':
+		"""
+		Weights of emission found by BSDF sampling, 1 if
+		`direct`, i.e., not sampled from lights, 0 if
+		the light would not have sampled it
+		"""
+		from pytracer.montecarlo import power_heuristic
+		with np.errstate(divide='ignore', invalid='ignore'):
+			wt = power_heuristic(1, bsdf_pdf, 1, light_pdf)
+		return np.where(direct, 1., np.where(light_pdf > 0., wt, 0.))
@@ -15,13 +15,13 @@ if TYPE_CHECKING:
 	from pytracer.scene import Scene
 	from pytracer.aggregate import Intersection
 	from pytracer.renderer import Renderer
-	from pytracer.light import Light
+	from pytracer.light import (Light, LightTree)
 	from pytracer.reflection import (BSDF, BDFType)
 	from pytracer.sampler import Sample
 
 
 __all__ = ['compute_light_sampling_cdf', 'uniform_sample_all_lights',
-           'uniform_sample_one_light', 'specular_reflect', 'specular_transmit', 'estimate_direct']
+           'uniform_sample_one_light', 'tree_sample_one_light', 'specular_reflect', 'specular_transmit', 'estimate_direct']
 
 
 def compute_light_sampling_cdf(scene: 'Scene') -> 'Distribution1D':
@@ -117,6 +117,35 @@ def uniform_sample_one_light(scene: 'Scene', renderer: 'Renderer', p: 'geo.Point
 	                                  light_smp, bsdf_smp, BDFType(BDFType.ALL & ~BDFType.SPECULAR), rng)
 
 
+def tree_sample_one_light(scene: 'Scene', renderer: 'Renderer', tree: 'LightTree', p: 'geo.Point', n: 'geo.Normal',
+                          wo: 'geo.Vector', r_eps: FLOAT, time: FLOAT, bsdf: 'BSDF', sample: 'Sample', light_num_offset: INT=-1,
+                          light_offset: 'LightSampleOffset'=None, bsdf_offset: 'BSDFSampleOffset'=None, rng=np.random.rand):
+	"""
+	tree_sample_one_light()
+
+	As `uniform_sample_one_light()`, but the light
+	is chosen by `tree` according to its estimated
+	contribution at `p`, divided by its probability
+	"""
+	from pytracer.light import LightSample
+	from pytracer.reflection import (BDFType, BSDFSample)
+	u = rng() if light_num_offset == -1 else sample.oneD[light_num_offset][0]
+	light_num, pmf = tree.sample(p, n, u)
+	if light_num < 0 or pmf == 0.:
+		return Spectrum(0.)
+	light = scene.lights[light_num]
+
+	if light_offset is not None and bsdf_offset is not None:
+		light_smp = LightSample.from_sample(sample, light_offset, 0)
+		bsdf_smp = BSDFSample.from_sample(sample, bsdf_offset, 0)
+	else:
+		light_smp = LightSample.from_rand(rng)
+		bsdf_smp = BSDFSample.from_rand(rng)
+
+	return estimate_direct(scene, renderer, light, p, n, wo, r_eps, time, bsdf,
+	                       light_smp, bsdf_smp, BDFType(BDFType.ALL & ~BDFType.SPECULAR), rng) / pmf
+
+
 def specular_reflect(ray: 'geo.RayDifferential', bsdf: 'BSDF', isect: 'Intersection',
                      renderer: 'Renderer', scene: 'Scene', sample: 'Sample', rng) -> 'Spectrum':
 	from pytracer.reflection import (BDFType, BSDFSample)
@@ -233,26 +262,32 @@ def estimate_direct(scene: 'Scene', renderer: 'Renderer', light: 'Light', p:'geo
 	if not light.is_delta_light():
 		bsdf_pdf, wi, smp_type, f = bsdf.sample_f(wo, bsdf_smp, flags)
 		if not util.is_black(f) and bsdf_pdf > 0.:
+			# find the light hit first, its pdf
+			# depends on the shape hit
+			from pytracer.aggregate import Intersection
+			Li = Spectrum(0.)
+			shape = None
+			ray = geo.RayDifferential(p, wi, r_eps, np.inf, time=time)
+			light_isect = Intersection()
+			if scene.intersect(ray, light_isect):
+				if light_isect.primitive.get_area_light() == light:
+					Li = light_isect.le(-wi)
+					shape = light_isect.dg.shape
+			else:
+				Li = light.le(ray) # light illum.
+
 			wt = 1.
-			if not (smp_type & BDFType.SPECULAR).v == 0:  # MIS not apply to specular direction
-				light_pdf = light.pdf(p, wi)
+			if not util.is_black(Li) and not smp_type & BDFType.SPECULAR:  # MIS not apply to specular direction
+				light_pdf = light.pdf(p, wi, shape)
 				if light_pdf == 0.:
 					return Ld
 				from pytracer.montecarlo import power_heuristic
 				wt = power_heuristic(1, bsdf_pdf, 1, light_pdf)
-				# add contribution
-				Li = Spectrum(0.)
-				ray = geo.RayDifferential(p, wi, r_eps, np.inf, time)
-				hit, light_isect = scene.intersect(ray)
-				if hit:
-					if light_isect.primitive.get_area_light() == light:
-						Li = light_isect.le(-wi)
-				else:
-					Li = light.le(ray) # light illum.
-
-				if not util.is_black(Li):
-					Li *= renderer.transmittance(scene, ray, None, rng) # attenuation
-					Ld += f * Li * wi.abs_dot(n) * wt / bsdf_pdf
+
+			# add contribution
+			if not util.is_black(Li):
+				Li *= renderer.transmittance(scene, ray, None, rng) # attenuation
+				Ld += f * Li * wi.abs_dot(n) * wt / bsdf_pdf
 
 	return Ld
 
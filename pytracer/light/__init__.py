@@ -8,4 +8,5 @@ Modified on Aug 13, 2017
 """
 from __future__ import absolute_import
 from pytracer.light.utility import *
-from pytracer.light.light import *
\ No newline at end of file
+from pytracer.light.light import *
+from pytracer.light.tree import *
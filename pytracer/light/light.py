@@ -13,6 +13,8 @@ import pytracer.geometry as geo
 import pytracer.transform as trans
 import pytracer.montecarlo as mc
 from pytracer.light.utility import *
+from pytracer.light.tree import LightBounds
+from pytracer.spectral import SpectrumBatch
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
 	from pytracer.scene import Scene
@@ -74,14 +76,16 @@ class Light(object, metaclass=ABCMeta):
 									'called'.format(self.__class__)) 
 
 	@abstractmethod
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT:
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', shape: 'Shape'=None) -> FLOAT:
 		"""
 		pdf()
+
+		Solid angle pdf of sampling `wi` from `p`,
+		`shape` is the shape hit along `wi` if known
 		"""
 		raise NotImplementedError('src.core.light.{}.pdf(): abstract method '
 									'called'.format(self.__class__)) 		
 
-	@property
 	@abstractmethod
 	def power(self, scene: 'Scene') -> 'Spectrum':
 		"""
@@ -105,6 +109,16 @@ class Light(object, metaclass=ABCMeta):
 		raise NotImplementedError('src.core.light.{}.is_delta_light(): abstract method '
 									'called'.format(self.__class__)) 	
 
+	def bounds(self, scene: 'Scene') -> 'LightBounds':
+		"""
+		bounds()
+
+		Returns the `LightBounds` of the light
+		for `LightTree`, `None` if unbounded,
+		e.g., distant lights.
+		"""
+		return None
+
 	def le(self, rd: 'geo.RayDifferential') -> 'Spectrum':
 		"""
 		le()
@@ -114,6 +128,58 @@ class Light(object, metaclass=ABCMeta):
 		"""
 		return Spectrum(0.)
 
+	def sample_l_many(self, p: 'np.ndarray', pEps: 'np.ndarray', u: 'np.ndarray',
+	                  time: 'np.ndarray') -> ['SpectrumBatch', 'np.ndarray', 'np.ndarray', 'geo.RayBatch']:
+		"""
+		sample_l_many()
+
+		`sample_l()` for each row of the (n, 3) arrays
+		`p` and `u`, the latter ordered as `LightSample`.
+		Returns the radiance, (n, 3) incident directions,
+		pdfs and the shadow rays as a `geo.RayBatch`.
+		Loops over `sample_l()` unless overridden.
+		"""
+		n = len(p)
+		Li = SpectrumBatch(n)
+		wi = np.zeros((n, 3), dtype=FLOAT)
+		pdf = np.zeros(n, dtype=FLOAT)
+		rays = [None] * n
+		for k in range(n):
+			Li[k], w, pdf[k], vis = self.sample_l(geo.Point.from_arr(p[k]), pEps[k], LightSample(*u[k]), time[k])
+			if w is not None:
+				wi[k] = w
+			rays[k] = vis.ray
+		return [Li, wi, pdf, geo.RayBatch.from_rays(rays)]
+
+	def pdf_many(self, p: 'np.ndarray', wi: 'np.ndarray', shapes: ['Shape']=None,
+	             pts: 'np.ndarray'=None, ns: 'np.ndarray'=None) -> 'np.ndarray':
+		"""
+		pdf_many()
+
+		`pdf()` for each row of the (n, 3) arrays `p`
+		and `wi`. `shapes` are those hit along `wi`, if
+		known, `pts` and `ns` the points and normals hit.
+		Loops over `pdf()` unless overridden.
+		"""
+		pdf = np.zeros(len(p), dtype=FLOAT)
+		for k in range(len(p)):
+			pdf[k] = self.pdf(geo.Point.from_arr(p[k]), geo.Vector.from_arr(wi[k]),
+			                  None if shapes is None else shapes[k])
+		return pdf
+
+	def le_many(self, rays: 'geo.RayBatch') -> 'SpectrumBatch':
+		"""
+		le_many()
+
+		`le()` for each of `rays`, which hit nothing.
+		Delta lights are not seen along rays.
+		"""
+		L = SpectrumBatch(len(rays))
+		if not self.is_delta_light():
+			for k in range(len(rays)):
+				L[k] = self.le(rays.ray(k))
+		return L
+
 
 class PointLight(Light):
 	"""
@@ -134,6 +200,16 @@ class PointLight(Light):
 		vis.set_segment(p, pEps, self.pos, 0., time)
 		return [self.intensity / (self.pos - p).sq_length(), wi, pdf, vis]
 
+	def sample_l_many(self, p: 'np.ndarray', pEps: 'np.ndarray', u: 'np.ndarray',
+	                  time: 'np.ndarray') -> ['SpectrumBatch', 'np.ndarray', 'np.ndarray', 'geo.RayBatch']:
+		d = np.asarray(self.pos) - p
+		dist = np.linalg.norm(d, axis=1)
+		wi = d / dist[:, np.newaxis]
+		Li = SpectrumBatch.from_array(np.asarray(self.intensity) / (dist * dist)[:, np.newaxis], type(self.intensity))
+		rays = geo.RayBatch(p, wi)
+		rays.mint, rays.maxt, rays.time = np.array(pEps, dtype=FLOAT), dist, np.array(time, dtype=FLOAT)
+		return [Li, wi, np.ones(len(p), dtype=FLOAT), rays]
+
 	def sample_r(self, scene: 'Scene', ls: 'LightSample', u1: FLOAT, 
 					u2: FLOAT, time: FLOAT) -> ['geo.Ray', 'geo.Normal', FLOAT, 'Spectrum']:
 		ray = geo.Ray(self.pos, mc.uniform_sample_sphere(ls.u_pos[0], ls.u_pos[1]),
@@ -142,12 +218,14 @@ class PointLight(Light):
 		pdf = mc.uniform_sphere_pdf()
 		return [ray, Ns, pdf, self.intensity]
 
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT: return 0.
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', shape: 'Shape'=None) -> FLOAT: return 0.
 
-	@property
 	def power(self, scene: 'Scene') -> 'Spectrum':
 		return 4. * PI * self.intensity
 
+	def bounds(self, scene: 'Scene') -> 'LightBounds':
+		return LightBounds.from_point(self.pos, self.power(scene).y())
+
 	def is_delta_light(self) -> bool:
 		return True
 
@@ -205,9 +283,8 @@ class SpotLight(Light):
 		pdf = mc.uniform_cone_pdf(self.cos_width)
 		return [ray, Ns, pdf, self.intensity * self.__falloff(ray.d)]
 
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT: return 0.
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', shape: 'Shape'=None) -> FLOAT: return 0.
 
-	@property
 	def power(self, scene: 'Scene') -> 'Spectrum':
 		"""
 		power()
@@ -218,6 +295,12 @@ class SpotLight(Light):
 		"""
 		return self.intensity * 2. * PI * (1. - .5 * (self.cos_falloff + self.cos_width))
 
+	def bounds(self, scene: 'Scene') -> 'LightBounds':
+		# full intensity within falloff, fading out to width
+		theta_o = np.arccos(self.cos_falloff)
+		return LightBounds(geo.BBox(self.pos, self.pos), self.l2w(geo.Vector(0., 0., 1.)), self.power(scene).y(),
+		                   theta_o, max(np.arccos(self.cos_width) - theta_o, 0.))
+
 	def is_delta_light(self) -> bool:
 		return True
 
@@ -314,9 +397,8 @@ class ProjectionLight(Light):
 		pdf = mc.uniform_cone_pdf(self.cos_width)
 		return [ray, Ns, pdf, self.intensity * self.__projection(ray.d)]
 
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT: return 0.
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', shape: 'Shape'=None) -> FLOAT: return 0.
 
-	@property
 	def power(self, scene: 'Scene') -> 'Spectrum':
 		"""
 		power()
@@ -325,8 +407,13 @@ class ProjectionLight(Light):
 		diagonal of the image, scaled
 		by the average intensity.
 		"""
-		return Spectrum( self.projMap.look_up([.5, .5, .5]), SpectrumType.ILLUMINANT) * \
-					self.intensity * 2. * PI * (1. - self.cos_width)
+		scale = Spectrum(1.) if self.projMap is None else \
+					Spectrum(self.projMap.look_up([.5, .5, .5]), SpectrumType.ILLUMINANT)
+		return scale * self.intensity * 2. * PI * (1. - self.cos_width)
+
+	def bounds(self, scene: 'Scene') -> 'LightBounds':
+		return LightBounds(geo.BBox(self.pos, self.pos), self.l2w(geo.Vector(0., 0., 1.)), self.power(scene).y(),
+		                   np.arccos(self.cos_width), 0.)
 
 	def is_delta_light(self) -> bool:
 		return True
@@ -399,12 +486,16 @@ class GonioPhotometricLight(Light):
 		pdf = mc.uniform_sphere_pdf()
 		return [ray, Ns, pdf, self.intensity * self.__scale(ray.d)]
 
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT: return 0.
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', shape: 'Shape'=None) -> FLOAT: return 0.
 
-	@property
 	def power(self, scene: 'Scene') -> 'Spectrum':
+		if self.MIPMap is None:
+			return 4. * PI * self.intensity
 		return 4. * PI * self.intensity * Spectrum(self.MIPMap.look_up([.5, .5, .5]), SpectrumType.ILLUMINANT)
 
+	def bounds(self, scene: 'Scene') -> 'LightBounds':
+		return LightBounds.from_point(self.pos, self.power(scene).y())
+
 	def is_delta_light(self) -> bool:
 		return True
 
@@ -449,9 +540,8 @@ class DistantLight(Light):
 		pdf = 1. / (PI * rad * rad)
 		return [ray, Ns, pdf, self.l]
 
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT: return 0.
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', shape: 'Shape'=None) -> FLOAT: return 0.
 
-	@property
 	def power(self, scene: 'Scene') -> 'Spectrum':
 		"""
 		power()
@@ -480,6 +570,13 @@ class AreaLight(Light):
 		raise NotImplementedError('src.core.volume.{}.l(): abstract method '
 									'called'.format(self.__class__)) 		
 
+	def l_many(self, p: 'np.ndarray', n: 'np.ndarray', w: 'np.ndarray') -> 'SpectrumBatch':
+		"""`l()` for each row of the (n, 3) arrays"""
+		L = SpectrumBatch(len(p))
+		for k in range(len(p)):
+			L[k] = self.l(geo.Point.from_arr(p[k]), geo.Normal.from_arr(n[k]), geo.Vector.from_arr(w[k]))
+		return L
+
 
 class DiffuseAreaLight(Light):
 	"""
@@ -500,26 +597,54 @@ class DiffuseAreaLight(Light):
 		self.shape_set = ShapeSet(shape)
 		self.area = self.shape_set.areas
 
-	# debugging purposes only
 	def le(self, rd: 'geo.RayDifferential'):
-		return self.emit
+		# emission is seen at intersections, c.f. `l()`
+		return Spectrum(0.)
 
 	def l(self, p: 'geo.Point', n: 'geo.Normal', w: 'geo.Vector') -> 'Spectrum':
 		return self.emit if n.dot(w) > 0. else Spectrum(0.)
 
+	def le_many(self, rays: 'geo.RayBatch') -> 'SpectrumBatch':
+		return SpectrumBatch(len(rays))
+
+	def l_many(self, p: 'np.ndarray', n: 'np.ndarray', w: 'np.ndarray') -> 'SpectrumBatch':
+		"""`l()` for each row of the (n, 3) arrays"""
+		L = SpectrumBatch(len(p), type(self.emit))
+		L[np.einsum('ij,ij->i', n, w) > 0.] = self.emit
+		return L
+
 	# TODO use MCMC
 	# def sample_l(self, p: 'geo.Point', pEps: FLOAT, ls: 'LightSample',
 	# 		time: FLOAT,) -> ['Spectrum', 'geo.Vector', FLOAT, 'VisibilityTester']:	
 
 	def sample_l(self, p: 'geo.Point', pEps: FLOAT, ls: 'LightSample',
 			time: FLOAT,) -> ['Spectrum', 'geo.Vector', FLOAT, 'VisibilityTester']:	
-		ps, ns = self.shape_set.sample_p(p, ls)
+		ps, ns, sn = self.shape_set.sample_p(p, ls)
 		wi = geo.normalize(ps - p)
-		pdf = self.shape_set.pdf(p, wi)
+		pdf = self.shape_set.pdf(p, wi, sn)
 		vis = VisibilityTester()
 		vis.set_segment(p, pEps, ps, EPS, time)
 		return [self.l(ps, ns, -wi), wi, pdf, vis]
 
+	def sample_l_many(self, p: 'np.ndarray', pEps: 'np.ndarray', u: 'np.ndarray',
+	                  time: 'np.ndarray') -> ['SpectrumBatch', 'np.ndarray', 'np.ndarray', 'geo.RayBatch']:
+		"""
+		Triangles are sampled by area as `sample_l()`
+		does, at once, other shapes are sampled
+		w.r.t. `p`, one by one
+		"""
+		if not np.all(self.shape_set.tris):
+			return super().sample_l_many(p, pEps, u, time)
+		u = np.asarray(u, dtype=FLOAT)
+		ps, ns, idx = self.shape_set.sample_many(u[:, [2, 0, 1]])
+		d = ps - p
+		dist = np.linalg.norm(d, axis=1)
+		wi = d / dist[:, np.newaxis]
+		pdf = self.shape_set.pdf_many(p, ps, ns, idx)
+		rays = geo.RayBatch(p, wi)
+		rays.mint, rays.maxt, rays.time = np.array(pEps, dtype=FLOAT), dist * (1. - EPS), np.array(time, dtype=FLOAT)
+		return [self.l_many(ps, ns, -wi), wi, pdf, rays]
+
 	def sample_r(self, scene: 'Scene', ls: 'LightSample', u1: FLOAT, 
 					u2: FLOAT, time: FLOAT) -> ['geo.Ray', 'geo.Normal', FLOAT, 'Spectrum']:
 		"""
@@ -527,21 +652,49 @@ class DiffuseAreaLight(Light):
 		and uniformly sample
 		on it.
 		"""
-		org, Ns = self.shape_set.sample(ls)
+		org, Ns, _ = self.shape_set.sample(ls)
 		di = mc.uniform_sample_sphere(u1, u2)
 		if di.dot(Ns) < 0.:
 			di *= -1.
 		ray = geo.Ray(org, di, EPS, np.inf, time)
-		pdf = self.shape_set.pdf(org) * INV_2PI
+		pdf = self.shape_set.pdf_p(org) * INV_2PI
 		return [ray, Ns, pdf, self.l(org, Ns, di)]
 
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT: return self.shape_set.pdf(p, wi)
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', shape: 'Shape'=None) -> FLOAT:
+		return self.shape_set.pdf(p, wi, None if shape is None else self.shape_set.index_of(shape))
+
+	def pdf_many(self, p: 'np.ndarray', wi: 'np.ndarray', shapes: ['Shape']=None,
+	             pts: 'np.ndarray'=None, ns: 'np.ndarray'=None) -> 'np.ndarray':
+		if shapes is None or pts is None or ns is None:
+			return super().pdf_many(p, wi, shapes, pts, ns)
+		idx = np.array([self.shape_set.index_of(sh) for sh in shapes], dtype=INT)
+		return self.shape_set.pdf_many(p, pts, ns, idx)
 
 
 
-	@property
 	def power(self, scene: 'Scene') -> 'Spectrum':
-		return self.emit * self.area * PI
+		return self.emit * self.shape_set.sum_area * PI
+
+	def bounds(self, scene: 'Scene') -> 'LightBounds':
+		ss = self.shape_set
+		bounds = geo.BBox()
+		for sh in ss.shapes:
+			bounds.union(sh.world_bound())
+
+		# cone of the triangle normals, emitting
+		# on their side only, else all directions
+		w, theta_o = geo.Vector(0., 0., 1.), PI
+		if np.all(ss.tris):
+			v = ss.vertices
+			n = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+			n /= np.linalg.norm(n, axis=1)[:, np.newaxis]
+			n[ss.ro] *= -1.
+			axis = n.sum(axis=0)
+			if np.linalg.norm(axis) > EPS:
+				axis /= np.linalg.norm(axis)
+				w = geo.Vector.from_arr(axis)
+				theta_o = np.arccos(np.clip(n.dot(axis), -1., 1.)).max()
+		return LightBounds(bounds, w, self.power(scene).y(), theta_o, .5 * PI)
 
 	def is_delta_light(self) -> bool:
 		return False
@@ -628,7 +781,7 @@ class InfiniteAreaLight(Light):
 		return [Spectrum.from_rgb(self.radMap.look_up([uv[0], uv[1]]), SpectrumType.ILLUMINANT),
 					wi, pdf, vis]
 
-	def pdf(self, p: 'geo.Point', w: 'geo.Vector') -> FLOAT:
+	def pdf(self, p: 'geo.Point', w: 'geo.Vector', shape: 'Shape'=None) -> FLOAT:
 		wi = self.w2l(w)
 		theta = geo.spherical_theta(wi)
 		phi = geo.spherical_phi(wi)
@@ -677,7 +830,6 @@ class InfiniteAreaLight(Light):
 
 		return [ray, Ns, pdf, Spectrum.from_rgb(self.radMap.look_up([uv[0], uv[1]]), SpectrumType.ILLUMINANT)]
 
-	@property
 	def power(self, scene: 'Scene') -> 'Spectrum':
 		_, rad = scene.world_bound().bounding_sphere()
 		return PI * rad * rad * Spectrum.from_rgb(self.radMap.look_up([.5, .5, .5]), SpectrumType.ILLUMINANT)
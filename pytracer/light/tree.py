@@ -0,0 +1,286 @@
+"""
+tree.py
+
+pytracer.light package
+
+Light bounds and a bounding hierarchy
+over lights for many-light sampling.
+"""
+from __future__ import absolute_import
+from pytracer import *
+import pytracer.geometry as geo
+
+__all__ = ['LightBounds', 'LightTree']
+
+
+class LightBounds(object):
+	"""
+	LightBounds Class
+
+	Where and whereto a light emits: world `bounds`,
+	a cone of emitting normals around `w` of half angle
+	`theta_o`, from which emission spreads by up to
+	`theta_e`, and the power `phi` as luminance.
+	"""
+	def __init__(self, bounds: 'geo.BBox', w: 'geo.Vector', phi: FLOAT, theta_o: FLOAT=PI,
+	             theta_e: FLOAT=.5 * PI, two_sided: bool=False):
+		self.bounds = bounds
+		self.w = geo.normalize(w)
+		self.phi = phi
+		self.theta_o = theta_o
+		self.theta_e = theta_e
+		self.two_sided = two_sided
+
+	def __repr__(self):
+		return "{}\nBounds: {}\nAxis: {}\nPower: {}\nTheta o: {}\nTheta e: {}\n" \
+			.format(self.__class__, self.bounds, self.w, self.phi, self.theta_o, self.theta_e)
+
+	@classmethod
+	def from_point(cls, p: 'geo.Point', phi: FLOAT) -> 'LightBounds':
+		"""Emitting from `p` in all directions"""
+		return cls(geo.BBox(p, p), geo.Vector(0., 0., 1.), phi)
+
+	@staticmethod
+	def cone_union(w_a: 'np.ndarray', theta_a: FLOAT, w_b: 'np.ndarray', theta_b: FLOAT) -> ['np.ndarray', FLOAT]:
+		"""Smallest cone containing both cones"""
+		if theta_b > theta_a:
+			w_a, theta_a, w_b, theta_b = w_b, theta_b, w_a, theta_a
+		theta_d = np.arccos(np.clip(np.dot(w_a, w_b), -1., 1.))
+		if min(theta_d + theta_b, PI) <= theta_a:
+			return [w_a, theta_a]
+
+		theta_o = .5 * (theta_a + theta_d + theta_b)
+		if theta_o >= PI:
+			return [w_a, PI]
+		# rotate `w_a` towards `w_b`
+		axis = np.cross(w_a, w_b)
+		if np.dot(axis, axis) == 0.:
+			return [w_a, PI]
+		axis /= np.linalg.norm(axis)
+		theta_r = theta_o - theta_a
+		w = w_a * np.cos(theta_r) + np.cross(axis, w_a) * np.sin(theta_r) + \
+			axis * np.dot(axis, w_a) * (1. - np.cos(theta_r))
+		return [w / np.linalg.norm(w), theta_o]
+
+	@staticmethod
+	def union(a: 'LightBounds', b: 'LightBounds') -> 'LightBounds':
+		if a.phi == 0.:
+			return b
+		if b.phi == 0.:
+			return a
+		w, theta_o = LightBounds.cone_union(np.asarray(a.w), a.theta_o, np.asarray(b.w), b.theta_o)
+		return LightBounds(geo.BBox.Union(a.bounds, b.bounds), geo.Vector.from_arr(w), a.phi + b.phi, theta_o,
+		                   max(a.theta_e, b.theta_e), a.two_sided or b.two_sided)
+
+	def orientation_measure(self) -> FLOAT:
+		"""Solid angle measure of the emitted directions"""
+		theta_w = min(self.theta_o + self.theta_e, PI)
+		cos_o, sin_o = np.cos(self.theta_o), np.sin(self.theta_o)
+		return 2. * PI * (1. - cos_o) + .5 * PI * (2. * theta_w * sin_o - np.cos(self.theta_o - 2. * theta_w) -
+		                                           2. * self.theta_o * sin_o + cos_o)
+
+
+class LightTree(object):
+	"""
+	LightTree Class
+
+	Bounding hierarchy over the lights with a
+	`LightBounds`, c.f. Conty Estevez and Kulla,
+	Importance Sampling of Many Lights, 2018.
+	A light is chosen by walking down from the root,
+	taking each child with probability proportional
+	to its estimated contribution at the shading
+	point. Lights without bounds, e.g., distant ones,
+	are chosen uniformly, the tree counting as one
+	more of them.
+	"""
+	N_BUCKETS = 12
+
+	class _Node(object):
+		def __init__(self, lb: 'LightBounds', light: INT=-1, children: ['LightTree._Node']=None):
+			self.lb = lb
+			self.light = light
+			self.children = children
+
+	def __init__(self, lights: ['Light'], scene: 'Scene'):
+		self.lights = lights
+		self.infinite = []
+		bounded = []
+		for i, light in enumerate(lights):
+			lb = light.bounds(scene)
+			if lb is None:
+				self.infinite.append(i)
+			elif lb.phi > 0.:
+				# lights of no power are never chosen
+				bounded.append((i, lb))
+
+		# nodes flattened in depth-first order, the first
+		# child follows its parent, `second` is the offset
+		# of the other, -1 for leaves
+		self.n_nodes = 2 * len(bounded) - 1 if len(bounded) > 0 else 0
+		self.pmin = np.zeros((self.n_nodes, 3), dtype=FLOAT)
+		self.pmax = np.zeros((self.n_nodes, 3), dtype=FLOAT)
+		self.w = np.zeros((self.n_nodes, 3), dtype=FLOAT)
+		self.phi = np.zeros(self.n_nodes, dtype=FLOAT)
+		self.theta_o = np.zeros(self.n_nodes, dtype=FLOAT)
+		self.theta_e = np.zeros(self.n_nodes, dtype=FLOAT)
+		self.two_sided = np.zeros(self.n_nodes, dtype=bool)
+		self.second = np.full(self.n_nodes, -1, dtype=INT)
+		self.light = np.full(self.n_nodes, -1, dtype=INT)
+		# nodes and choices leading to each light
+		self.trail = {}
+		if len(bounded) > 0:
+			self._flatten(self._build(bounded), [0], [])
+
+		n = len(self.infinite) + (self.n_nodes > 0)
+		self.p_infinite = len(self.infinite) / n if n > 0 else 0.
+
+	def __repr__(self):
+		return "{}\nLights: {}\nNodes: {}\nInfinite lights: {}\n" \
+			.format(self.__class__, len(self.lights), self.n_nodes, len(self.infinite))
+
+	@staticmethod
+	def _cost(lb: 'LightBounds', bounds: 'geo.BBox', dim: INT) -> FLOAT:
+		# penalise thin slices of the parent
+		diag = bounds.pMax - bounds.pMin
+		kr = np.max(diag) / diag[dim]
+		return lb.phi * lb.orientation_measure() * kr * lb.bounds.surface_area()
+
+	def _build(self, items: [(INT, 'LightBounds')]) -> 'LightTree._Node':
+		if len(items) == 1:
+			return LightTree._Node(items[0][1], items[0][0])
+
+		bounds = geo.BBox()
+		centroid_bounds = geo.BBox()
+		for _, lb in items:
+			bounds.union(lb.bounds)
+			centroid_bounds.union(.5 * (lb.bounds.pMin + lb.bounds.pMax))
+
+		# bucketed SAH, weighted by power and orientation
+		best = [np.inf, -1, -1]
+		centroids = np.array([.5 * (lb.bounds.pMin + lb.bounds.pMax) for _, lb in items])
+		for dim in range(3):
+			lo, hi = centroid_bounds.pMin[dim], centroid_bounds.pMax[dim]
+			if hi == lo:
+				continue
+			b = np.minimum(((centroids[:, dim] - lo) / (hi - lo) * LightTree.N_BUCKETS).astype(INT),
+			               LightTree.N_BUCKETS - 1)
+			buckets = [None] * LightTree.N_BUCKETS
+			for k, (_, lb) in zip(b, items):
+				buckets[k] = lb if buckets[k] is None else LightBounds.union(buckets[k], lb)
+			for i in range(1, LightTree.N_BUCKETS):
+				below = [bk for bk in buckets[:i] if bk is not None]
+				above = [bk for bk in buckets[i:] if bk is not None]
+				if len(below) == 0 or len(above) == 0:
+					continue
+				lb0, lb1 = below[0], above[0]
+				for bk in below[1:]:
+					lb0 = LightBounds.union(lb0, bk)
+				for bk in above[1:]:
+					lb1 = LightBounds.union(lb1, bk)
+				cost = LightTree._cost(lb0, bounds, dim) + LightTree._cost(lb1, bounds, dim)
+				if cost < best[0]:
+					best = [cost, dim, i]
+
+		if best[1] < 0:
+			# coincident centroids
+			mid = len(items) // 2
+			c0, c1 = items[:mid], items[mid:]
+		else:
+			_, dim, i = best
+			lo, hi = centroid_bounds.pMin[dim], centroid_bounds.pMax[dim]
+			b = np.minimum(((centroids[:, dim] - lo) / (hi - lo) * LightTree.N_BUCKETS).astype(INT),
+			               LightTree.N_BUCKETS - 1)
+			c0 = [item for k, item in zip(b, items) if k < i]
+			c1 = [item for k, item in zip(b, items) if k >= i]
+
+		children = [self._build(c0), self._build(c1)]
+		return LightTree._Node(LightBounds.union(children[0].lb, children[1].lb), children=children)
+
+	def _flatten(self, node: 'LightTree._Node', offset: [INT], trail: [(INT, INT)]) -> INT:
+		idx = offset[0]
+		offset[0] += 1
+		lb = node.lb
+		self.pmin[idx], self.pmax[idx] = lb.bounds.pMin, lb.bounds.pMax
+		self.w[idx] = lb.w
+		self.phi[idx], self.theta_o[idx], self.theta_e[idx] = lb.phi, lb.theta_o, lb.theta_e
+		self.two_sided[idx] = lb.two_sided
+		if node.children is None:
+			self.light[idx] = node.light
+			self.trail[node.light] = trail
+		else:
+			self._flatten(node.children[0], offset, trail + [(idx, 0)])
+			self.second[idx] = self._flatten(node.children[1], offset, trail + [(idx, 1)])
+		return idx
+
+	def importance(self, nodes: 'np.ndarray', p: 'geo.Point', n: 'geo.Normal'=None) -> 'np.ndarray':
+		"""
+		Estimated contribution of the lights under
+		`nodes` at `p`, for a surface of normal `n`
+		if given, up to a common factor
+		"""
+		pmin, pmax = self.pmin[nodes], self.pmax[nodes]
+		d = np.asarray(p) - .5 * (pmin + pmax)
+		dist2 = np.sum(d * d, axis=-1)
+		# radius of the bounding sphere
+		r2 = .25 * np.sum((pmax - pmin) ** 2, axis=-1)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			wi = np.where(dist2[:, np.newaxis] > 0., d / np.sqrt(dist2)[:, np.newaxis], self.w[nodes])
+			theta_b = np.where(dist2 > r2, np.arcsin(np.sqrt(r2 / dist2)), PI)
+
+		# angle to the emission cone
+		cos_w = np.sum(self.w[nodes] * wi, axis=-1)
+		cos_w[self.two_sided[nodes]] = np.fabs(cos_w[self.two_sided[nodes]])
+		theta_p = np.maximum(np.arccos(np.clip(cos_w, -1., 1.)) - self.theta_o[nodes] - theta_b, 0.)
+		imp = np.where((theta_p < self.theta_e[nodes]) | (theta_p == 0.),
+		               self.phi[nodes] * np.cos(theta_p) / np.maximum(dist2, r2), 0.)
+
+		if n is not None:
+			# angle to the surface normal
+			theta_i = np.arccos(np.clip(np.fabs(wi.dot(np.asarray(n))), 0., 1.))
+			imp *= np.cos(np.maximum(theta_i - theta_b, 0.))
+		return np.maximum(imp, 0.)
+
+	def sample(self, p: 'geo.Point', n: 'geo.Normal', u: FLOAT) -> [INT, FLOAT]:
+		"""
+		Chooses a light for shading `p` by the uniform
+		sample `u`, returns its index in `lights` and
+		probability, [-1, 0.] if none contributes.
+		"""
+		if u < self.p_infinite:
+			i = min(util.ftoi(u / self.p_infinite * len(self.infinite)), len(self.infinite) - 1)
+			return [self.infinite[i], self.p_infinite / len(self.infinite)]
+		if self.n_nodes == 0:
+			return [-1, 0.]
+
+		u = min((u - self.p_infinite) / (1. - self.p_infinite), 1. - EPS)
+		pmf = 1. - self.p_infinite
+		node = 0
+		if self.second[node] < 0 and self.importance([node], p, n)[0] == 0.:
+			return [-1, 0.]
+		while self.second[node] >= 0:
+			imp = self.importance([node + 1, self.second[node]], p, n)
+			if imp.sum() == 0.:
+				return [-1, 0.]
+			p0 = imp[0] / imp.sum()
+			if u < p0:
+				node, pmf, u = node + 1, pmf * p0, min(u / p0, 1. - EPS)
+			else:
+				node, pmf, u = self.second[node], pmf * (1. - p0), min((u - p0) / (1. - p0), 1. - EPS)
+		return [self.light[node], pmf]
+
+	def pmf(self, p: 'geo.Point', n: 'geo.Normal', light: INT) -> FLOAT:
+		"""Probability of choosing `lights[light]` by `sample()`"""
+		if light in self.infinite:
+			return self.p_infinite / len(self.infinite)
+		if light not in self.trail:
+			return 0.
+		pmf = 1. - self.p_infinite
+		if len(self.trail[light]) == 0 and self.importance([0], p, n)[0] == 0.:
+			return 0.
+		for node, side in self.trail[light]:
+			imp = self.importance([node + 1, self.second[node]], p, n)
+			if imp.sum() == 0.:
+				return 0.
+			pmf *= imp[side] / imp.sum()
+		return pmf
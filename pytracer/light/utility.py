@@ -74,6 +74,8 @@ class ShapeSet(object):
 	ShapeSet Class
 
 	Wrapper for a set of `Shape`s.
+	Shapes are chosen by area using an
+	alias table, i.e., in constant time.
 	"""
 	def __init__(self, shape: 'Shape'):
 		self.shapes = []
@@ -85,57 +87,122 @@ class ShapeSet(object):
 			else:
 				tmp.extend(sh.refine())
 
-		if len(self.shapes) > 64:
-			print("Warning: src.core.light.{}.__init__(): " 
-			      "Area light turned into {} shapes, might be inefficient".format(self.__class__,
-			                                                                      len(self.shapes)))
-		self.areas = []
-		self.sum_area = 0.
-		for sh in self.shapes:
-			area = sh.area()
-			self.areas.append(area)
-			self.sum_area += area
+		self.areas = np.array([sh.area() for sh in self.shapes], dtype=FLOAT)
+		self.sum_area = self.areas.sum()
+		self.area_dist = mc.AliasTable(self.areas)
 
-		self.area_dist = mc.Distribution1D(self.areas)
+		# triangles are sampled in batches from packed vertices
+		from pytracer.shape import Triangle
+		self.tris = np.array([isinstance(sh, Triangle) for sh in self.shapes], dtype=bool)
+		self.vertices = np.zeros((len(self.shapes), 3, 3), dtype=FLOAT)
+		self.ro = np.array([sh.ro for sh in self.shapes], dtype=bool)
+		for i in np.flatnonzero(self.tris):
+			self.vertices[i] = self.shapes[i].mesh.vertices(self.shapes[i].v // 3)
+
+		# shapes hit are looked up by `index_of()`
+		self.index = {ShapeSet._key(sh): i for i, sh in enumerate(self.shapes)}
 
 	def __repr__(self):
 		return "{}\nNumber of Shapes: {}\n".format(self.__class__, len(self.shapes))
 
-	def sample_p(self, p: 'geo.Point', ls: 'LightSample') -> ['geo.Point', 'geo.Normal']:
+	@staticmethod
+	def _key(sh: 'Shape') -> object:
+		# triangles are created anew by refining
+		# meshes, hence told apart by their ids
+		from pytracer.shape import Triangle
+		if isinstance(sh, Triangle):
+			return id(sh.mesh), sh.v // 3
+		return id(sh)
+
+	def index_of(self, sh: 'Shape') -> INT:
+		"""
+		Returns the index of `sh`, e.g., `isect.dg.shape`
+		of an intersection, in the set, -1 if not found
+		"""
+		return self.index.get(ShapeSet._key(sh), -1)
+
+	def sample_p(self, p: 'geo.Point', ls: 'LightSample') -> ['geo.Point', 'geo.Normal', INT]:
 		sn, _ = self.area_dist.sample_dis(ls.u_com)
 		pt, ns = self.shapes[sn].sample_p(p, ls.u_pos[0], ls.u_pos[1])
 
-		return [pt, ns]
-		# find cloest intersection
-		# r = geo.Ray(p, pt - p, EPS, np.inf)
-		# any_hit = False
-
-		# # inefficient
-		# for sh in self.shapes:
-		# 	hit, thit, _, dg = sh.intersect(r)
-		# 	any_hit |= hit
-		# if any_hit:
-		# 	return [r(thit), dg.nn]
-		# else:
-		# 	return [pt, ns]
-
-	def sample(self, ls: 'LightSample') -> ['geo.Point', 'geo.Normal']:
+		return [pt, ns, sn]
+
+	def sample(self, ls: 'LightSample') -> ['geo.Point', 'geo.Normal', INT]:
 		sn, _ = self.area_dist.sample_dis(ls.u_com)
 		pt, ns = self.shapes[sn].sample(ls.u_pos[0], ls.u_pos[1])
 
-		return [pt, ns]
+		return [pt, ns, sn]
 
-	def pdf(self, p: 'geo.Point', wi: 'geo.Vector') -> FLOAT:
-		pdf = 0.
-		for i, sh in enumerate(self.shapes):
-			pdf += self.areas[i] * sh.pdf_p(p, wi)
-		return pdf / self.sum_area
+	def sample_many(self, u: 'np.ndarray') -> ['np.ndarray', 'np.ndarray', 'np.ndarray']:
+		"""
+		Samples a point on the set for each row of the
+		(n, 3) array `u`, the first column chooses the shape.
+		Returns (n, 3) arrays of points and normals
+		and the indices of the shapes sampled.
+		"""
+		u = np.asarray(u, dtype=FLOAT).reshape(-1, 3)
+		idx, _ = self.area_dist.sample_many(u[:, 0])
+		pts = np.empty((len(u), 3), dtype=FLOAT)
+		ns = np.empty((len(u), 3), dtype=FLOAT)
+
+		tri = self.tris[idx]
+		if np.any(tri):
+			v = self.vertices[idx[tri]]
+			b1, b2 = mc.uniform_sample_triangle(u[tri, 1], u[tri, 2])
+			pts[tri] = b1[:, np.newaxis] * v[:, 0] + b2[:, np.newaxis] * v[:, 1] + \
+			           (1. - b1 - b2)[:, np.newaxis] * v[:, 2]
+			n = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+			n /= np.linalg.norm(n, axis=1)[:, np.newaxis]
+			n[self.ro[idx[tri]]] *= -1.
+			ns[tri] = n
+
+		for j in np.flatnonzero(~tri):
+			pts[j], ns[j] = self.shapes[idx[j]].sample(u[j, 1], u[j, 2])
+
+		return [pts, ns, idx]
+
+	def pdf(self, p: 'geo.Point', wi: 'geo.Vector', i: INT = None) -> FLOAT:
+		"""
+		Solid angle pdf of sampling the point hit
+		along `wi` on the `i`-th shape, e.g., as
+		sampled or found by `index_of()`. Sums
+		over all shapes if `i` is not given.
+		"""
+		if i is None:
+			pdf = 0.
+			for a, sh in zip(self.areas, self.shapes):
+				pdf += a * sh.pdf_p(p, wi)
+			return pdf / self.sum_area
+		if i < 0:
+			return 0.
+		return self.area_dist.pmf[i] * self.shapes[i].pdf_p(p, wi)
+
+	def pdf_many(self, p: 'np.ndarray', pts: 'np.ndarray', ns: 'np.ndarray', idx: 'np.ndarray') -> 'np.ndarray':
+		"""
+		`pdf()` for each row of the (n, 3) arrays, seen
+		from `p`, of the points `pts` with normals `ns` on
+		the `idx`-th shapes, e.g., as by `sample_many()`.
+		Triangles, sampled by area, at once.
+		"""
+		idx = np.asarray(idx, dtype=INT)
+		pdf = np.zeros(len(idx), dtype=FLOAT)
+		d = pts - p
+		d2 = np.einsum('ij,ij->i', d, d)
+		found = idx >= 0
+		tri = found & self.tris[np.maximum(idx, 0)]
+		cos = np.fabs(np.einsum('ij,ij->i', ns[tri], d[tri])) / np.sqrt(d2[tri])
+		with np.errstate(divide='ignore', invalid='ignore'):
+			pdf[tri] = np.where(cos > 0., d2[tri] / (cos * self.sum_area), 0.)
+
+		for j in np.flatnonzero(found & ~tri):
+			pdf[j] = self.pdf(geo.Point.from_arr(p[j]), geo.normalize(geo.Vector.from_arr(d[j])), idx[j])
+		return pdf
 
 	def pdf_p(self, p: 'geo.Point') -> FLOAT:
-		pdf = 0.
-		for i, sh in enumerate(self.shapes):
-			pdf += self.areas[i] * sh.pdf(p)
-		return pdf / (self.sum_area * len(self.shapes))
+		"""
+		Area pdf of sampling `p` on the set
+		"""
+		return 1. / self.sum_area
 
 
 class LightSampleOffset(object):
@@ -10,4 +10,5 @@ Modified on Aug 13, 2017
 """
 from __future__ import absolute_import
 from pytracer.montecarlo.utility import *
-from pytracer.montecarlo.distribution import *
\ No newline at end of file
+from pytracer.montecarlo.distribution import *
+from pytracer.montecarlo.rng import *
@@ -11,7 +11,7 @@ Modified on Aug 13, 2017
 from __future__ import absolute_import
 from pytracer import *
 
-__all__ = ['Distribution1D', 'Distribution2D']
+__all__ = ['Distribution1D', 'Distribution2D', 'AliasTable']
 
 
 # Utility Classes
@@ -80,6 +80,70 @@ class Distribution1D(object):
 		return [off, self.func[off] / (self.cdf_raw * self.cnt)]
 
 
+class AliasTable(object):
+	"""
+	AliasTable Class
+
+	Discrete distribution sampled in
+	constant time, c.f. Vose's alias method.
+	"""
+
+	def __init__(self, arr: [FLOAT]):
+		w = np.asarray(arr, dtype=FLOAT).ravel()
+		self.cnt = len(w)
+		self.func_int = w.sum()
+		if self.func_int > 0.:
+			self.pmf = w / self.func_int
+		else:
+			self.pmf = np.full(self.cnt, 1. / self.cnt)
+
+		# split each bin between itself and an alias
+		q = self.pmf * self.cnt
+		self.prob = np.ones(self.cnt, dtype=FLOAT)
+		self.alias = np.arange(self.cnt)
+		small = np.flatnonzero(q < 1.).tolist()
+		large = np.flatnonzero(q >= 1.).tolist()
+		while len(small) > 0 and len(large) > 0:
+			s, l = small.pop(), large.pop()
+			self.prob[s] = q[s]
+			self.alias[s] = l
+			q[l] = (q[l] + q[s]) - 1.
+			if q[l] < 1.:
+				small.append(l)
+			else:
+				large.append(l)
+		# leftovers are one up to round-off
+
+	def __repr__(self):
+		return "{}\nSteps: {}\n".format(self.__class__, self.cnt)
+
+	def sample_dis(self, u: FLOAT) -> [INT, FLOAT]:
+		"""
+		sample_dis()
+
+		Use given random sample `u` to
+		sample from its distribution.
+		Returns the index and pmf: [idx, pmf].
+		"""
+		u *= self.cnt
+		i = min(int(u), self.cnt - 1)
+		if u - i >= self.prob[i]:
+			i = self.alias[i]
+		return [i, self.pmf[i]]
+
+	def sample_many(self, u: 'np.ndarray') -> ['np.ndarray', 'np.ndarray']:
+		"""
+		sample_many()
+
+		Vectorized `sample_dis()`, returns
+		arrays of indices and pmfs.
+		"""
+		u = np.asarray(u, dtype=FLOAT) * self.cnt
+		i = np.minimum(u.astype(INT), self.cnt - 1)
+		i = np.where(u - i < self.prob[i], i, self.alias[i])
+		return [i, self.pmf[i]]
+
+
 class Distribution2D(object):
 	"""
 	Distribution2D Class
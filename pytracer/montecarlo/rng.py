@@ -0,0 +1,61 @@
+"""
+rng.py
+
+pytracer.montecarlo package
+
+Seedable random streams.
+"""
+from __future__ import absolute_import
+from pytracer import *
+
+__all__ = ['RNG']
+
+
+class RNG(object):
+	"""
+	RNG Class
+
+	An independent `np.random.Generator` stream,
+	called like `np.random.rand`, s.t. it can be
+	passed wherever `rng` is expected.
+
+	Streams of tiles are derived from a job seed
+	and the tile index, c.f. `SeedSequence.spawn`,
+	so any tile can be re-rendered on its own, and
+	those of passes over a tile from its stream.
+	"""
+	def __init__(self, seed: (INT, 'np.random.SeedSequence') = None):
+		if not isinstance(seed, np.random.SeedSequence):
+			seed = np.random.SeedSequence(seed)
+		self.seed_seq = seed
+		self.gen = np.random.Generator(np.random.PCG64(seed))
+
+	def __repr__(self):
+		return "{}\nEntropy: {}\nSpawn key: {}".format(self.__class__, self.seed_seq.entropy,
+		                                               self.seed_seq.spawn_key)
+
+	def __call__(self, *shape) -> (FLOAT, 'np.ndarray'):
+		return self.gen.random(shape) if shape else self.gen.random()
+
+	@classmethod
+	def for_tile(cls, seed: INT, tile: INT) -> 'RNG':
+		"""
+		Stream of the `tile`-th tile, identical to
+		`RNG(seed).spawn(n)[tile]` for any `n > tile`
+		"""
+		return cls(np.random.SeedSequence(seed, spawn_key=(tile,)))
+
+	@classmethod
+	def for_pass(cls, seed: INT, tile: INT, n_pass: INT) -> 'RNG':
+		"""
+		Stream of the `n_pass`-th pass over the `tile`-th tile,
+		identical to `RNG.for_tile(seed, tile).spawn(n)[n_pass]`
+		"""
+		return cls(np.random.SeedSequence(seed, spawn_key=(tile, n_pass)))
+
+	def spawn(self, n: INT) -> ['RNG']:
+		"""`n` independent child streams"""
+		return [RNG(s) for s in self.seed_seq.spawn(n)]
+
+	def shuffle(self, x: 'np.ndarray'):
+		self.gen.shuffle(x)
@@ -14,8 +14,8 @@ import pytracer.geometry as geo
 
 __all__ = ['balance_heuristic', 'power_heuristic', 'rejection_sample_disk',
            'uniform_sample_hemisphere', 'uniform_sample_triangle', 'uniform_hemisphere_pdf', 'uniform_sample_sphere',
-           'uniform_sphere_pdf', 'uniform_sample_disk', 'concentric_sample_disk',
-           'cosine_sample_hemisphere', 'cosine_hemisphere_pdf', 'uniform_sample_cone',
+           'uniform_sphere_pdf', 'uniform_sample_disk', 'concentric_sample_disk', 'concentric_sample_disk_batch',
+           'cosine_sample_hemisphere', 'cosine_sample_hemisphere_batch', 'cosine_hemisphere_pdf', 'uniform_sample_cone',
            'uniform_cone_pdf', 'sample_hg', 'hg_pdf']
 
 
@@ -168,6 +168,26 @@ def concentric_sample_disk(u1: FLOAT, u2: FLOAT) -> [FLOAT, FLOAT]:
 	return [r * np.cos(theta), r * np.sin(theta)]
 
 
+def concentric_sample_disk_batch(u1: 'np.ndarray', u2: 'np.ndarray') -> ['np.ndarray', 'np.ndarray']:
+	"""
+	concentric_sample_disk_batch()
+
+	`concentric_sample_disk()` on
+	arrays of random numbers.
+	"""
+	sx = 2. * np.asarray(u1, dtype=FLOAT) - 1.
+	sy = 2. * np.asarray(u2, dtype=FLOAT) - 1.
+
+	# regions as in `concentric_sample_disk()`
+	with np.errstate(divide='ignore', invalid='ignore'):
+		r = np.where(sx > -sy, np.where(sx > sy, sx, sy), np.where(sx > sy, -sy, -sx))
+		theta = np.where(sx > -sy,
+		                 np.where(sx > sy, sy / sx + np.where(sy <= 0., 8., 0.), 2. - sx / sy),
+		                 np.where(sx > sy, 6. + sx / sy, 4. - sy / sx))
+	theta = np.where(r == 0., 0., theta) * (PI / 4.)
+	return [r * np.cos(theta), r * np.sin(theta)]
+
+
 def cosine_sample_hemisphere(u1: FLOAT, u2: FLOAT) -> 'geo.Vector':
 	"""
 	cosine_sample_hemisphere()
@@ -184,6 +204,21 @@ def cosine_sample_hemisphere(u1: FLOAT, u2: FLOAT) -> 'geo.Vector':
 	return vec
 
 
+def cosine_sample_hemisphere_batch(u1: 'np.ndarray', u2: 'np.ndarray') -> 'np.ndarray':
+	"""
+	cosine_sample_hemisphere_batch()
+
+	`cosine_sample_hemisphere()` on
+	arrays of random numbers, returns
+	an (n, 3) array of directions.
+	"""
+	z = 1. - 2. * np.asarray(u1, dtype=FLOAT)
+	r = np.sqrt(np.maximum(0., 1. - z * z))
+	phi = 2. * PI * np.asarray(u2, dtype=FLOAT)
+	x, y = r * np.cos(phi), r * np.sin(phi)
+	return np.column_stack([x, y, np.sqrt(np.maximum(0., 1. - x * x - y * y))])
+
+
 def cosine_hemisphere_pdf(costheta: FLOAT, phi: FLOAT) -> FLOAT:
 	"""
 	cosine_hemisphere_pdf()
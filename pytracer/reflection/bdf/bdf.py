@@ -36,6 +36,9 @@ class BDFType():
 	def __repr__(self):
 		return "{}\nEnum: {}".format(self.__class__, self.v)
 
+	def __bool__(self):
+		return bool(self.v)
+
 	def __invert__(self):
 		return BDFType(~self.v)
 
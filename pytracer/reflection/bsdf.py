@@ -12,10 +12,10 @@ Modified on Aug 13, 2017
 from __future__ import absolute_import
 from pytracer import *
 import pytracer.geometry as geo
-from pytracer.reflection.bdf.bdf import (BDFType, BDF)
+from pytracer.reflection.bdf.bdf import (BDFType, BDF, Lambertian)
 
 
-__all__ = ['BSDFSample', 'BSDFSampleOffset', 'BSDF']
+__all__ = ['BSDFSample', 'BSDFSampleOffset', 'BSDF', 'BSDFBatch']
 
 
 class BSDFSample(object):
@@ -200,9 +200,9 @@ class BSDF(object):
 		Transform a `geo.Vector` in the local system
 		to the world system
 		"""
-		return geo.Vector(self.sn.x * v.x + self.tn.x * v.x + self.nn.x * v.x,
-		                  self.sn.y * v.y + self.tn.y * v.y + self.nn.y * v.y,
-		                  self.sn.z * v.z + self.tn.z * v.z + self.nn.z * v.z)
+		return geo.Vector(self.sn.x * v.x + self.tn.x * v.y + self.nn.x * v.z,
+		                  self.sn.y * v.x + self.tn.y * v.y + self.nn.y * v.z,
+		                  self.sn.z * v.x + self.tn.z * v.y + self.nn.z * v.z)
 
 	def f(self, wo_w: 'geo.Vector', wi_w: 'geo.Vector', flags: 'BDFType' = BDFType.ALL) -> 'Spectrum':
 		wi = self.w2l(wi_w)
@@ -258,4 +258,118 @@ class BSDF(object):
 		return sp
 
 
+class BSDFBatch(object):
+	"""
+	BSDFBatch Class
+
+	`BSDF`s of a batch of points, with their frames
+	packed as (n, 3) arrays `p`, `nn`, `sn`, `tn` and
+	`ng`. BSDFs of a single `Lambertian`, as made by
+	`MatteMaterial` without roughness, are evaluated
+	and sampled at once, others one by one.
+	"""
 
+	def __init__(self, bsdfs: ['BSDF']):
+		self.bsdfs = bsdfs
+		n = len(bsdfs)
+		self.p = np.array([b.dgs.p for b in bsdfs], dtype=FLOAT).reshape(n, 3)
+		self.nn = np.array([b.nn for b in bsdfs], dtype=FLOAT).reshape(n, 3)
+		self.sn = np.array([b.sn for b in bsdfs], dtype=FLOAT).reshape(n, 3)
+		self.tn = np.array([b.tn for b in bsdfs], dtype=FLOAT).reshape(n, 3)
+		self.ng = np.array([b.ng for b in bsdfs], dtype=FLOAT).reshape(n, 3)
+
+		# reflectances of the lambertian ones
+		self.diffuse = np.array([len(b.bdfs) == 1 and type(b.bdfs[0]) is Lambertian for b in bsdfs], dtype=bool)
+		self.R = np.zeros((n, Spectrum().n_samples), dtype=FLOAT)
+		for k in np.flatnonzero(self.diffuse):
+			self.R[k] = bsdfs[k].bdfs[0].R
+
+	def __repr__(self):
+		return "{}\nBSDFs: {}\nLambertian: {}".format(self.__class__, len(self), self.diffuse.sum())
+
+	def __len__(self):
+		return len(self.bsdfs)
+
+	def __getitem__(self, idx) -> 'BSDFBatch':
+		"""The BSDFs at `idx`, an index array or mask, as a new batch"""
+		ret = BSDFBatch.__new__(BSDFBatch)
+		ret.bsdfs = [self.bsdfs[k] for k in np.arange(len(self))[idx]]
+		for name in ('p', 'nn', 'sn', 'tn', 'ng', 'diffuse', 'R'):
+			setattr(ret, name, getattr(self, name)[idx])
+		return ret
+
+	@staticmethod
+	def _dot(a: 'np.ndarray', b: 'np.ndarray') -> 'np.ndarray':
+		return np.einsum('ij,ij->i', a, b)
+
+	def w2l(self, v: 'np.ndarray') -> 'np.ndarray':
+		"""`BSDF.w2l()` of the rows of `v`"""
+		return np.column_stack([self._dot(v, self.sn), self._dot(v, self.tn), self._dot(v, self.nn)])
+
+	def l2w(self, v: 'np.ndarray') -> 'np.ndarray':
+		"""`BSDF.l2w()` of the rows of `v`"""
+		return v[:, 0:1] * self.sn + v[:, 1:2] * self.tn + v[:, 2:3] * self.nn
+
+	@staticmethod
+	def _lambertian(flags: 'BDFType') -> bool:
+		tp = BDFType.REFLECTION | BDFType.DIFFUSE
+		return BDFType(flags).v & tp == tp
+
+	def f(self, wo_w: 'np.ndarray', wi_w: 'np.ndarray', flags: 'BDFType' = BDFType.ALL) -> 'SpectrumBatch':
+		"""`BSDF.f()` of the rows of `wo_w` and `wi_w`"""
+		from pytracer.spectral import SpectrumBatch
+		f = SpectrumBatch(len(self))
+		if self._lambertian(flags):
+			# lambertians reflect only
+			on = self.diffuse & (self._dot(wi_w, self.ng) * self._dot(wo_w, self.ng) > 0.)
+			f[on] = INV_PI * self.R[on]
+
+		for k in np.flatnonzero(~self.diffuse):
+			f[k] = self.bsdfs[k].f(geo.Vector.from_arr(wo_w[k]), geo.Vector.from_arr(wi_w[k]), flags)
+		return f
+
+	def pdf(self, wo_w: 'np.ndarray', wi_w: 'np.ndarray', flags: 'BDFType' = BDFType.ALL) -> 'np.ndarray':
+		"""`BSDF.pdf()` of the rows of `wo_w` and `wi_w`"""
+		pdf = np.zeros(len(self), dtype=FLOAT)
+		if self._lambertian(flags):
+			cos_o = self._dot(wo_w[self.diffuse], self.nn[self.diffuse])
+			cos_i = self._dot(wi_w[self.diffuse], self.nn[self.diffuse])
+			pdf[self.diffuse] = np.where(cos_o * cos_i > 0., np.fabs(cos_i) * INV_PI, 0.)
+
+		for k in np.flatnonzero(~self.diffuse):
+			pdf[k] = self.bsdfs[k].pdf(geo.Vector.from_arr(wo_w[k]), geo.Vector.from_arr(wi_w[k]), flags)
+		return pdf
+
+	def sample_f(self, wo_w: 'np.ndarray', u: 'np.ndarray',
+	             flags: 'BDFType' = BDFType.ALL) -> ['np.ndarray', 'np.ndarray', 'np.ndarray', 'SpectrumBatch']:
+		"""
+		`BSDF.sample_f()` for the rows of `wo_w` and
+		`u`, the latter ordered as `BSDFSample`.
+		Returns pdfs, (n, 3) directions, whether
+		the directions are specular, and the values.
+		"""
+		from pytracer.montecarlo import cosine_sample_hemisphere_batch
+		from pytracer.spectral import SpectrumBatch
+		n = len(self)
+		pdf = np.zeros(n, dtype=FLOAT)
+		wi_w = np.zeros((n, 3), dtype=FLOAT)
+		specular = np.zeros(n, dtype=bool)
+		f = SpectrumBatch(n)
+
+		dif = np.flatnonzero(self.diffuse) if self._lambertian(flags) else np.zeros(0, dtype=INT)
+		if len(dif) > 0:
+			# cosine sampling on the side of `wo`
+			wo_z = self._dot(wo_w[dif], self.nn[dif])
+			wi = cosine_sample_hemisphere_batch(u[dif, 0], u[dif, 1])
+			wi[wo_z < 0., 2] *= -1.
+			pdf[dif] = np.where(wo_z * wi[:, 2] > 0., np.fabs(wi[:, 2]) * INV_PI, 0.)
+			wi_w[dif] = self[dif].l2w(wi)
+			on = (pdf[dif] > 0.) & (self._dot(wi_w[dif], self.ng[dif]) * self._dot(wo_w[dif], self.ng[dif]) > 0.)
+			f[dif[on]] = INV_PI * self.R[dif[on]]
+
+		for k in np.flatnonzero(~self.diffuse):
+			pdf[k], wi, tp, f[k] = self.bsdfs[k].sample_f(geo.Vector.from_arr(wo_w[k]), BSDFSample(*u[k]), flags)
+			if wi is not None:
+				wi_w[k] = wi
+			specular[k] = tp is not None and bool(tp & BDFType.SPECULAR)
+		return [pdf, wi_w, specular, f]
@@ -6,4 +6,5 @@ pytracer.renderer package
 Created by Jiayao on Aug 13, 2017
 """
 from __future__ import absolute_import
-from pytracer.renderer.renderer import *
\ No newline at end of file
+from pytracer.renderer.renderer import *
+from pytracer.renderer.cache import *
@@ -0,0 +1,166 @@
+"""
+cache.py
+
+pytracer.renderer package
+
+Caches primary intersections
+across rendering passes.
+"""
+from __future__ import absolute_import
+from pytracer import *
+import pytracer.geometry as geo
+import pytracer.transform as trans
+
+__all__ = ['PrimaryHitCache']
+
+
+class PrimaryHitCache(object):
+	"""
+	PrimaryHitCache Class
+
+	Primary intersections per pixel sample,
+	i.e., a G-buffer, stored as arrays of shape
+	(ny, nx, spp[, k]): `hit`, `t`, `uv`, the frame
+	`p`, `n`, `dpdu`, `dpdv`, `dndu`, `dndv`, and
+	the primitive and shape hit, from which a new
+	`Intersection` is made on each lookup.
+
+	Entries are keyed by pixel and sample index, the
+	renderer keeps the camera samples of each tile the
+	same across passes, c.f. `SamplerRendererTask`.
+	Entries are dropped by `validate()` once the camera,
+	the scene aggregate, its bounds or `scene.version`,
+	to be bumped on geometry edits, changed.
+	"""
+	def __init__(self, x0: INT, x1: INT, y0: INT, y1: INT, spp: INT):
+		self.x0, self.x1, self.y0, self.y1 = x0, x1, y0, y1
+		self.spp = spp
+		shape = (y1 - y0, x1 - x0, spp)
+		self.valid = np.zeros(shape, dtype=bool)
+		self.hit = np.zeros(shape, dtype=bool)
+		self.t = np.full(shape, np.inf, dtype=FLOAT)
+		self.r_eps = np.zeros(shape, dtype=FLOAT)
+		self.primitive_id = np.full(shape, -1, dtype=INT)
+		self.shape_id = np.full(shape, -1, dtype=INT)
+		self.uv = np.zeros(shape + (2,), dtype=FLOAT)
+		self.p = np.zeros(shape + (3,), dtype=FLOAT)
+		self.n = np.zeros(shape + (3,), dtype=FLOAT)
+		self.dpdu = np.zeros(shape + (3,), dtype=FLOAT)
+		self.dpdv = np.zeros(shape + (3,), dtype=FLOAT)
+		self.dndu = np.zeros(shape + (3,), dtype=FLOAT)
+		self.dndv = np.zeros(shape + (3,), dtype=FLOAT)
+		# scene objects, referenced only
+		self.primitive = np.empty(shape, dtype=object)
+		self.shape = np.empty(shape, dtype=object)
+		self.o2w = np.empty(shape, dtype=object)
+		self.w2o = np.empty(shape, dtype=object)
+
+		self.aggregate = None
+		self.scene_state = None
+		self.camera_state = None
+		self.n_lookups = 0
+		self.n_reused = 0
+
+	def __repr__(self):
+		return "{}\nx: {} - {}\ny: {} - {}\nSamples per pixel: {}\nReused: {}/{}" \
+			.format(self.__class__, self.x0, self.x1, self.y0, self.y1, self.spp, self.n_reused, self.n_lookups)
+
+	@classmethod
+	def from_sampler(cls, sampler: 'Sampler') -> 'PrimaryHitCache':
+		return cls(sampler.xPixel_start, sampler.xPixel_end, sampler.yPixel_start, sampler.yPixel_end,
+		           sampler.maximum_sample_cnt())
+
+	@staticmethod
+	def camera_state(camera: 'Camera') -> list:
+		"""Snapshot of the numeric camera parameters"""
+		state = []
+		for k, v in sorted(vars(camera).items()):
+			if isinstance(v, trans.AnimatedTransform):
+				state.append((k, v.startTransform.m.tobytes(), v.endTransform.m.tobytes(), v.startTime, v.endTime))
+			elif isinstance(v, trans.Transform):
+				state.append((k, v.m.tobytes()))
+			elif isinstance(v, np.ndarray):
+				state.append((k, v.tobytes()))
+			elif isinstance(v, (bool, int, float, np.number)):
+				state.append((k, v))
+		return state
+
+	@staticmethod
+	def scene_state(scene: 'Scene') -> list:
+		"""Geometry version and bounds of the aggregate"""
+		b = scene.aggregate.world_bound()
+		return [getattr(scene, 'version', 0), np.concatenate([b.pMin, b.pMax]).tobytes()]
+
+	def clear(self):
+		self.valid[...] = False
+		for arr in (self.primitive, self.shape, self.o2w, self.w2o):
+			arr[...] = None
+
+	def validate(self, scene: 'Scene', camera: 'Camera') -> bool:
+		"""
+		Drops all entries if the camera, the scene
+		aggregate or its geometry changed since the
+		last call, returns whether entries are kept.
+		"""
+		camera_state = PrimaryHitCache.camera_state(camera)
+		scene_state = PrimaryHitCache.scene_state(scene)
+		kept = scene.aggregate is self.aggregate and scene_state == self.scene_state and \
+			camera_state == self.camera_state
+		if not kept:
+			self.clear()
+			self.aggregate = scene.aggregate
+			self.scene_state = scene_state
+			self.camera_state = camera_state
+		return kept
+
+	def lookup(self, x: INT, y: INT, i: INT, ray: 'geo.Ray') -> [bool, bool, 'Intersection']:
+		"""
+		Returns whether sample `i` of pixel (x, y) is
+		stored, whether it hit, and a new `Intersection`
+		made of the entry. `ray.maxt` is set on a hit.
+		"""
+		from pytracer.aggregate import Intersection
+		self.n_lookups += 1
+		key = (y - self.y0, x - self.x0, i)
+		if not self.valid[key]:
+			return [False, False, None]
+
+		self.n_reused += 1
+		if not self.hit[key]:
+			return [True, False, None]
+		ray.maxt = self.t[key]
+		dg = geo.DifferentialGeometry(geo.Point.from_arr(self.p[key]), geo.Vector.from_arr(self.dpdu[key]),
+		                              geo.Vector.from_arr(self.dpdv[key]), geo.Normal.from_arr(self.dndu[key]),
+		                              geo.Normal.from_arr(self.dndv[key]), self.uv[key][0], self.uv[key][1],
+		                              self.shape[key])
+		dg.nn = geo.Normal.from_arr(self.n[key])
+		return [True, True, Intersection(dg, self.primitive[key], self.w2o[key], self.o2w[key],
+		                                 self.shape_id[key], self.primitive_id[key], self.r_eps[key])]
+
+	def store(self, x: INT, y: INT, i: INT, ray: 'geo.Ray', hit: bool, isect: 'Intersection'):
+		"""Stores the result of intersecting `ray`, the fields of `isect` are copied"""
+		key = (y - self.y0, x - self.x0, i)
+		self.valid[key] = True
+		self.hit[key] = hit
+		if not hit:
+			self.t[key] = np.inf
+			self.primitive_id[key] = -1
+			self.primitive[key] = self.shape[key] = None
+			return
+
+		dg = isect.dg
+		self.t[key] = ray.maxt
+		self.r_eps[key] = isect.rEps
+		self.primitive_id[key] = isect.primitiveId
+		self.shape_id[key] = isect.shapeId
+		self.uv[key] = [dg.u, dg.v]
+		self.p[key] = dg.p
+		self.n[key] = dg.nn
+		self.dpdu[key] = dg.dpdu
+		self.dpdv[key] = dg.dpdv
+		self.dndu[key] = dg.dndu
+		self.dndv[key] = dg.dndv
+		self.primitive[key] = isect.primitive
+		self.shape[key] = dg.shape
+		self.o2w[key] = isect.o2w
+		self.w2o[key] = isect.w2o
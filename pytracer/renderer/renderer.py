@@ -47,21 +47,47 @@ class SamplerRenderer(Renderer):
 	"""
 	SamplerRenderer Class
 
-	Sample-driven renderer
+	Sample-driven renderer. The image is split into
+	tiles of about `TILE_SIZE` squared pixels, one
+	task each. Camera samples are drawn from a stream
+	derived from `seed` and the tile index, the same
+	for every call to `render()`, integrator samples
+	from one derived from the pass too. Renders, and
+	any tile on its own, are reproducible if `seed`
+	is given.
+
+	With `hit_cache`, primary intersections are kept
+	in a `PrimaryHitCache` and reused by later calls
+	to `render()` while camera and scene are unchanged.
 	"""
-	def __init__(self, s: 'Sampler', c: 'Camera', si: 'SurfaceIntegrator', vi: 'VolumeIntegrator'):
+	TILE_SIZE = 16
+
+	def __init__(self, s: 'Sampler', c: 'Camera', si: 'SurfaceIntegrator', vi: 'VolumeIntegrator',
+	             seed: INT=None, hit_cache: bool=False):
 		self.sampler = s
 		self.camera = c
 		self.surf_integrator = si
 		self.vol_integrator = vi
+		if seed is None:
+			seed = np.random.SeedSequence().entropy
+		self.seed = seed
+		self.use_hit_cache = hit_cache
+		self.hit_cache = None
+		self.n_pass = 0
 
 	def li(self, scene: 'Scene', ray: 'geo.RayDifferential', sample: 'Sample',
-			isect: 'Intersection', rng=np.random.rand) -> ['Spectrum']:
+			isect: 'Intersection', rng=np.random.rand, hit: bool=None) -> ['Spectrum']:
+		"""
+		`hit`, if given, is the result of
+		`scene.intersect(ray, isect)` done by the caller
+		"""
 		# local variable
 		assert ray.time == sample.time
 
 		li = Spectrum(0.)
-		if scene.intersect(ray, isect):
+		if hit is None:
+			hit = scene.intersect(ray, isect)
+		if hit:
 			li = self.surf_integrator.li(scene, self, ray, isect, sample, rng)
 		else:
 			for light in scene.lights:
@@ -75,7 +101,7 @@ class SamplerRenderer(Renderer):
 			return li, Spectrum(0.)
 
 	def transmittance(self, scene: 'Scene', ray: 'geo.RayDifferential', sample: 'Sample',
-									rng='np.random.rand') -> 'Spectrum':
+									rng=np.random.rand) -> 'Spectrum':
 		if self.vol_integrator is not None:
 			return self.vol_integrator.transmittance(scene, self, ray, sample, rng)
 		else:
@@ -91,25 +117,36 @@ class SamplerRenderer(Renderer):
 
 		# init sample
 		sample = Sample(self.sampler, self.surf_integrator, self.vol_integrator, scene)
+		self.sampler.reset()
+
+		if self.use_hit_cache:
+			from pytracer.renderer.cache import PrimaryHitCache
+			if self.hit_cache is None:
+				self.hit_cache = PrimaryHitCache.from_sampler(self.sampler)
+			self.hit_cache.validate(scene, self.camera)
 
-		task = SamplerRendererTask(scene, self, self.camera, self.sampler, sample, False, 1, 1)
-		task()		
 		# main rendering loop: launch tasks
-		# numer of samples
-		# n_pixels = self.camera.film.xResolution * self.camera.film.yResolution
-		# n_tasks = max(32 *  multiprocessing.cpu_count(), n_pixels / (16 * 16))
-		# n_tasks = round_pow_2(n_tasks)
-		# n_tasks = 1
-		# render_tasks = []
-		# for i in range(n_tasks):
-		#   render_tasks.append(SamplerRendererTask(scene, self, self.camera,
-		#       self.sampler, sample, n_tasks-1-i, n_tasks))
-		# enqueue_tasks(render_tasks)
-		# wait_for_tasks()
-		# render_tasks[0]()
+		n_tasks = self.task_count()
+		render_tasks = []
+		for i in range(n_tasks):
+			render_tasks.append(SamplerRendererTask(scene, self, self.camera,
+			                                        self.sampler, sample, False, i, n_tasks))
+		for task in render_tasks:
+			task()
+		self.n_pass += 1
 		# store result
 		self.camera.film.write_image()
 
+	def task_count(self) -> INT:
+		"""
+		Number of tiles the image is split into, by
+		its size alone rather than the number of cores,
+		s.t. tiles and their streams do not depend on it
+		"""
+		n_pixels = (self.sampler.xPixel_end - self.sampler.xPixel_start) * \
+			(self.sampler.yPixel_end - self.sampler.yPixel_start)
+		return util.round_pow_2(max(1, n_pixels // (self.TILE_SIZE * self.TILE_SIZE)))
+
 
 class SamplerRendererTask(object):
 	"""
@@ -131,15 +168,27 @@ class SamplerRendererTask(object):
 
 	def __call__(self):
 		from pytracer.aggregate import Intersection
+		from pytracer.montecarlo import RNG
+		from pytracer.sampler import SampleBatch
 		# get sub-sampler
-		# sampler = self.main_sampler.get_subsampler(self.task_num, self.task_cnt)
-		sampler = self.main_sampler
+		sampler = self.main_sampler.get_subsampler(self.task_num, self.task_cnt)
 		if sampler is None:
 			return
 
 		# variables for rendering loop
-		# memory managed by python
-		rng = np.random.rand
+		# memory managed by python, camera samples
+		# are drawn from the stream of the tile, the
+		# same in every pass, the rest from that of the pass
+		tile_rng = RNG.for_tile(self.renderer.seed, self.task_num)
+		rng = RNG.for_pass(self.renderer.seed, self.task_num, self.renderer.n_pass)
+		cache = getattr(self.renderer, 'hit_cache', None)
+
+		# integrators tracing all rays of the tile at once
+		if hasattr(self.renderer.surf_integrator, 'li_batch') and hasattr(sampler, 'generate_tile') and \
+				hasattr(self.camera.film, 'add_samples') and self.renderer.vol_integrator is None and \
+				not self.vis_obj_id:
+			self.render_tile(sampler, tile_rng, rng, cache)
+			return
 
 		# allocate space for samples and isects
 		max_smp = sampler.maximum_sample_cnt()
@@ -147,25 +196,38 @@ class SamplerRendererTask(object):
 		Ls = [None] * max_smp
 		Ts = [None] * max_smp
 		isects = [Intersection() for _ in range(max_smp)]
-		samples = self.orig_sample.duplicate(max_smp)
+		samples = SampleBatch(self.orig_sample, max_smp)
 
 		# get samples and update image
 		total_iteration = (sampler.xPixel_end - sampler.xPixel_start) * (sampler.yPixel_end - sampler.yPixel_start)
 		# for cnt, samples in enumerate(sampler):
 		cnt = 0
-		while sampler.generate(samples):
+		while sampler.generate(samples, tile_rng, rng):
 			cnt += 1
 			util.progress_reporter(cnt, total_iteration, prefix='Rendering')
 
-			# generate camera ray and compute radiance
+			# generate camera rays of the pixel at once
+			wts, ray_batch = self.camera.generate_rays(samples)
+			ray_batch.scale_differential(1. / np.sqrt(sampler.spp))
+
+			# compute radiance
 			for i, sample in enumerate(samples):
 				# print('    Sample: {}/{}\n'.format(i+1, cnt))
 
 				# find camera ray for i-th sample
-				wt, rays[i] = self.camera.generate_ray_differential(sample)
-				rays[i].scale_differential(1. / np.sqrt(sampler.spp))
-
-				hit = self.scene.intersect_p(rays[i])
+				wt, rays[i] = wts[i], ray_batch.ray(i)
+
+				# primary intersection, possibly from the last pass
+				found = False
+				if cache is not None:
+					px, py = int(sample.imageX), int(sample.imageY)
+					found, hit, isect = cache.lookup(px, py, i, rays[i])
+					if hit:
+						isects[i] = isect
+				if not found:
+					hit = self.scene.intersect(rays[i], isects[i])
+					if cache is not None:
+						cache.store(px, py, i, rays[i], hit, isects[i])
 
 				if self.vis_obj_id:
 					if hit and wt > 0.:
@@ -175,7 +237,7 @@ class SamplerRendererTask(object):
 						Ls[i] = Spectrum(0.)
 				else:
 					if hit and wt > 0.:
-						Ls[i], Ts[i] = self.renderer.li(self.scene, rays[i], sample, isects[i], rng)
+						Ls[i], Ts[i] = self.renderer.li(self.scene, rays[i], sample, isects[i], rng, hit)
 						Ls[i] *= wt
 
 					else:
@@ -197,15 +259,78 @@ class SamplerRendererTask(object):
 				for i, sample in enumerate(samples):
 					self.camera.film.add_sample(sample, Ls[i])
 
-
-
-
-
-
-
-
-
-
-
-
-
+	def render_tile(self, sampler: 'Sampler', tile_rng, rng, cache: 'PrimaryHitCache'=None):
+		"""
+		Renders all samples of the tile by one call to
+		`li_batch()` of the surface integrator, for
+		scenes without volume integrator, i.e., with
+		transmittance 1. Primary intersections are
+		looked up in and stored to `cache`, if given.
+		"""
+		from pytracer.sampler import SampleBatch
+		tile = sampler.generate_tile(sampler.xPixel_start, sampler.xPixel_end, sampler.yPixel_start,
+		                             sampler.yPixel_end, self.orig_sample, tile_rng, rng)
+		samples = SampleBatch.from_tile(self.orig_sample, tile)
+		wts, rays = self.camera.generate_rays(samples)
+		rays.scale_differential(1. / np.sqrt(sampler.spp))
+
+		isects, hit = None, None
+		if cache is not None:
+			isects, hit = self.cached_hits(cache, tile, rays)
+		# hero wavelengths per camera sample if asked for
+		integrator = self.renderer.surf_integrator
+		wavelengths = None
+		if getattr(integrator, 'n_wavelengths', 0) > 0:
+			from pytracer.spectral import SampledWavelengths
+			wavelengths = SampledWavelengths.sample_hero(rng(len(rays)), integrator.n_wavelengths)
+			Ls = integrator.li_batch(self.scene, self.renderer, rays, samples, rng, isects, hit, wavelengths)
+		else:
+			Ls = integrator.li_batch(self.scene, self.renderer, rays, samples, rng, isects, hit)
+		Ls[wts <= 0.] = 0.
+		Ls *= wts[:, np.newaxis]
+
+		nans = np.isnan(Ls).any(axis=1)
+		if np.any(nans):
+			util.logging('Error', 'NAN radiance returned, setting to black.')
+			Ls[nans] = 0.
+		y = Ls.y() if wavelengths is None else wavelengths.to_xyz(Ls)[:, 1]
+		if np.any(y < -EPS):
+			util.logging('Error', 'Negative luminance {} returned, setting to black.'.format(y[y < -EPS].min()))
+			Ls[y < -EPS] = 0.
+		if np.any(y == np.inf):
+			util.logging('Error', 'Infinite luminance returned, setting to balck.')
+			Ls[y == np.inf] = 0.
+
+		self.camera.film.add_samples(samples.camera[:, 0], samples.camera[:, 1], Ls, wavelengths)
+
+	def cached_hits(self, cache: 'PrimaryHitCache', tile: 'TileSamples',
+	                rays: 'geo.RayBatch') -> [['Intersection'], 'np.ndarray']:
+		"""
+		Primary intersections of the tile, taken from
+		`cache` if stored, traced at once and stored
+		otherwise, `rays.maxt` is updated on hits
+		"""
+		from pytracer.aggregate import Intersection
+		n_smp = tile.time.shape[1]
+		isects = [None] * len(rays)
+		hit = np.zeros(len(rays), dtype=bool)
+		missing = []
+		for k in range(len(rays)):
+			(px, py), i = tile.pixels[k // n_smp], k % n_smp
+			ray = rays.ray(k)
+			found, hit[k], isects[k] = cache.lookup(px, py, i, ray)
+			if not found:
+				missing.append(k)
+			elif hit[k]:
+				rays.maxt[k] = ray.maxt
+
+		missing = np.array(missing, dtype=INT)
+		traced = rays[missing]
+		new = [Intersection() for _ in missing]
+		hit[missing] = self.scene.intersect_batch(traced, new)
+		rays.maxt[missing] = traced.maxt
+		for j, k in enumerate(missing):
+			(px, py), i = tile.pixels[k // n_smp], k % n_smp
+			isects[k] = new[j]
+			cache.store(px, py, i, traced.ray(j), hit[k], new[j])
+		return [isects, hit]
@@ -10,7 +10,7 @@ Modified on Aug 13, 2017
 from __future__ import absolute_import
 from pytracer import *
 
-__all__ = ['CameraSample', 'Sample']
+__all__ = ['CameraSample', 'Sample', 'SampleBatch', 'TileSamples']
 
 
 class CameraSample(object):
@@ -74,3 +74,150 @@ class Sample(CameraSample):
 	def add_2d(self, num: INT) -> INT:
 		self.n2D.append(num)
 		return len(self.n2D) - 1
+
+
+def _camera_property(k: INT) -> property:
+	"""Column `k` of `SampleBatch.camera`"""
+	def get(self):
+		return self.batch.camera[self.i, k]
+
+	def set(self, v):
+		self.batch.camera[self.i, k] = v
+
+	return property(get, set)
+
+
+class SampleBatch(object):
+	"""
+	SampleBatch Class
+
+	`n` samples with the dimensions requested in a
+	`Sample`, stored as 2-D arrays:
+	camera: (n, 5), imageX, imageY, lens_u, lens_v, time
+	data: (n, D), integrator dimensions, the j-th
+	      1D (2D) request in columns `slices_1d[j]`
+	      (`slices_2d[j]`), 2D samples interleaved.
+
+	Iterating yields per-sample views behaving
+	like `Sample`, for existing code.
+	"""
+	def __init__(self, sample: 'Sample', n: INT):
+		self.n1D = list(sample.n1D)
+		self.n2D = list(sample.n2D)
+		cols = np.cumsum([0] + self.n1D + [2 * n for n in self.n2D])
+		self.slices_1d = [slice(cols[j], cols[j + 1]) for j in range(len(self.n1D))]
+		self.slices_2d = [slice(cols[j], cols[j + 1]) for j in range(len(self.n1D), len(cols) - 1)]
+
+		self.camera = np.zeros([n, 5], dtype=FLOAT)
+		self.data = np.zeros([n, cols[-1]], dtype=FLOAT)
+		self.views = [SampleBatch.View(self, i) for i in range(n)]
+
+	def __repr__(self):
+		return "{}\nSamples: {}\nDimensions: {}".format(self.__class__, len(self), self.data.shape[1])
+
+	def __len__(self):
+		return len(self.camera)
+
+	def __iter__(self):
+		return iter(self.views)
+
+	def __getitem__(self, i: INT) -> 'SampleBatch.View':
+		return self.views[i]
+
+	@classmethod
+	def from_tile(cls, sample: 'Sample', tile: 'TileSamples') -> 'SampleBatch':
+		"""All samples of the tile, pixel by pixel"""
+		P, S = tile.time.shape
+		self = cls(sample, P * S)
+		self.fill(tile.image.reshape(-1, 2), tile.lens.reshape(-1, 2), tile.time.ravel(),
+		          [d.reshape(P * S, -1) for d in tile.oneD], [d.reshape(P * S, -1) for d in tile.twoD])
+		return self
+
+	def oneD(self, j: INT) -> 'np.ndarray':
+		"""The j-th 1D request of all samples, (n, n1D[j]) view"""
+		return self.data[:, self.slices_1d[j]]
+
+	def twoD(self, j: INT) -> 'np.ndarray':
+		"""The j-th 2D request of all samples, (n, n2D[j], 2) view"""
+		return self.data[:, self.slices_2d[j]].reshape(len(self), self.n2D[j], 2)
+
+	def fill(self, image: 'np.ndarray', lens: 'np.ndarray', time: 'np.ndarray',
+	         oneD: ['np.ndarray'], twoD: ['np.ndarray']):
+		"""Copies arrays of shapes (n, 2), (n, 2), (n,), [(n, n1D[j])] and [(n, n2D[j], 2)]"""
+		self.camera[:, 0:2] = image
+		self.camera[:, 2:4] = lens
+		self.camera[:, 4] = time
+		for j, d in enumerate(oneD):
+			self.data[:, self.slices_1d[j]] = d
+		for j, d in enumerate(twoD):
+			self.data[:, self.slices_2d[j]] = np.reshape(d, (len(self), -1))
+
+	class View(object):
+		"""
+		A sample of the batch, `oneD` and `twoD`
+		are views into the batch arrays
+		"""
+		def __init__(self, batch: 'SampleBatch', i: INT):
+			self.batch = batch
+			self.i = i
+			self.n1D = batch.n1D
+			self.n2D = batch.n2D
+			row = batch.data[i]
+			self.oneD = [row[s] for s in batch.slices_1d]
+			self.twoD = [row[s].reshape(n, 2) for s, n in zip(batch.slices_2d, batch.n2D)]
+
+		def __repr__(self):
+			return "{}\nImage: ({}, {})\nLens:({}, {})\nTime: {}".format(self.__class__,
+				self.imageX, self.imageY, self.lens_u, self.lens_v, self.time)
+
+		imageX = _camera_property(0)
+		imageY = _camera_property(1)
+		lens_u = _camera_property(2)
+		lens_v = _camera_property(3)
+		time = _camera_property(4)
+
+
+class TileSamples(object):
+	"""
+	TileSamples Class
+
+	All samples of a tile of pixels as contiguous
+	arrays, indexed by pixel then sample:
+	pixels: (P, 2) pixel coordinates, row major
+	image, lens: (P, S, 2)
+	time: (P, S)
+	oneD[j]: (P, S, n1D[j])
+	twoD[j]: (P, S, n2D[j], 2)
+	"""
+	def __init__(self, pixels: 'np.ndarray', image: 'np.ndarray', lens: 'np.ndarray',
+	             time: 'np.ndarray', oneD: ['np.ndarray'], twoD: ['np.ndarray']):
+		self.pixels = pixels
+		self.image = image
+		self.lens = lens
+		self.time = time
+		self.oneD = oneD
+		self.twoD = twoD
+
+	def __repr__(self):
+		return "{}\nPixels: {}\nSamples per pixel: {}".format(self.__class__, len(self.pixels),
+		                                                      self.image.shape[1])
+
+	def __len__(self):
+		return len(self.pixels)
+
+	def fill(self, pixel: INT, samples: (['Sample'], 'SampleBatch')):
+		"""Copies the samples of the `pixel`-th pixel into `samples`"""
+		image, lens, time = self.image[pixel], self.lens[pixel], self.time[pixel]
+		oneD = [d[pixel] for d in self.oneD]
+		twoD = [d[pixel] for d in self.twoD]
+		if isinstance(samples, SampleBatch):
+			samples.fill(image, lens, time, oneD, twoD)
+			return
+		for i, sample in enumerate(samples):
+			sample.imageX, sample.imageY = image[i]
+			sample.lens_u, sample.lens_v = lens[i]
+			sample.time = time[i]
+			for j, d in enumerate(oneD):
+				sample.oneD[j] = d[i]
+			for j, d in enumerate(twoD):
+				sample.twoD[j] = d[i]
@@ -45,7 +45,7 @@ class Sampler(object, metaclass=ABCMeta):
 		            self.yPixel_start, self.yPixel_end, self.spp)
 
 	@abstractmethod
-	def generate(self, samples: ['Sample'], rng=np.random.rand) -> bool:
+	def generate(self, samples: ['Sample'], rng=np.random.rand, integrator_rng=None) -> bool:
 		raise NotImplementedError('pytracer.sampler.__init__.{}.generate(): abstract method called' \
 		                          .format(self.__class__))
 	@abstractmethod
@@ -73,6 +73,13 @@ class Sampler(object, metaclass=ABCMeta):
 		'''
 		return True
 
+	def reset(self):
+		'''
+		Restart from the first pixel, e.g.,
+		for another rendering pass
+		'''
+		pass
+
 	@abstractmethod
 	def round_size(self, size: INT) -> INT:
 		'''
@@ -105,10 +112,10 @@ class Sampler(object, metaclass=ABCMeta):
 		# compute x and y pixel sample range
 		x0 = num % nx
 		y0 = num // nx
-		x = np.clip([x0 / nx, (x0 + 1) / nx], self.xPixel_start, self.xPixel_end)
-		y = np.clip([y0 / ny, (y0 + 1) / ny], self.yPixel_start, self.yPixel_end)
-		return np.concatenate([util.ufunc_lerp(x, self.xPixel_start, self.xPixel_end),
-		                       util.ufunc_lerp(y, self.yPixel_start, self.yPixel_end)])
+		x = [x0 / nx, (x0 + 1) / nx]
+		y = [y0 / ny, (y0 + 1) / ny]
+		return np.floor(np.concatenate([util.ufunc_lerp(x, self.xPixel_start, self.xPixel_end),
+		                                util.ufunc_lerp(y, self.yPixel_start, self.yPixel_end)])).astype(INT)
 
 
 from pytracer.sampler.sampler.stratified import *
\ No newline at end of file
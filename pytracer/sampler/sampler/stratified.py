@@ -11,10 +11,9 @@ Modified on Aug 13, 2017
 """
 from __future__ import absolute_import
 from pytracer import *
-from pytracer.sampler.sample import Sample
+from pytracer.sampler.sample import (Sample, TileSamples)
 from pytracer.sampler.sampler import Sampler
-from pytracer.sampler.utility import (stratified_sample_1d, stratified_sample_2d,
-                                      latin_hypercube_1d, latin_hypercube_2d)
+from pytracer.sampler.utility import (latin_hypercube_1d_batch, latin_hypercube_2d_batch)
 
 __all__ = ['StratifiedSampler']
 
@@ -41,44 +40,23 @@ class StratifiedSampler(Sampler):
 		self.yPos = ys
 		self.xSamples = xst
 		self.ySamples = yst
+		self.tile = None  # samples of the current row
 
-	def generate(self, samples: ['Sample'], rng=np.random.rand) -> bool:
+	def generate(self, samples: ['Sample'], rng=np.random.rand, integrator_rng=None) -> bool:
 		"""
 		It is the caller's responsibility to ensure
 		samples are initiliazed and len(samplse) == self.xSamples * self.ySamples.
 		Return a bool indicating whether there is are more samples to generate.
+		Samples are generated by rows, c.f. `generate_tile()`.
 		"""
 		if self.yPos == self.yPixel_end:
 			return False
 
-		n_samples = self.xSamples * self.ySamples
-		assert n_samples == len(samples)
-		# generate stratified samples
-		image_samples = stratified_sample_2d(self.xSamples, self.ySamples, self.jitter, rng)
-		lens_samples = stratified_sample_2d(self.xSamples, self.ySamples, self.jitter, rng)
-		time_samples = stratified_sample_1d(self.xSamples * self.ySamples, self.jitter, rng)
-
-		# shift samples to pixel coord
-		image_samples += [self.xPos, self.yPos]
-
-		# decorrelate dimensions
-		np.random.shuffle(lens_samples)
-		np.random.shuffle(time_samples)
-
-		# init `Sample` object
-		# samples = np.empty(n_samples, dtype=object)
-		for i, sample in enumerate(samples):
-			sample.imageX = image_samples[i, 0]
-			sample.imageY = image_samples[i, 1]
-			sample.lens_u = lens_samples[i, 0]
-			sample.lens_v = lens_samples[i, 1]
-			sample.time = util.lerp(time_samples[i], self.s_open, self.s_close)
-
-			# generate patterns for integraters, if needed
-			for j, n in enumerate(sample.n1D):
-				sample.oneD[j] = latin_hypercube_1d(n, rng)
-			for j, n in enumerate(samples[i].n2D):
-				sample.twoD[j] = latin_hypercube_2d(n, rng)
+		assert self.xSamples * self.ySamples == len(samples)
+		if self.xPos == self.xPixel_start:
+			self.tile = self.generate_tile(self.xPixel_start, self.xPixel_end, self.yPos, self.yPos + 1,
+			                               samples[0], rng, integrator_rng)
+		self.tile.fill(self.xPos - self.xPixel_start, samples)
 
 		# advance current position
 		self.xPos += 1
@@ -88,6 +66,56 @@ class StratifiedSampler(Sampler):
 
 		return True
 
+	def generate_tile(self, x0: INT, x1: INT, y0: INT, y1: INT, sample: 'Sample'=None,
+	                  rng=np.random.rand, integrator_rng=None) -> 'TileSamples':
+		"""
+		Generates the samples of pixels [x0, x1-1] x [y0, y1-1]
+		at once. Integrator dimensions are those requested
+		in `sample`, if given, drawn from `integrator_rng`,
+		`rng` if not given, s.t. they can be reseeded
+		while the camera samples are kept.
+		"""
+		nx, ny = self.xSamples, self.ySamples
+		n_samples = nx * ny
+		y, x = np.mgrid[y0:y1, x0:x1]
+		pixels = np.column_stack([x.ravel(), y.ravel()])
+		shape = (len(pixels), n_samples)
+
+		# stratum of each sample
+		sx = np.tile(np.arange(nx), ny)
+		sy = np.repeat(np.arange(ny), nx)
+		if self.jitter:
+			jitter = rng(*(shape + (5,)))
+		else:
+			jitter = np.full(shape + (5,), .5)
+
+		image = np.empty(shape + (2,))
+		image[..., 0] = (sx + jitter[..., 0]) / nx + pixels[:, 0:1]
+		image[..., 1] = (sy + jitter[..., 1]) / ny + pixels[:, 1:2]
+
+		# decorrelate dimensions by shuffling the strata
+		perm = np.argsort(rng(*shape), axis=-1)
+		lens = np.empty(shape + (2,))
+		lens[..., 0] = (sx[perm] + jitter[..., 2]) / nx
+		lens[..., 1] = (sy[perm] + jitter[..., 3]) / ny
+		time = (np.argsort(rng(*shape), axis=-1) + jitter[..., 4]) / n_samples
+		time = util.lerp(time, self.s_open, self.s_close)
+
+		# generate patterns for integraters, if needed
+		oneD, twoD = [], []
+		if sample is not None:
+			if integrator_rng is None:
+				integrator_rng = rng
+			oneD = [latin_hypercube_1d_batch(shape, n, integrator_rng) for n in sample.n1D]
+			twoD = [latin_hypercube_2d_batch(shape, n, integrator_rng) for n in sample.n2D]
+
+		return TileSamples(pixels, image, lens, time, oneD, twoD)
+
+	def reset(self):
+		self.xPos = self.xPixel_start
+		self.yPos = self.yPixel_start
+		self.tile = None
+
 	def round_size(self, size: INT) -> INT:
 		"""
 		round_size
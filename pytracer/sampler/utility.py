@@ -12,7 +12,7 @@ from __future__ import absolute_import
 from pytracer import *
 
 __all__ = ['stratified_sample_1d', 'stratified_sample_2d', 'latin_hypercube_1d',
-           'latin_hypercube_2d']
+           'latin_hypercube_2d', 'latin_hypercube_1d_batch', 'latin_hypercube_2d_batch']
 
 
 def stratified_sample_1d(nSamples: INT, jitter: bool=True, rng=np.random.rand) -> 'np.ndarray':
@@ -33,12 +33,24 @@ def stratified_sample_2d(nx: INT, ny: INT, jitter: bool=True, rng=np.random.rand
 
 
 def latin_hypercube_1d(nSamples: INT, rng=np.random.rand) -> 'np.ndarray':
-	ret = (np.arange(nSamples) + rng(nSamples)) / nSamples
-	np.random.shuffle(ret)
-	return ret
+	# random permutation of the strata, s.t. only `rng` is used
+	return (np.argsort(rng(nSamples)) + rng(nSamples)) / nSamples
 
 
 def latin_hypercube_2d(n: INT, rng=np.random.rand) -> 'np.ndarray':
-	ys = (np.arange(n) + rng(n)) / n
-	np.random.shuffle(ys)
-	return np.column_stack([(np.arange(n) + rng(n)) / n, ys])
\ No newline at end of file
+	ys = (np.argsort(rng(n)) + rng(n)) / n
+	return np.column_stack([(np.arange(n) + rng(n)) / n, ys])
+
+
+def latin_hypercube_1d_batch(shape: tuple, n: INT, rng=np.random.rand) -> 'np.ndarray':
+	"""`latin_hypercube_1d` for each entry of `shape`, (*shape, n)"""
+	shape = tuple(shape) + (n,)
+	# random permutation of the strata
+	return (np.argsort(rng(*shape), axis=-1) + rng(*shape)) / n
+
+
+def latin_hypercube_2d_batch(shape: tuple, n: INT, rng=np.random.rand) -> 'np.ndarray':
+	"""`latin_hypercube_2d` for each entry of `shape`, (*shape, n, 2)"""
+	shape = tuple(shape) + (n,)
+	return np.stack([(np.arange(n) + rng(*shape)) / n,
+	                 (np.argsort(rng(*shape), axis=-1) + rng(*shape)) / n], axis=-1)
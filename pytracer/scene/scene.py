@@ -17,12 +17,16 @@ __all__ = ['Scene']
 class Scene(object):
 	"""
 	Scene Class
+
+	`version` is to be bumped whenever geometry
+	is edited in place, s.t. caches are dropped.
 	"""
 	def __init__(self, aggregate: 'Primitive', lights: ['Light'],
 	             vr: ['VolumeRegion']):
 		self.aggregate = aggregate
 		self.lights = lights
 		self.vr = vr
+		self.version = 0
 
 		self.bound = self.aggregate.world_bound()
 		if self.vr is not None:
@@ -38,5 +42,11 @@ class Scene(object):
 	def intersect_p(self, ray: 'geo.Ray') -> bool:
 		return self.aggregate.intersect_p(ray)
 
+	def intersect_batch(self, rays: 'geo.RayBatch', isects: ['Intersection']) -> 'np.ndarray':
+		return self.aggregate.intersect_batch(rays, isects)
+
+	def intersect_p_batch(self, rays: 'geo.RayBatch') -> 'np.ndarray':
+		return self.aggregate.intersect_p_batch(rays)
+
 	def world_bound(self) -> 'geo.BBox':
 		return self.bound
\ No newline at end of file
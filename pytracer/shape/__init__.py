@@ -144,7 +144,9 @@ from pytracer.shape.triangle import *
 from pytracer.shape.sphere import *
 from pytracer.shape.cylinder import *
 from pytracer.shape.disk import *
+from pytracer.shape.batch import *
 
 __all__ = ['Shape', 'create_loop_subdiv','LoopSubdiv',
            'create_triangle_mesh', 'TriangleMesh', 'Triangle',
-           'Sphere', 'Cylinder', 'Disk']
\ No newline at end of file
+           'Sphere', 'Cylinder', 'Disk',
+           'ShapeBatch', 'SphereBatch', 'CylinderBatch', 'DiskBatch']
\ No newline at end of file
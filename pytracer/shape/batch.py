@@ -0,0 +1,270 @@
+"""
+batch.py
+
+Batched intersection of rays against
+collections of same-type quadrics.
+"""
+from __future__ import absolute_import
+from abc import (ABCMeta, abstractmethod)
+from pytracer import *
+
+__all__ = ['ShapeBatch', 'SphereBatch', 'CylinderBatch', 'DiskBatch']
+
+
+class ShapeBatch(object, metaclass=ABCMeta):
+	"""
+	ShapeBatch Class
+
+	Base class of shape collections stored
+	as parameter arrays. Rays are given as
+	(m, 3) arrays of origins and directions
+	and are tested against all shapes in
+	chunks of at most `CHUNK_SIZE` pairs.
+	"""
+	CHUNK_SIZE = 1 << 18
+
+	def __init__(self, w2o: 'np.ndarray', shapes: ['Shape'] = None):
+		"""
+		w2o: (n, 4, 4) world to object matrices
+		shapes: optionally, the `Shape`s batched,
+			e.g., to compute `DifferentialGeometry`s
+			of hits
+		"""
+		self.w2o = np.asarray(w2o, dtype=FLOAT).reshape(-1, 4, 4)
+		self.shapes = shapes
+
+	def __repr__(self):
+		return "{}\nShapes: {}".format(self.__class__, len(self))
+
+	def __len__(self):
+		return len(self.w2o)
+
+	@classmethod
+	def from_shapes(cls, shapes: ['Shape']) -> 'ShapeBatch':
+		"""Collects the parameters of `shapes`"""
+		raise NotImplementedError('{}.from_shapes(): Not implemented'.format(cls))
+
+	@abstractmethod
+	def _hit(self, o: 'np.ndarray', d: 'np.ndarray', mint: 'np.ndarray',
+	         maxt: 'np.ndarray') -> 'np.ndarray':
+		"""
+		Returns the (m, n) nearest hit params of
+		rays in the object spaces of all shapes,
+		(m, n, 3), `np.inf` if missed
+		"""
+		raise NotImplementedError('src.core.shape.{}._hit(): abstract method '
+		                          'called'.format(self.__class__))
+
+	def _chunks(self, o: 'np.ndarray', d: 'np.ndarray', mint, maxt):
+		o = np.asarray(o, dtype=FLOAT).reshape(-1, 3)
+		d = np.asarray(d, dtype=FLOAT).reshape(-1, 3)
+		mint = np.broadcast_to(np.asarray(mint, dtype=FLOAT), (len(o),))
+		maxt = np.broadcast_to(np.asarray(maxt, dtype=FLOAT), (len(o),))
+		n = len(self)
+		step = max(1, self.CHUNK_SIZE // max(n, 1))
+		for i in range(0, len(o), step):
+			s = slice(i, i + step)
+			# transform rays to object spaces, (m, n, 3)
+			oo = np.einsum('jab,ib->ija', self.w2o[:, 0:3, 0:3], o[s]) + self.w2o[:, 0:3, 3]
+			dd = np.einsum('jab,ib->ija', self.w2o[:, 0:3, 0:3], d[s])
+			yield s, self._hit(oo, dd, mint[s, np.newaxis], maxt[s, np.newaxis])
+
+	def intersect(self, o: 'np.ndarray', d: 'np.ndarray', mint=0.,
+	              maxt=np.inf) -> ['np.ndarray', 'np.ndarray']:
+		"""
+		Returns the nearest hit params and
+		the ids of the shapes hit, `np.inf`
+		and -1 for rays missing all shapes
+		"""
+		m = len(np.reshape(o, (-1, 3)))
+		t = np.full(m, np.inf)
+		ids = np.full(m, -1, dtype=np.int64)
+		if len(self) == 0:
+			return t, ids
+		for s, th in self._chunks(o, d, mint, maxt):
+			j = np.argmin(th, axis=1)
+			t[s] = th[np.arange(len(j)), j]
+			ids[s] = np.where(np.isfinite(t[s]), j, -1)
+		return t, ids
+
+	def intersect_p(self, o: 'np.ndarray', d: 'np.ndarray', mint=0.,
+	                maxt=np.inf) -> 'np.ndarray':
+		"""Returns whether rays hit any shape"""
+		m = len(np.reshape(o, (-1, 3)))
+		hit = np.zeros(m, dtype=bool)
+		if len(self) == 0:
+			return hit
+		for s, th in self._chunks(o, d, mint, maxt):
+			hit[s] = np.any(np.isfinite(th), axis=1)
+		return hit
+
+	@staticmethod
+	def _phi(x: 'np.ndarray', y: 'np.ndarray') -> 'np.ndarray':
+		phi = np.arctan2(y, x)
+		return np.where(phi < 0., phi + 2. * np.pi, phi)
+
+	@staticmethod
+	def _roots(A: 'np.ndarray', B: 'np.ndarray', C: 'np.ndarray') -> ['np.ndarray', 'np.ndarray', 'np.ndarray']:
+		"""
+		Returns the ordered roots of the quadratics
+		and whether they exist
+		"""
+		D = B * B - 4. * A * C
+		ok = (D > 0.) & (A != 0.)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			q = -.5 * (B + np.copysign(np.sqrt(np.where(ok, D, 0.)), B))
+			t0 = q / A
+			t1 = C / q
+		return np.minimum(t0, t1), np.maximum(t0, t1), ok
+
+	@staticmethod
+	def _select(t0, t1, ok, mint, maxt, clip) -> 'np.ndarray':
+		"""
+		Takes the nearer root within the ray
+		extent and passing `clip(t)`, `np.inf` if none
+		"""
+		ok0 = ok & (t0 >= mint) & (t0 <= maxt)
+		ok0[ok0] = clip(t0, ok0)
+		ok1 = ok & ~ok0 & (t1 >= mint) & (t1 <= maxt)
+		ok1[ok1] = clip(t1, ok1)
+		return np.where(ok0, t0, np.where(ok1, t1, np.inf))
+
+
+class SphereBatch(ShapeBatch):
+	"""
+	SphereBatch Class
+
+	Possibly partial spheres, c.f. `Sphere`
+	"""
+
+	def __init__(self, w2o: 'np.ndarray', radius: 'np.ndarray', zmin: 'np.ndarray' = None,
+	             zmax: 'np.ndarray' = None, phi_max: 'np.ndarray' = None, shapes: ['Shape'] = None):
+		"""
+		radius: (n,) radii
+		zmin, zmax: (n,) clipping heights, no clipping if None
+		phi_max: (n,) max. azimuths in radians, 2 pi if None
+		"""
+		super().__init__(w2o, shapes)
+		n = len(self)
+		self.radius = np.broadcast_to(np.asarray(radius, dtype=FLOAT), (n,))
+		self.zmin = -self.radius if zmin is None else np.broadcast_to(np.asarray(zmin, dtype=FLOAT), (n,))
+		self.zmax = self.radius if zmax is None else np.broadcast_to(np.asarray(zmax, dtype=FLOAT), (n,))
+		self.phiMax = np.full(n, 2. * np.pi) if phi_max is None else \
+			np.broadcast_to(np.asarray(phi_max, dtype=FLOAT), (n,))
+
+	@classmethod
+	def from_shapes(cls, shapes: ['Sphere']) -> 'SphereBatch':
+		return cls(np.array([s.w2o.m for s in shapes]).reshape(-1, 4, 4),
+		           [s.radius for s in shapes], [s.zmin for s in shapes],
+		           [s.zmax for s in shapes], [s.phiMax for s in shapes], list(shapes))
+
+	def _hit(self, o, d, mint, maxt):
+		r = self.radius
+		A = np.einsum('ijk,ijk->ij', d, d)
+		B = 2. * np.einsum('ijk,ijk->ij', d, o)
+		C = np.einsum('ijk,ijk->ij', o, o) - r * r
+		t0, t1, ok = self._roots(A, B, C)
+
+		zmin, zmax, pm = self.zmin, self.zmax, self.phiMax
+		clipped = np.any(zmin > -r) or np.any(zmax < r) or np.any(pm < 2. * np.pi)
+
+		def clip(t, sel):
+			if not clipped:
+				return True
+			p = o[sel] + t[sel][:, np.newaxis] * d[sel]
+			j = np.nonzero(sel)[1]
+			x = np.where((p[:, 0] == 0.) & (p[:, 1] == 0.), EPS * r[j], p[:, 0])
+			return ~(((zmin[j] > -r[j]) & (p[:, 2] < zmin[j])) |
+			         ((zmax[j] < r[j]) & (p[:, 2] > zmax[j])) |
+			         (self._phi(x, p[:, 1]) > pm[j]))
+
+		return self._select(t0, t1, ok, mint, maxt, clip)
+
+
+class CylinderBatch(ShapeBatch):
+	"""
+	CylinderBatch Class
+
+	Possibly partial cylinders, c.f. `Cylinder`
+	"""
+
+	def __init__(self, w2o: 'np.ndarray', radius: 'np.ndarray', zmin: 'np.ndarray',
+	             zmax: 'np.ndarray', phi_max: 'np.ndarray' = None, shapes: ['Shape'] = None):
+		"""
+		radius: (n,) radii
+		zmin, zmax: (n,) extents along z
+		phi_max: (n,) max. azimuths in radians, 2 pi if None
+		"""
+		super().__init__(w2o, shapes)
+		n = len(self)
+		self.radius = np.broadcast_to(np.asarray(radius, dtype=FLOAT), (n,))
+		self.zmin = np.broadcast_to(np.asarray(zmin, dtype=FLOAT), (n,))
+		self.zmax = np.broadcast_to(np.asarray(zmax, dtype=FLOAT), (n,))
+		self.phiMax = np.full(n, 2. * np.pi) if phi_max is None else \
+			np.broadcast_to(np.asarray(phi_max, dtype=FLOAT), (n,))
+
+	@classmethod
+	def from_shapes(cls, shapes: ['Cylinder']) -> 'CylinderBatch':
+		return cls(np.array([s.w2o.m for s in shapes]).reshape(-1, 4, 4),
+		           [s.radius for s in shapes], [s.zmin for s in shapes],
+		           [s.zmax for s in shapes], [s.phiMax for s in shapes], list(shapes))
+
+	def _hit(self, o, d, mint, maxt):
+		r = self.radius
+		A = d[:, :, 0] * d[:, :, 0] + d[:, :, 1] * d[:, :, 1]
+		B = 2. * (d[:, :, 0] * o[:, :, 0] + d[:, :, 1] * o[:, :, 1])
+		C = o[:, :, 0] * o[:, :, 0] + o[:, :, 1] * o[:, :, 1] - r * r
+		t0, t1, ok = self._roots(A, B, C)
+
+		zmin, zmax, pm = self.zmin, self.zmax, self.phiMax
+
+		def clip(t, sel):
+			p = o[sel] + t[sel][:, np.newaxis] * d[sel]
+			j = np.nonzero(sel)[1]
+			return (p[:, 2] >= zmin[j]) & (p[:, 2] <= zmax[j]) & \
+			       (self._phi(p[:, 0], p[:, 1]) <= pm[j])
+
+		return self._select(t0, t1, ok, mint, maxt, clip)
+
+
+class DiskBatch(ShapeBatch):
+	"""
+	DiskBatch Class
+
+	Possibly partial disks, c.f. `Disk`
+	"""
+
+	def __init__(self, w2o: 'np.ndarray', height: 'np.ndarray', radius: 'np.ndarray',
+	             inner_radius: 'np.ndarray' = 0., phi_max: 'np.ndarray' = None, shapes: ['Shape'] = None):
+		"""
+		height: (n,) heights along z
+		radius, inner_radius: (n,) radii
+		phi_max: (n,) max. azimuths in radians, 2 pi if None
+		"""
+		super().__init__(w2o, shapes)
+		n = len(self)
+		self.height = np.broadcast_to(np.asarray(height, dtype=FLOAT), (n,))
+		self.radius = np.broadcast_to(np.asarray(radius, dtype=FLOAT), (n,))
+		self.inner_radius = np.broadcast_to(np.asarray(inner_radius, dtype=FLOAT), (n,))
+		self.phiMax = np.full(n, 2. * np.pi) if phi_max is None else \
+			np.broadcast_to(np.asarray(phi_max, dtype=FLOAT), (n,))
+
+	@classmethod
+	def from_shapes(cls, shapes: ['Disk']) -> 'DiskBatch':
+		return cls(np.array([s.w2o.m for s in shapes]).reshape(-1, 4, 4),
+		           [s.height for s in shapes], [s.radius for s in shapes],
+		           [s.inner_radius for s in shapes], [s.phiMax for s in shapes], list(shapes))
+
+	def _hit(self, o, d, mint, maxt):
+		# parallel ray has not intersection
+		ok = np.fabs(d[:, :, 2]) >= EPS
+		with np.errstate(divide='ignore', invalid='ignore'):
+			t = (self.height - o[:, :, 2]) / d[:, :, 2]
+		ok &= (t >= mint) & (t <= maxt)
+
+		# check radial distance and angle
+		p = o + np.where(ok, t, 0.)[:, :, np.newaxis] * d
+		dt2 = p[:, :, 0] * p[:, :, 0] + p[:, :, 1] * p[:, :, 1]
+		ok &= (dt2 <= self.radius ** 2) & (dt2 >= self.inner_radius ** 2)
+		ok &= self._phi(p[:, :, 0], p[:, :, 1]) <= self.phiMax
+		return np.where(ok, t, np.inf)
@@ -93,7 +93,7 @@ class Disk(Shape):
 		# otherwise ray hits the disk
 		# initialize the differential structure
 		u = phi / self.phiMax
-		v = 1. - ((np.sqrt(dt2 - self.inner_radius)) /
+		v = 1. - ((np.sqrt(dt2) - self.inner_radius) /
 		          (self.radius - self.inner_radius))
 
 		# find derivatives
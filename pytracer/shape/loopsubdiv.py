@@ -10,22 +10,32 @@ from __future__ import absolute_import
 from pytracer import *
 import pytracer.geometry as geo
 import pytracer.transform as trans
-from pytracer.shape import Shape, NEXT, PREV
+from pytracer.shape import Shape
 
 
 __all__ = ['create_loop_subdiv', 'LoopSubdiv']
 
 
 def create_loop_subdiv(o2w: 'trans.Transform', w2o: 'trans.Transform',
-                       ro: bool, params: {str: object}):
+                       ro: bool, params: {str: object}, camera: 'Camera' = None):
+	"""
+	Create Loop subdivision surface from parameters.
+	If `camera` is given and `pixelerror` is positive,
+	the number of levels is chosen such that edges
+	are at most `pixelerror` pixels long on the film,
+	`nlevels` being the upper limit.
+	"""
 	nlevels = 3 if 'nlevels' not in params else params['nlevels']
+	pixel_error = 0. if 'pixelerror' not in params else params['pixelerror']
 	vi = None if 'indices' not in params else params['indices']
 	P = None if 'P' not in params else params['P']
 
 	if vi is None or P is None:
 		return None
 
-	if not len(P) % 3 == 0:
+	P = np.asarray(P, dtype=FLOAT)
+	vi = np.asarray(vi, dtype=np.int64).ravel()
+	if not P.size % 3 == 0:
 		util.logging('Error', 'LoopSubDiv: data error')
 		return None
 
@@ -33,15 +43,16 @@ def create_loop_subdiv(o2w: 'trans.Transform', w2o: 'trans.Transform',
 		util.logging('Error', 'LoopSubDiv: data error')
 		return None
 
-	npnt = len(P) // 3
+	P = P.reshape(-1, 3)
+	shape = LoopSubdiv(o2w, w2o, ro, len(vi) // 3, len(P), vi, P, nlevels)
+	if camera is not None and pixel_error > 0.:
+		shape.nLevels = shape.adaptive_levels(camera, pixel_error, nlevels)
+	return shape
 
-	p = [None] * npnt
-	cnt = 0
-	for i in range(0, len(P), 3):
-		p[cnt] = geo.Point(P[i], P[i+1], P[i+2])
-		cnt += 1
 
-	return LoopSubdiv(o2w, w2o, ro, len(vi) // 3, npnt, vi, p, nlevels)
+def _scatter(idx: 'np.ndarray', val: 'np.ndarray', n: INT) -> 'np.ndarray':
+	"""Sums rows of (m, 3) `val` into `n` rows by `idx`"""
+	return np.stack([np.bincount(idx, val[:, i], n) for i in range(3)], axis=1)
 
 
 class LoopSubdiv(Shape):
@@ -50,397 +61,245 @@ class LoopSubdiv(Shape):
 
 	Implement Loop's method for subdivision surfaces.
 	Assumes meshes are manifolds and are consistently ordered.
-	"""
-	class SDVertex(object):
-		"""
-		SDVertex Class
-
-		Inner class for `LoopSubdiv`
-		"""
-
-		def __init__(self, pt: 'geo.Point' = geo.Point(0., 0., 0., )):
-			self.P = pt.copy()
-			self.startFace = None  # ref to SDFace
-			self.child = None  # ref to SDVertex
-			self.regular = self.boundary = False
-
-		def __repr__(self):
-			return "SDVertex: {}\nPoint: {}".format(id(self), self.P)
-
-		def __lt__(self, other):
-			return id(self) < id(other)
-
-		def __eq__(self, other):
-			return id(self) == id(other)
-
-		def __hash__(self):
-			return id(self)
-
-		def valence(self):
-			f = self.startFace
-			if not self.boundary:
-				# interior
-				nf = 1
-				f = f.next_face(self)
-				while f != self.startFace:
-					nf += 1
-					f = f.next_face(self)
-				return nf
-			else:
-				# boundary
-				nf = 1
-				f = f.next_face(self)
-				while f is not None:
-					nf += 1
-					f = f.next_face(self)
-				f = self.startFace
-				f = f.prev_face(self)
-				while f is not None:
-					nf += 1
-					f = f.prev_face(self)
-				return nf + 1
-
-		def one_ring(self):
-			P = []
-			if not self.boundary:
-				# interior
-				f = self.startFace
-				P.append(f.next_vert(self).P)
-				f = f.next_face(self)
-				while f != self.startFace:
-					P.append(f.next_vert(self).P)
-					f = f.next_face(self)
-			else:
-				# boundary
-				f = self.startFace
-				f2 = f.next_face(self)
-				while f2 is not None:
-					f = f2
-					f2 = f.next_face(self)
-
-				P.append(f.next_vert(self).P)
-				P.append(f.prev_vert(self).P)
-				f = f.prev_face(self)
-				while f is not None:
-					P.append(f.prev_vert(self).P)
-					f = f.prev_face(self)
-
-			return P
-
-	class SDFace(object):
-		"""
-		SDFace Class
-
-		Inner class for `LoopSubdiv`
-		"""
-
-		def __init__(self):
-			self.v = [None, None, None]  # ref to SDVertex (3)
-			self.f = [None, None, None]  # ref to SDFace (3)
-			self.children = [None, None, None, None]  # ref to SDFace (4)
 
-		def __repr__(self):
-			return "SDFace: {}\n".format(id(self))
-
-		def vnum(self, vert) -> INT:
-			for i in range(3):
-				if self.v[i] == vert:
-					return i
-			raise RuntimeError('Logic error in Shape.LoopSubdiv.SDFace.vnum()')
-
-		def next_face(self, vert):
-			return self.f[self.vnum(vert)]
-
-		def prev_face(self, vert):
-			return self.f[PREV(self.vnum(vert))]
-
-		def next_vert(self, vert):
-			return self.v[NEXT(self.vnum(vert))]
-
-		def prev_vert(self, vert):
-			return self.v[PREV(self.vnum(vert))]
-
-		def other_vert(self, v0, v1):
-			for i in range(3):
-				if self.v[i] != v0 and self.v[i] != v1:
-					return self.v[i]
-			raise RuntimeError('Logic error in Shape.LoopSubdiv.SDVertex.other_vert()')
-
-	class SDEdge(object):
+	The mesh is kept as a (nv, 3) array of points and
+	a (nf, 3) array of vertex indices. Each level is
+	computed with gathers and scatters over all half-edges,
+	half-edge `h` being the `h % 3`-th edge of face `h // 3`.
+	"""
+	class Topology(object):
 		"""
-		SDEdge Class
+		Topology Class
 
-		Inner class for `LoopSubdiv`
+		Inner class for `LoopSubdiv`,
+		half-edge connectivity of a mesh
 		"""
-
-		def __init__(self, v0: 'SDVertex' = None, v1: 'SDVertex' = None):
-			self.v = [v0, v1] if id(v0) < id(v1) else [v1, v0]
-			self.f = [None, None]
-			self.f0edge_num = -1
-
-		def __repr__(self):
-			return "SDEdge: {}\n".format(id(self))
-
-		def __lt__(self, other):
-			if id(self.v[0]) == id(other.v[0]):
-				return id(self.v[1]) < id(other.v[1])
-			return id(self.v[0]) < id(other.v[0])
-
-		def __eq__(self, other):
-			return id(self.v[0]) == id(other.v[0]) and id(self.v[1]) == id(other.v[1])
-
-		def __hash__(self):
-			return hash( (id(self.v[0]), id(self.v[1])) )
+		def __init__(self, F: 'np.ndarray', nv: INT):
+			nf = len(F)
+			h = np.arange(3 * nf)
+			self.nv = nv
+			self.origin = F.ravel()
+			self.next = h - h % 3 + (h + 1) % 3
+			self.prev = h - h % 3 + (h + 2) % 3
+			self.dest = self.origin[self.next]
+
+			# undirected edges from sorted endpoints
+			lo = np.minimum(self.origin, self.dest)
+			hi = np.maximum(self.origin, self.dest)
+			keys, self.edge = np.unique(lo * nv + hi, return_inverse=True)
+			self.edges = np.stack([keys // nv, keys % nv], axis=1)
+			cnt = np.bincount(self.edge, minlength=len(keys))
+			if np.any(cnt > 2):
+				util.logging('Warning', 'LoopSubdiv: non-manifold mesh, {} edges shared by '
+				                        'more than two faces'.format(np.sum(cnt > 2)))
+			self.edge_boundary = cnt == 1
+
+			# pair half-edges of interior edges
+			self.twin = np.full(3 * nf, -1, dtype=np.int64)
+			order = np.argsort(self.edge, kind='mergesort')
+			first = np.searchsorted(self.edge[order], np.arange(len(keys)))
+			pair = np.flatnonzero(cnt == 2)
+			h0, h1 = order[first[pair]], order[first[pair] + 1]
+			self.twin[h0] = h1
+			self.twin[h1] = h0
+			if np.any(self.origin[h0] == self.origin[h1]):
+				util.logging('Warning', 'LoopSubdiv: inconsistently ordered mesh')
+
+			self.boundary = np.zeros(nv, dtype=bool)
+			self.boundary[self.edges[self.edge_boundary].ravel()] = True
+			self.valence = np.bincount(self.edges.ravel(), minlength=nv)
+
+		def rings(self) -> ['np.ndarray', 'np.ndarray', 'np.ndarray']:
+			"""
+			Returns ordered one-rings as `(v, k, r)`,
+			`r` being the `k`-th neighbor of `v`. Rings of
+			boundary vertices run from one boundary
+			neighbor to the other.
+			"""
+			nh = len(self.origin)
+			start = np.full(self.nv, -1, dtype=np.int64)
+			start[self.origin] = np.arange(nh)
+			bd = np.flatnonzero(self.twin < 0)
+			start[self.origin[bd]] = bd
+
+			vs, ks, rs = [], [], []
+			v = np.flatnonzero(start >= 0)
+			cur = start[v]
+			k = 0
+			while len(v) > 0 and k <= nh:
+				vs.append(v)
+				ks.append(np.full(len(v), k))
+				rs.append(self.dest[cur])
+				# rotate to the next outgoing half-edge
+				nxt = self.twin[self.prev[cur]]
+				end = nxt < 0
+				if np.any(end):
+					# last neighbor on the boundary
+					vs.append(v[end])
+					ks.append(np.full(np.sum(end), k + 1))
+					rs.append(self.origin[self.prev[cur[end]]])
+				keep = ~end & (nxt != start[v])
+				v, cur = v[keep], nxt[keep]
+				k += 1
+			return np.concatenate(vs), np.concatenate(ks), np.concatenate(rs)
 
 	def __init__(self, o2w: 'trans.Transform', w2o: 'trans.Transform',
-	             ro: bool, nf: INT, nv: INT, vi: [INT],
-	             P: ['geo.Point'], nl: INT):
+	             ro: bool, nf: INT, nv: INT, vi: 'np.ndarray',
+	             P: 'np.ndarray', nl: INT):
 		super().__init__(o2w, w2o, ro)
 		self.nLevels = nl
-		self.vertices = np.array([LoopSubdiv.SDVertex(P[i]) for i in range(nv)])
-		self.faces = np.array([self.SDFace() for _ in range(nf)])
-
-		# set face to vertex refs
-		k = 0
-		for i in range(nf):
-			f = self.faces[i]
-			for j in range(3):
-				f.v[j] = self.vertices[vi[k + j]]
-				f.v[j].startFace = f
-			k += 3
-
-		# set neighbor refs in faces
-		edges = {}
-		for i in range(nf):
-			f = self.faces[i]
-			for edge_num in range(3):
-				v0 = edge_num
-				v1 = NEXT(edge_num)
-				e = LoopSubdiv.SDEdge(f.v[v0], f.v[v1])
-				if e in edges:
-					e = edges[e]
-					e.f[0].f[e.f0edge_num] = f
-					f.f[edge_num] = e.f[0]
-					del edges[e]  # by assumption, each edge appears at most twice
-				else:
-					# new edge
-					e.f[0] = f
-					e.f0edge_num = edge_num
-					edges[e] = e
-
-		# finish vertex init
-		for i in range(nv):
-			v = self.vertices[i]
-			f = v.startFace
-			f = f.next_face(v)
-			while f is not None and not f == v.startFace:
-				f = f.next_face(v)
-			v.boundary = (f is None)
-
-			val = v.valence()
-
-			if not v.boundary and val == 6:
-				v.regular = True
-			elif v.boundary and val == 4:
-				v.regular = True
-			else:
-				v.regular = False
+		self.vertices = np.array(P, dtype=FLOAT).reshape(nv, 3)
+		self.faces = np.array(vi, dtype=np.int64).reshape(nf, 3)
+		if nf > 0 and (self.faces.min() < 0 or self.faces.max() >= nv):
+			raise RuntimeError('{}: out of bound vertex index'.format(self.__class__))
 
 	def __repr__(self):
 		return "{}\nLevels: {}".format(self.__class__, self.nLevels)
 
 	@staticmethod
-	def beta(valence: INT) -> FLOAT:
-		if valence == 3:
-			return .1875
-		else:
-			return 3. / (8. * valence)
+	def beta(valence: 'np.ndarray') -> 'np.ndarray':
+		return np.where(valence == 3, .1875, 3. / (8. * np.maximum(valence, 1)))
+
+	@staticmethod
+	def gamma(valence: 'np.ndarray') -> 'np.ndarray':
+		return 1. / (valence + 3. / (8. * LoopSubdiv.beta(valence)))
 
 	@staticmethod
-	def gamma(valence: INT) -> FLOAT:
-		return 1. / (valence + 3. / (8. + LoopSubdiv.beta(valence)))
-
-	def weight_one_ring(self, vert: 'SDVertex', beta: 'FLOAT') -> 'geo.Point':
-		valence = vert.valence()
-		p_ring = vert.one_ring()
-		P = (1. - valence * beta) * vert.P
-		for p in p_ring:
-			P += beta * p
-		return P
-
-	def weight_boundary(self, vert: 'SDVertex', beta: 'FLOAT') -> 'geo.Point':
-		valence = vert.valence()
-		p_ring = vert.one_ring()
-		P = (1. - 2. * beta) * vert.P
-		P += beta * (p_ring[0] + p_ring[-1])
-		return P
+	def subdivide(V: 'np.ndarray', F: 'np.ndarray') -> ['np.ndarray', 'np.ndarray']:
+		"""
+		Subdivides a mesh once, returns new points
+		and faces. Even vertices keep their indices,
+		the odd vertex of edge `e` is `nv + e`.
+		"""
+		nv = len(V)
+		top = LoopSubdiv.Topology(F, nv)
+		a, b = top.edges[:, 0], top.edges[:, 1]
+
+		# even vertices
+		## one-ring rule
+		## $v' = (1 - n \beta) v + \sum_{i=1}^{N} \beta v_i$
+		ring = _scatter(top.edges.ravel(), V[top.edges[:, ::-1].ravel()], nv)
+		beta = LoopSubdiv.beta(top.valence)[:, np.newaxis]
+		even = (1. - top.valence[:, np.newaxis] * beta) * V + beta * ring
+		## boundary rule
+		## $v' = (1 - 2 \beta) v + \beta (v_1 + v_2)$
+		be = top.edges[top.edge_boundary]
+		ring = _scatter(be.ravel(), V[be[:, ::-1].ravel()], nv)
+		even[top.boundary] = .75 * V[top.boundary] + .125 * ring[top.boundary]
+
+		# odd vertices, along the split edges
+		opposite = _scatter(top.edge, V[F.ravel()[top.prev]], len(top.edges))
+		odd = .375 * (V[a] + V[b]) + .125 * opposite
+		odd[top.edge_boundary] = .5 * (V[a] + V[b])[top.edge_boundary]
+
+		# four children per face
+		m = (nv + top.edge).reshape(-1, 3)  # odd vertices on edges (v0, v1), (v1, v2), (v2, v0)
+		F = np.stack([np.stack([F[:, 0], m[:, 0], m[:, 2]], axis=1),
+		              np.stack([m[:, 0], F[:, 1], m[:, 1]], axis=1),
+		              np.stack([m[:, 2], m[:, 1], F[:, 2]], axis=1),
+		              m], axis=1).reshape(-1, 3)
+		return np.concatenate([even, odd]), F
+
+	@staticmethod
+	def limit(V: 'np.ndarray', F: 'np.ndarray') -> ['np.ndarray', 'np.ndarray']:
+		"""
+		Pushes vertices to the limit surface,
+		returns the points and normals
+		"""
+		nv = len(V)
+		top = LoopSubdiv.Topology(F, nv)
+		v, k, r = top.rings()
+		n = np.bincount(v, minlength=nv)  # ring sizes
+		nr = n[v].astype(FLOAT)
+		bd = top.boundary[v]
+
+		# limit positions
+		gamma = LoopSubdiv.gamma(n)[:, np.newaxis]
+		P = (1. - n[:, np.newaxis] * gamma) * V + gamma * _scatter(v, V[r], nv)
+		ends = bd & ((k == 0) | (k == n[v] - 1))
+		ring = _scatter(v[ends], V[r[ends]], nv)
+		P[top.boundary] = .6 * V[top.boundary] + .2 * ring[top.boundary]
+
+		# tangents
+		## S: first tangent, across tangent
+		## T: second tangent, transverse tangent
+		theta = 2. * np.pi * k / nr
+		ws = np.cos(theta)
+		wt = np.sin(theta)
+		wc = np.zeros(nv)  # weights of the vertex itself in `T`
+		## boundary
+		ws[bd] = np.where(k[bd] == 0, -1., np.where(k[bd] == n[v[bd]] - 1, 1., 0.))
+		theta = np.pi / np.maximum(nr - 1, 1)
+		wt[bd] = -np.where(ends[bd], np.sin(theta[bd]),
+		                   (2. * np.cos(theta[bd]) - 2.) * np.sin(k[bd] * theta[bd]))
+		for val, w, c in ((2, [1., 1.], -2.), (3, [0., 1., 0.], -1.),
+		                  (4, [-1., 2., 2., -1.], -2.)):
+			sel = bd & (nr == val)
+			wt[sel] = np.take(w, k[sel])
+			wc[top.boundary & (n == val)] = c
+		S = _scatter(v, ws[:, np.newaxis] * P[r], nv)
+		T = _scatter(v, wt[:, np.newaxis] * P[r], nv) + wc[:, np.newaxis] * P
+		N = np.cross(S, T)
+
+		# orient with the faces
+		e = V[F[:, 1]] - V[F[:, 0]], V[F[:, 2]] - V[F[:, 0]]
+		Nf = np.repeat(np.cross(e[0], e[1]), 3, axis=0)
+		Nf = _scatter(F.ravel(), Nf, nv)
+		N[np.einsum('ij,ij->i', N, Nf) < 0.] *= -1.
+		return P, N
+
+	def adaptive_levels(self, camera: 'Camera', pixel_error: FLOAT, max_levels: INT) -> INT:
+		"""
+		Returns the number of levels for the edges
+		of the control mesh, as projected through `camera`
+		at shutter open, to be at most `pixel_error` pixels
+		long. Each level halves the edges.
+		"""
+		if not hasattr(camera, 'r2c'):
+			util.logging('Warning', 'LoopSubdiv: screen space levels need a projective camera, '
+			                        'using {} levels'.format(max_levels))
+			return max_levels
+
+		w2c = camera.c2w.interpolate(camera.s_open).inverse()
+		p = w2c.transform_points(self.o2w.transform_points(self.vertices))
+		front = p[:, 2] > 0.
+		if not np.any(front):
+			# behind the camera
+			return 0
+		if not np.all(front):
+			# straddling the camera plane
+			return max_levels
+
+		r = camera.r2c.inverse().transform_points(p)[:, 0:2]
+		top = LoopSubdiv.Topology(self.faces, len(self.vertices))
+		length = np.max(np.linalg.norm(r[top.edges[:, 0]] - r[top.edges[:, 1]], axis=1)) \
+			if len(top.edges) > 0 else 0.
+		if length <= pixel_error:
+			return 0
+		return INT(min(max_levels, np.ceil(np.log2(length / pixel_error))))
 
 	def object_bound(self) -> 'geo.BBox':
-		ret = geo.BBox()
-		for i in range(len(self.vertices)):
-			ret.union(self.vertices[i].P)
-		return ret
+		return geo.BBox(geo.Point.from_arr(self.vertices.min(axis=0)),
+		                geo.Point.from_arr(self.vertices.max(axis=0)))
 
 	def world_bound(self) -> 'geo.BBox':
-		ret = geo.BBox()
-		for i in range(len(self.vertices)):
-			ret.union(self.o2w(self.vertices[i].P))
-		return ret
+		p = self.o2w.transform_points(self.vertices)
+		return geo.BBox(geo.Point.from_arr(p.min(axis=0)), geo.Point.from_arr(p.max(axis=0)))
 
 	def can_intersect(self) -> bool:
 		return False
 
 	def refine(self) -> ['Shape']:
-		f = self.faces
-		v = self.vertices
+		V, F = self.vertices, self.faces
 		for i in range(self.nLevels):
-			new_faces = []
-			new_vertices = []
-			# update next level
-			for vv in v:
-				vv.child = LoopSubdiv.SDVertex()
-				vv.child.regular = vv.regular
-				vv.child.boundary = vv.boundary
-				new_vertices.append(vv.child)
-
-			for ff in f:
-				for k in range(4):
-					ff.children[k] = LoopSubdiv.SDFace()
-					new_faces.append(ff.children[k])
-
-			# update vertex positions and create new edge vertices
-			# update for even vertices (already presented)
-			for vv in v:
-				if not vv.boundary:
-					# one-ring rule
-					# $v' = (1 - n \beta) v + \sum_{i=1}^{N} \beta v_i$
-					if vv.regular:
-						vv.child.P = self.weight_one_ring(vv, .0625)
-					else:
-						vv.child.P = self.weight_one_ring(vv, LoopSubdiv.beta(vv.valence()))
-				else:
-					# boundary rule
-					# $v' = (1 - 2 \beta) v + \beta (v_1 + v_2)
-					vv.child.P = self.weight_boundary(vv, .125)
-
-			# update for odd vertices (along the split edges)
-			edge_verts = {}
-			for ff in f:
-				for k in range(3):
-					# k-th edge
-					edge = LoopSubdiv.SDEdge(ff.v[k], ff.v[NEXT(k)])
-
-					if edge not in edge_verts:
-						# create and init
-						vert = LoopSubdiv.SDVertex()
-						new_vertices.append(vert)
-						vert.regular = True
-						vert.boundary = (ff.f[k] is None)
-						vert.startFace = ff.children[3]
-
-						# compute new vertex position
-						if vert.boundary:
-							vert.P = .5 * edge.v[0].P + .5 * edge.v[1].P
-						else:
-							vert.P = .375 * edge.v[0].P + \
-							         .375 * edge.v[1].P + \
-							         .125 * ff.other_vert(edge.v[0], edge.v[1]).P + \
-							         .125 * ff.f[k].other_vert(edge.v[0], edge.v[1]).P
-						edge_verts[edge] = vert
-
-			# update new mesh topology
-			# startFace ref of odd vertices (done)
-			# startFace ref of even vertices
-			for vv in v:
-				v_num = vv.startFace.vnum(vv)
-				vv.child.startFace = vv.startFace.children[v_num]
-
-			# new faces' neighbor ref
-			for ff in f:
-				for k in range(3):
-					### update for siblings
-					ff.children[3].f[k] = ff.children[NEXT(k)]
-					ff.children[k].f[NEXT(k)] = ff.children[3]
-
-					### update for neighbor children
-					f2 = ff.f[k]
-					ff.children[k].f[k] = None if f2 is None else f2.children[f2.vnum(ff.v[k])]
-					f2 = ff.f[PREV(k)]
-					ff.children[k].f[PREV(k)] = None if f2 is None else f2.children[f2.vnum(ff.v[k])]
-
-			## new faces' vertices ref
-			for ff in f:
-				for k in range(3):
-					### update to new even vertex
-					ff.children[k].v[k] = ff.v[k].child
-					### update to new odd vertex
-					vert = edge_verts[LoopSubdiv.SDEdge(ff.v[k], ff.v[NEXT(k)])]
-					ff.children[k].v[NEXT(k)] = vert
-					ff.children[NEXT(k)].v[k] = vert
-					ff.children[3].v[k] = vert
-
-			# prepare for next level
-			f = np.array(new_faces)
-			v = np.array(new_vertices)
+			V, F = LoopSubdiv.subdivide(V, F)
 
 		# add vertices to the limiting surface
-		Plimit = []  # [geo.Point]
-		for vv in v:
-			if vv.boundary:
-				Plimit.append(self.weight_boundary(vv, .2))
-			else:
-				Plimit.append(self.weight_one_ring(vv, self.gamma(vv.valence())))
+		P, N = LoopSubdiv.limit(V, F)
 
-		for i, vv in enumerate(v):
-			vv.P = Plimit[i]
-
-		# compute vertex tangents
-		## S: first tangent, across tangent
-		## T: second tangent, transverse tangent
-		Ns = []
-		for vv in v:
-			valence = vv.valence()
-			valInv = 1. / valence
-
-			Pring = vv.one_ring()
-
-			if not vv.boundary:
-				## interior
-				S += np.sum([np.cos(2. * np.pi * k * valInv) * (Pring[k]) for k in range(valence)], axis=0)
-				T += np.sum([np.sin(2. * np.pi * k * valInv) * (Pring[k]) for k in range(valence)], axis=0)
-
-
-			else:
-				## boundary
-				S = Pring[valence - 1] - Pring[0]
-				if valence == 2:
-					T = geo.Vector.from_arr(Pring[0] + Pring[1] - 2 * vv.P)
-				elif valence == 3:
-					T = Pring[1] - vv.P
-				elif valence == 4:
-					T = geo.Vector.from_arr(
-						-Pring[0] + 2 * Pring[1] + 2 * Pring[2] + -Pring[3] + -2 * vv.P)  # avoid geo.Point substraction
-				else:
-					theta = np.pi / (valence - 1)
-					T = geo.Vector.from_arr(np.sin(theta) * (Pring[0] + Pring[-1]))
-					T += np.sum([((2 * np.cos(theta) - 2) * np.sin(k * theta)) * \
-					             Pring[k] for k in range(valence - 1)], axis=0)
-					T *= -1.
-
-			Ns.append(geo.Normal.from_arr(S.cross(T)))
-
-		# create `TriangleMesh`
-		verts = []
-		usedVerts = {}
-		for i, vv in enumerate(v):
-			usedVerts[vv] = i
-		for ff in f:
-			for j in range(3):
-				verts.append(usedVerts[ff.v[j]])
-
-		params = {'indices': verts,
-		          'P': Plimit,
-		          'N': Ns}
+		params = {'indices': F,
+		          'P': P,
+		          'N': N}
 
 		from pytracer.shape.triangle import create_triangle_mesh
 		return [create_triangle_mesh(self.o2w, self.w2o, self.ro, params)]
@@ -453,5 +312,3 @@ class LoopSubdiv(Shape):
 
 	def area(self) -> FLOAT:
 		raise NotImplementedError('unimplemented Shape.area() method called')
-
-
@@ -16,8 +16,38 @@ __all__ = ['create_triangle_mesh', 'Triangle', 'TriangleMesh']
 
 
 def create_triangle_mesh(o2w: 'trans.Transform', w2o: 'trans.Transform',
-                         ro: bool, params: {str: object}, txt: {str: object} = None):
-	"""Create triangle mesh from file"""
+                         ro: bool, params: {str: object}, txt: {str: object} = None,
+                         dtype: type = None):
+	"""
+	Create triangle mesh from parameters.
+	`P`, `N`, `S` and `uv` can be flat sequences,
+	sequences of `geo.Point`s etc. or arrays.
+	Vertex data are stored as `dtype`, `FLOAT`
+	by default.
+
+	Alternatively, `filename` names an OBJ, PLY
+	or cached `.ptm` mesh, c.f. `pytracer.utility.meshio`.
+	Cached meshes are memory-mapped and used in
+	place if stored with the same `o2w`.
+
+	`precompute` stores per-triangle intersection
+	data, `'wald'` for Wald's projection test,
+	c.f. `TriangleMesh.precompute()`.
+	"""
+	if 'filename' in params:
+		from pytracer.utility.meshio import read_mesh
+		mesh_params = read_mesh(params['filename'])
+		mesh_params.update({k: v for k, v in params.items() if k not in mesh_params and k != 'filename'})
+		params = mesh_params
+
+	# points of cached meshes are in the world system
+	world = None if 'world' not in params else params['world']
+	if world is not None and not np.allclose(world, o2w.m):
+		o2w_cached = trans.Transform(np.asarray(world, dtype=FLOAT))
+		params = dict(params, P=o2w_cached.inverse().transform_points(params['P']))
+		world = None
+	if dtype is None:
+		dtype = params['P'].dtype if world is not None else FLOAT
 
 	vi = None if 'indices' not in params else params['indices']
 	p = None if 'P' not in params else params['P']
@@ -25,27 +55,29 @@ def create_triangle_mesh(o2w: 'trans.Transform', w2o: 'trans.Transform',
 	if uvs is None:
 		uvs = None if 'st' not in params else params['st']
 	discard = False if 'discard' not in params else params['discard']
+	precompute = False if 'precompute' not in params else params['precompute']
+
+	if vi is None or p is None:
+		return None
 
+	vi = np.asarray(vi).ravel()
 	if len(vi) % 3 != 0:
-		raise RuntimeError
-
-	if not isinstance(p[0], geo.Point):
-		if len(p) % 3 != 0:
-			raise RuntimeError
-		npi = len(p) // 3 if p is not None else -1
-		P = [None] * npi
-		cnt = 0
-		for i in range(0, len(p), 3):
-			P[cnt] = geo.Point(p[i], p[i+1], p[i+2])
-			cnt += 1
-	else:
-		P = p
-		npi = len(P) if p is not None else -1
-
-	nvi = len(vi) if vi is not None else -1
-	nuvi = len(uvs) if uvs is not None else -1
+		raise RuntimeError('src.core.shape.create_triangle_mesh(): number of '
+		                   '\"indices\" is not a multiple of 3')
+
+	P = np.asarray(p)
+	if P.dtype.kind != 'f':
+		P = P.astype(FLOAT)
+	if P.size % 3 != 0:
+		raise RuntimeError('src.core.shape.create_triangle_mesh(): number of '
+		                   '\"P\" is not a multiple of 3')
+	P = P.reshape(-1, 3)
+	npi = len(P)
+	nvi = len(vi)
 
 	if uvs is not None:
+		uvs = np.asarray(uvs).ravel()
+		nuvi = len(uvs)
 		if nuvi < 2 * npi:
 			raise RuntimeError('src.core.shape.create_triangle_mesh(): insufficient '
 			                   '\"uv\" for triangular mesh, {} expected, {} found.' \
@@ -53,36 +85,29 @@ def create_triangle_mesh(o2w: 'trans.Transform', w2o: 'trans.Transform',
 		elif nuvi > 2 * npi:
 			print('[Warning] src.core.shape.create_triangle_mesh(): more \"uv\"s '
 			      'found, {} expcted, {} found'.format(2 * npi, nuvi))
+		uvs = uvs[:2 * npi].reshape(-1, 2)
 
-	if vi is None or P is None:
-		return None
-
-	S = None if 'S' not in params else params['S']
-	nsi = len(S) if S is not None else -1
-	if S is not None and nsi != npi:
+	S = None if 'S' not in params else np.asarray(params['S']).reshape(-1, 3)
+	if S is not None and len(S) != npi:
 		raise RuntimeError('src.core.shape.create_triangle_mesh(): \"S\" and \"P\" do not match')
 
-	N = None if 'N' not in params else params['N']
-	nni = len(N) if N is not None else -1
-	if N is not None and nni != npi:
+	N = None if 'N' not in params else np.asarray(params['N']).reshape(-1, 3)
+	if N is not None and len(N) != npi:
 		raise RuntimeError('src.core.shape.create_triangle_mesh(): \"N\" and \"P\" do not match')
 
+	if nvi > 0 and (vi.min() < 0 or vi.max() >= npi):
+		raise RuntimeError('src.core.shape.create_triangle_mesh(): mesh has out of-boundes vertex index')
+
 	if discard and uvs is not None and N is not None:
 		# discard degenerated uvs if any
-		for i in range(0, nvi, 3):
-			area = .5 * (P[vi[i]] - P[vi[ i +1]]).cross(P[vi[ i +2]] - P[vi[ i +1]]).length()
-			if area < EPS:
-				continue
-			if (uvs[2 * vi[i]] == uvs[2 * vi[ i +1]] and uvs[2 * vi[i] + 1] == uvs[2 * vi[ i +1] + 1]) or \
-					(uvs[2 * vi[ i +1]] == uvs[2 * vi[ i +2]] and uvs[2 * vi[ i +1] + 1] == uvs[2 * vi[ i +2] + 1]) or \
-					(uvs[2 * vi[ i +2]] == uvs[2 * vi[i]] and uvs[2 * vi[ i +2] + 1] == uvs[2 * vi[i] + 1]):
-				print('[Warning] src.core.shape.create_triangle_mesh(): degenerated \"uv\"s, discarding')
-				uvs = None
-				nuvi = 0
-				break
-	for i in vi:
-		if i >= npi:
-			raise RuntimeError('src.core.shape.create_triangle_mesh(): mesh has out of-boundes vertex index')
+		tri = vi.reshape(-1, 3)
+		p0, p1, p2 = P[tri[:, 0]], P[tri[:, 1]], P[tri[:, 2]]
+		area = .5 * np.linalg.norm(np.cross(p0 - p1, p2 - p1), axis=1)
+		uv0, uv1, uv2 = uvs[tri[:, 0]], uvs[tri[:, 1]], uvs[tri[:, 2]]
+		degenerated = np.all(uv0 == uv1, axis=1) | np.all(uv1 == uv2, axis=1) | np.all(uv2 == uv0, axis=1)
+		if np.any(degenerated & (area >= EPS)):
+			print('[Warning] src.core.shape.create_triangle_mesh(): degenerated \"uv\"s, discarding')
+			uvs = None
 
 	alphaTex = None
 
@@ -100,7 +125,13 @@ def create_triangle_mesh(o2w: 'trans.Transform', w2o: 'trans.Transform',
 	# TODO
 	# alphaTex = ConstantTexture(0.)
 
-	return TriangleMesh(o2w, w2o, ro, nvi // 3, npi, vi, P, N, S, uvs, alphaTex)
+	mesh = TriangleMesh(o2w, w2o, ro, nvi // 3, npi, vi, P, N, S, uvs, alphaTex, dtype,
+	                    world is not None)
+	if world is not None and 'bvh' in params:
+		mesh.bvh_cache = params['bvh']
+	if precompute:
+		mesh.precompute(wald=precompute == 'wald')
+	return mesh
 
 
 class Triangle(Shape):
@@ -123,37 +154,26 @@ class Triangle(Shape):
 			.format(self.__class__, self.mesh, self.v)
 
 	def get_uvs(self) -> [FLOAT]:
-		if self.mesh.uvs is None:
-			return [[0., 0.], [1., 0.], [1., 1.]]  # default
-		else:
-			return [[self.mesh.uvs[2 * self.v], self.mesh.uvs[2 * self.v + 1]],
-			        [self.mesh.uvs[2 * (self.v + 1)], self.mesh.uvs[2 * (self.v + 1) + 1]],
-			        [self.mesh.uvs[2 * (self.v + 2)], self.mesh.uvs[2 * (self.v + 2) + 1]]]
+		return self.mesh.get_uvs(self.v // 3)
 
 	def object_bound(self) -> 'geo.BBox':
-		p1 = self.mesh.p[self.mesh.vertexIndex[self.v]]
-		p2 = self.mesh.p[self.mesh.vertexIndex[self.v+1]]
-		p3 = self.mesh.p[self.mesh.vertexIndex[self.v+2]]
-		return geo.BBox(self.mesh.w2o(p1), self.mesh.w2o(p2)) \
-			.union(self.mesh.w2o(p3))
+		p = self.mesh.w2o.transform_points(self.mesh.p[self.mesh.vertexIndex[self.v:self.v+3]])
+		return geo.BBox(geo.Point.from_arr(p.min(axis=0)), geo.Point.from_arr(p.max(axis=0)))
 
 	def world_bound(self) -> 'geo.BBox':
-		p1 = self.mesh.p[self.mesh.vertexIndex[self.v]]
-		p2 = self.mesh.p[self.mesh.vertexIndex[self.v+1]]
-		p3 = self.mesh.p[self.mesh.vertexIndex[self.v+2]]
-		return geo.BBox(p1, p2).union(p3)
+		if self.mesh.bounds is not None:
+			b = self.mesh.bounds[self.v // 3]
+			return geo.BBox(geo.Point.from_arr(b[0]), geo.Point.from_arr(b[1]))
+		p = self.mesh.p[self.mesh.vertexIndex[self.v:self.v+3]]
+		return geo.BBox(geo.Point.from_arr(p.min(axis=0)), geo.Point.from_arr(p.max(axis=0)))
 
 	def sample(self, u1: FLOAT, u2: FLOAT) -> ['geo.Point', 'geo.Normal']:
 		from pytracer.montecarlo import uniform_sample_triangle
 		b1, b2 = uniform_sample_triangle(u1, u2)
+		p1, p2, p3 = self.mesh.vertices(self.v // 3)
 
-		p = b1 * self.mesh.p[self.mesh.vertexIndex[self.v]] + \
-		    b2 * self.mesh.p[self.mesh.vertexIndex[self.v]+1] + \
-		    (1. - b1 - b2) * self.mesh.p[self.mesh.vertexIndex[self.v+2]]
-
-		Ns = geo.normalize(geo.Normal.from_arr(
-			(self.mesh.p[self.mesh.vertexIndex[self.v+1]] - self.mesh.p[self.mesh.vertexIndex[self.v]]) \
-				.cross(self.mesh.p[self.mesh.vertexIndex[self.v+2]] - self.mesh.p[self.mesh.vertexIndex[self.v]])))
+		p = (b1 * p1 + b2 * p2 + (1. - b1 - b2) * p3).view(geo.Point)
+		Ns = geo.normalize(geo.Normal.from_arr((p2 - p1).cross(p3 - p1)))
 
 		if self.ro:
 			Ns *= -1.
@@ -161,169 +181,33 @@ class Triangle(Shape):
 		return [p, Ns]
 
 	def __getitem__(self, item):
-		if item == 0:
-			return self.mesh.p[self.mesh.vertexIndex[self.v]]
-		elif item == 1:
-			return self.mesh.p[self.mesh.vertexIndex[self.v+1]]
-		elif item == 2:
-			return self.mesh.p[self.mesh.vertexIndex[self.v+2]]
-		else:
+		if item not in (0, 1, 2):
 			raise KeyError
+		return self.mesh.p[self.mesh.vertexIndex[self.v + item]].astype(FLOAT).view(geo.Point)
 
 	def intersect(self, r: 'Ray') -> [bool, FLOAT, FLOAT, 'geo.DifferentialGeometry']:
 		"""
 		Determine whether intersects
 		using Barycentric coordinates
 		"""
-		# compute s1
-		p1 = self.mesh.p[self.mesh.vertexIndex[self.v]]
-		p2 = self.mesh.p[self.mesh.vertexIndex[self.v+1]]
-		p3 = self.mesh.p[self.mesh.vertexIndex[self.v+2]]
-
-		e1 = p2 - p1  # geo.Vector
-		e2 = p3 - p1
-		s1 = r.d.cross(e2)
-		div = s1.dot(e1)
-
-		if div == 0.:
-			return [False, None, None, None]
-		divInv = 1. / div
-
-		# compute barycentric coordinate
-		## first one
-		d = r.o - p1
-		b1 = d.dot(s1) * divInv
-		if b1 < 0. or b1 > 1.:
-			return [False, None, None, None]
-		## second one
-		s2 = d.cross(e1)
-		b2 = r.d.dot(s2) * divInv
-		if b2 < 0. or (b1 + b2) > 1.:
-			return [False, None, None, None]
-
-		# compute intersection
-		t = e2.dot(s2) * divInv
-		if t < r.mint or t > r.maxt:
-			return [False, None, None, None]
-
-		# compute partial derivatives
-		uvs = self.get_uvs()
-		du1 = uvs[0][0] - uvs[2][0]
-		du2 = uvs[1][0] - uvs[2][0]
-		dv1 = uvs[0][1] - uvs[2][1]
-		dv2 = uvs[1][1] - uvs[2][1]
-		dp1 = p1 - p3
-		dp2 = p2 - p3
-
-		det = du1 * dv2 - du2 * dv1
-		if det == 0.:
-			# choose an arbitrary system
-			_, dpdu, dpdv = geo.coordinate_system(geo.normalize(e2.cross(e1)))
-		else:
-			detInv = 1. / det
-			dpdu = (dv2 * dp1 - dv1 * dp2) * detInv
-			dpdv = (-du2 * dp1 + du1 * dp2) * detInv
-
-		# interpolate triangle parametric coord.
-		b0 = 1. - b1 - b2
-		tu = b0 * uvs[0][0] + b1 * uvs[1][0] + b2 * uvs[2][0]
-		tv = b0 * uvs[0][1] + b1 * uvs[1][1] + b2 * uvs[2][1]
-
-		# test alpha texture
-		dg = geo.DifferentialGeometry(r(t), dpdu, dpdv,
-		                              geo.Normal(0., 0., 0.), geo.Normal(0., 0., 0.),
-		                              tu, tv, self)
-
-		if self.mesh.alphaTexture is not None:
-			# alpha mask presents
-			if self.mesh.alphaTexture.evaluate(dg) == 0.:
-				return [False, None, None, None]
-
-		# have a hit
-		return True, t, 1e-3 * t, dg
+		return self.mesh.intersect_triangle(self.v // 3, r, self)
 
 	def intersect_p(self, r: 'Ray') -> bool:
 		"""
 		Determine whether intersects
 		using Barycentric coordinates
 		"""
-		# compute s1
-		p1 = self.mesh.p[self.mesh.vertexIndex[self.v]]
-		p2 = self.mesh.p[self.mesh.vertexIndex[self.v+1]]
-		p3 = self.mesh.p[self.mesh.vertexIndex[self.v+2]]
-
-		e1 = p2 - p1  # geo.Vector
-		e2 = p3 - p1
-		s1 = r.d.cross(e2)
-		div = s1.dot(e1)
-
-		if div == 0.:
-			return False
-		divInv = 1. / div
-
-		# compute barycentric coordinate
-		## first one
-		d = r.o - p1
-		b1 = d.dot(s1) * divInv
-		if b1 < 0. or b1 > 1.:
-			return False
-		## second one
-		s2 = d.cross(e1)
-		b2 = r.d.dot(s2) * divInv
-		if b2 < 0. or (b1 + b2) > 1.:
-			return False
-
-		# compute intersection
-		t = e2.dot(s2) * divInv
-		if t < r.mint or t > r.maxt:
-			return False
-
-		# compute partial derivatives
-		uvs = self.get_uvs()
-		du1 = uvs[0][0] - uvs[2][0]
-		du2 = uvs[1][0] - uvs[2][0]
-		dv1 = uvs[0][1] - uvs[2][1]
-		dv2 = uvs[1][1] - uvs[2][1]
-		dp1 = p1 - p3
-		dp2 = p2 - p3
-
-		det = du1 * dv2 - du2 * dv1
-		if det == 0.:
-			# choose an arbitrary system
-			_, dpdu, dpdv = geo.coordinate_system(geo.normalize(e2.cross(e1)))
-		else:
-			detInv = 1. / det
-			dpdu = (dv2 * dp1 - dv1 * dp2) * detInv
-			dpdv = (-du2 * dp1 + du1 * dp2) * detInv
-
-		# interpolate triangle parametric coord.
-		b0 = 1. - b1 - b2
-		tu = b0 * uvs[0][0] + b1 * uvs[1][0] + b2 * uvs[2][0]
-		tv = b0 * uvs[0][1] + b1 * uvs[1][1] + b2 * uvs[2][1]
-
-		# test alpha texture
-		dg = geo.DifferentialGeometry(r(t), dpdu, dpdv,
-		                          geo.Normal(0., 0., 0.), geo.Normal(0., 0., 0.),
-		                          tu, tv, self)
-
-		if self.mesh.alphaTexture is not None:
-			# alpha mask presents
-			if self.mesh.alphaTexture.evaluate(dg) == 0.:
-				return False
-
-		# have a hit
-		return True
+		return self.mesh.intersect_p_triangle(self.v // 3, r)
 
 	def area(self) -> FLOAT:
-		p1 = self.mesh.p[self.mesh.vertexIndex[self.v]]
-		p2 = self.mesh.p[self.mesh.vertexIndex[self.v+1]]
-		p3 = self.mesh.p[self.mesh.vertexIndex[self.v+2]]
+		p1, p2, p3 = self.mesh.vertices(self.v // 3)
 		return .5 * (p2 - p1).cross(p3 - p1).length()
 
 	def get_shading_geometry(self, o2w: 'trans.Transform',
 	                         dg: 'geo.DifferentialGeometry') -> 'geo.DifferentialGeometry':
-		if self.mesh.n is None or self.mesh.s is None:
+		if self.mesh.n is None and self.mesh.s is None:
 			return dg
+		vi = self.mesh.vertexIndex[self.v:self.v+3]
 		# compute barycentric coord
 		uvs = self.get_uvs()
 		A = np.array([[uvs[1][0] - uvs[0][0], uvs[2][0] - uvs[0][0]],
@@ -333,23 +217,19 @@ class Triangle(Shape):
 		try:
 			b = np.linalg.solve(A, C)
 		except:
-			b = [1. / 3, 1. / 3, 1. / 3]
+			b = np.array([1. / 3, 1. / 3, 1. / 3])
 
 		else:
-			b = [1. - b[0] - b[1], b[0], b[1]]
+			b = np.array([1. - b[0] - b[1], b[0], b[1]])
 
 		# compute shading tangents
 		if self.mesh.n is not None:
-			ns = geo.normalize(o2w(b[0] * self.mesh.n[self.v] +
-			                   b[1] * self.mesh.n[self.v + 1] +
-			                   b[2] * self.mesh.n[self.v + 2]))
+			ns = geo.normalize(o2w(b.dot(self.mesh.n[vi]).view(geo.Normal)))
 		else:
 			ns = dg.nn
 
 		if self.mesh.s is not None:
-			ss = geo.normalize(o2w(b[0] * self.mesh.s[self.v] +
-			                   b[1] * self.mesh.s[self.v + 1] +
-			                   b[2] * self.mesh.s[self.v + 2]))
+			ss = geo.normalize(o2w(b.dot(self.mesh.s[vi]).view(geo.Vector)))
 		else:
 			ss = geo.normalize(dg.dpdu)
 
@@ -366,16 +246,17 @@ class Triangle(Shape):
 			du2 = uvs[1][0] - uvs[2][0]
 			dv1 = uvs[0][1] - uvs[2][1]
 			dv2 = uvs[1][1] - uvs[2][1]
-			dn1 = self.mesh.n[self.mesh.vertexIndex[self.v]] - self.mesh.n[self.mesh.vertexIndex[self.v+2]]
-			dn2 = self.mesh.n[self.mesh.vertexIndex[self.v+1]] - self.mesh.n[self.mesh.vertexIndex[self.v+2]]
+			n = self.mesh.n[vi].astype(FLOAT)
+			dn1 = n[0] - n[2]
+			dn2 = n[1] - n[2]
 			det = du1 * dv2 - du2 * dv1
 			if det == 0.:
 				# choose an arbitrary system
 				dndu = dndv = geo.Normal(0., 0., 0.)
 			else:
 				detInv = 1. / det
-				dndu = (dv2 * dn1 - dv1 * dn2) * detInv
-				dndv = (-du2 * dn1 + du1 * dn2) * detInv
+				dndu = ((dv2 * dn1 - dv1 * dn2) * detInv).view(geo.Normal)
+				dndv = ((-du2 * dn1 + du1 * dn2) * detInv).view(geo.Normal)
 		else:
 			dndu = geo.Normal(0., 0., 0.)
 			dndv = geo.Normal(0., 0., 0.)
@@ -403,36 +284,52 @@ class TriangleMesh(Shape):
 	TriangleMesh Class
 
 	Subclasses `Shape` and is used
-	to model trianglular meshes.
+	to model trianglular meshes. Vertex
+	data are kept as packed arrays, with
+	points transformed to the world system.
 	"""
+	DEFAULT_UVS = np.array([[0., 0.], [1., 0.], [1., 1.]], dtype=FLOAT)
+	DEFAULT_UVS.flags.writeable = False
 
 	def __init__(self, o2w: 'trans.Transform', w2o: 'trans.Transform',
-	             ro: bool, nt: INT, nv: INT, vi: [INT],
-	             P: [geo.Point], N: [geo.Normal] = None, S: [geo.Vector] = None,
-	             uv: np.ndarray = None, atex=None):
+	             ro: bool, nt: INT, nv: INT, vi: 'np.ndarray',
+	             P: 'np.ndarray', N: 'np.ndarray' = None, S: 'np.ndarray' = None,
+	             uv: 'np.ndarray' = None, atex=None, dtype: type = FLOAT, world: bool = False):
 		"""
 		o2w, w2o: Transformations
 		ro: reverse_orientation
 		nt: # of triangles
 		nv: # of vertices
 		vi: plain array of vertex indices
-		P: plain array of `geo.Point`s
+		P: (nv, 3) array of points
 			i-th triangle: P[vi[3*i]], P[vi[3*i+1]], P[vi[3*i+2]]
-		N: plain array of `geo.Normal`s
-		S: plain array of `geo.Vector`s
-		uv: plain array of parametric values
+		N: (nv, 3) array of normals
+		S: (nv, 3) array of tangents
+		uv: (nv, 2) array of parametric values
 		atex: reference to alpha mask texture
+		dtype: storage type of vertex data, e.g.,
+			`np.float32` to halve the memory
+		world: whether `P` is in the world system already,
+			arrays of `dtype` are then used without copying
 		"""
 		super().__init__(o2w, w2o, ro)
 		self.alphaTexture = atex
 		self.ntris = nt
 		self.nverts = nv
-		self.vertexIndex = vi.copy()
-		self.uvs = None if uv is None else uv.copy()
-		self.n = None if N is None else N.copy()
-		self.s = None if S is None else S.copy()
-		# transform the mesh to the world system
-		self.p = [o2w(p) for p in P]
+		self.vertexIndex = np.asarray(vi, dtype=np.int32 if nv < 2 ** 31 else np.int64).ravel()
+		self.uvs = None if uv is None else np.asarray(uv, dtype=dtype).reshape(-1, 2)
+		self.n = None if N is None else np.asarray(N, dtype=dtype).reshape(-1, 3)
+		self.s = None if S is None else np.asarray(S, dtype=dtype).reshape(-1, 3)
+		if world:
+			self.p = np.asarray(P, dtype=dtype).reshape(-1, 3)
+		else:
+			# transform the mesh to the world system
+			self.p = o2w.transform_points(np.reshape(P, (-1, 3))).astype(dtype)
+		# flattened `BVH` stored with the mesh, c.f. `BVH.to_arrays()`
+		self.bvh_cache = None
+		# per-triangle intersection data, c.f. `precompute()`
+		self.p0 = self.e1 = self.e2 = self.bounds = None
+		self.wald = self.wald_axis = None
 
 	def __repr__(self):
 		return "{}\nTriangles: {}\nVertices: {}" \
@@ -440,20 +337,216 @@ class TriangleMesh(Shape):
 
 	# assumes the caller will cache the result
 	def object_bound(self) -> 'geo.BBox':
-		ret = geo.BBox()
-		for i in range(self.nverts):
-			ret = ret.union(self.w2o(self.p[i]))
-		return ret
+		p = self.w2o.transform_points(self.p)
+		return geo.BBox(geo.Point.from_arr(p.min(axis=0)), geo.Point.from_arr(p.max(axis=0)))
 
 	def world_bound(self) -> 'geo.BBox':
-		ret = geo.BBox()
-		for i in range(self.nverts):
-			ret = ret.union(self.p[i])
-		return ret
+		return geo.BBox(geo.Point.from_arr(self.p.min(axis=0)), geo.Point.from_arr(self.p.max(axis=0)))
 
 	def can_intersect(self) -> bool:  # why didn't pbrt make it an attribute?
 		return False
 
+	# per-triangle access, c.f. `MeshPrimitive`
+	def triangle(self, i: INT) -> 'Triangle':
+		"""Returns the `i`-th triangle as a `Shape`"""
+		return Triangle(self.o2w, self.w2o, self.ro, self, i)
+
+	def triangle_bounds(self) -> 'np.ndarray':
+		"""Returns world bounds of all triangles as a (ntris, 2, 3) array"""
+		if self.bounds is not None:
+			return self.bounds
+		p = self.p[self.vertexIndex.reshape(-1, 3)].astype(FLOAT)
+		return np.stack([p.min(axis=1), p.max(axis=1)], axis=1)
+
+	def vertices(self, i: INT) -> ['geo.Point', 'geo.Point', 'geo.Point']:
+		"""Returns the world space vertices of the `i`-th triangle"""
+		p = self.p[self.vertexIndex[3 * i:3 * i + 3]].astype(FLOAT)
+		return p[0].view(geo.Point), p[1].view(geo.Point), p[2].view(geo.Point)
+
+	def get_uvs(self, i: INT) -> 'np.ndarray':
+		"""Returns the (3, 2) parametric values of the `i`-th triangle"""
+		if self.uvs is None:
+			return TriangleMesh.DEFAULT_UVS
+		return self.uvs[self.vertexIndex[3 * i:3 * i + 3]].astype(FLOAT)
+
+	def precompute(self, wald: bool = False) -> INT:
+		"""
+		Stores per-triangle intersection data as packed
+		arrays, i.e., first vertices, edges and world
+		bounds, trading memory for speed. `wald`
+		additionally stores the projected plane of
+		Wald's test. Returns the bytes used.
+		"""
+		p = self.p[self.vertexIndex.reshape(-1, 3)].astype(FLOAT)
+		self.p0 = p[:, 0]
+		self.e1 = p[:, 1] - p[:, 0]
+		self.e2 = p[:, 2] - p[:, 0]
+		self.bounds = np.stack([p.min(axis=1), p.max(axis=1)], axis=1)
+		arrays = [self.p0, self.e1, self.e2, self.bounds]
+
+		if wald:
+			# project onto the plane perpendicular to the
+			# dominant axis `k` of the normal, c.f. Wald, 2004
+			n = np.cross(self.e1, self.e2)
+			k = np.argmax(np.fabs(n), axis=1)
+			u, v = (k + 1) % 3, (k + 2) % 3
+			rows = np.arange(self.ntris)
+			nk = n[rows, k]
+			c, b, a = self.e1, self.e2, self.p0
+			cu, cv, bu, bv, au, av = c[rows, u], c[rows, v], b[rows, u], b[rows, v], a[rows, u], a[rows, v]
+			with np.errstate(divide='ignore', invalid='ignore'):
+				# degenerated triangles get nans and never hit
+				inv = np.where(nk == 0., np.nan, 1. / nk)
+				self.wald = np.stack([n[rows, u] * inv, n[rows, v] * inv,
+				                      np.einsum('ij,ij->i', n, a) * inv,
+				                      bv * inv, -bu * inv, (av * bu - au * bv) * inv,
+				                      -cv * inv, cu * inv, (au * cv - av * cu) * inv], axis=1)
+			self.wald_axis = k.astype(np.int8)
+			arrays += [self.wald, self.wald_axis]
+
+		for arr in arrays:
+			arr.flags.writeable = False
+		nbytes = sum(arr.nbytes for arr in arrays)
+		util.logging('Info', 'TriangleMesh: precomputed {} triangles, {:.1f} KiB'
+		             .format(self.ntris, nbytes / 1024.))
+		return nbytes
+
+	def edges(self, i: INT) -> ['geo.Point', 'geo.Vector', 'geo.Vector']:
+		"""Returns the first vertex and edges of the `i`-th triangle"""
+		if self.e1 is not None:
+			return self.p0[i].view(geo.Point), self.e1[i].view(geo.Vector), self.e2[i].view(geo.Vector)
+		p1, p2, p3 = self.vertices(i)
+		return p1, p2 - p1, p3 - p1
+
+	def barycentric(self, i: INT, r: 'geo.Ray') -> [FLOAT, FLOAT, FLOAT]:
+		"""
+		Returns `t` and the Barycentric coordinates
+		`b1`, `b2` of `r` hitting the `i`-th triangle,
+		`None` if missed.
+		"""
+		if self.wald is not None:
+			return self._wald(i, r)
+
+		# compute s1
+		p1, e1, e2 = self.edges(i)
+		s1 = r.d.cross(e2)
+		div = s1.dot(e1)
+
+		if div == 0.:
+			return None
+		divInv = 1. / div
+
+		# compute barycentric coordinate
+		## first one
+		d = r.o - p1
+		b1 = d.dot(s1) * divInv
+		if b1 < 0. or b1 > 1.:
+			return None
+		## second one
+		s2 = d.cross(e1)
+		b2 = r.d.dot(s2) * divInv
+		if b2 < 0. or (b1 + b2) > 1.:
+			return None
+
+		# compute intersection
+		t = e2.dot(s2) * divInv
+		if t < r.mint or t > r.maxt:
+			return None
+		return t, b1, b2
+
+	_AXES = ((1, 2), (2, 0), (0, 1))
+
+	def _wald(self, i: INT, r: 'geo.Ray') -> [FLOAT, FLOAT, FLOAT]:
+		# plain floats are way faster than numpy scalars
+		n_u, n_v, n_d, b1_u, b1_v, b1_d, b2_u, b2_v, b2_d = self.wald[i].tolist()
+		k = int(self.wald_axis[i])
+		u, v = TriangleMesh._AXES[k]
+		o, d = r.o.tolist(), r.d.tolist()
+
+		div = d[k] + n_u * d[u] + n_v * d[v]
+		if div == 0.:
+			return None
+		t = (n_d - o[k] - n_u * o[u] - n_v * o[v]) / div
+		if not r.mint <= t <= r.maxt:
+			return None
+
+		hu = o[u] + t * d[u]
+		hv = o[v] + t * d[v]
+		b1 = hu * b1_u + hv * b1_v + b1_d
+		if b1 < 0. or b1 > 1.:
+			return None
+		b2 = hu * b2_u + hv * b2_v + b2_d
+		if b2 < 0. or (b1 + b2) > 1.:
+			return None
+		return t, b1, b2
+
+	def _differential_geometry(self, i: INT, r: 'geo.Ray', t: FLOAT, b1: FLOAT, b2: FLOAT,
+	                           tri: 'Triangle' = None) -> 'geo.DifferentialGeometry':
+		_, e1, e2 = self.edges(i)
+
+		# compute partial derivatives
+		uvs = self.get_uvs(i)
+		du1 = uvs[0][0] - uvs[2][0]
+		du2 = uvs[1][0] - uvs[2][0]
+		dv1 = uvs[0][1] - uvs[2][1]
+		dv2 = uvs[1][1] - uvs[2][1]
+		dp1 = -e2  # p1 - p3
+		dp2 = e1 - e2  # p2 - p3
+
+		det = du1 * dv2 - du2 * dv1
+		if det == 0.:
+			# choose an arbitrary system
+			_, dpdu, dpdv = geo.coordinate_system(geo.normalize(e2.cross(e1)))
+		else:
+			detInv = 1. / det
+			dpdu = (dv2 * dp1 - dv1 * dp2) * detInv
+			dpdv = (-du2 * dp1 + du1 * dp2) * detInv
+
+		# interpolate triangle parametric coord.
+		b0 = 1. - b1 - b2
+		tu = b0 * uvs[0][0] + b1 * uvs[1][0] + b2 * uvs[2][0]
+		tv = b0 * uvs[0][1] + b1 * uvs[1][1] + b2 * uvs[2][1]
+
+		return geo.DifferentialGeometry(r(t), dpdu, dpdv,
+		                                geo.Normal(0., 0., 0.), geo.Normal(0., 0., 0.),
+		                                tu, tv, self.triangle(i) if tri is None else tri)
+
+	def intersect_triangle(self, i: INT, r: 'geo.Ray', tri: 'Triangle'=None) -> [bool, FLOAT, FLOAT, 'geo.DifferentialGeometry']:
+		"""
+		Intersects the `i`-th triangle using Barycentric
+		coordinates. `tri` is recorded as the shape
+		hit, created on hit if not given.
+		"""
+		hit = self.barycentric(i, r)
+		if hit is None:
+			return [False, None, None, None]
+		t, b1, b2 = hit
+		dg = self._differential_geometry(i, r, t, b1, b2, tri)
+
+		# test alpha texture
+		if self.alphaTexture is not None:
+			# alpha mask presents
+			if self.alphaTexture.evaluate(dg) == 0.:
+				return [False, None, None, None]
+
+		# have a hit
+		return True, t, 1e-3 * t, dg
+
+	def intersect_p_triangle(self, i: INT, r: 'geo.Ray') -> bool:
+		"""
+		Determine whether the `i`-th triangle
+		intersects using Barycentric coordinates
+		"""
+		hit = self.barycentric(i, r)
+		if hit is None:
+			return False
+
+		if self.alphaTexture is None:
+			return True
+
+		# alpha mask presents
+		return self.alphaTexture.evaluate(self._differential_geometry(i, r, *hit)) != 0.
+
 	# produce a list of `Shape`s that
 	# can be intersected
 	def refine(self) -> ['Shape']:
@@ -11,4 +11,5 @@ Created by Jiayao on July 27, 2017
 Modified on Aug 13, 2017
 """
 from __future__ import absolute_import
-from pytracer.spectral.spectrum import *
\ No newline at end of file
+from pytracer.spectral.spectrum import *
+from pytracer.spectral.rgb2spec import *
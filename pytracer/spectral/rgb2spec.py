@@ -0,0 +1,321 @@
+"""
+rgb2spec.py
+
+Smooth reflectance spectra from RGB
+using a precomputed coefficient table,
+c.f. Jakob and Hanika, 2019.
+"""
+from __future__ import absolute_import
+import os
+import bisect
+from pytracer import *
+from pytracer.spectral.spectrum import (SAMPLED_LAMBDA, SAMPLED_LAMBDA_START, SAMPLED_LAMBDA_END, XYZ2RGB,
+                                        SpectrumType)
+
+__all__ = ['RGBToSpectrumTable']
+
+
+def _sigmoid(x: 'np.ndarray') -> 'np.ndarray':
+	return .5 + x / (2. * np.sqrt(1. + x * x))
+
+
+class RGBToSpectrumTable(object):
+	"""
+	RGBToSpectrumTable Class
+
+	Spectra are modelled as `sigmoid(c0 x^2 + c1 x + c2)`
+	for normalized wavelengths `x` in [0, 1]. The
+	coefficients are tabulated over the RGB cube
+	by the largest component `l`, its value `z`
+	and the ratios of the other two, then looked
+	up by trilinear interpolation.
+
+	Reflectances are fitted under the white
+	illuminant `RGBIllum2SpectWhite`, normalized
+	s.t. a unit reflectance is RGB white, and
+	illuminant spectra are scaled by it.
+	"""
+	RES = 32
+	VERSION = 1
+	N_LAMBDA = 150
+	MEMO_SIZE = 4096
+	_table = None
+
+	def __init__(self, scale: 'np.ndarray', coeffs: 'np.ndarray'):
+		"""
+		scale: (res,) values of the largest component
+		coeffs: (3, res, res, res, 3) coefficients
+			indexed by `l`, `z`, `y` and `x`
+		"""
+		self.res = len(scale)
+		self.scale = scale
+		self.coeffs = coeffs
+		self._scale = scale.tolist()
+		# powers of the normalized `SAMPLED_LAMBDA`, `white()`
+		# there and spectra already found, for converting
+		# single RGB values
+		x = (SAMPLED_LAMBDA - SAMPLED_LAMBDA_START) / (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START)
+		self._powers = np.stack([x * x, x, np.ones_like(x)], axis=1)
+		self._white = None
+		self._memo = {}
+
+	def __repr__(self):
+		return "{}\nResolution: {}\n".format(self.__class__, self.res)
+
+	@staticmethod
+	def white(lam: 'np.ndarray') -> 'np.ndarray':
+		"""The white illuminant at `lam`, normalized to unit luminance"""
+		from pytracer.data.spectral import (RGB2SpectLambda, RGBIllum2SpectWhite)
+		x, A = RGBToSpectrumTable._system(False)
+		w = np.interp(SAMPLED_LAMBDA_START + x * (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START),
+		              RGB2SpectLambda, RGBIllum2SpectWhite)
+		return np.interp(lam, RGB2SpectLambda, RGBIllum2SpectWhite) / A[1].dot(w)
+
+	@staticmethod
+	def _system(reflectance: bool = True) -> ['np.ndarray', 'np.ndarray']:
+		"""
+		Returns the normalized wavelengths and the
+		linear map from spectra to RGB, under the
+		white illuminant for `reflectance`
+		"""
+		from pytracer.data.spectral import (CIE_LAMBDA, CIE_X, CIE_Y, CIE_Z, CIE_Y_INTEGRAL,
+		                                    RGB2SpectLambda, RGBIllum2SpectWhite)
+		x = (np.arange(RGBToSpectrumTable.N_LAMBDA) + .5) / RGBToSpectrumTable.N_LAMBDA
+		lam = SAMPLED_LAMBDA_START + x * (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START)
+		cmf = np.stack([np.interp(lam, CIE_LAMBDA, CIE_X), np.interp(lam, CIE_LAMBDA, CIE_Y),
+		                np.interp(lam, CIE_LAMBDA, CIE_Z)])
+		dl = (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START) / (RGBToSpectrumTable.N_LAMBDA * CIE_Y_INTEGRAL)
+		A = XYZ2RGB.dot(cmf) * dl
+		if not reflectance:
+			return x, A
+		# von Kries-like adaption s.t. white maps to white
+		A = A * np.interp(lam, RGB2SpectLambda, RGBIllum2SpectWhite)
+		return x, A / A.sum(axis=1)[:, np.newaxis]
+
+	@staticmethod
+	def _solve(c: 'np.ndarray', rgb: 'np.ndarray', x: 'np.ndarray', A: 'np.ndarray',
+	           n_iter: INT = 50) -> 'np.ndarray':
+		"""Damped Gauss-Newton iterations for all rows of `rgb` at once"""
+		X = np.stack([x * x, x, np.ones_like(x)])
+		c = c.copy()
+
+		def residual(c, rgb):
+			poly = c.dot(X)
+			r = _sigmoid(poly).dot(A.T) - rgb
+			return r, poly, np.sum(r * r, axis=1)
+
+		# rows not converged yet
+		idx = np.arange(len(c))
+		r, poly, err = residual(c, rgb)
+		for _ in range(n_iter):
+			active = err > 1e-16
+			idx, r, poly, err = idx[active], r[active], poly[active], err[active]
+			if len(idx) == 0:
+				break
+			ci, rgbi = c[idx], rgb[idx]
+			ds = .5 / (1. + poly * poly) ** 1.5
+			J = np.einsum('mk,ik,jk->mij', ds, A, X)
+			Jt = J.transpose(0, 2, 1)
+			step = np.linalg.solve(np.matmul(Jt, J) + 1e-12 * np.eye(3), np.matmul(Jt, r[:, :, np.newaxis]))[:, :, 0]
+
+			# halve the steps that do not improve
+			for _ in range(16):
+				c_new = np.clip(ci - step, -1e4, 1e4)
+				r_new, poly_new, err_new = residual(c_new, rgbi)
+				worse = err_new > err
+				if not np.any(worse):
+					break
+				step[worse] *= .5
+			# stalled rows are done
+			err_new[err - err_new < 1e-12 * err] = 0.
+			c[idx], r, poly, err = c_new, r_new, poly_new, err_new
+		return c
+
+	@classmethod
+	def generate(cls, res: INT = RES) -> 'RGBToSpectrumTable':
+		"""
+		Fits the coefficients, starting from the
+		middle gray and continuing along the
+		brightness in both directions
+		"""
+		x, A = cls._system()
+		t = np.linspace(0., 1., res)
+		scale = t * t * (3. - 2. * t)
+		scale = scale * scale * (3. - 2. * scale)
+		gy, gx = [g.ravel() for g in np.meshgrid(t, t, indexing='ij')]
+
+		coeffs = np.zeros([3, res, res, res, 3], dtype=FLOAT)
+		start = INT(np.argmin(np.fabs(scale - .5)))
+		for l in range(3):
+			def target(z):
+				rgb = np.empty([res * res, 3], dtype=FLOAT)
+				rgb[:, l] = z
+				rgb[:, (l + 1) % 3] = gx * z
+				rgb[:, (l + 2) % 3] = gy * z
+				return rgb
+
+			c = np.zeros([res * res, 3], dtype=FLOAT)
+			for j in range(start, res):
+				c = cls._solve(c, target(scale[j]), x, A)
+				coeffs[l, j] = c.reshape(res, res, 3)
+			c = coeffs[l, start].reshape(-1, 3)
+			for j in range(start - 1, -1, -1):
+				c = cls._solve(c, target(scale[j]), x, A)
+				coeffs[l, j] = c.reshape(res, res, 3)
+		return cls(scale, coeffs)
+
+	@classmethod
+	def load(cls, res: INT = RES) -> 'RGBToSpectrumTable':
+		"""
+		Returns the table, generated once and
+		cached in `util.cache_dir()`
+		"""
+		if cls._table is not None and cls._table.res == res:
+			return cls._table
+
+		try:
+			fn = os.path.join(util.cache_dir(), 'rgb2spec_{}_v{}.npz'.format(res, cls.VERSION))
+		except OSError as e:
+			util.logging('Warning', 'RGBToSpectrumTable: no cache directory: {}'.format(e))
+			cls._table = cls.generate(res)
+			return cls._table
+		try:
+			with np.load(fn) as data:
+				cls._table = cls(data['scale'], data['coeffs'])
+			return cls._table
+		except (IOError, KeyError, ValueError):
+			pass
+
+		cls._table = cls.generate(res)
+		try:
+			# write atomically, workers may race
+			tmp = '{}.{}.npz'.format(fn[:-4], os.getpid())
+			np.savez(tmp, scale=cls._table.scale, coeffs=cls._table.coeffs)
+			os.replace(tmp, fn)
+		except OSError as e:
+			util.logging('Warning', 'RGBToSpectrumTable: cannot cache table to {}: {}'.format(fn, e))
+		return cls._table
+
+	def coefficient(self, r: FLOAT, g: FLOAT, b: FLOAT) -> 'np.ndarray':
+		"""Coefficients of a single RGB value, avoids per-call array overhead"""
+		rgb = [min(max(float(r), 0.), 1.), min(max(float(g), 0.), 1.), min(max(float(b), 0.), 1.)]
+		l = 0 if rgb[0] >= rgb[1] and rgb[0] >= rgb[2] else (1 if rgb[1] >= rgb[2] else 2)
+		z = rgb[l]
+		zinv = (self.res - 1) / z if z > 0. else 0.
+		x = rgb[(l + 1) % 3] * zinv
+		y = rgb[(l + 2) % 3] * zinv
+
+		zi = min(max(bisect.bisect_left(self._scale, z) - 1, 0), self.res - 2)
+		xi = min(int(x), self.res - 2)
+		yi = min(int(y), self.res - 2)
+		dz = (z - self._scale[zi]) / (self._scale[zi + 1] - self._scale[zi])
+		dx = x - xi
+		dy = y - yi
+
+		# lerp the corners as floats
+		((c000, c001), (c010, c011)), ((c100, c101), (c110, c111)) = \
+			self.coeffs[l, zi:zi + 2, yi:yi + 2, xi:xi + 2].tolist()
+		c = []
+		for k in range(3):
+			c0 = (1. - dy) * ((1. - dx) * c000[k] + dx * c001[k]) + dy * ((1. - dx) * c010[k] + dx * c011[k])
+			c1 = (1. - dy) * ((1. - dx) * c100[k] + dx * c101[k]) + dy * ((1. - dx) * c110[k] + dx * c111[k])
+			c.append((1. - dz) * c0 + dz * c1)
+		return np.array(c)
+
+	def coefficients(self, rgb: 'np.ndarray') -> 'np.ndarray':
+		"""Returns (N, 3) coefficients of (N, 3) RGB values in [0, 1]"""
+		rgb = np.clip(np.asarray(rgb, dtype=FLOAT).reshape(-1, 3), 0., 1.)
+		n = np.arange(len(rgb))
+		l = np.argmax(rgb, axis=1)
+		z = rgb[n, l]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			zinv = np.where(z > 0., (self.res - 1) / z, 0.)
+		x = rgb[n, (l + 1) % 3] * zinv
+		y = rgb[n, (l + 2) % 3] * zinv
+
+		zi = np.clip(np.searchsorted(self.scale, z) - 1, 0, self.res - 2)
+		xi = np.minimum(x.astype(INT), self.res - 2)
+		yi = np.minimum(y.astype(INT), self.res - 2)
+		dz = ((z - self.scale[zi]) / (self.scale[zi + 1] - self.scale[zi]))[:, np.newaxis]
+		dx = (x - xi)[:, np.newaxis]
+		dy = (y - yi)[:, np.newaxis]
+
+		def lerp_x(j, k):
+			return (1. - dx) * self.coeffs[l, j, k, xi] + dx * self.coeffs[l, j, k, xi + 1]
+
+		def lerp_y(j):
+			return (1. - dy) * lerp_x(j, yi) + dy * lerp_x(j, yi + 1)
+
+		return (1. - dz) * lerp_y(zi) + dz * lerp_y(zi + 1)
+
+	def evaluate(self, rgb: 'np.ndarray', lam: 'np.ndarray',
+	             tp: 'SpectrumType' = SpectrumType.REFLECTANCE) -> 'np.ndarray':
+		"""
+		Evaluates the spectra of (N, 3) RGB values at
+		wavelengths `lam`, either (n,) shared or (N, n).
+		Illuminants are a reflectance scaled by twice the
+		largest component times `white()`. Returns an
+		(N, n) array.
+		"""
+		if len(rgb) == 3 and np.isscalar(rgb[0]):
+			return self._evaluate_one(rgb, lam, tp)
+		rgb = np.asarray(rgb, dtype=FLOAT).reshape(-1, 3)
+		if len(rgb) == 1:
+			return self._evaluate_one(rgb[0], lam, tp)
+		if tp == SpectrumType.ILLUMINANT:
+			scale = 2. * np.max(rgb, axis=1)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				c = self.coefficients(np.where(scale[:, np.newaxis] > 0., rgb / scale[:, np.newaxis], 0.))
+		elif tp == SpectrumType.REFLECTANCE:
+			scale = np.ones(len(rgb), dtype=FLOAT)
+			c = self.coefficients(rgb)
+		else:
+			raise TypeError
+
+		x = (np.asarray(lam, dtype=FLOAT) - SAMPLED_LAMBDA_START) / (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START)
+		if x.ndim == 1:
+			x = x[np.newaxis, :]
+		poly = (c[:, 0:1] * x + c[:, 1:2]) * x + c[:, 2:3]
+		s = scale[:, np.newaxis] * _sigmoid(poly)
+		if tp == SpectrumType.ILLUMINANT:
+			s *= self.white(lam)
+		return s
+
+	def _evaluate_one(self, rgb: 'Sequence', lam: 'np.ndarray', tp: 'SpectrumType') -> 'np.ndarray':
+		"""
+		`evaluate()` of a single RGB value, without
+		broadcasting. Spectra at `SAMPLED_LAMBDA` are
+		remembered, up to `MEMO_SIZE` of them.
+		"""
+		r, g, b = float(rgb[0]), float(rgb[1]), float(rgb[2])
+		sampled = lam is SAMPLED_LAMBDA
+		if sampled:
+			s = self._memo.get((r, g, b, tp))
+			if s is not None:
+				return s.reshape(1, -1).copy()
+
+		if tp == SpectrumType.ILLUMINANT:
+			scale = 2. * max(r, g, b)
+			c = self.coefficient(r / scale, g / scale, b / scale) if scale > 0. else self.coefficient(0., 0., 0.)
+		elif tp == SpectrumType.REFLECTANCE:
+			scale = 1.
+			c = self.coefficient(r, g, b)
+		else:
+			raise TypeError
+
+		if sampled:
+			s = _sigmoid(self._powers.dot(c))
+			if tp == SpectrumType.ILLUMINANT:
+				if self._white is None:
+					self._white = self.white(SAMPLED_LAMBDA)
+				s *= scale * self._white
+			if len(self._memo) >= self.MEMO_SIZE:
+				self._memo.clear()
+			self._memo[(r, g, b, tp)] = s
+			return s.reshape(1, -1).copy()
+
+		x = (np.asarray(lam, dtype=FLOAT) - SAMPLED_LAMBDA_START) / (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START)
+		s = _sigmoid((c[0] * x + c[1]) * x + c[2])
+		if tp == SpectrumType.ILLUMINANT:
+			s *= scale * self.white(lam)
+		return s.reshape(1, -1) if s.ndim == 1 else s
@@ -13,25 +13,36 @@ from enum import Enum
 from pytracer import *
 from pytracer.data.spectral import CIE_Y_INTEGRAL
 
-__all__ = ['xyz2rgb', 'rgb2xyz', 'Spectrum', 'SpectrumType', 'RGBSpectrum']
+__all__ = ['xyz2rgb', 'rgb2xyz', 'Spectrum', 'SpectrumType', 'RGBSpectrum', 'SpectrumBatch',
+           'SampledWavelengths']
 
 
 # Utility Declarations
 SAMPLED_LAMBDA_START = 400
 SAMPLED_LAMBDA_END = 700
 N_SPECTRAL_SAMPLES = 30
+N_HERO_WAVELENGTHS = 4
+# centers of the spectral samples
+SAMPLED_LAMBDA = SAMPLED_LAMBDA_START + (np.arange(N_SPECTRAL_SAMPLES) + .5) * \
+                 (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START) / N_SPECTRAL_SAMPLES
+
+
+XYZ2RGB = np.array([[3.240479, -1.537150, -0.498535],
+                    [-0.969256, 1.875991, 0.041556],
+                    [0.055648, -0.204043, 1.057311]])
+RGB2XYZ = np.array([[0.412453, 0.357580, 0.180423],
+                    [0.212671, 0.715160, 0.072169],
+                    [0.019334, 0.119193, 0.950227]])
 
 
 def xyz2rgb(xyz: (Sequence, np.ndarray)) -> np.ndarray:
-	return np.array([3.240479 * xyz[0] - 1.537150 * xyz[1] - 0.498535 * xyz[2],
-	                 -0.969256 * xyz[0] + 1.875991 * xyz[1] + 0.041556 * xyz[2],
-	                 0.055648 * xyz[0] - 0.204043 * xyz[1] + 1.057311 * xyz[2]])
+	"""Converts a triple, or (..., 3) array of them"""
+	return np.asarray(xyz, dtype=FLOAT).dot(XYZ2RGB.T)
 
 
 def rgb2xyz(rgb: (Sequence, np.ndarray)) -> np.ndarray:
-	return np.array([0.412453 * rgb[0] + 0.357580 * rgb[1] + 0.180423 * rgb[2],
-	                 0.212671 * rgb[0] + 0.715160 * rgb[1] + 0.072169 * rgb[2],
-	                 0.019334 * rgb[0] + 0.119193 * rgb[1] + 0.950227 * rgb[2]])
+	"""Converts a triple, or (..., 3) array of them"""
+	return np.asarray(rgb, dtype=FLOAT).dot(RGB2XYZ.T)
 
 
 # Spectrum Definitions
@@ -282,6 +293,27 @@ class SampledSpectrum(CoefficientSpectrum):
 	rgbIllum2SpectGreen = None
 	rgbIllum2SpectBlue = None
 
+	# curves resampled by `init()`, by data of `pytracer.data.spectral`
+	CURVES = {
+		'X': ('CIE_LAMBDA', 'CIE_X'),
+		'Y': ('CIE_LAMBDA', 'CIE_Y'),
+		'Z': ('CIE_LAMBDA', 'CIE_Z'),
+		'rgbRefl2SpectWhite': ('RGB2SpectLambda', 'RGBRefl2SpectWhite'),
+		'rgbRefl2SpectCyan': ('RGB2SpectLambda', 'RGBRefl2SpectCyan'),
+		'rgbRefl2SpectMagenta': ('RGB2SpectLambda', 'RGBRefl2SpectMagenta'),
+		'rgbRefl2SpectYellow': ('RGB2SpectLambda', 'RGBRefl2SpectYellow'),
+		'rgbRefl2SpectRed': ('RGB2SpectLambda', 'RGBRefl2SpectRed'),
+		'rgbRefl2SpectGreen': ('RGB2SpectLambda', 'RGBRefl2SpectGreen'),
+		'rgbRefl2SpectBlue': ('RGB2SpectLambda', 'RGBRefl2SpectBlue'),
+		'rgbIllum2SpectWhite': ('RGB2SpectLambda', 'RGBIllum2SpectWhite'),
+		'rgbIllum2SpectCyan': ('RGB2SpectLambda', 'RGBIllum2SpectCyan'),
+		'rgbIllum2SpectMagenta': ('RGB2SpectLambda', 'RGBIllum2SpectMagenta'),
+		'rgbIllum2SpectYellow': ('RGB2SpectLambda', 'RGBIllum2SpectYellow'),
+		'rgbIllum2SpectRed': ('RGB2SpectLambda', 'RGBIllum2SpectRed'),
+		'rgbIllum2SpectGreen': ('RGB2SpectLambda', 'RGBIllum2SpectGreen'),
+		'rgbIllum2SpectBlue': ('RGB2SpectLambda', 'RGBIllum2SpectBlue'),
+	}
+
 	def __new__(cls, v: Iterable=None):
 		if v is None:
 			return np.full(N_SPECTRAL_SAMPLES, 0.).view(cls)
@@ -302,114 +334,21 @@ class SampledSpectrum(CoefficientSpectrum):
 		"""
 		To be called at startup when pyTracer initialize
 		"""
-		from pytracer.data.spectral import (
-			CIE_LAMBDA,
-			CIE_X,
-			CIE_Y,
-			CIE_Z,
-			RGB2SpectLambda,
-			RGBRefl2SpectWhite,
-			RGBRefl2SpectCyan,
-			RGBRefl2SpectMagenta,
-			RGBRefl2SpectYellow,
-			RGBRefl2SpectRed,
-			RGBRefl2SpectGreen,
-			RGBRefl2SpectBlue,
-			RGBIllum2SpectWhite,
-			RGBIllum2SpectCyan,
-			RGBIllum2SpectMagenta,
-			RGBIllum2SpectYellow,
-			RGBIllum2SpectRed,
-			RGBIllum2SpectGreen,
-			RGBIllum2SpectBlue
-		)
-		
-		SampledSpectrum.X = SampledSpectrum()
-		SampledSpectrum.Y = SampledSpectrum()
-		SampledSpectrum.Z = SampledSpectrum()
-		SampledSpectrum.rgbRefl2SpectWhite = SampledSpectrum()
-		SampledSpectrum.rgbRefl2SpectCyan = SampledSpectrum()
-		SampledSpectrum.rgbRefl2SpectMagenta = SampledSpectrum()
-		SampledSpectrum.rgbRefl2SpectYellow = SampledSpectrum()
-		SampledSpectrum.rgbRefl2SpectRed = SampledSpectrum()
-		SampledSpectrum.rgbRefl2SpectGreen = SampledSpectrum()
-		SampledSpectrum.rgbRefl2SpectBlue = SampledSpectrum()
-		SampledSpectrum.rgbIllum2SpectWhite = SampledSpectrum()
-		SampledSpectrum.rgbIllum2SpectCyan = SampledSpectrum()
-		SampledSpectrum.rgbIllum2SpectMagenta = SampledSpectrum()
-		SampledSpectrum.rgbIllum2SpectYellow = SampledSpectrum()
-		SampledSpectrum.rgbIllum2SpectRed = SampledSpectrum()
-		SampledSpectrum.rgbIllum2SpectGreen = SampledSpectrum()
-		SampledSpectrum.rgbIllum2SpectBlue = SampledSpectrum()
-
-		wl0 = util.ufunc_lerp(np.arange(0, N_SPECTRAL_SAMPLES) / N_SPECTRAL_SAMPLES, SAMPLED_LAMBDA_START,
-		                      SAMPLED_LAMBDA_END)
-		wl1 = util.ufunc_lerp(np.arange(1, N_SPECTRAL_SAMPLES + 1) / N_SPECTRAL_SAMPLES, SAMPLED_LAMBDA_START,
-		                      SAMPLED_LAMBDA_END)
-
-		for i in range(N_SPECTRAL_SAMPLES):
-			SampledSpectrum.X.c[i] = SampledSpectrum.average_spectrum_samples(CIE_LAMBDA, CIE_X, wl0[i],
-			                                                                  wl1[i])
-			SampledSpectrum.Y.c[i] = SampledSpectrum.average_spectrum_samples(CIE_LAMBDA, CIE_Y, wl0[i],
-			                                                                  wl1[i])
-			SampledSpectrum.Z.c[i] = SampledSpectrum.average_spectrum_samples(CIE_LAMBDA, CIE_Z, wl0[i],
-			                                                                  wl1[i])
-			SampledSpectrum.rgbRefl2SpectWhite.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                   RGBRefl2SpectWhite,
-			                                                                                   wl0[i],
-			                                                                                   wl1[i])
-			SampledSpectrum.rgbRefl2SpectCyan.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                  RGBRefl2SpectCyan,
-			                                                                                  wl0[i],
-			                                                                                  wl1[i])
-			SampledSpectrum.rgbRefl2SpectMagenta.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                     RGBRefl2SpectMagenta,
-			                                                                                     wl0[i],
-			                                                                                     wl1[i])
-			SampledSpectrum.rgbRefl2SpectYellow.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                    RGBRefl2SpectYellow,
-			                                                                                    wl0[i],
-			                                                                                    wl1[i])
-			SampledSpectrum.rgbRefl2SpectRed.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                 RGBRefl2SpectRed,
-			                                                                                 wl0[i],
-			                                                                                 wl1[i])
-			SampledSpectrum.rgbRefl2SpectGreen.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                   RGBRefl2SpectGreen,
-			                                                                                   wl0[i],
-			                                                                                   wl1[i])
-			SampledSpectrum.rgbRefl2SpectBlue.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                  RGBRefl2SpectBlue,
-			                                                                                  wl0[i],
-			                                                                                  wl1[i])
-			SampledSpectrum.rgbIllum2SpectWhite.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                    RGBIllum2SpectWhite,
-			                                                                                    wl0[i],
-			                                                                                    wl1[i])
-			SampledSpectrum.rgbIllum2SpectCyan.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                   RGBIllum2SpectCyan,
-			                                                                                   wl0[i],
-			                                                                                   wl1[i])
-			SampledSpectrum.rgbIllum2SpectMagenta.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                      RGBIllum2SpectMagenta,
-			                                                                                      wl0[i],
-			                                                                                      wl1[i])
-			SampledSpectrum.rgbIllum2SpectYellow.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                     RGBIllum2SpectYellow,
-			                                                                                     wl0[i],
-			                                                                                     wl1[i])
-			SampledSpectrum.rgbIllum2SpectRed.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                  RGBIllum2SpectRed,
-			                                                                                  wl0[i],
-			                                                                                  wl1[i])
-			SampledSpectrum.rgbIllum2SpectGreen.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                    RGBIllum2SpectGreen,
-			                                                                                    wl0[i],
-			                                                                                    wl1[i])
-			SampledSpectrum.rgbIllum2SpectBlue.c[i] = SampledSpectrum.average_spectrum_samples(RGB2SpectLambda,
-			                                                                                   RGBIllum2SpectBlue,
-			                                                                                   wl0[i],
-			                                                                                   wl1[i])
+		for name, v in SampledSpectrum.resample_curves().items():
+			setattr(SampledSpectrum, name, SampledSpectrum(v))
+
+	@staticmethod
+	def resample_curves() -> dict:
+		"""Averages the CIE and RGB basis curves over the spectral samples"""
+		import pytracer.data.spectral as data
+
+		wl = util.ufunc_lerp(np.arange(0, N_SPECTRAL_SAMPLES + 1) / N_SPECTRAL_SAMPLES, SAMPLED_LAMBDA_START,
+		                     SAMPLED_LAMBDA_END)
+		curves = {}
+		for name, (lam, v) in SampledSpectrum.CURVES.items():
+			curves[name] = SampledSpectrum.average_spectrum_samples(getattr(data, lam), getattr(data, v),
+			                                                        wl[:-1], wl[1:])
+		return curves
 
 	@classmethod
 	def from_sampled(cls, lam: Iterable, v: Iterable):
@@ -417,120 +356,51 @@ class SampledSpectrum(CoefficientSpectrum):
 		v = np.array(v)[np.argsort(lam)]
 		lam = np.sort(lam)
 
-		# compute average SPD values 
-		self = cls()
-		for i in range(N_SPECTRAL_SAMPLES):
-			l0 = util.lerp(i / N_SPECTRAL_SAMPLES, SAMPLED_LAMBDA_START, SAMPLED_LAMBDA_END)
-			l1 = util.lerp(i+1 / N_SPECTRAL_SAMPLES, SAMPLED_LAMBDA_START, SAMPLED_LAMBDA_END)
-			self[i] = cls.average_spectrum_samples(lam, v, l0, l1)
-
-		return self
+		# compute average SPD values
+		wl = util.ufunc_lerp(np.arange(0, N_SPECTRAL_SAMPLES + 1) / N_SPECTRAL_SAMPLES, SAMPLED_LAMBDA_START,
+		                     SAMPLED_LAMBDA_END)
+		return cls.average_spectrum_samples(lam, v, wl[:-1], wl[1:]).view(cls)
 
 	@staticmethod
-	def average_spectrum_samples(lam: MutableSequence, v: MutableSequence, ls: FLOAT, le: FLOAT) -> FLOAT:
+	def average_spectrum_samples(lam: Sequence, v: Sequence, ls: (FLOAT, 'np.ndarray'),
+	                             le: (FLOAT, 'np.ndarray')) -> (FLOAT, 'np.ndarray'):
 		"""
 		Piece-wise Linear Interpolation of
-		SPD. 
-		lam: Wavelength List
+		SPD, averaged over [ls, le].
+		lam: Wavelength List, sorted
 		v: Value List
-		n: Number of Samples
-		ls: Minimum Wavelength
-		le: Maximum Wavelength
+		ls: Minimum Wavelength(s)
+		le: Maximum Wavelength(s)
 
 		NB: boundary values are used to extropolate
 		out-of-bound values
 		"""
-		# out-of-bound or single sample
-		if le <= lam[0]:
-			return v[0]
-		if ls >= lam[-1]:
-			return v[-1]
+		lam = np.asarray(lam, dtype=FLOAT)
+		v = np.asarray(v, dtype=FLOAT)
+		ls = np.asarray(ls, dtype=FLOAT)
+		le = np.asarray(le, dtype=FLOAT)
 		if len(lam) == 1:
-			return v[0]
-
-		v_sum = 0.
-		# constant contributions before/after samples
-		# if end points are partially covered
-		if ls < lam[0]:
-			v_sum += v[0] * (lam[0] - ls)
-		if le > lam[-1]:
-			v_sum += v[-1] * (le - lam[-1])
-
-		# advance to the first and last contributable wavelength
-		idx_lo = np.searchsorted(lam, ls) - 1
-		idx_hi = np.searchsorted(lam, le) # due to np.searchsorted implementation
-
-		if idx_lo >= 0:
-			bk_lam_lo = lam[idx_lo]
-			bk_v_lo = v[idx_lo]
-			v[idx_lo] = util.lerp( (ls - bk_lam_lo) / (lam[idx_lo+1] - bk_lam_lo), v[idx_lo], v[idx_lo+1])
-			lam[idx_lo] = ls			
-		else:
-			idx_lo = 0
-			bk_lam_lo = lam[idx_lo]
-			bk_v_lo = v[idx_lo]
-
-		if idx_hi < len(lam) and lam[idx_hi] != le:
-			bk_lam_hi = lam[idx_hi]
-			bk_v_hi = v[idx_hi]
-			v[idx_hi] = util.lerp((bk_lam_hi - le) / (lam[idx_hi] - lam[idx_hi-1]), v[idx_hi], v[idx_hi-1])
-			lam[idx_hi] = le
-			idx_hi += 1
-		else:
-			idx_hi = len(lam)
-			bk_lam_hi = lam[-1]
-			bk_v_hi = v[-1]
+			return np.full(np.broadcast(ls, le).shape, v[0])[()]
 
-		# integrate using trapezoidal rule
-		v_sum += np.trapz(v[idx_lo:idx_hi], lam[idx_lo:idx_hi])
+		# integral from lam[0] at the samples, by trapezoidal rule
+		dl = np.diff(lam)
+		cum = np.concatenate([[0.], np.cumsum(.5 * (v[:-1] + v[1:]) * dl)])
 
-		# clean-up
-		lam[idx_lo] = bk_lam_lo
-		lam[idx_hi-1] = bk_lam_hi
-		v[idx_lo] = bk_v_lo
-		v[idx_hi-1] = bk_v_hi
+		def integral(x):
+			# within the samples, the linear segment is integrated exactly
+			i = np.clip(np.searchsorted(lam, x, side='right') - 1, 0, len(lam) - 2)
+			t = np.clip(x, lam[0], lam[-1]) - lam[i]
+			res = cum[i] + v[i] * t + .5 * (v[i + 1] - v[i]) / dl[i] * t * t
+			# constant extrapolation outside
+			return res + v[0] * np.minimum(x - lam[0], 0.) + v[-1] * np.maximum(x - lam[-1], 0.)
 
-		return v_sum / (le - ls)
+		return ((integral(le) - integral(ls)) / (le - ls))[()]
 
 	@classmethod
 	def from_rgb(cls, rgb: Sequence, tp: 'SpectrumType' = SpectrumType.REFLECTANCE):
-		self = cls()
-		lo, me, hi = np.argsort(rgb)
-
-		if tp == SpectrumType.REFLECTANCE:
-			# reflectance spectrum from RGB
-			if lo == 0:
-				spec = [cls.rgbRefl2SpectCyan, cls.rgbRefl2SpectGreen, cls.rgbRefl2SpectBlue]
-			elif lo == 1:
-				spec = [cls.rgbRefl2SpectMagenta, cls.rgbRefl2SpectRed, cls.rgbRefl2SpectBlue]
-			else:
-				spec = [cls.rgbRefl2SpectYellow, cls.rgbRefl2SpectRed, cls.rgbRefl2SpectGreen]
-
-			self += rgb[lo] * cls.rgbRefl2SpectWhite
-			self += (rgb[me] - rgb[lo]) * spec[lo]
-			self += (rgb[hi] - rgb[me]) * spec[hi]
-
-			self *= .94
-
-		elif tp == SpectrumType.ILLUMINANT:
-			# illuminance spectrum
-			if lo == 0:
-				spec = [cls.rgbIllum2SpectCyan, cls.rgbIllum2SpectGreen, cls.rgbIllum2SpectBlue]
-			elif lo == 1:
-				spec = [cls.rgbIllum2SpectMagenta, cls.rgbIllum2SpectRed, cls.rgbIllum2SpectBlue]
-			else:
-				spec = [cls.rgbIllum2SpectYellow, cls.rgbIllum2SpectRed, cls.rgbIllum2SpectGreen]
-
-			self += rgb[lo] * cls.rgbIllum2SpectWhite
-			self += (rgb[me] - rgb[lo]) * spec[lo]
-			self += (rgb[hi] - rgb[me]) * spec[hi]
-
-			self *= .86445
-
-		else:
-			raise TypeError
-
-		return self.clip()
+		"""Smooth spectrum from RGB, c.f. `RGBToSpectrumTable`"""
+		from pytracer.spectral.rgb2spec import RGBToSpectrumTable
+		return RGBToSpectrumTable.load().evaluate(rgb, SAMPLED_LAMBDA, tp)[0].view(cls)
 
 	@classmethod
 	def from_xyz(cls, xyz: Sequence, tp: 'SpectrumType' = SpectrumType.REFLECTANCE):
@@ -610,5 +480,169 @@ class RGBSpectrum(CoefficientSpectrum):
 Spectrum = RGBSpectrum
 
 
+class SpectrumBatch(np.ndarray):
+	"""
+	SpectrumBatch Class
+
+	Holds N spectra of type `tp` as an
+	(N, n_samples) array. Arithmetic is
+	plain NumPy, the methods of
+	`CoefficientSpectrum` apply row-wise.
+	"""
+	def __new__(cls, n: INT, tp: type = None, v: FLOAT = 0.):
+		tp = Spectrum if tp is None else tp
+		self = np.full((n, tp().n_samples), v, dtype=FLOAT).view(cls)
+		self.tp = tp
+		return self
+
+	def __array_finalize__(self, obj):
+		self.tp = getattr(obj, 'tp', Spectrum)
+
+	def __repr__(self):
+		return "{}\nType: {}\nNumber of Spectra: {}\n".format(self.__class__, self.tp, len(self))
+
+	@classmethod
+	def from_array(cls, arr: 'np.ndarray', tp: type = None) -> 'SpectrumBatch':
+		"""Copies an (N, n_samples) array"""
+		self = np.array(arr, dtype=FLOAT, ndmin=2).view(cls)
+		self.tp = Spectrum if tp is None else tp
+		return self
+
+	@classmethod
+	def from_spectra(cls, spectra: ['CoefficientSpectrum']) -> 'SpectrumBatch':
+		return cls.from_array(np.stack(spectra), type(spectra[0]))
+
+	@classmethod
+	def from_rgb(cls, rgb: 'np.ndarray', tp: 'SpectrumType' = SpectrumType.REFLECTANCE) -> 'SpectrumBatch':
+		"""`SampledSpectrum`s of (N, 3) RGB values"""
+		from pytracer.spectral.rgb2spec import RGBToSpectrumTable
+		return cls.from_array(RGBToSpectrumTable.load().evaluate(rgb, SAMPLED_LAMBDA, tp), SampledSpectrum)
+
+	@property
+	def n_samples(self):
+		return self.shape[1]
+
+	def spectrum(self, i: INT) -> 'CoefficientSpectrum':
+		"""Returns a copy of the `i`-th spectrum"""
+		return np.array(self[i]).view(self.tp)
+
+	def is_black(self) -> 'np.ndarray':
+		return np.asarray((self < EPS).all(axis=1))
 
+	def has_nans(self) -> 'np.ndarray':
+		return np.asarray(np.isnan(self).any(axis=1))
 
+	def sqrt(self) -> 'SpectrumBatch':
+		return np.sqrt(self)
+
+	def exp(self) -> 'SpectrumBatch':
+		return np.exp(self)
+
+	def pow(self, n) -> 'SpectrumBatch':
+		return np.power(self, n)
+
+	def clip(self, min=0., max=np.inf) -> 'SpectrumBatch':
+		return np.clip(self, min, max)
+
+	def y(self) -> 'np.ndarray':
+		if issubclass(self.tp, SampledSpectrum):
+			return np.asarray(self).dot(SampledSpectrum.Y) * (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START) \
+			       / (CIE_Y_INTEGRAL * N_SPECTRAL_SAMPLES)
+		return np.asarray(self).dot(RGB2XYZ[1])
+
+	def to_xyz(self) -> 'np.ndarray':
+		"""Returns an (N, 3) array"""
+		if issubclass(self.tp, SampledSpectrum):
+			xyz = np.stack([SampledSpectrum.X, SampledSpectrum.Y, SampledSpectrum.Z], axis=1)
+			return np.asarray(self).dot(xyz) * (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START) \
+			       / (CIE_Y_INTEGRAL * N_SPECTRAL_SAMPLES)
+		return rgb2xyz(self)
+
+	def to_rgb(self) -> 'np.ndarray':
+		"""Returns an (N, 3) array"""
+		if issubclass(self.tp, SampledSpectrum):
+			return xyz2rgb(self.to_xyz())
+		return np.array(self)
+
+
+class SampledWavelengths(object):
+	"""
+	SampledWavelengths Class
+
+	Hero wavelength sampling, c.f. Wilkie et al., 2014.
+	Each of N camera samples carries `n` wavelengths,
+	the hero one and `n - 1` companions rotated evenly
+	over the sampled range. Radiance is then carried
+	as (N, n) arrays and converted to XYZ on the film,
+	e.g., by `WavefrontPathIntegrator` with
+	`n_wavelengths` set.
+	"""
+	def __init__(self, lam: 'np.ndarray', pdf: 'np.ndarray' = None):
+		self.lam = np.array(lam, dtype=FLOAT, ndmin=2)
+		if pdf is None:
+			pdf = np.full(self.lam.shape, 1. / (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START))
+		self.pdf = pdf
+
+	def __repr__(self):
+		return "{}\nSamples: {}\nWavelengths: {}\n".format(self.__class__, len(self), self.n_wavelengths)
+
+	def __len__(self):
+		return len(self.lam)
+
+	def __getitem__(self, idx) -> 'SampledWavelengths':
+		"""Wavelengths of the samples `idx`"""
+		return SampledWavelengths(self.lam[idx], self.pdf[idx])
+
+	@property
+	def n_wavelengths(self):
+		return self.lam.shape[1]
+
+	@classmethod
+	def sample_hero(cls, u: 'np.ndarray', n: INT = N_HERO_WAVELENGTHS) -> 'SampledWavelengths':
+		"""Samples `n` wavelengths for each of the uniform samples `u`"""
+		u = np.asarray(u, dtype=FLOAT).reshape(-1, 1)
+		offset = np.fmod(u + np.arange(n) / n, 1.)
+		return cls(SAMPLED_LAMBDA_START + offset * (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START))
+
+	def sample(self, s: 'np.ndarray') -> 'np.ndarray':
+		"""
+		Evaluates `SampledSpectrum`s at the wavelengths,
+		either one for all or a `SpectrumBatch` of N.
+		Returns an (N, n) array.
+		"""
+		idx = np.clip(((self.lam - SAMPLED_LAMBDA_START) * N_SPECTRAL_SAMPLES /
+		               (SAMPLED_LAMBDA_END - SAMPLED_LAMBDA_START)).astype(INT), 0, N_SPECTRAL_SAMPLES - 1)
+		s = np.asarray(s)
+		if s.ndim == 1:
+			return s[idx]
+		return s[np.arange(len(idx))[:, np.newaxis], idx]
+
+	def from_rgb(self, rgb: 'np.ndarray', tp: 'SpectrumType' = SpectrumType.REFLECTANCE) -> 'np.ndarray':
+		"""
+		Upsamples one, or N, RGB triples and
+		evaluates at the wavelengths exactly.
+		Reflectances above 1, e.g., BSDF values,
+		are scaled by their largest component.
+		"""
+		from pytracer.spectral.rgb2spec import RGBToSpectrumTable
+		if tp == SpectrumType.REFLECTANCE:
+			rgb = np.asarray(rgb, dtype=FLOAT).reshape(-1, 3)
+			scale = np.maximum(rgb.max(axis=1), 1.)[:, np.newaxis]
+			return scale * RGBToSpectrumTable.load().evaluate(rgb / scale, self.lam, tp)
+		return RGBToSpectrumTable.load().evaluate(rgb, self.lam, tp)
+
+	def matching(self) -> 'np.ndarray':
+		"""CIE matching functions at the wavelengths, an (N, n, 3) array"""
+		from pytracer.data.spectral import (CIE_LAMBDA, CIE_X, CIE_Y, CIE_Z)
+		return np.stack([np.interp(self.lam, CIE_LAMBDA, CIE_X), np.interp(self.lam, CIE_LAMBDA, CIE_Y),
+		                 np.interp(self.lam, CIE_LAMBDA, CIE_Z)], axis=2)
+
+	def to_xyz(self, L: 'np.ndarray') -> 'np.ndarray':
+		"""Monte Carlo estimate of XYZ from (N, n) radiance, an (N, 3) array"""
+		L = np.asarray(L, dtype=FLOAT).reshape(self.lam.shape)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			w = np.where(self.pdf > 0., L / self.pdf, 0.)
+		return np.einsum('ij,ijk->ik', w, self.matching()) / (self.n_wavelengths * CIE_Y_INTEGRAL)
+
+	def to_rgb(self, L: 'np.ndarray') -> 'np.ndarray':
+		return xyz2rgb(self.to_xyz(L))
@@ -72,6 +72,11 @@ class Transform(object):
 			r = geo.RayDifferential.from_rd(arg)
 			r.o = self(r.o)
 			r.d = self(r.d)
+			if r.has_differentials:
+				r.rxOrigin = self(r.rxOrigin)
+				r.ryOrigin = self(r.ryOrigin)
+				r.rxDirection = self(r.rxDirection)
+				r.ryDirection = self(r.ryDirection)
 			return r
 
 		elif isinstance(arg, geo.Ray):
@@ -95,6 +100,24 @@ class Transform(object):
 		else:
 			raise TypeError('Transform can only be called on geo.Point, geo.Vector, geo.Normal, geo.Ray or geo.geo.BBox')
 
+	# batched transformations on (n, 3) arrays
+	def transform_points(self, p: 'np.ndarray') -> 'np.ndarray':
+		p = np.asarray(p, dtype=FLOAT).reshape(-1, 3)
+		res = p.dot(self.m[0:4, 0:3].T) + self.m[0:4, 3]
+		w = res[:, 3:4]
+		if np.any(w != 1.):
+			return res[:, 0:3] / w
+		return res[:, 0:3]
+
+	def transform_vectors(self, v: 'np.ndarray') -> 'np.ndarray':
+		v = np.asarray(v, dtype=FLOAT).reshape(-1, 3)
+		return v.dot(self.m[0:3, 0:3].T)
+
+	def transform_normals(self, n: 'np.ndarray') -> 'np.ndarray':
+		# must be transformed by inverse transpose
+		n = np.asarray(n, dtype=FLOAT).reshape(-1, 3)
+		return n.dot(self.m_inv[0:3, 0:3])
+
 	def __mul__(self, other):
 		m = self.m.dot(other.m)
 		m_inv = other.m_inv.dot(self.m_inv)
@@ -297,6 +320,27 @@ class AnimatedTransform(object):
 			tr.time = r.time
 			return tr
 
+		elif isinstance(arg_1, geo.RayBatch) and arg_2 is None:
+			r = arg_1
+			if not self.animated:
+				tp, tv = self.startTransform.transform_points, self.startTransform.transform_vectors
+			else:
+				m = self.interpolate_batch(r.time)
+
+				def tp(p):
+					res = np.einsum('nij,nj->ni', m[:, :, 0:3], p) + m[:, :, 3]
+					return res[:, 0:3] / res[:, 3:4]
+
+				def tv(v):
+					return np.einsum('nij,nj->ni', m[:, 0:3, 0:3], v)
+
+			tr = geo.RayBatch(tp(r.o), tv(r.d), r.mint, r.maxt, r.time, r.depth)
+			if r.has_differentials:
+				tr.rxOrigin, tr.ryOrigin = tp(r.rxOrigin), tp(r.ryOrigin)
+				tr.rxDirection, tr.ryDirection = tv(r.rxDirection), tv(r.ryDirection)
+				tr.has_differentials = True
+			return tr
+
 		elif isinstance(arg_1, (float, FLOAT, np.float)) and isinstance(arg_2, geo.Point):
 			time = arg_1
 			p = arg_2
@@ -330,6 +374,38 @@ class AnimatedTransform(object):
 			ret.union(t(b))
 		return ret
 
+	def max_speed(self, b: 'geo.BBox', use_inv: bool=False) -> FLOAT:
+		"""
+		Bound on the speed of the points of `b` under
+		the transform, or its inverse, per unit of
+		normalised time, i.e., on the distance travelled
+		over [startTime, endTime]. Used to pad bounds
+		sampled at a few times.
+		"""
+		if not self.animated:
+			return 0.
+		r = np.linalg.norm(np.maximum(np.fabs(b.pMin), np.fabs(b.pMax)))
+		q1 = np.array([self.R[0].w, self.R[0].x, self.R[0].y, self.R[0].z])
+		q2 = np.array([self.R[1].w, self.R[1].x, self.R[1].y, self.R[1].z])
+		omega = 2. * np.arccos(np.clip(q1.dot(q2), -1., 1.))  # angular speed of `slerp`
+		s0, s1 = self.S[0][0:3, 0:3], self.S[1][0:3, 0:3]
+		s_max = max(np.linalg.norm(s0, 2), np.linalg.norm(s1, 2))
+		ds = np.linalg.norm(s1 - s0, 2)
+		dt = np.linalg.norm(np.asarray(self.T[1]) - np.asarray(self.T[0]))
+		if not use_inv:
+			# p = T + R S x
+			return dt + (omega * s_max + ds) * r
+
+		# x = S^-1 R^T (p - T), s.t. |dx| <= |S^-1| (|dT| + (omega |S| + |dS|) |x|),
+		# the stretches are symmetric positive definite and the smallest
+		# eigenvalue of their lerp is at least that of either end
+		s_min = min(np.linalg.eigvalsh(.5 * (s0 + s0.T))[0], np.linalg.eigvalsh(.5 * (s1 + s1.T))[0])
+		if s_min <= 0.:
+			return np.inf
+		t_max = max(np.linalg.norm(np.asarray(self.T[0])), np.linalg.norm(np.asarray(self.T[1])))
+		x = (r + t_max) / s_min
+		return (dt + (omega * s_max + ds) * x) / s_min
+
 	@staticmethod
 	def decompose(m: 'np.ndarray') -> ['geo.Vector', 'quat.Quaternion', 'np.ndarray']:
 		"""
@@ -383,3 +459,70 @@ class AnimatedTransform(object):
 		return Transform.translate(trans) *\
 		       to_transform(rot) *\
 		       Transform(scale)
+
+	def interpolate_batch(self, times: 'np.ndarray') -> 'np.ndarray':
+		"""
+		Matrices of `interpolate()` at each of
+		`times`, (N, 4, 4)
+		"""
+		times = np.asarray(times, dtype=FLOAT).ravel()
+		m = np.empty([len(times), 4, 4], dtype=FLOAT)
+		m[:] = self.startTransform.m
+		if not self.animated:
+			return m
+		m[times >= self.endTime] = self.endTransform.m
+		mid = (times > self.startTime) & (times < self.endTime)
+		if not np.any(mid):
+			return m
+
+		dt = ((times[mid] - self.startTime) / (self.endTime - self.startTime))[:, np.newaxis]
+		trans = (1. - dt) * np.asarray(self.T[0]) + dt * np.asarray(self.T[1])
+
+		# slerp, c.f. `quat.slerp`
+		q1 = np.array([self.R[0].w, self.R[0].x, self.R[0].y, self.R[0].z])
+		q2 = np.array([self.R[1].w, self.R[1].x, self.R[1].y, self.R[1].z])
+		cos_theta = q1.dot(q2)
+		if cos_theta > 1. - EPS:
+			q = (1. - dt) * q1 + dt * q2
+			q /= np.linalg.norm(q, axis=1)[:, np.newaxis]
+		else:
+			theta = np.arccos(np.clip(cos_theta, -1., 1.)) * dt
+			qperp = q2 - q1 * cos_theta
+			q = q1 * np.cos(theta) + qperp / np.linalg.norm(qperp) * np.sin(theta)
+
+		# rotation matrix, c.f. `quat.to_transform`
+		x, y, z, w = q.T
+		rot = np.empty([len(q), 3, 3], dtype=FLOAT)
+		rot[:, 0, 0] = 1. - 2. * (y * y + z * z)
+		rot[:, 1, 0] = 2. * (x * y + z * w)
+		rot[:, 2, 0] = 2. * (x * z - y * w)
+		rot[:, 0, 1] = 2. * (x * y - z * w)
+		rot[:, 1, 1] = 1. - 2. * (x * x + z * z)
+		rot[:, 2, 1] = 2. * (y * z + x * w)
+		rot[:, 0, 2] = 2. * (x * z + y * w)
+		rot[:, 1, 2] = 2. * (y * z - x * w)
+		rot[:, 2, 2] = 1. - 2. * (x * x + y * y)
+
+		scale = (1. - dt[:, :, np.newaxis]) * self.S[0] + dt[:, :, np.newaxis] * self.S[1]
+		mm = np.zeros([len(q), 4, 4], dtype=FLOAT)
+		mm[:, 0:3, :] = np.einsum('nij,njk->nik', rot, scale[:, 0:3, :])
+		mm[:, 0:3, :] += trans[:, :, np.newaxis] * scale[:, 3:4, :]
+		mm[:, 3, :] = scale[:, 3, :]
+		m[mid] = mm
+		return m
+
+	def transform_points(self, times: 'np.ndarray', p: 'np.ndarray') -> 'np.ndarray':
+		"""Transforms (N, 3) points, each at its time"""
+		if not self.animated:
+			return self.startTransform.transform_points(p)
+		p = np.asarray(p, dtype=FLOAT).reshape(-1, 3)
+		m = self.interpolate_batch(times)
+		res = np.einsum('nij,nj->ni', m[:, :, 0:3], p) + m[:, :, 3]
+		return res[:, 0:3] / res[:, 3:4]
+
+	def transform_vectors(self, times: 'np.ndarray', v: 'np.ndarray') -> 'np.ndarray':
+		"""Transforms (N, 3) vectors, each at its time"""
+		if not self.animated:
+			return self.startTransform.transform_vectors(v)
+		v = np.asarray(v, dtype=FLOAT).reshape(-1, 3)
+		return np.einsum('nij,nj->ni', self.interpolate_batch(times)[:, 0:3, 0:3], v)
@@ -0,0 +1,512 @@
+"""
+meshio.py
+
+Defines mesh IO utility
+functions. Wavefront OBJ and
+Stanford PLY files are read in
+chunks into packed arrays.
+"""
+from __future__ import absolute_import
+import os
+import json
+import numpy as np
+from pytracer import FLOAT
+import pytracer.utility.utility as util
+
+__all__ = ['read_obj', 'read_ply', 'read_ptm', 'write_ptm', 'read_mesh', 'load_mesh']
+
+CHUNK_SIZE = 1 << 22  # bytes of text read at a time
+
+# `.ptm` cache: magic, version and length of the
+# JSON table of contents, then aligned arrays
+PTM_MAGIC = b'PYTRMESH'
+PTM_VERSION = 1
+PTM_ALIGN = 64
+
+PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+             'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+             'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+             'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+
+def _fan(poly: 'np.ndarray') -> 'np.ndarray':
+	"""
+	Triangulates a (n, k, ...) array of convex
+	polygons as fans, returns (n * (k - 2), 3, ...)
+	"""
+	k = poly.shape[1]
+	if k < 3:
+		raise RuntimeError('pytracer.meshio._fan(): degenerated polygon with {} vertices'.format(k))
+	if k == 3:
+		return poly
+	j = np.arange(1, k - 1)
+	fan = np.column_stack([np.zeros_like(j), j, j + 1])
+	return poly[:, fan].reshape(-1, 3, *poly.shape[2:])
+
+
+def _parse(lines: [bytes], dtype) -> 'np.ndarray':
+	"""Parses whitespace separated numbers"""
+	if len(lines) == 0:
+		return np.empty(0, dtype=dtype)
+	return np.fromstring(b' '.join(lines), dtype=dtype, sep=' ')
+
+
+def _read_lines(f, n: int, dtype, chunk: int = 1 << 16) -> 'np.ndarray':
+	"""Parses `n` lines of numbers in chunks"""
+	arr = []
+	for i in range(0, n, chunk):
+		arr.append(_parse([f.readline() for _ in range(min(chunk, n - i))], dtype))
+	return np.concatenate(arr) if len(arr) > 0 else np.empty(0, dtype=dtype)
+
+
+# byte classes for parsing text buffers
+_NL, _SLASH, _SPACE, _ZERO = ord('\n'), ord('/'), ord(' '), ord('0')
+_BLANK = np.zeros(256, dtype=bool)
+_BLANK[[9, 32]] = True
+
+
+def _per_line(mask: 'np.ndarray', ends: 'np.ndarray') -> 'np.ndarray':
+	"""Counts of `mask` on each line, given the line breaks `ends`"""
+	return np.diff(np.cumsum(mask, dtype=np.int64)[ends], prepend=0)
+
+
+def _numbers(buf: 'np.ndarray', dtype, k: int = None) -> ['np.ndarray', 'np.ndarray']:
+	"""
+	Parses the whitespace separated numbers of a byte
+	buffer ending with a line break, returns them
+	and how many there are on each line. Lines are
+	not counted if there are `k` numbers per line.
+	"""
+	if len(buf) == 0:
+		return np.empty(0, dtype=dtype), np.empty(0, dtype=np.int64)
+	values = np.fromstring(buf.tobytes(), dtype=dtype, sep=' ')
+	ends = np.flatnonzero(buf == _NL)
+	if k is not None and len(values) == k * len(ends):
+		return values, np.full(len(ends), k, dtype=np.int64)
+
+	# any control character is taken as whitespace
+	ws = buf <= _SPACE
+	first = ~ws
+	first[1:] &= ws[:-1]
+	counts = _per_line(first, ends)
+	if len(values) != counts.sum():
+		raise RuntimeError('pytracer.meshio._numbers(): malformed numbers')
+	return values, counts
+
+
+def _leading(values: 'np.ndarray', counts: 'np.ndarray', k: int) -> 'np.ndarray':
+	"""The first `k` numbers of each line, c.f. `_numbers`"""
+	if np.all(counts == k):
+		return values.reshape(-1, k)
+	if np.any(counts < k):
+		raise RuntimeError('pytracer.meshio._leading(): {} numbers per line expected'.format(k))
+	first = np.cumsum(counts) - counts
+	return values[first[:, np.newaxis] + np.arange(k)]
+
+
+def _fields(rec: 'np.ndarray', names: (str,)) -> 'np.ndarray':
+	"""
+	(n, k) `FLOAT` array of the fields `names` of a structured
+	array, a read-only view if they are stored next to each
+	other as `FLOAT`, else a copy
+	"""
+	fields = [rec.dtype.fields[n] for n in names]
+	dt, offset = fields[0][0], fields[0][1]
+	if dt == FLOAT and all(t == dt and o == offset + i * dt.itemsize for i, (t, o) in enumerate(fields)):
+		return np.lib.stride_tricks.as_strided(rec[names[0]], (len(rec), len(names)),
+		                                       (rec.strides[0], dt.itemsize), writeable=False)
+	ret = np.empty((len(rec), len(names)), dtype=FLOAT)
+	for i, n in enumerate(names):
+		ret[:, i] = rec[n]
+	return ret
+
+
+def _as_params(P, vi, N=None, uv=None) -> {str: object}:
+	params = {'P': P, 'indices': vi}
+	if N is not None:
+		params['N'] = N
+	if uv is not None:
+		params['uv'] = uv
+	return params
+
+
+def read_obj(filename: str, chunk_size: int = CHUNK_SIZE) -> {str: object}:
+	"""
+	Reads a Wavefront OBJ file, returns
+	`create_triangle_mesh` parameters.
+	Each chunk is parsed as a byte array, lines
+	are told apart by their keywords. Polygons
+	are triangulated as fans, grouped by their
+	sizes, and `v/vt/vn` triplets are made unique.
+	"""
+	P, T, N = [], [], []
+	faces = {}  # key: (# of vertices, # of indices per vertex)
+	nv = nvt = nvn = 0
+
+	with open(filename, 'rb') as f:
+		while True:
+			# whole lines of about `chunk_size` bytes
+			buf = f.read(chunk_size)
+			if len(buf) == 0:
+				break
+			buf += f.readline()
+			if not buf.endswith(b'\n'):
+				buf += b'\n'
+			buf = np.frombuffer(buf, dtype=np.uint8).copy()
+			ends = np.flatnonzero(buf == _NL)
+			starts = np.r_[0, ends[:-1] + 1]
+			length = ends + 1 - starts
+			c0 = buf[starts]
+			c1 = buf[np.minimum(starts + 1, len(buf) - 1)]
+			c2 = buf[np.minimum(starts + 2, len(buf) - 1)]
+
+			# kind of each line by its keyword, blanked out
+			is_v = (c0 == ord('v')) & _BLANK[c1]
+			is_vt = (c0 == ord('v')) & (c1 == ord('t')) & _BLANK[c2]
+			is_vn = (c0 == ord('v')) & (c1 == ord('n')) & _BLANK[c2]
+			is_f = (c0 == ord('f')) & _BLANK[c1]
+			buf[starts[is_v | is_vt | is_vn | is_f]] = _SPACE
+			buf[starts[is_vt | is_vn] + 1] = _SPACE
+			kind = np.repeat(np.select([is_v, is_vt, is_vn, is_f], [1, 2, 3, 4]).astype(np.uint8), length)
+
+			# only x, y, z and u, v are used
+			if np.any(is_v):
+				P.append(_leading(*_numbers(buf[kind == 1], FLOAT, 3), 3))
+			if np.any(is_vt):
+				T.append(_leading(*_numbers(buf[kind == 2], FLOAT, 2), 2))
+			if np.any(is_vn):
+				N.append(_leading(*_numbers(buf[kind == 3], FLOAT, 3), 3))
+
+			if np.any(is_f):
+				fb = buf[kind == 4]
+				# `v//vn` to `v/0/vn`, i.e., -1 once made zero-based
+				empty = np.flatnonzero((fb[:-1] == _SLASH) & (fb[1:] == _SLASH))
+				if len(empty) > 0:
+					fb = np.insert(fb, empty + 1, _ZERO)
+				slash = fb == _SLASH
+				n_slash = _per_line(slash, np.flatnonzero(fb == _NL))
+				fb[slash] = _SPACE
+				ind, n_ind = _numbers(fb, np.int64)
+				# k vertices of m indices each, separated by m - 1 slashes
+				k = n_ind - n_slash
+				m = n_ind // np.maximum(k, 1)
+				if np.any(k < 3) or np.any(k * m != n_ind):
+					raise RuntimeError('pytracer.meshio.read_obj(): malformed face in {}'.format(filename))
+
+				# counts seen so far, for relative indices
+				counts = np.column_stack([nv + np.cumsum(is_v), nvt + np.cumsum(is_vt),
+				                          nvn + np.cumsum(is_vn)])[is_f]
+				first = np.cumsum(n_ind) - n_ind
+				_, seen = np.unique(k * 4 + m, return_index=True)
+				for key in zip(k[np.sort(seen)].tolist(), m[np.sort(seen)].tolist()):
+					sel = (k == key[0]) & (m == key[1])
+					fi = ind[first[sel, np.newaxis] + np.arange(key[0] * key[1])].reshape(-1, key[0], key[1])
+					# OBJ indices are one-based, negative ones are relative
+					fi = np.where(fi < 0, fi + counts[sel, np.newaxis, 0:key[1]], fi - 1)
+					faces.setdefault(key, []).append(fi)
+
+			nv += int(is_v.sum())
+			nvt += int(is_vt.sum())
+			nvn += int(is_vn.sum())
+
+	if len(P) == 0:
+		raise RuntimeError('pytracer.meshio.read_obj(): no vertices found in {}'.format(filename))
+	P = np.concatenate(P)
+	T = np.concatenate(T) if len(T) > 0 else None
+	N = np.concatenate(N) if len(N) > 0 else None
+
+	# triangulate and pad to `v/vt/vn`
+	tris = []
+	for (k, m), ind in faces.items():
+		ind = np.concatenate(ind)
+		full = np.full((len(ind), k, 3), -1, dtype=np.int64)
+		full[:, :, 0:m] = ind
+		tris.append(_fan(full))
+	if len(tris) == 0:
+		raise RuntimeError('pytracer.meshio.read_obj(): no faces found in {}'.format(filename))
+	tris = np.concatenate(tris).reshape(-1, 3)
+
+	if np.any(tris[:, 0] < 0) or np.any(tris[:, 0] >= len(P)):
+		raise RuntimeError('pytracer.meshio.read_obj(): out of bound vertex index in {}'.format(filename))
+
+	use_uv = T is not None and np.all(tris[:, 1] >= 0)
+	use_n = N is not None and np.all(tris[:, 2] >= 0)
+	if not use_uv:
+		tris[:, 1] = -1
+	if not use_n:
+		tris[:, 2] = -1
+
+	if (not use_uv or (len(T) >= len(P) and np.array_equal(tris[:, 1], tris[:, 0]))) and \
+			(not use_n or (len(N) >= len(P) and np.array_equal(tris[:, 2], tris[:, 0]))):
+		# attributes share the position indices
+		return _as_params(P, tris[:, 0].astype(np.int32),
+		                  N[:len(P)] if use_n else None,
+		                  T[:len(P)] if use_uv else None)
+
+	# split vertices by unique triplets
+	uniq, vi = np.unique(tris, axis=0, return_inverse=True)
+	return _as_params(P[uniq[:, 0]], vi.astype(np.int32),
+	                  N[uniq[:, 2]] if use_n else None,
+	                  T[uniq[:, 1]] if use_uv else None)
+
+
+def _read_ply_header(f) -> [str, [(str, int, [(str, object)])]]:
+	"""
+	Returns the format and a list of
+	(element name, count, properties), where
+	properties are (name, dtype) or
+	(name, (count dtype, item dtype)) for lists
+	"""
+	if f.readline().strip() != b'ply':
+		raise RuntimeError('pytracer.meshio.read_ply(): not a PLY file')
+	fmt = None
+	elements = []
+	while True:
+		line = f.readline()
+		if len(line) == 0:
+			raise RuntimeError('pytracer.meshio.read_ply(): unexpected end of header')
+		tok = line.decode('ascii').split()
+		if len(tok) == 0 or tok[0] in ('comment', 'obj_info'):
+			continue
+		elif tok[0] == 'end_header':
+			break
+		elif tok[0] == 'format':
+			fmt = tok[1]
+		elif tok[0] == 'element':
+			elements.append((tok[1], int(tok[2]), []))
+		elif tok[0] == 'property':
+			if tok[1] == 'list':
+				elements[-1][2].append((tok[4], (PLY_TYPES[tok[2]], PLY_TYPES[tok[3]])))
+			else:
+				elements[-1][2].append((tok[2], PLY_TYPES[tok[1]]))
+
+	if fmt not in ('ascii', 'binary_little_endian', 'binary_big_endian'):
+		raise RuntimeError('pytracer.meshio.read_ply(): unsupported format {}'.format(fmt))
+	return fmt, elements
+
+
+def _runs(read, n: int) -> ['np.ndarray']:
+	"""
+	Reads `n` variable length lists, assuming
+	runs of lists share the same length. `read(k, m)`
+	returns at most `m` lists of length `k` from the
+	current position as a (m, k + 1) array (counts
+	first), `read(None, 1)` peeks the next count.
+	"""
+	polys = []
+	while n > 0:
+		k = int(read(None, 1))
+		rec = read(k, n)
+		same = rec[:, 0] == k
+		m = len(rec) if np.all(same) else int(np.argmin(same))
+		polys.append((k, rec[:m, 1:]))
+		read.advance(k, m)
+		n -= m
+	return polys
+
+
+class _BinaryLists(object):
+	"""Reads lists from a buffer, c.f. `_runs`"""
+	def __init__(self, buf, offset: int, ct: str, it: str, end: str):
+		self.buf = buf
+		self.offset = offset
+		self.ct = np.dtype(end + ct)
+		self.it = np.dtype(end + it)
+
+	def dtype(self, k: int) -> 'np.dtype':
+		return np.dtype([('n', self.ct), ('i', self.it, (k,))])
+
+	def __call__(self, k, m):
+		if k is None:
+			return np.frombuffer(self.buf, self.ct, 1, self.offset)[0]
+		dt = self.dtype(k)
+		m = min(m, (len(self.buf) - self.offset) // dt.itemsize)
+		rec = np.frombuffer(self.buf, dt, m, self.offset)
+		return np.column_stack([rec['n'].astype(np.int64), rec['i'].reshape(m, k).astype(np.int64)])
+
+	def advance(self, k, m):
+		self.offset += m * self.dtype(k).itemsize
+
+
+class _TextLists(object):
+	"""Reads lists from a flat array, c.f. `_runs`"""
+	def __init__(self, arr: 'np.ndarray'):
+		self.arr = arr
+		self.offset = 0
+
+	def __call__(self, k, m):
+		if k is None:
+			return self.arr[self.offset]
+		m = min(m, (len(self.arr) - self.offset) // (k + 1))
+		return self.arr[self.offset:self.offset + m * (k + 1)].reshape(m, k + 1)
+
+	def advance(self, k, m):
+		self.offset += m * (k + 1)
+
+
+def read_ply(filename: str) -> {str: object}:
+	"""
+	Reads a Stanford PLY file, returns
+	`create_triangle_mesh` parameters.
+	Binary files are memory-mapped, vertex
+	data are returned as views where possible.
+	"""
+	with open(filename, 'rb') as f:
+		fmt, elements = _read_ply_header(f)
+		offset = f.tell()
+
+	vertex, faces = None, None
+
+	if fmt == 'ascii':
+		with open(filename, 'rb') as f:
+			f.seek(offset)
+			for name, n, props in elements:
+				if name == 'vertex':
+					if any(isinstance(dt, tuple) for _, dt in props):
+						raise RuntimeError('pytracer.meshio.read_ply(): list properties of vertices unsupported')
+					arr = _read_lines(f, n, FLOAT).reshape(n, len(props))
+					vertex = arr.view(np.dtype([(p, FLOAT) for p, _ in props])).ravel()
+				elif name == 'face':
+					if len(props) != 1:
+						raise RuntimeError('pytracer.meshio.read_ply(): only vertex index lists of faces supported')
+					faces = _runs(_TextLists(_read_lines(f, n, np.int64)), n)
+				else:
+					for _ in range(n):
+						f.readline()
+
+	else:
+		end = '<' if fmt == 'binary_little_endian' else '>'
+		buf = np.memmap(filename, dtype=np.uint8, mode='r')
+		for name, n, props in elements:
+			if any(isinstance(dt, tuple) for _, dt in props):
+				if name != 'face' or len(props) != 1:
+					raise RuntimeError('pytracer.meshio.read_ply(): list properties only supported '
+					                   'for face vertex indices')
+				lists = _BinaryLists(buf, offset, props[0][1][0], props[0][1][1], end)
+				faces = _runs(lists, n)
+				offset = lists.offset
+				continue
+
+			dt = np.dtype([(p, end + t) for p, t in props])
+			rec = np.frombuffer(buf, dt, n, offset)
+			offset += n * dt.itemsize
+			if name == 'vertex':
+				vertex = rec
+
+	if vertex is None or faces is None:
+		raise RuntimeError('pytracer.meshio.read_ply(): {} has no vertex or face element'.format(filename))
+
+	# views of the memory map if possible
+	names = vertex.dtype.names
+	P = _fields(vertex, ('x', 'y', 'z'))
+	N = None
+	if all(p in names for p in ('nx', 'ny', 'nz')):
+		N = _fields(vertex, ('nx', 'ny', 'nz'))
+	uv = None
+	for u, v in (('u', 'v'), ('s', 't'), ('texture_u', 'texture_v'), ('texture_s', 'texture_t')):
+		if u in names and v in names:
+			uv = _fields(vertex, (u, v))
+			break
+
+	vi = np.concatenate([_fan(poly) for _, poly in faces]).astype(np.int32).ravel()
+	return _as_params(P, vi, N, uv)
+
+
+def write_ptm(filename: str, mesh: 'TriangleMesh', bvh: 'BVH' = None):
+	"""
+	Writes a `TriangleMesh` to a `.ptm` cache, with
+	points in the world system and optionally the
+	flattened `bvh` built over the mesh alone, whose
+	build parameters are kept in the header.
+	"""
+	arrays = {'P': mesh.p, 'indices': mesh.vertexIndex}
+	for name, arr in (('N', mesh.n), ('S', mesh.s), ('uv', mesh.uvs)):
+		if arr is not None:
+			arrays[name] = arr
+	if bvh is not None:
+		arrays.update(bvh.to_arrays())
+		if bvh.primitives[0].mesh is not mesh:
+			raise RuntimeError('pytracer.meshio.write_ptm(): BVH is not built over the mesh')
+
+	# lay out the arrays after the header
+	toc = {'world': np.asarray(mesh.o2w.m).tolist(), 'arrays': {}}
+	if bvh is not None:
+		toc['bvh'] = bvh.build_params
+	offset = 0
+	for name, arr in arrays.items():
+		arr = np.ascontiguousarray(arr)
+		arrays[name] = arr
+		toc['arrays'][name] = [offset, arr.dtype.str, list(arr.shape)]
+		offset += -(-arr.nbytes // PTM_ALIGN) * PTM_ALIGN
+	header = json.dumps(toc).encode('utf-8')
+	start = -(-(len(PTM_MAGIC) + 8 + len(header)) // PTM_ALIGN) * PTM_ALIGN
+
+	with open(filename, 'wb') as f:
+		f.write(PTM_MAGIC)
+		f.write(np.array([PTM_VERSION, len(header)], dtype='<u4').tobytes())
+		f.write(header)
+		for name, arr in arrays.items():
+			f.seek(start + toc['arrays'][name][0])
+			f.write(arr.tobytes())
+		f.truncate(start + offset)
+
+
+def read_ptm(filename: str) -> {str: object}:
+	"""
+	Opens a `.ptm` cache, returns `create_triangle_mesh`
+	parameters backed by read-only memory maps, which
+	are shared by processes opening the same file.
+	"""
+	with open(filename, 'rb') as f:
+		if f.read(len(PTM_MAGIC)) != PTM_MAGIC:
+			raise RuntimeError('pytracer.meshio.read_ptm(): {} is not a mesh cache'.format(filename))
+		version, length = np.frombuffer(f.read(8), dtype='<u4')
+		if version != PTM_VERSION:
+			raise RuntimeError('pytracer.meshio.read_ptm(): version {} of {} unsupported'
+			                   .format(version, filename))
+		toc = json.loads(f.read(int(length)).decode('utf-8'))
+	start = -(-(len(PTM_MAGIC) + 8 + int(length)) // PTM_ALIGN) * PTM_ALIGN
+
+	arrays = {}
+	for name, (offset, dtype, shape) in toc['arrays'].items():
+		if np.prod(shape) == 0:
+			arrays[name] = np.empty(shape, dtype=dtype)
+		else:
+			arrays[name] = np.memmap(filename, dtype=np.dtype(dtype), mode='r',
+			                         offset=start + offset, shape=tuple(shape))
+
+	params = {k: v for k, v in arrays.items() if not k.startswith('bvh_')}
+	params['world'] = np.array(toc['world'], dtype=FLOAT)
+	bvh = {k: v for k, v in arrays.items() if k.startswith('bvh_')}
+	if len(bvh) > 0:
+		bvh['params'] = toc.get('bvh')
+		params['bvh'] = bvh
+	return params
+
+
+def read_mesh(filename: str) -> {str: object}:
+	"""Reads a mesh by file extension"""
+	ext = os.path.splitext(filename)[1].lower()
+	if ext == '.obj':
+		return read_obj(filename)
+	elif ext == '.ply':
+		return read_ply(filename)
+	elif ext == '.ptm':
+		return read_ptm(filename)
+	raise TypeError('pytracer.meshio.read_mesh(): unsupported '
+	                'type of file {}'.format(filename))
+
+
+def load_mesh(filename: str, o2w: 'trans.Transform', w2o: 'trans.Transform', ro: bool,
+              params: {str: object} = None, txt: {str: object} = None, dtype: type = None) -> 'TriangleMesh':
+	"""
+	Reads a mesh and creates a `TriangleMesh`,
+	`params` are passed on, e.g., `alphatex`.
+	"""
+	from pytracer.shape import create_triangle_mesh
+	params = {} if params is None else dict(params)
+	params['filename'] = filename
+	mesh = create_triangle_mesh(o2w, w2o, ro, params, txt, dtype)
+	util.logging('Info', 'pytracer.meshio.load_mesh(): {} triangles read from {}'
+	             .format(mesh.ntris, filename))
+	return mesh
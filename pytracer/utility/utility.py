@@ -9,11 +9,12 @@ utility functions.
 Created by Jiayao on Aug 13, 2017
 """
 from __future__ import absolute_import
+import os
 import numpy as np
 
 from pytracer import (FLOAT, INT, UINT, EPS)
 
-__all__ = ['progress_reporter','logging','feq', 'eq_unity', 'ne_unity',
+__all__ = ['progress_reporter','logging', 'cache_dir','feq', 'eq_unity', 'ne_unity',
            'ftoi', 'ctoi', 'rtoi', 'lerp', 'round_pow_2', 'next_pow_2', 'is_pow_2', 'ufunc_lerp', 'clip', 'is_black']
 
 
@@ -22,6 +23,17 @@ def logging(tp: str, msg: str):
 	print("[{}] {}".format(tp.upper(), msg))
 
 
+def cache_dir() -> str:
+	"""
+	Directory for data computed once and reused
+	across runs, `$PYTRACER_CACHE` if set,
+	`~/.cache/pytracer` otherwise.
+	"""
+	path = os.environ.get('PYTRACER_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'pytracer'))
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
 def progress_reporter(iteration, total, prefix='', suffix='', decimals=1, length=100, fill='█'):
 	"""
 	Call in a loop to create terminal progress bar
@@ -0,0 +1,232 @@
+"""
+test_aggregate.py
+
+A test script that (roughly) test
+the implementation of the BVH by
+comparing against brute force
+intersection.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+from pytracer import EPS
+import pytracer.geometry as geo
+import pytracer.transform as trans
+from pytracer.shape import (Sphere, create_triangle_mesh)
+from pytracer.aggregate import (GeometricPrimitive, MeshPrimitive, TransformedPrimitive, Intersection, BVH)
+
+N_TEST_CASE = 64
+N_PRIM = 40
+VAR = 10
+np.random.seed(1)
+rng = np.random.rand
+
+
+def make_spheres(n: int=N_PRIM):
+	prims = []
+	for _ in range(n):
+		t = trans.Transform.translate(geo.Vector(*((rng(3) - .5) * VAR)))
+		r = .2 + rng()
+		prims.append(GeometricPrimitive(Sphere(t, t.inverse(), False, r, -r, r, 360.), None))
+	return prims
+
+
+def make_slivers(n: int=N_PRIM):
+	"""Long skinny triangles crossing the scene"""
+	P = []
+	for _ in range(n):
+		p = (rng(3) - .5) * VAR
+		d = (rng(3) - .5) * 2. * VAR
+		P.extend([p - d, p + d, p + (rng(3) - .5) * .5])
+	t = trans.Transform()
+	mesh = create_triangle_mesh(t, t, False, {'indices': list(range(3 * n)), 'P': list(np.ravel(P))})
+	prims = []
+	GeometricPrimitive(mesh, None).full_refine(prims)
+	return prims
+
+
+def make_movers(n: int=N_PRIM):
+	"""Spheres translating over the shutter [0, 1]"""
+	prims = []
+	for prim in make_spheres(n):
+		t0 = trans.Transform.translate(geo.Vector(*((rng(3) - .5) * VAR)))
+		t1 = trans.Transform.translate(geo.Vector(*((rng(3) - .5) * VAR))) * \
+		     trans.Transform.rotate(360. * rng(), geo.Vector(*rng(3)))
+		prims.append(TransformedPrimitive(prim, trans.AnimatedTransform(t0.inverse(), 0., t1.inverse(), 1.)))
+	return prims
+
+
+def make_rays(n: int=N_TEST_CASE):
+	rays = []
+	for _ in range(n):
+		o = geo.Point(*((rng(3) - .5) * 2. * VAR))
+		d = geo.normalize(geo.Vector(*((rng(3) - .5) * VAR)) - o)
+		rays.append(geo.Ray(o, d, time=rng()))
+	return rays
+
+
+def brute_force(prims, ray):
+	isect = Intersection()
+	hit = False
+	for prim in prims:
+		if prim.intersect(ray, isect):
+			hit = True
+	return hit, ray.maxt, isect.primitive
+
+
+def assert_same_hits(bvh, prims, rays, same_prim=True):
+	for ray in rays:
+		r0 = geo.Ray(ray.o, ray.d, time=ray.time)
+		r1 = geo.Ray(ray.o, ray.d, time=ray.time)
+		hit, thit, prim = brute_force(prims, r0)
+		isect = Intersection()
+		assert bvh.intersect(r1, isect) == hit
+		assert bvh.intersect_p(geo.Ray(ray.o, ray.d, time=ray.time)) == hit
+		if hit:
+			assert r1.maxt == pytest.approx(thit, abs=EPS)
+			assert not same_prim or isect.primitive is prim
+
+
+class TestBVH(object):
+	prims = make_spheres()
+	rays = make_rays()
+
+	@pytest.mark.parametrize("method", ['sah', 'middle'])
+	@pytest.mark.parametrize("max_prim", [1, 4, 8])
+	def test_intersect(self, method, max_prim):
+		bvh = BVH(self.prims, max_prim, method)
+		assert_same_hits(bvh, self.prims, self.rays)
+
+	@pytest.mark.parametrize("max_prim", [1, 4])
+	def test_optimize(self, max_prim):
+		bvh = BVH(self.prims, max_prim, 'sah', optimize=4)
+		assert bvh.sah_cost is not None
+		assert_same_hits(bvh, self.prims, self.rays)
+
+	@pytest.mark.parametrize("max_prim", [1, 4])
+	def test_sbvh(self, max_prim):
+		prims = make_slivers() + self.prims
+		bvh = BVH(prims, max_prim, 'sbvh')
+		assert len(bvh.primitives) >= len(prims)
+		assert len(bvh.primitives) <= int(1.3 * len(prims))
+		assert_same_hits(bvh, prims, self.rays)
+
+	def test_motion(self):
+		prims = make_movers(20) + self.prims[:20]
+		bvh = BVH(prims, 4, 'sah')
+		assert bvh.motion_range == (0., 1.)
+		assert_same_hits(bvh, prims, self.rays)
+		for prim in prims[:20]:
+			b = prim.world_bound_at(.5)
+			assert bvh.world_bound_at(.5).inside(b.pMin)
+			assert bvh.world_bound_at(.5).inside(b.pMax)
+
+	def test_motion_bounds(self):
+		# a long sliver spinning fast, its bounds bulge out between samples
+		prim = make_slivers(1)[0]
+		t1 = trans.Transform.rotate(170., geo.Vector(0., 0., 1.))
+		mover = TransformedPrimitive(prim, trans.AnimatedTransform(trans.Transform(), 0., t1.inverse(), 1.))
+		bvh = BVH([mover], 1, 'sah')
+		bound = mover.world_bound()
+		for t in np.linspace(0., 1., 1001):
+			b = mover.world_bound_at(t)
+			for box in [bvh.world_bound_at(t), bound]:
+				assert box.inside(b.pMin) and box.inside(b.pMax)
+
+	def test_stats(self):
+		bvh = BVH(self.prims, 4, 'sah')
+		stats = bvh.stats()
+		assert stats['nodes'] == len(bvh.nodes)
+		assert stats['leaves'] + stats['interior'] == stats['nodes']
+		assert stats['interior'] == stats['leaves'] - 1
+		assert sum(k * v for k, v in stats['leaf_size_histogram'].items()) == len(bvh.primitives)
+		assert sum(stats['depth_histogram'].values()) == stats['leaves']
+		assert stats['sah_cost'] > 0. and stats['memory'] > 0
+		assert stats['rays'] == 0
+
+		assert_same_hits(bvh, self.prims, self.rays)
+		stats = bvh.stats()
+		assert stats['rays'] == 2 * len(self.rays)
+		assert stats['avg_nodes_visited'] >= 1.
+		bvh.reset_stats()
+		assert bvh.stats()['rays'] == 0
+
+	def test_lazy(self):
+		import pickle
+		slivers = make_slivers()
+		mesh = GeometricPrimitive(slivers[0].shape.mesh, None)
+		bvh = BVH([mesh] + self.prims, 4, 'sah', lazy=True)
+		assert len(bvh.primitives) == len(self.prims) + 1
+		proxy = [p for p in bvh.primitives if isinstance(p, BVH._LazyPrimitive)][0]
+		assert proxy.accel is None
+
+		bvh = pickle.loads(pickle.dumps(bvh))
+		# refined and unpickled primitives are copies
+		assert_same_hits(bvh, slivers + self.prims, self.rays, same_prim=False)
+		proxy = [p for p in bvh.primitives if isinstance(p, BVH._LazyPrimitive)][0]
+		assert proxy.accel is not None
+		assert len(proxy.accel.primitives) == len(slivers)
+
+		# a failed refinement releases the lock
+		proxy.accel, proxy.primitive = None, None
+		with pytest.raises(Exception):
+			proxy.intersect_p(self.rays[0])
+		assert not proxy.lock.locked()
+
+	@pytest.mark.parametrize("method", ['sah', 'sbvh'])
+	def test_mesh_primitive(self, method):
+		slivers = make_slivers()
+		mesh = MeshPrimitive(slivers[0].shape.mesh, None)
+		bvh = BVH([mesh] + self.prims, 4, method)
+		assert all(p is mesh for p, i in zip(bvh.primitives, bvh.items) if i >= 0)
+		assert sum(bvh.items >= 0) >= len(slivers)
+		assert_same_hits(bvh, slivers + self.prims, self.rays, same_prim=False)
+
+		for ray in self.rays:
+			isect = Intersection()
+			if bvh.intersect(geo.Ray(ray.o, ray.d), isect) and isect.primitive is mesh:
+				assert isect.dg.shape.mesh is mesh.mesh
+
+	@pytest.mark.parametrize("method, optimize", [('sah', 0), ('middle', 0), ('sah', 2)])
+	def test_mesh_arrays(self, method, optimize):
+		# nodes are packed, tens of bytes per node
+		# and a pointer and an id per triangle
+		n = 500
+		P = ((rng(n, 1, 3) - .5) * VAR + rng(n, 3, 3)).reshape(-1, 3)
+		t = trans.Transform()
+		mesh = MeshPrimitive(create_triangle_mesh(t, t, False, {'indices': np.arange(3 * n), 'P': P}), None)
+		bvh = BVH([mesh], 4, method, optimize)
+		assert bvh.nodes.dtype == BVH.NODE_DTYPE and bvh.bounds1 is None
+		assert sorted(bvh.items) == list(range(n))
+		assert bvh.stats()['memory'] < 150 * n
+		for ray in self.rays:
+			r0, r1 = geo.Ray(ray.o, ray.d), geo.Ray(ray.o, ray.d)
+			hit = mesh.intersect(r0, Intersection())
+			assert bvh.intersect(r1, Intersection()) == hit
+			assert bvh.intersect_p(geo.Ray(ray.o, ray.d)) == hit
+			if hit:
+				assert r1.maxt == pytest.approx(r0.maxt)
+
+	@pytest.mark.parametrize("scene", ['spheres', 'movers', 'mesh'])
+	def test_intersect_batch(self, scene):
+		if scene == 'spheres':
+			prims = self.prims
+		elif scene == 'movers':
+			prims = make_movers(20) + self.prims[:20]
+		else:
+			prims = [MeshPrimitive(make_slivers()[0].shape.mesh, None)] + self.prims
+		bvh = BVH(prims, 4, 'sah')
+		rays = geo.RayBatch.from_rays(self.rays)
+		isects = [Intersection() for _ in self.rays]
+		hit = bvh.intersect_batch(rays, isects)
+		assert hit.any() and not hit.all()
+		for k, ray in enumerate(self.rays):
+			r = geo.Ray(ray.o, ray.d, time=ray.time)
+			isect = Intersection()
+			assert bvh.intersect(r, isect) == hit[k]
+			if hit[k]:
+				assert rays.maxt[k] == r.maxt and isects[k].primitive is isect.primitive
+		assert np.array_equal(bvh.intersect_p_batch(geo.RayBatch.from_rays(self.rays)), hit)
+		# the fallback of other primitives gives the same
+		assert np.array_equal(super(BVH, bvh).intersect_p_batch(geo.RayBatch.from_rays(self.rays)), hit)
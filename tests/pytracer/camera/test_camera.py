@@ -0,0 +1,62 @@
+"""
+test_camera.py
+
+A test script that (roughly) test
+the implementation of cameras.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import pytest
+import pytracer.geometry as geo
+import pytracer.transform as trans
+from pytracer.camera import (PerspectiveCamera, OrthoCamera, EnvironmentCamera)
+from pytracer.film import ImageFilm
+from pytracer.filter import BoxFilter
+from pytracer.montecarlo import (concentric_sample_disk, concentric_sample_disk_batch)
+from pytracer.sampler import (Sample, SampleBatch, StratifiedSampler)
+
+np.random.seed(1)
+rng = np.random.rand
+
+
+def test_concentric_sample_disk():
+	u = np.concatenate([rng(64, 2), [[.5, .5], [0., 0.], [1., .5], [.5, 0.], [.3, .3]]])
+	x, y = concentric_sample_disk_batch(u[:, 0], u[:, 1])
+	assert_array_almost_equal(np.column_stack([x, y]), [concentric_sample_disk(*uu) for uu in u])
+
+
+class TestCamera(object):
+
+	@pytest.mark.parametrize("animated", [False, True])
+	@pytest.mark.parametrize("lensr", [0., .3])
+	@pytest.mark.parametrize("cls", [PerspectiveCamera, OrthoCamera, EnvironmentCamera])
+	def test_generate_rays(self, cls, lensr, animated):
+		film = ImageFilm(xr=16, yr=12, filt=BoxFilter(.5, .5), crop=[0., 1., 0., 1.], fn='tmp.png')
+		t1 = trans.Transform.translate(geo.Vector(1., 2., 3.)) * trans.Transform.rotate(30., geo.Vector(1., 1., 0.))
+		t2 = trans.Transform.translate(geo.Vector(-1., 0., 3.)) * trans.Transform.rotate(60., geo.Vector(0., 1., 1.))
+		c2w = trans.AnimatedTransform(t1, 0., t2 if animated else t1, 1.)
+		if cls is PerspectiveCamera:
+			camera = cls(c2w, [-1., 1., -.75, .75], 0., 1., lensr, 5., 60., film)
+		elif cls is OrthoCamera:
+			camera = cls(c2w, [-1., 1., -.75, .75], 0., 1., lensr, 5., film)
+		else:
+			camera = cls(c2w, 0., 1., film)
+
+		sample = Sample()
+		sampler = StratifiedSampler(0, 16, 0, 12, 2, 2, True, 0., 1.)
+		samples = SampleBatch.from_tile(sample, sampler.generate_tile(0, 4, 0, 4, sample))
+		wt, rays = camera.generate_rays(samples)
+		assert len(wt) == len(rays) == 64 and rays.has_differentials
+
+		for i, s in enumerate(samples):
+			w, r = camera.generate_ray_differential(s)
+			assert wt[i] == w and rays.time[i] == pytest.approx(r.time)
+			assert_array_almost_equal(rays.o[i], r.o)
+			assert_array_almost_equal(rays.d[i], r.d)
+			assert_array_almost_equal(rays.rxOrigin[i], r.rxOrigin)
+			assert_array_almost_equal(rays.ryOrigin[i], r.ryOrigin)
+			assert_array_almost_equal(rays.rxDirection[i], r.rxDirection)
+			assert_array_almost_equal(rays.ryDirection[i], r.ryDirection)
+			assert_array_almost_equal(rays.ray(i).ryDirection, r.ryDirection)
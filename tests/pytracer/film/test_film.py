@@ -0,0 +1,40 @@
+"""
+test_film.py
+
+A test script that (roughly) test
+the implementation of the image film.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import pytest
+from pytracer.spectral import (Spectrum, SpectrumBatch)
+from pytracer.filter import (BoxFilter, TriangleFilter)
+from pytracer.film import ImageFilm
+
+N_TEST_CASE = 256
+np.random.seed(1)
+rng = np.random.rand
+
+
+class CameraSample(object):
+	def __init__(self, x, y):
+		self.imageX = x
+		self.imageY = y
+
+
+@pytest.mark.parametrize("filt", [BoxFilter(.5, .5), TriangleFilter(2., 1.5)])
+def test_add_samples(filt):
+	film = ImageFilm(16, 12, filt, [0., 1., 0., 1.], 'tmp.png')
+	batch_film = ImageFilm(16, 12, filt, [0., 1., 0., 1.], 'tmp.png')
+	x, y = rng(N_TEST_CASE) * 18. - 1., rng(N_TEST_CASE) * 14. - 1.
+	L = rng(N_TEST_CASE, 3)
+	for i in range(N_TEST_CASE):
+		film.add_sample(CameraSample(x[i], y[i]), Spectrum.create_from_array(L[i]))
+	batch_film.add_samples(x, y, SpectrumBatch.from_array(L))
+
+	assert_array_almost_equal(batch_film.Lxyz, film.Lxyz)
+	assert_array_almost_equal(batch_film.weight_sum, film.weight_sum)
+	# pixels view the packed arrays
+	assert film.pixels[3][4].weight_sum == film.weight_sum[3, 4] > 0.
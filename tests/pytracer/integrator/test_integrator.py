@@ -0,0 +1,191 @@
+"""
+test_integrator.py
+
+A test script that (roughly) test
+the implementation of integrators.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+from pytracer import Spectrum
+import pytracer.geometry as geo
+import pytracer.transform as trans
+from pytracer.aggregate import (BVH, GeometricPrimitive, Intersection)
+from pytracer.integrator import (DirectLightingIntegrator, LightStrategy, PathIntegrator, WavefrontPathIntegrator)
+from pytracer.light import (PointLight, DiffuseAreaLight)
+from pytracer.material import MatteMaterial
+from pytracer.renderer import SamplerRenderer
+from pytracer.sampler import (Sample, SampleBatch)
+from pytracer.scene import Scene
+from pytracer.shape import (Sphere, create_triangle_mesh)
+from pytracer.spectral import SampledWavelengths
+from pytracer.texture import ConstantTexture
+
+np.random.seed(1)
+N_PATHS = 400
+
+
+def make_scene(area: bool):
+	"""A sphere on a floor"""
+	Spectrum.init()
+	mat = MatteMaterial(ConstantTexture(Spectrum(.7)), ConstantTexture(0.))
+	t = trans.Transform()
+	floor = create_triangle_mesh(t, t, False, {'indices': [0, 1, 2, 2, 0, 3],
+	                                           'P': [-5, -5, 0, 5, -5, 0, 5, 5, 0, -5, 5, 0]})
+	t = trans.Transform.translate(geo.Vector(0., 0., 1.))
+	prims = [GeometricPrimitive(floor, mat), GeometricPrimitive(Sphere(t, t.inverse(), False, 1., -1., 1., 360.), mat)]
+	t = trans.Transform.translate(geo.Vector(2., 0., 4.))
+	if area:
+		shape = Sphere(t, t.inverse(), False, .5, -.5, .5, 360.)
+		light = DiffuseAreaLight(t, Spectrum(20.), 1, shape)
+		prims.append(GeometricPrimitive(shape, mat, light))
+	else:
+		light = PointLight(t, Spectrum(20.))
+	return Scene(BVH(prims, 4), [light], None)
+
+
+class TestWavefrontPathIntegrator(object):
+
+	@pytest.mark.parametrize("area", [False, True])
+	def test_li(self, area):
+		scene = make_scene(area)
+		renderer = SamplerRenderer(None, None, None, None)
+		o = geo.Point(0., -4., 3.)
+		d = geo.normalize(geo.Point(.3, .5, .4) - o)
+
+		integrator = PathIntegrator(5)
+		sample = Sample()
+		integrator.request_samples(None, sample, scene)
+		path = []
+		for _ in range(N_PATHS):
+			sample.oneD = [np.random.rand(n) for n in sample.n1D]
+			sample.twoD = [np.random.rand(n, 2) for n in sample.n2D]
+			ray, isect = geo.RayDifferential(o, d), Intersection()
+			assert scene.intersect(ray, isect)
+			path.append(integrator.li(scene, renderer, ray, isect, sample).y())
+
+		rays = geo.RayBatch(np.tile(o, (N_PATHS, 1)), np.tile(d, (N_PATHS, 1)))
+		wavefront = WavefrontPathIntegrator(5).li_batch(scene, renderer, rays).y()
+		assert rays.maxt[0] < np.inf
+
+		# at hero wavelengths, the same luminance
+		wl = SampledWavelengths.sample_hero(np.random.rand(N_PATHS), 4)
+		rays = geo.RayBatch(np.tile(o, (N_PATHS, 1)), np.tile(d, (N_PATHS, 1)))
+		L = WavefrontPathIntegrator(5, 4).li_batch(scene, renderer, rays, wavelengths=wl)
+		assert L.shape == (N_PATHS, 4)
+		hero = wl.to_xyz(L)[:, 1]
+		err = np.sqrt(np.var(path) / N_PATHS + np.var(hero) / N_PATHS)
+		assert abs(np.mean(path) - np.mean(hero)) < 4. * err
+
+		# same in expectation
+		err = np.sqrt(np.var(path) / N_PATHS + np.var(wavefront) / N_PATHS)
+		assert np.mean(path) > 0. and abs(np.mean(path) - np.mean(wavefront)) < 4. * err
+
+
+	def test_li_samples(self):
+		# a quad light, sampled at once, and
+		# sample dimensions from the sampler
+		Spectrum.init()
+		mat = MatteMaterial(ConstantTexture(Spectrum(.7)), ConstantTexture(0.))
+		t = trans.Transform.translate(geo.Vector(1., 0., 4.))
+		quad = create_triangle_mesh(t, t.inverse(), True, {'indices': [0, 1, 2, 2, 0, 3],
+		                                                   'P': [-1, -1, 0, 1, -1, 0, 1, 1, 0, -1, 1, 0]})
+		light = DiffuseAreaLight(t, Spectrum(10.), 1, quad)
+		scene = make_scene(False)
+		scene = Scene(BVH(scene.aggregate.primitives + [GeometricPrimitive(quad, mat, light)], 4), [light], None)
+		renderer = SamplerRenderer(None, None, None, None)
+		o = geo.Point(0., -4., 3.)
+		d = geo.normalize(geo.Point(.3, .5, .4) - o)
+
+		path, wavefront = PathIntegrator(5), WavefrontPathIntegrator(5)
+		sample, sample_w = Sample(), Sample()
+		path.request_samples(None, sample, scene)
+		wavefront.request_samples(None, sample_w, scene)
+		L = []
+		for _ in range(N_PATHS):
+			sample.oneD = [np.random.rand(n) for n in sample.n1D]
+			sample.twoD = [np.random.rand(n, 2) for n in sample.n2D]
+			ray, isect = geo.RayDifferential(o, d), Intersection()
+			assert scene.intersect(ray, isect)
+			L.append(path.li(scene, renderer, ray, isect, sample).y())
+
+		samples = SampleBatch(sample_w, N_PATHS)
+		samples.data[...] = np.random.rand(*samples.data.shape)
+		rays = geo.RayBatch(np.tile(o, (N_PATHS, 1)), np.tile(d, (N_PATHS, 1)))
+		Lw = wavefront.li_batch(scene, renderer, rays, samples)
+		err = np.sqrt(np.var(L) / N_PATHS + np.var(Lw.y()) / N_PATHS)
+		assert np.mean(L) > 0. and abs(np.mean(L) - np.mean(Lw.y())) < 4. * err
+
+		# a single ray by `li()`, as in the batch
+		wavefront = WavefrontPathIntegrator(2)
+		wavefront.request_samples(None, Sample(), scene)
+		Lw = wavefront.li_batch(scene, renderer, geo.RayBatch(np.tile(o, (8, 1)), np.tile(d, (8, 1))), samples)
+		for i in range(8):
+			ray, isect = geo.RayDifferential(o, d), Intersection()
+			assert scene.intersect(ray, isect)
+			assert np.allclose(wavefront.li(scene, renderer, ray, isect, samples[i]), Lw.spectrum(i))
+
+
+	@pytest.mark.parametrize("max_depth", [0, 1])
+	def test_li_max_depth(self, max_depth):
+		# a floor lit by a large quad light, MIS
+		# at the last vertex includes BSDF sampling
+		Spectrum.init()
+		mat = MatteMaterial(ConstantTexture(Spectrum(.7)), ConstantTexture(0.))
+		t = trans.Transform()
+		floor = create_triangle_mesh(t, t, False, {'indices': [0, 1, 2, 2, 0, 3],
+		                                           'P': [-5, -5, 0, 5, -5, 0, 5, 5, 0, -5, 5, 0]})
+		t = trans.Transform.translate(geo.Vector(0., 0., 2.))
+		quad = create_triangle_mesh(t, t.inverse(), True, {'indices': [0, 1, 2, 2, 0, 3],
+		                                                   'P': [-4, -4, 0, 4, -4, 0, 4, 4, 0, -4, 4, 0]})
+		light = DiffuseAreaLight(t, Spectrum(2.), 1, quad)
+		scene = Scene(BVH([GeometricPrimitive(floor, mat), GeometricPrimitive(quad, mat, light)], 4), [light], None)
+		renderer = SamplerRenderer(None, None, None, None)
+		o = geo.Point(0., -1., 1.)
+		d = geo.normalize(geo.Point(0., 0., 0.) - o)
+		n_paths = 1000
+
+		integrator = PathIntegrator(max_depth)
+		sample = Sample()
+		integrator.request_samples(None, sample, scene)
+		path = []
+		for _ in range(n_paths):
+			sample.oneD = [np.random.rand(n) for n in sample.n1D]
+			sample.twoD = [np.random.rand(n, 2) for n in sample.n2D]
+			ray, isect = geo.RayDifferential(o, d), Intersection()
+			assert scene.intersect(ray, isect)
+			path.append(integrator.li(scene, renderer, ray, isect, sample).y())
+
+		rays = geo.RayBatch(np.tile(o, (n_paths, 1)), np.tile(d, (n_paths, 1)))
+		wavefront = WavefrontPathIntegrator(max_depth).li_batch(scene, renderer, rays).y()
+
+		err = np.sqrt(np.var(path) / n_paths + np.var(wavefront) / n_paths)
+		assert np.mean(path) > 0. and abs(np.mean(path) - np.mean(wavefront)) < 4. * err
+
+
+class TestDirectLightingIntegrator(object):
+
+	def test_light_tree(self):
+		scene = make_scene(True)
+		for x, y in np.random.rand(30, 2) * 8. - 4.:
+			t = trans.Transform.translate(geo.Vector(x, y, 3.))
+			scene.lights.append(PointLight(t, Spectrum(.5)))
+		renderer = SamplerRenderer(None, None, None, None)
+		o = geo.Point(0., -4., 3.)
+		d = geo.normalize(geo.Point(.3, .5, .4) - o)
+
+		L = {}
+		for strategy in [LightStrategy.SAMPLE_ALL_UNIFORM, LightStrategy.SAMPLE_ONE_TREE]:
+			integrator = DirectLightingIntegrator(strategy, 1)
+			integrator.preprocess(scene, None, renderer)
+			L[strategy] = []
+			for _ in range(N_PATHS):
+				ray, isect = geo.RayDifferential(o, d), Intersection()
+				assert scene.intersect(ray, isect)
+				L[strategy].append(integrator.li(scene, renderer, ray, isect, Sample()).y())
+
+		# same in expectation
+		a, b = L[LightStrategy.SAMPLE_ALL_UNIFORM], L[LightStrategy.SAMPLE_ONE_TREE]
+		err = np.sqrt(np.var(a) / N_PATHS + np.var(b) / N_PATHS)
+		assert np.mean(a) > 0. and abs(np.mean(a) - np.mean(b)) < 4. * err
@@ -0,0 +1,173 @@
+"""
+test_light.py
+
+A test script that (roughly) test
+the sampling of lights.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import pytest
+import pytracer.geometry as geo
+import pytracer.transform as trans
+from pytracer.shape import (Sphere, create_triangle_mesh)
+from pytracer.montecarlo import AliasTable
+from pytracer.light import (ShapeSet, PointLight, SpotLight, DistantLight, DiffuseAreaLight, LightTree)
+
+N_TEST_CASE = 32
+np.random.seed(1)
+rng = np.random.rand
+
+
+def test_alias_table():
+	w = rng(17)
+	w[3] = 0.
+	dist = AliasTable(w)
+	assert_array_almost_equal(dist.pmf, w / w.sum())
+	# stratified samples reproduce the pmf
+	u = (np.arange(17 * 1000) + .5) / (17 * 1000)
+	idx, pmf = dist.sample_many(u)
+	assert_array_almost_equal(np.bincount(idx, minlength=17) / len(u), dist.pmf, 3)
+	assert_array_almost_equal(pmf, dist.pmf[idx])
+	assert not np.any(idx == 3)
+	for x in u[::97]:
+		i, p = dist.sample_dis(x)
+		assert i == idx[int(x * len(u))] and p == dist.pmf[i]
+
+
+def test_shape_set():
+	# a strip of triangles of various areas in the z = 1 plane
+	x = np.cumsum(rng(12) + .1)
+	P = np.concatenate([np.stack([x, np.zeros(12), np.ones(12)], axis=1),
+	                    np.stack([x, np.ones(12), np.ones(12)], axis=1)])
+	i = np.arange(11)
+	F = np.concatenate([np.stack([i, i + 1, i + 12], axis=1), np.stack([i + 1, i + 13, i + 12], axis=1)])
+	t = trans.Transform()
+	mesh = create_triangle_mesh(t, t, False, {'indices': F.ravel(), 'P': P.ravel()})
+	ss = ShapeSet(mesh)
+	assert len(ss.shapes) == 22
+	assert ss.sum_area == pytest.approx(x[-1] - x[0])
+	assert ss.pdf_p(geo.Point(x[0], 0., 1.)) == pytest.approx(1. / ss.sum_area)
+
+	pts, ns, idx = ss.sample_many(rng(4000, 3))
+	assert_array_almost_equal(pts[:, 2], 1.)
+	assert np.all((pts[:, 0] >= x[0]) & (pts[:, 0] <= x[-1]))
+	assert_array_almost_equal(np.fabs(ns[:, 2]), 1.)
+	assert np.corrcoef(np.bincount(idx, minlength=22), ss.areas)[0, 1] > .9
+
+	# solid angle pdf from the hit triangle alone,
+	# the same as summed over the set
+	p = geo.Point(x[0] - 1., .5, 0.)
+	tris = mesh.refine()
+	for pt, i in zip(pts[:N_TEST_CASE], idx):
+		wi = geo.normalize(geo.Point(*pt) - p)
+		d2 = np.sum((pt - np.asarray(p)) ** 2)
+		j = ss.index_of(tris[ss.shapes[i].v // 3])
+		assert j == i
+		assert ss.pdf(p, wi, j) == pytest.approx(d2 / (wi.z * ss.sum_area))
+		assert ss.pdf(p, wi) == pytest.approx(d2 / (wi.z * ss.sum_area))
+	assert ss.pdf(p, geo.Vector(0., 0., -1.)) == 0.
+	assert ss.index_of(create_triangle_mesh(t, t, False, {'indices': F.ravel(), 'P': P.ravel()}).refine()[0]) == -1
+
+
+def test_light_tree():
+	from pytracer import Spectrum
+	Spectrum.init()
+	# a grid of point lights of equal power above the z = 0 plane
+	lights = []
+	for x, y in rng(60, 2) * 20. - 10.:
+		lights.append(PointLight(trans.Transform.translate(geo.Vector(x, y, 1.)), Spectrum(1.)))
+	t = trans.Transform.translate(geo.Vector(0., 0., 3.))
+	lights.append(SpotLight(t, Spectrum(5.), 30., 20.))
+	t = trans.Transform()
+	quad = create_triangle_mesh(t, t, True, {'indices': [0, 1, 2, 0, 2, 3],
+	                                         'P': [-1, -1, 2, 1, -1, 2, 1, 1, 2, -1, 1, 2]})
+	lights.append(DiffuseAreaLight(t, Spectrum(2.), 1, quad))
+	lights.append(DistantLight(t, Spectrum(1.), geo.Vector(0., 0., 1.)))
+	assert lights[-2].power(None).y() == pytest.approx(2. * 4. * np.pi)
+	area = lights[-2].bounds(None)
+	assert area.theta_o == pytest.approx(0.) and np.allclose(area.w, [0., 0., -1.])
+
+	tree = LightTree(lights, None)
+	assert tree.n_nodes == 2 * (len(lights) - 1) - 1 and tree.infinite == [len(lights) - 1]
+	assert tree.p_infinite == .5
+
+	p, n = geo.Point(.5, -.5, 0.), geo.Normal(0., 0., 1.)
+	pmf = np.array([tree.pmf(p, n, i) for i in range(len(lights))])
+	assert pmf.sum() == pytest.approx(1.) and np.all(pmf[:60] > 0.)
+	# the spot light shines upwards, the area light downwards
+	assert pmf[-3] == 0. and pmf[-2] > 0.
+	assert tree.pmf(geo.Point(0., 0., 4.), n, len(lights) - 3) > 0.
+	assert tree.pmf(geo.Point(0., 0., 4.), n, len(lights) - 2) == 0.
+	# nearer lights are more likely
+	d = np.array([lights[i].pos.dist(p) for i in range(60)])
+	assert pmf[np.argmin(d)] > pmf[np.argmax(d)]
+
+	u = (np.arange(4000) + .5) / 4000
+	idx = []
+	for x in u:
+		i, prob = tree.sample(p, n, x)
+		assert prob == pytest.approx(pmf[i])
+		idx.append(i)
+	assert_array_almost_equal(np.bincount(idx, minlength=len(lights)) / len(u), pmf, 2)
+
+
+
+def test_light_tree_inside():
+	from pytracer import Spectrum
+	Spectrum.init()
+	# at points inside the bounds of a node, its importance
+	# falls off with the squared radius of the bounds
+	for s in (1., 2.):
+		t = trans.Transform()
+		quad = create_triangle_mesh(t, t, False, {'indices': [0, 1, 2, 0, 2, 3],
+		                                          'P': np.array([-1, -1, 0, 1, -1, 0, 1, 1, 0, -1, 1, 0]) * s})
+		tree = LightTree([DiffuseAreaLight(t, Spectrum(2.), 1, quad)], None)
+		r2 = 2. * s * s
+		for p in (geo.Point(0., 0., 0.), geo.Point(.2 * s, -.5 * s, 0.)):
+			imp = tree.importance(np.array([0]), p, geo.Normal(0., 0., 1.))
+			assert imp[0] == pytest.approx(tree.phi[0] / r2)
+		# continuous at the bounding sphere
+		p = geo.Point(0., 0., np.sqrt(r2))
+		assert tree.importance(np.array([0]), p)[0] == pytest.approx(tree.phi[0] / r2)
+
+
+@pytest.mark.parametrize("kind", ['point', 'sphere', 'quad'])
+def test_sample_l_many(kind):
+	from pytracer import Spectrum
+	from pytracer.light import LightSample
+	Spectrum.init()
+	t = trans.Transform.translate(geo.Vector(.5, 0., 3.))
+	if kind == 'point':
+		light = PointLight(t, Spectrum(5.))
+	elif kind == 'sphere':
+		light = DiffuseAreaLight(t, Spectrum(2.), 1, Sphere(t, t.inverse(), False, .5, -.5, .5, 360.))
+	else:
+		quad = create_triangle_mesh(t, t.inverse(), True, {'indices': [0, 1, 2, 0, 2, 3],
+		                                                   'P': [-1, -1, 0, 1, -1, 0, 1, 1, 0, -1, 1, 0]})
+		light = DiffuseAreaLight(t, Spectrum(2.), 1, quad)
+
+	# the same as `sample_l()` one by one
+	p, eps, u, time = rng(N_TEST_CASE, 3) * 4. - 2., rng(N_TEST_CASE) * 1e-3, rng(N_TEST_CASE, 3), rng(N_TEST_CASE)
+	Li, wi, pdf, rays = light.sample_l_many(p, eps, u, time)
+	assert np.any(pdf > 0.) and not np.all(Li.is_black())
+	for k in range(N_TEST_CASE):
+		l, w, pd, vis = light.sample_l(geo.Point(*p[k]), eps[k], LightSample(*u[k]), time[k])
+		assert_array_almost_equal(Li[k], l)
+		assert_array_almost_equal(wi[k], w)
+		assert pdf[k] == pytest.approx(pd)
+		assert_array_almost_equal(rays.o[k], np.asarray(vis.ray.o))
+		assert_array_almost_equal(rays.d[k], vis.ray.d)
+		assert_array_almost_equal([rays.mint[k], rays.maxt[k], rays.time[k]],
+		                          [vis.ray.mint, vis.ray.maxt, vis.ray.time])
+
+	# pdfs of the points sampled, by the shapes hit
+	if kind != 'point':
+		ss = light.shape_set
+		hits = [ss.sample_p(geo.Point(*p[k]), LightSample(*u[k])) for k in range(N_TEST_CASE)]
+		pts, ns = np.array([h[0] for h in hits]), np.array([h[1] for h in hits])
+		shapes = [ss.shapes[h[2]] for h in hits]
+		assert_array_almost_equal(light.pdf_many(p, wi, shapes, pts, ns), pdf)
+		assert_array_almost_equal(light.pdf_many(p, wi), pdf)
+	assert np.all(light.le_many(rays).is_black())
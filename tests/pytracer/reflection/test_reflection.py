@@ -0,0 +1,66 @@
+"""
+test_reflection.py
+
+A test script that (roughly) test
+the batched evaluation of BSDFs.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import pytest
+from pytracer import Spectrum
+import pytracer.geometry as geo
+from pytracer.reflection import (BDFType, BSDF, BSDFBatch, BSDFSample, Lambertian, OrenNayar)
+
+N_TEST_CASE = 40
+np.random.seed(1)
+rng = np.random.rand
+
+
+def normalize(v: 'np.ndarray') -> 'np.ndarray':
+	return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def make_bsdfs() -> ['BSDF']:
+	"""Random frames, some with bumped shading normals, of lambertian and other BSDFs"""
+	Spectrum.init()
+	bsdfs = []
+	for k in range(N_TEST_CASE):
+		n = normalize(rng(3) - .5)
+		dpdu = np.cross(n, rng(3))
+		dg = geo.DifferentialGeometry(geo.Point(*rng(3)), geo.Vector(*dpdu), geo.Vector(*np.cross(n, dpdu)),
+		                              geo.Normal(0., 0., 0.), geo.Normal(0., 0., 0.), 0., 0., None)
+		dg.nn = geo.Normal(*n)
+		ng = n if k % 3 else normalize(n + .3 * (rng(3) - .5))
+		bsdf = BSDF(dg, geo.Normal(*ng))
+		bsdf.push_back(Lambertian(Spectrum(rng(3))) if k % 4 else OrenNayar(Spectrum(.5), 20.))
+		bsdfs.append(bsdf)
+	return bsdfs
+
+
+@pytest.mark.parametrize("flags", [BDFType.ALL, BDFType.ALL & ~BDFType.SPECULAR, BDFType.TRANSMISSION])
+def test_bsdf_batch(flags):
+	bsdfs = make_bsdfs()
+	batch = BSDFBatch(bsdfs)
+	assert np.count_nonzero(batch.diffuse) == 30
+	wo, wi = normalize(rng(N_TEST_CASE, 3) - .5), normalize(rng(N_TEST_CASE, 3) - .5)
+	u = rng(N_TEST_CASE, 3)
+
+	# the same as `BSDF` one by one
+	f, pdf = batch.f(wo, wi, flags), batch.pdf(wo, wi, flags)
+	pdf_s, wi_s, specular, f_s = batch.sample_f(wo, u, flags)
+	assert not np.any(specular)
+	for k, bsdf in enumerate(bsdfs):
+		v_o, v_i = geo.Vector(*wo[k]), geo.Vector(*wi[k])
+		assert_array_almost_equal(f[k], bsdf.f(v_o, v_i, flags))
+		assert pdf[k] == pytest.approx(bsdf.pdf(v_o, v_i, flags))
+		p, w, _, fs = bsdf.sample_f(v_o, BSDFSample(*u[k]), flags)
+		assert pdf_s[k] == pytest.approx(p)
+		assert_array_almost_equal(f_s[k], fs)
+		if w is not None:
+			assert_array_almost_equal(wi_s[k], w)
+
+	# a part of the batch
+	rows = np.arange(0, N_TEST_CASE, 3)
+	assert_array_almost_equal(batch[rows].f(wo[rows], wi[rows], flags), f[rows])
@@ -0,0 +1,192 @@
+"""
+test_renderer.py
+
+A test script that (roughly) test
+the implementation of renderers.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+from pytracer import Spectrum
+import pytracer.geometry as geo
+import pytracer.transform as trans
+from pytracer.aggregate import (BVH, GeometricPrimitive, Intersection)
+from pytracer.camera import PerspectiveCamera
+from pytracer.film import ImageFilm
+from pytracer.filter import BoxFilter
+from pytracer.integrator import (PathIntegrator, WavefrontPathIntegrator)
+from pytracer.light import PointLight
+from pytracer.material import MatteMaterial
+from pytracer.renderer import (PrimaryHitCache, SamplerRenderer, SamplerRendererTask)
+from pytracer.sampler import (Sample, SampleBatch, StratifiedSampler)
+from pytracer.scene import Scene
+from pytracer.shape import Sphere
+from pytracer.texture import ConstantTexture
+
+np.random.seed(1)
+
+
+class TestPrimaryHitCache(object):
+
+	def setup_method(self):
+		t = trans.Transform.translate(geo.Vector(0., 0., 5.))
+		sphere = GeometricPrimitive(Sphere(t, t.inverse(), False, 1., -1., 1., 360.), None)
+		self.scene = Scene(BVH([sphere], False), [], None)
+		film = ImageFilm(xr=4, yr=4, filt=BoxFilter(.5, .5), crop=[0., 1., 0., 1.], fn='tmp.png')
+		c2w = trans.AnimatedTransform(trans.Transform(), 0., trans.Transform(), 0.)
+		self.camera = PerspectiveCamera(c2w, [-1., 1., -1., 1.], 0., 0., 0., 1e100, 30., film)
+		self.sampler = StratifiedSampler(0, 4, 0, 4, 1, 1, False, 0., 0.)
+
+	def test_lookup(self):
+		cache = PrimaryHitCache.from_sampler(self.sampler)
+		assert cache.valid.shape == (4, 4, 1)
+		assert not cache.validate(self.scene, self.camera)
+
+		sample = Sample()
+		samples = SampleBatch.from_tile(sample, self.sampler.generate_tile(0, 4, 0, 4, sample))
+		_, rays = self.camera.generate_rays(samples)
+		hits = []
+		for i, s in enumerate(samples):
+			x, y = int(s.imageX), int(s.imageY)
+			ray, isect = rays.ray(i), Intersection()
+			assert cache.lookup(x, y, 0, ray) == [False, False, None]
+			hits.append(self.scene.intersect(ray, isect))
+			cache.store(x, y, 0, ray, hits[-1], isect)
+		assert any(hits) and not all(hits)
+
+		assert cache.validate(self.scene, self.camera)
+		for i, s in enumerate(samples):
+			x, y = int(s.imageX), int(s.imageY)
+			ray = rays.ray(i)
+			found, hit, isect = cache.lookup(x, y, 0, ray)
+			assert found and hit == hits[i]
+			if hit:
+				assert ray.maxt == cache.t[y, x, 0] and np.array_equal(isect.dg.p, cache.p[y, x, 0])
+				assert isect.primitive is self.scene.aggregate.primitives[0]
+				# entries are not changed by shading
+				isect.dg.p.x += 1.
+				assert not np.array_equal(cache.lookup(x, y, 0, ray)[2].dg.p, isect.dg.p)
+		assert cache.n_reused == 16 + sum(hits)
+
+		# editing geometry drops all entries
+		self.scene.version += 1
+		assert not cache.validate(self.scene, self.camera) and not cache.valid.any()
+		cache.store(0, 0, 0, rays.ray(0), False, None)
+		assert cache.validate(self.scene, self.camera)
+
+		# moving the camera drops all entries
+		t = trans.Transform.translate(geo.Vector(0., 0., 1.))
+		self.camera.c2w = trans.AnimatedTransform(t, 0., t, 0.)
+		assert not cache.validate(self.scene, self.camera) and not cache.valid.any()
+
+
+class TestSamplerRenderer(object):
+
+	def make_camera(self, fn: str):
+		film = ImageFilm(xr=32, yr=32, filt=BoxFilter(.5, .5), crop=[0., 1., 0., 1.], fn=fn)
+		c2w = trans.AnimatedTransform(trans.Transform(), 0., trans.Transform(), 0.)
+		return PerspectiveCamera(c2w, [-1., 1., -1., 1.], 0., 0., 0., 1e100, 30., film)
+
+	def make_scene(self) -> 'Scene':
+		Spectrum.init()
+		mat = MatteMaterial(ConstantTexture(Spectrum(.7)), ConstantTexture(0.))
+		t = trans.Transform.translate(geo.Vector(0., 0., 5.))
+		spheres = [GeometricPrimitive(Sphere(t, t.inverse(), False, 1., -1., 1., 360.), mat)]
+		t = trans.Transform.translate(geo.Vector(.5, .5, 4.))
+		spheres.append(GeometricPrimitive(Sphere(t, t.inverse(), False, .3, -.3, .3, 360.), mat))
+		t = trans.Transform.translate(geo.Vector(2., 2., 2.))
+		return Scene(BVH(spheres), [PointLight(t, Spectrum(20.))], None)
+
+	def test_tiles(self, tmpdir):
+		scene = self.make_scene()
+		sampler = StratifiedSampler(0, 32, 0, 32, 1, 1, True, 0., 0.)
+		integrator = PathIntegrator(3)
+
+		camera = self.make_camera(str(tmpdir.join('full.png')))
+		renderer = SamplerRenderer(sampler, camera, integrator, None, seed=5)
+		assert renderer.task_count() == 4
+		renderer.render(scene)
+		full = camera.film.Lxyz
+		assert np.all(camera.film.weight_sum == 1.) and np.any(full > 0.)
+
+		# re-rendering a tile on its own gives the same pixels
+		for k in (2, 1):
+			camera = self.make_camera(str(tmpdir.join('tile.png')))
+			renderer = SamplerRenderer(sampler, camera, integrator, None, seed=5)
+			sample = Sample(sampler, integrator, None, scene)
+			SamplerRendererTask(scene, renderer, camera, sampler, sample, False, k, 4)()
+			x0, x1, y0, y1 = sampler.compute_subwindow(k, 4)
+			tile = camera.film.Lxyz
+			assert_array_almost_equal(tile[x0:x1, y0:y1], full[x0:x1, y0:y1])
+			assert camera.film.weight_sum.sum() == (x1 - x0) * (y1 - y0)
+
+		# other seeds give other images
+		camera = self.make_camera(str(tmpdir.join('other.png')))
+		SamplerRenderer(sampler, camera, integrator, None, seed=6).render(scene)
+		assert not np.allclose(camera.film.Lxyz, full)
+
+	def test_passes(self, tmpdir):
+		scene = self.make_scene()
+		sampler = StratifiedSampler(0, 32, 0, 32, 1, 1, True, 0., 0.)
+		integrator = PathIntegrator(3)
+		films = []
+		for hit_cache in (False, True):
+			camera = self.make_camera(str(tmpdir.join('passes.png')))
+			renderer = SamplerRenderer(sampler, camera, integrator, None, seed=5, hit_cache=hit_cache)
+			renderer.render(scene)
+			first = camera.film.Lxyz.copy()
+			renderer.render(scene)
+			films.append(camera.film.Lxyz)
+		# camera samples are kept, the others reseeded
+		assert renderer.hit_cache.n_reused == 32 * 32
+		assert_array_almost_equal(films[0], films[1])
+		assert not np.allclose(films[1], 2. * first)
+
+	def test_batched(self, tmpdir):
+		scene = self.make_scene()
+		sampler = StratifiedSampler(0, 32, 0, 32, 2, 2, True, 0., 0.)
+		calls = []
+
+		class Integrator(WavefrontPathIntegrator):
+			def li_batch(self, scene, renderer, rays, samples=None, rng=np.random.rand, isects=None, hit=None):
+				calls.append(len(rays))
+				return super().li_batch(scene, renderer, rays, samples, rng, isects, hit)
+
+		# one batch per tile, primary hits reused
+		films = []
+		for hit_cache in (False, True):
+			camera = self.make_camera(str(tmpdir.join('batched.png')))
+			renderer = SamplerRenderer(sampler, camera, Integrator(3), None, seed=5, hit_cache=hit_cache)
+			renderer.render(scene)
+			renderer.render(scene)
+			films.append(camera.film.Lxyz)
+		assert calls == [16 * 16 * 4] * 16
+		assert renderer.hit_cache.n_reused == 32 * 32 * 4
+		assert np.all(camera.film.weight_sum == 8.) and np.any(films[0] > 0.)
+		assert_array_almost_equal(films[0], films[1])
+
+		# re-rendering a tile on its own gives the same pixels
+		camera = self.make_camera(str(tmpdir.join('full.png')))
+		integrator = WavefrontPathIntegrator(3)
+		SamplerRenderer(sampler, camera, integrator, None, seed=5).render(scene)
+		full = camera.film.Lxyz
+		camera = self.make_camera(str(tmpdir.join('tile.png')))
+		renderer = SamplerRenderer(sampler, camera, integrator, None, seed=5)
+		SamplerRendererTask(scene, renderer, camera, sampler, Sample(sampler, integrator, None, scene), False, 3, 4)()
+		x0, x1, y0, y1 = sampler.compute_subwindow(3, 4)
+		assert_array_almost_equal(camera.film.Lxyz[x0:x1, y0:y1], full[x0:x1, y0:y1])
+
+	def test_hero_wavelengths(self, tmpdir):
+		# carried at four wavelengths per camera
+		# sample, close to the image in RGB
+		scene = self.make_scene()
+		sampler = StratifiedSampler(0, 32, 0, 32, 2, 2, True, 0., 0.)
+		images = []
+		for n_wavelengths in (0, 4):
+			camera = self.make_camera(str(tmpdir.join('hero.png')))
+			integrator = WavefrontPathIntegrator(3, n_wavelengths)
+			SamplerRenderer(sampler, camera, integrator, None, seed=5).render(scene)
+			assert np.all(camera.film.weight_sum == 4.)
+			images.append(camera.film.Lxyz.sum(axis=(0, 1)))
+		assert np.all(images[0] > 0.) and np.allclose(images[1], images[0], rtol=.05)
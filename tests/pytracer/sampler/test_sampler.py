@@ -0,0 +1,131 @@
+"""
+test_sampler.py
+
+A test script that (roughly) test
+the implementation of samplers.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+from pytracer.sampler import (Sample, SampleBatch, StratifiedSampler, latin_hypercube_1d_batch, latin_hypercube_2d_batch)
+from pytracer.montecarlo import RNG
+
+np.random.seed(1)
+
+
+def is_stratified(x, n):
+	"""Exactly one value of `x` in each of the `n` strata along the last axis"""
+	return np.all(np.sort(np.floor(x * n), axis=-1) == np.arange(n))
+
+
+class TestStratifiedSampler(object):
+
+	def test_latin_hypercube(self):
+		x = latin_hypercube_1d_batch((4, 3), 8)
+		assert x.shape == (4, 3, 8) and is_stratified(x, 8)
+		x = latin_hypercube_2d_batch((4, 3), 8)
+		assert x.shape == (4, 3, 8, 2)
+		assert is_stratified(x[..., 0], 8) and is_stratified(x[..., 1], 8)
+		# shuffled, not in order
+		assert not np.all(np.diff(x[..., 1], axis=-1) > 0.)
+
+	@pytest.mark.parametrize("jitter", [True, False])
+	def test_generate_tile(self, jitter):
+		sampler = StratifiedSampler(2, 6, 1, 4, 2, 3, jitter, 1., 2.)
+		sample = Sample()
+		sample.add_1d(4)
+		sample.add_2d(5)
+		tile = sampler.generate_tile(2, 6, 1, 3, sample)
+		assert len(tile) == 8 and tile.image.shape == (8, 6, 2)
+		assert tile.pixels.tolist()[:5] == [[2, 1], [3, 1], [4, 1], [5, 1], [2, 2]]
+		assert np.all(np.floor(tile.image) == tile.pixels[:, np.newaxis, :])
+		# one sample in each stratum of the pixel
+		strata = np.floor((tile.image % 1.) * [2, 3])
+		assert np.all(np.sort(strata[..., 0] + 2 * strata[..., 1], axis=1) == np.arange(6))
+		strata = np.floor(tile.lens * [2, 3])
+		assert np.all(np.sort(strata[..., 0] + 2 * strata[..., 1], axis=1) == np.arange(6))
+		assert is_stratified(tile.time - 1., 6)
+		assert tile.oneD[0].shape == (8, 6, 4) and tile.twoD[0].shape == (8, 6, 5, 2)
+
+		# per pixel generation walks the window by rows
+		samples = sample.duplicate(6)
+		pixels = []
+		while sampler.generate(samples):
+			pixels.append([int(samples[0].imageX), int(samples[0].imageY)])
+			assert all(s.oneD[0].shape == (4,) and s.twoD[0].shape == (5, 2) for s in samples)
+			assert 1. <= samples[3].time < 2.
+		assert pixels == np.stack(np.meshgrid(np.arange(2, 6), np.arange(1, 4)), axis=-1).reshape(-1, 2).tolist()
+
+
+class TestSampleBatch(object):
+
+	def test_layout(self):
+		sample = Sample()
+		sample.add_1d(2)
+		sample.add_2d(3)
+		sample.add_1d(1)
+		batch = SampleBatch(sample, 4)
+		assert batch.data.shape == (4, 2 + 1 + 6) and len(batch) == 4
+		batch.data[:] = np.arange(36).reshape(4, 9)
+		assert batch.oneD(1).tolist() == [[2], [11], [20], [29]]
+		assert batch.twoD(0)[1].tolist() == [[12, 13], [14, 15], [16, 17]]
+
+		# views share the batch arrays
+		view = batch[2]
+		assert view.oneD[0].tolist() == [18, 19] and view.twoD[0][2].tolist() == [25, 26]
+		view.oneD[0][1] = -1.
+		view.time = .5
+		assert batch.data[2, 1] == -1. and batch.camera[2, 4] == .5
+		assert [v.time for v in batch] == [0., 0., .5, 0.]
+
+	def test_generate(self):
+		sample = Sample()
+		sample.add_1d(4)
+		sample.add_2d(5)
+		sampler = StratifiedSampler(0, 2, 0, 2, 2, 3, True, 0., 1.)
+		tile = sampler.generate_tile(0, 2, 0, 2, sample, RNG(0))
+		batch = SampleBatch.from_tile(sample, tile)
+		assert len(batch) == 24
+		assert np.array_equal(batch.twoD(0)[7], tile.twoD[0][1, 1])
+		assert np.array_equal(batch.camera[7], np.r_[tile.image[1, 1], tile.lens[1, 1], tile.time[1, 1]])
+
+		# by rows
+		tile = sampler.generate_tile(0, 2, 0, 1, sample, RNG(0))
+		samples = SampleBatch(sample, 6)
+		sampler.generate(samples, RNG(0))
+		assert np.array_equal(samples.oneD(0), tile.oneD[0][0])
+		assert samples[4].imageX == tile.image[0, 4, 0] and samples[4].twoD[0].shape == (5, 2)
+
+		# integrator dimensions reseeded alone
+		other = sampler.generate_tile(0, 2, 0, 1, sample, RNG(0), RNG(1))
+		for name in ('image', 'lens', 'time'):
+			assert np.array_equal(getattr(other, name), getattr(tile, name))
+		assert not np.array_equal(other.oneD[0], tile.oneD[0])
+
+
+class TestRNG(object):
+
+	def test_streams(self):
+		rng = RNG.for_tile(7, 3)
+		assert isinstance(rng(), float) and rng(2, 3).shape == (2, 3)
+		# a tile stream does not depend on the number of tiles
+		assert np.array_equal(RNG.for_tile(7, 3)(16), RNG(7).spawn(5)[3](16))
+		assert not np.array_equal(RNG.for_tile(7, 3)(16), RNG.for_tile(7, 2)(16))
+		assert not np.array_equal(RNG.for_tile(7, 3)(16), RNG.for_tile(8, 3)(16))
+		# passes over a tile
+		assert np.array_equal(RNG.for_pass(7, 3, 1)(16), RNG.for_tile(7, 3).spawn(2)[1](16))
+		assert not np.array_equal(RNG.for_pass(7, 3, 1)(16), RNG.for_pass(7, 3, 0)(16))
+
+	def test_reproducible_tile(self):
+		sample = Sample()
+		sample.add_1d(4)
+		sample.add_2d(2)
+		tiles = []
+		for _ in range(2):
+			np.random.seed(None)  # global state is not used
+			sampler = StratifiedSampler(0, 4, 0, 4, 2, 2, True, 0., 1.)
+			tiles.append(sampler.generate_tile(0, 4, 0, 4, sample, RNG.for_tile(1, 0)))
+		for a, b in zip([tiles[0].image, tiles[0].lens, tiles[0].time] + tiles[0].oneD + tiles[0].twoD,
+		                [tiles[1].image, tiles[1].lens, tiles[1].time] + tiles[1].oneD + tiles[1].twoD):
+			assert np.array_equal(a, b)
@@ -0,0 +1,221 @@
+"""
+test_shape.py
+
+A test script that (roughly) test
+the implementation of triangle
+meshes, subdivision surfaces and
+batched quadrics.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import pytest
+import pytracer.geometry as geo
+import pytracer.transform as trans
+from pytracer.shape import (create_triangle_mesh, TriangleMesh, create_loop_subdiv, LoopSubdiv,
+                            Sphere, Cylinder, Disk, SphereBatch, CylinderBatch, DiskBatch)
+
+N_TEST_CASE = 32
+VAR = 10
+np.random.seed(1)
+rng = np.random.rand
+
+
+def make_mesh(dtype=np.float64):
+	"""A unit quad made of two triangles, moved and rotated"""
+	t = trans.Transform.translate(geo.Vector(1., 2., 3.)) * trans.Transform.rotate(30., geo.Vector(1., 1., 0.))
+	params = {'indices': [0, 1, 2, 0, 2, 3],
+	          'P': [geo.Point(0., 0., 0.), geo.Point(1., 0., 0.), geo.Point(1., 1., 0.), geo.Point(0., 1., 0.)],
+	          'N': [0., 0., 1.] * 4,
+	          'uv': [0., 0., 1., 0., 1., 1., 0., 1.]}
+	return t, create_triangle_mesh(t, t.inverse(), False, params, dtype=dtype)
+
+
+class TestTriangleMesh(object):
+
+	def test_packed(self):
+		t, mesh = make_mesh()
+		assert isinstance(mesh, TriangleMesh)
+		assert mesh.vertexIndex.dtype == np.int32 and mesh.vertexIndex.shape == (6,)
+		assert mesh.p.shape == (4, 3) and mesh.n.shape == (4, 3) and mesh.uvs.shape == (4, 2)
+		assert_array_almost_equal(mesh.p[2], np.asarray(t(geo.Point(1., 1., 0.))))
+		assert_array_almost_equal(mesh.get_uvs(1), [[0., 0.], [1., 1.], [0., 1.]])
+
+		tris = mesh.refine()
+		assert len(tris) == 2
+		assert_array_almost_equal(np.asarray(tris[1][2]), np.asarray(t(geo.Point(0., 1., 0.))))
+		assert tris[0].area() + tris[1].area() == pytest.approx(1.)
+		b = mesh.object_bound()
+		assert_array_almost_equal(np.asarray(b.pMin), [0., 0., 0.])
+		assert_array_almost_equal(np.asarray(b.pMax), [1., 1., 0.])
+
+	@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+	def test_intersect(self, dtype):
+		t, mesh = make_mesh(dtype)
+		assert mesh.p.dtype == dtype
+		tris = mesh.refine()
+		for _ in range(N_TEST_CASE):
+			x, y = rng(2) * 1.2 - .1
+			o = t(geo.Point(x, y, 1.))
+			r = geo.Ray(o, t(geo.Vector(0., 0., -1.)))
+			hits = [tri.intersect(r) for tri in tris]
+			hit = [h for h in hits if h[0]]
+			if not (0. < x < 1. and 0. < y < 1.):
+				assert len(hit) == 0
+				continue
+			assert len(hit) >= 1
+			_, thit, _, dg = hit[0]
+			assert thit == pytest.approx(1., abs=1e-5)
+			assert dg.u == pytest.approx(x, abs=1e-5)
+			assert dg.v == pytest.approx(y, abs=1e-5)
+
+			ds = dg.shape.get_shading_geometry(t, dg)
+			assert_array_almost_equal(np.asarray(ds.nn), np.asarray(t(geo.Normal(0., 0., 1.))), 5)
+
+	@pytest.mark.parametrize("wald", [False, True])
+	def test_precompute(self, wald):
+		t = trans.Transform.rotate(30., geo.Vector(1., 1., 0.))
+		P = rng(60, 3) * VAR
+		params = {'indices': np.arange(60), 'P': P}
+		plain = create_triangle_mesh(t, t.inverse(), False, params)
+		mesh = create_triangle_mesh(t, t.inverse(), False, dict(params, precompute='wald' if wald else True))
+		assert (mesh.wald is not None) == wald
+		assert_array_almost_equal(mesh.triangle_bounds(), plain.triangle_bounds())
+		b0, b1 = plain.refine()[3].world_bound(), mesh.refine()[3].world_bound()
+		assert_array_almost_equal(np.asarray(b0.pMin), np.asarray(b1.pMin))
+		assert_array_almost_equal(np.asarray(b0.pMax), np.asarray(b1.pMax))
+
+		n_hit = 0
+		for _ in range(N_TEST_CASE * 4):
+			o = geo.Point(*(rng(3) * VAR))
+			d = geo.normalize(geo.Point(*(rng(3) * VAR)) - o)
+			for i in range(mesh.ntris):
+				h0 = plain.intersect_triangle(i, geo.Ray(o, d))
+				h1 = mesh.intersect_triangle(i, geo.Ray(o, d))
+				assert h0[0] == h1[0] == mesh.intersect_p_triangle(i, geo.Ray(o, d))
+				if h0[0]:
+					n_hit += 1
+					assert h1[1] == pytest.approx(h0[1])
+					assert_array_almost_equal(np.asarray(h1[3].p), np.asarray(h0[3].p))
+					assert h1[3].u == pytest.approx(h0[3].u) and h1[3].v == pytest.approx(h0[3].v)
+		assert n_hit > 0
+
+
+# regular tetrahedron centered at the origin
+TET_P = np.array([[1., 1., 1.], [1., -1., -1.], [-1., 1., -1.], [-1., -1., 1.]])
+TET_F = np.array([[0, 1, 2], [0, 3, 1], [0, 2, 3], [1, 3, 2]])
+
+
+class TestLoopSubdiv(object):
+
+	def test_rules(self):
+		V, F = LoopSubdiv.subdivide(TET_P, TET_F)
+		assert V.shape == (4 + 6, 3) and F.shape == (16, 3)
+		# valence 3 even vertices: (1 - 3 * 3/16) v + 3/16 (-v)
+		assert_array_almost_equal(V[:4], TET_P / 4.)
+		# odd vertices: 3/8 (a + b) + 1/8 (c + d) = (a + b) / 4
+		mids = sorted(map(tuple, V[4:]))
+		expected = sorted(tuple((TET_P[i] + TET_P[j]) / 4.) for i in range(4) for j in range(i + 1, 4))
+		assert_array_almost_equal(mids, expected)
+		# every edge shared by two faces after subdivision
+		top = LoopSubdiv.Topology(F, len(V))
+		assert len(top.edges) == 24 and not np.any(top.boundary)
+
+	@pytest.mark.parametrize("nlevels", [0, 1, 2])
+	def test_refine(self, nlevels):
+		t = trans.Transform.translate(geo.Vector(1., 2., 3.))
+		shape = create_loop_subdiv(t, t.inverse(), False,
+		                           {'indices': TET_F.ravel(), 'P': TET_P.ravel(), 'nlevels': nlevels})
+		mesh = shape.refine()[0]
+		assert mesh.ntris == 4 * 4 ** nlevels
+		# symmetric about the center, normals point outwards
+		p = mesh.w2o.transform_points(mesh.p)
+		assert_array_almost_equal(p.mean(axis=0), [0., 0., 0.])
+		r = np.linalg.norm(p, axis=1)
+		n = mesh.n / np.linalg.norm(mesh.n, axis=1)[:, np.newaxis]
+		assert np.all(np.einsum('ij,ij->i', n, p / r[:, np.newaxis]) > .5)
+
+	def test_boundary(self):
+		# a planar 3 x 3 grid stays planar
+		x, y = np.meshgrid(np.arange(4.), np.arange(4.))
+		P = np.stack([x.ravel(), y.ravel(), np.zeros(16)], axis=1)
+		i = (np.arange(4)[:3, np.newaxis] * 4 + np.arange(3)).ravel()
+		F = np.concatenate([np.stack([i, i + 1, i + 5], axis=1), np.stack([i, i + 5, i + 4], axis=1)])
+		t = trans.Transform()
+		mesh = create_loop_subdiv(t, t, False, {'indices': F.ravel(), 'P': P.ravel(), 'nlevels': 2}).refine()[0]
+		assert_array_almost_equal(mesh.p[:, 2], 0.)
+		# boundary rules smooth the outline within the grid
+		assert np.all(mesh.p[:, 0:2] >= 0.) and np.all(mesh.p[:, 0:2] <= 3.)
+		assert_array_almost_equal(mesh.p[5, 0:2], P[5, 0:2])
+		n = mesh.n / np.linalg.norm(mesh.n, axis=1)[:, np.newaxis]
+		assert_array_almost_equal(n, np.tile([0., 0., 1.], (len(n), 1)))
+
+	def test_adaptive_levels(self):
+		from pytracer.camera import (PerspectiveCamera, EnvironmentCamera)
+		from pytracer.film import ImageFilm
+		from pytracer.filter import BoxFilter
+		film = ImageFilm(xr=64, yr=64, filt=BoxFilter(.5, .5), crop=[0., 1., 0., 1.], fn='tmp.png')
+		cam_trans = trans.AnimatedTransform(trans.Transform(), 0., trans.Transform(), 0.)
+		camera = PerspectiveCamera(cam_trans, scr_win=[-1., 1., -1., 1.], s_open=0.,
+		                           s_close=0., lensr=0., focald=1e100, fov=60., f=film)
+		params = {'indices': TET_F.ravel(), 'P': TET_P.ravel(), 'nlevels': 6, 'pixelerror': 1.}
+
+		levels = []
+		for z in [4., 16., 64., 256.]:
+			t = trans.Transform.translate(geo.Vector(0., 0., z))
+			levels.append(create_loop_subdiv(t, t.inverse(), False, params, camera).nLevels)
+		assert levels[0] == 6 and levels[-1] < levels[0]
+		assert all(l0 >= l1 for l0, l1 in zip(levels[:-1], levels[1:]))
+		# each level halves the edges, every 4x is two levels
+		assert levels[1] - levels[2] == 2
+
+		# behind and around the camera
+		t = trans.Transform.translate(geo.Vector(0., 0., -10.))
+		assert create_loop_subdiv(t, t.inverse(), False, params, camera).nLevels == 0
+		t = trans.Transform()
+		assert create_loop_subdiv(t, t.inverse(), False, params, camera).nLevels == 6
+		camera = EnvironmentCamera(cam_trans, 0., 0., film)
+		t = trans.Transform.translate(geo.Vector(0., 0., 256.))
+		assert create_loop_subdiv(t, t.inverse(), False, params, camera).nLevels == 6
+
+
+def make_quadrics(cls, n: int=16):
+	shapes = []
+	for _ in range(n):
+		t = trans.Transform.translate(geo.Vector(*((rng(3) - .5) * VAR))) * \
+		    trans.Transform.rotate(360. * rng(), geo.Vector(*(rng(3) + .1)))
+		r = .5 + rng()
+		if cls is Sphere:
+			shapes.append(Sphere(t, t.inverse(), False, r, -r + rng() * r, r - rng() * r, 180. + 180. * rng()))
+		elif cls is Cylinder:
+			shapes.append(Cylinder(t, t.inverse(), False, r, -rng(), rng(), 180. + 180. * rng()))
+		else:
+			shapes.append(Disk(t, t.inverse(), False, rng() - .5, r, .3 * rng() * r, 180. + 180. * rng()))
+	return shapes
+
+
+class TestShapeBatch(object):
+
+	@pytest.mark.parametrize("cls, batch", [(Sphere, SphereBatch), (Cylinder, CylinderBatch), (Disk, DiskBatch)])
+	def test_intersect(self, cls, batch):
+		shapes = make_quadrics(cls)
+		b = batch.from_shapes(shapes)
+		b.CHUNK_SIZE = 100  # several chunks
+		o = (rng(N_TEST_CASE * 4, 3) - .5) * 2. * VAR
+		d = (rng(N_TEST_CASE * 4, 3) - .5) * VAR - o
+		d /= np.linalg.norm(d, axis=1)[:, np.newaxis]
+		t, ids = b.intersect(o, d, 0., 2. * VAR)
+		hit = b.intersect_p(o, d, 0., 2. * VAR)
+		assert np.array_equal(hit, ids >= 0)
+		assert np.any(hit)
+
+		for i in range(len(o)):
+			thit, idx = np.inf, -1
+			for j, shape in enumerate(shapes):
+				h = shape.intersect(geo.Ray(geo.Point(*o[i]), geo.Vector(*d[i]), 0., 2. * VAR))
+				if h[0] and h[1] < thit:
+					thit, idx = h[1], j
+			assert ids[i] == idx
+			if idx >= 0:
+				assert t[i] == pytest.approx(thit)
@@ -13,7 +13,10 @@ from numpy.testing import assert_array_almost_equal
 import pytest
 from pytracer.spectral.spectrum import (xyz2rgb, rgb2xyz, SpectrumType,
                                         CoefficientSpectrum, SampledSpectrum,
-                                        RGBSpectrum)
+                                        RGBSpectrum, SpectrumBatch,
+                                        SampledWavelengths, SAMPLED_LAMBDA)
+from pytracer.spectral.rgb2spec import RGBToSpectrumTable
+from pytracer.data.spectral import CIE_Y_INTEGRAL
 
 N_TEST_CASE = 10
 EPS = 5
@@ -134,6 +137,94 @@ class TestSampledAndRGBSpec(object):
 		assert_almost_eq(SampledSpectrum.average_spectrum_samples([1, 2, 3, 4], [3, 4, 5, 3], 1.5, 3.5), 4.3125)
 		assert_almost_eq(SampledSpectrum.average_spectrum_samples([1, 2, 3, 4], [3, 4, 5, 3], 0.5, 4), 3.8571428571428571)
 		assert_almost_eq(SampledSpectrum.average_spectrum_samples([1, 2, 3, 4], [3, 4, 5, 3], 0.5, 4.5), 3.75)
+		# vectorized over intervals
+		ls, le = np.array([1.5, 0.5, 0.5, 5., -1.]), np.array([3.5, 4., 4.5, 6., 0.])
+		assert_almost_eq(SampledSpectrum.average_spectrum_samples([1, 2, 3, 4], [3, 4, 5, 3], ls, le),
+		                 [4.3125, 3.8571428571428571, 3.75, 3., 3.])
+		# resampled matching functions keep their integral
+		SampledSpectrum.init()
+		assert np.sum(SampledSpectrum.Y) * 300. / 30 == pytest.approx(CIE_Y_INTEGRAL, rel=1e-3)
+
+	@pytest.mark.parametrize("tp", [SampledSpectrum, RGBSpectrum])
+	def test_batch(self, tp):
+		spectra = [tp.create_from_array(rng(tp().n_samples) * 2. - .5) for _ in range(N_TEST_CASE)]
+		spectra[3] *= 0.
+		batch = SpectrumBatch.from_spectra(spectra)
+		assert batch.shape == (N_TEST_CASE, tp().n_samples) and batch.tp is tp
+
+		batch = (batch * 2. + batch).clip()
+		assert isinstance(batch, SpectrumBatch) and batch.tp is tp
+		spectra = [(s * 2. + s).clip() for s in spectra]
+		assert isinstance(batch.spectrum(0), tp)
+		assert_almost_eq(batch.exp(), [s.exp() for s in spectra])
+		assert np.array_equal(batch.is_black(), [s.is_black() for s in spectra])
+		assert_almost_eq(batch.y(), [s.y() for s in spectra])
+		assert_almost_eq(batch.to_xyz(), [s.to_xyz() for s in spectra])
+		assert_almost_eq(batch.to_rgb(), [s.to_rgb() for s in spectra])
+
+	@pytest.mark.parametrize("arr", test_data['triple'][:3])
+	def test_hero_wavelengths(self, arr):
+		wl = SampledWavelengths.sample_hero((np.arange(1000) + .5) / 1000)
+		assert wl.lam.shape == (1000, 4)
+		assert np.all((wl.lam >= 400.) & (wl.lam < 700.))
+		# companions are evenly rotated
+		assert_almost_eq(np.diff(np.sort(wl.lam, axis=1), axis=1)[:, 0], 75.)
+
+		ss = SampledSpectrum.from_rgb(arr)
+		L = wl.sample(ss)
+		# reflectances above 1, e.g., of BSDFs, are scaled
+		m = np.max(arr) / 4.
+		assert_almost_eq(wl.from_rgb(np.asarray(arr) / m), wl.from_rgb(np.asarray(arr) / np.max(arr)) * 4.)
+		assert_almost_eq(wl[:10].lam, wl.lam[:10])
+		# illuminants round trip
+		assert np.allclose(wl.to_rgb(wl.from_rgb(arr, SpectrumType.ILLUMINANT)).mean(axis=0), arr, atol=.03)
+		# converges to the integral against the matching functions
+		from pytracer.data.spectral import (CIE_LAMBDA, CIE_X, CIE_Y, CIE_Z, CIE_Y_INTEGRAL)
+		lam = np.arange(400., 700., .01) + .005
+		s = np.asarray(ss)[(lam - 400.).astype(int) // 10]
+		xyz = [np.sum(s * np.interp(lam, CIE_LAMBDA, cmf)) * .01 / CIE_Y_INTEGRAL for cmf in [CIE_X, CIE_Y, CIE_Z]]
+		assert_array_almost_equal(wl.to_xyz(L).mean(axis=0), xyz, 3)
+		batch = SpectrumBatch.from_spectra([ss] * 1000)
+		assert_almost_eq(wl.sample(batch), L)
+
+	def test_rgb_table(self, tmpdir, monkeypatch):
+		monkeypatch.setenv('PYTRACER_CACHE', str(tmpdir))
+		monkeypatch.setattr(RGBToSpectrumTable, '_table', None)
+		table = RGBToSpectrumTable.load(8)
+		assert tmpdir.join('rgb2spec_8_v{}.npz'.format(RGBToSpectrumTable.VERSION)).check()
+		monkeypatch.setattr(RGBToSpectrumTable, '_table', None)
+		assert np.array_equal(RGBToSpectrumTable.load(8).coeffs, table.coeffs)
+
+		# reflectances round trip, exactly on the grid
+		x, A = RGBToSpectrumTable._system()
+		lam = 400. + 300. * x
+		rgb = np.array(test_data['triple'])
+		assert np.allclose(table.evaluate(rgb, lam).dot(A.T), rgb, atol=.15)
+		z = table.scale[5]
+		grid = [[1., 1., 1.], [z, 3. / 7. * z, z / 7.], [z / 7., z, 0.]]
+		assert_almost_eq(table.evaluate(grid, lam).dot(A.T), grid)
+
+		# single values, as the rows, remembered
+		for tp in [SpectrumType.REFLECTANCE, SpectrumType.ILLUMINANT]:
+			rows = table.evaluate(rgb, SAMPLED_LAMBDA, tp)
+			for c, row in zip(rgb, rows):
+				assert_almost_eq(table.evaluate(c, SAMPLED_LAMBDA, tp)[0], row)
+				s = table.evaluate(list(c), SAMPLED_LAMBDA, tp)
+				assert_almost_eq(s[0], row)
+				s[...] = 0.
+				assert_almost_eq(table.evaluate(list(c), SAMPLED_LAMBDA, tp)[0], row)
+				assert_almost_eq(table.evaluate(c, lam, tp), table.evaluate([c, c], lam, tp)[:1])
+
+		# built in memory if there is no cache
+		tmpdir.join('file').write('')
+		monkeypatch.setenv('PYTRACER_CACHE', str(tmpdir.join('file', 'cache')))
+		monkeypatch.setattr(RGBToSpectrumTable, '_table', None)
+		assert np.allclose(RGBToSpectrumTable.load(8).coeffs, table.coeffs)
+
+		monkeypatch.setattr(RGBToSpectrumTable, '_table', table)
+		batch = SpectrumBatch.from_rgb(rgb, SpectrumType.ILLUMINANT)
+		assert batch.tp is SampledSpectrum
+		assert_almost_eq(batch, [SampledSpectrum.from_rgb(c, SpectrumType.ILLUMINANT) for c in rgb])
 
 	# TODO: Full spectrum
 	# @pytest.mark.parametrize("arr", test_data['triple'])
@@ -190,6 +190,16 @@ class TestTransform(object):
 		assert (t.m == m1.dot(m2)).all()
 		assert (t.m_inv == m2_inv.dot(m1_inv)).all()
 
+	def test_transform_batch(self):
+		t = Transform.perspective(60., .1, 100.) * Transform.translate(geo.Vector(0., 0., 5.)) * \
+		    Transform.rotate(30., geo.Vector(1., 1., 0.))
+		p = np.array([pnt for pnt in test_data['point']])
+		v = np.array([vec for vec in test_data['vector']])
+		n = np.array([norm for norm in test_data['normal']])
+		assert_almost_eq(t.transform_points(p), [t(pnt) for pnt in test_data['point']])
+		assert_almost_eq(t.transform_vectors(v), [t(vec) for vec in test_data['vector']])
+		assert_almost_eq(t.transform_normals(n), [t(norm) for norm in test_data['normal']])
+
 	# translation
 	@pytest.mark.parametrize("vec", test_data['vector'])
 	@pytest.mark.parametrize("trans_vec", geometry_data['trans_vec'])
@@ -485,6 +495,21 @@ class TestAnimatedTransform(object):
 		at = AnimatedTransform(t1, 0., t2, tm)
 		t = at.interpolate(rng())
 
+	@pytest.mark.parametrize("t1", geometry_data['t1'])
+	@pytest.mark.parametrize("t2", geometry_data['t2'])
+	def test_interpolate_batch(self, t1, t2):
+		at = AnimatedTransform(t1, .5, t2, 1.5)
+		times = np.concatenate([[0., .5, 1.5, 2.], .5 + rng(N_TEST_CASE)])
+		m = at.interpolate_batch(times)
+		for tm, mm in zip(times, m):
+			assert_array_almost_equal(mm, at.interpolate(tm).m)
+
+		p = rng(len(times), 3) * VAR
+		assert_array_almost_equal(at.transform_points(times, p),
+		                          [at(tm, geo.Point(*pp)) for tm, pp in zip(times, p)])
+		assert_array_almost_equal(at.transform_vectors(times, p),
+		                          [at(tm, geo.Vector(*pp)) for tm, pp in zip(times, p)])
+
 	def test_decompose(self):
 		with pytest.raises(TypeError):
 			t, r, s = AnimatedTransform.decompose(rng(3, 3))
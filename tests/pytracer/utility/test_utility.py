@@ -0,0 +1,131 @@
+"""
+test_utility.py
+
+A test script that (roughly) test
+the implementation of mesh IO.
+"""
+from __future__ import absolute_import
+
+import struct
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import pytest
+import pytracer.geometry as geo
+import pytracer.transform as trans
+from pytracer.shape import (TriangleMesh, create_triangle_mesh)
+from pytracer.aggregate import (MeshPrimitive, Intersection, BVH)
+from pytracer.utility.meshio import (read_obj, read_ply, read_ptm, write_ptm, load_mesh)
+
+P = np.array([[0., 0., 0.], [1., 0., 0.], [1., 1., 0.], [0., 1., 0.], [0., 0., 1.]])
+UV = P[:, 0:2]
+# a quad and a triangle, triangulated as fans
+FACES = [[0, 1, 2, 3], [1, 2, 4]]
+TRIS = [[0, 1, 2], [0, 2, 3], [1, 2, 4]]
+
+
+def sorted_tris(params):
+	"""Triangles as sorted vertex positions, independent of ordering"""
+	t = params['P'][np.reshape(params['indices'], (-1, 3))]
+	return sorted(map(lambda x: tuple(np.ravel(x)), t))
+
+
+class TestMeshIO(object):
+
+	def test_obj(self, tmpdir):
+		fn = tmpdir.join('mesh.obj')
+		lines = ['# comment', 'o quad']
+		lines += ['v {} {} {}'.format(*p) for p in P]
+		lines += ['vt {} {}'.format(*uv) for uv in UV]
+		lines += ['vn 0 0 1']
+		lines += ['f {}/{}/1 {}/{}/1 {}/{}/1 {}/{}/1'.format(*np.repeat(np.array(FACES[0]) + 1, 2))]
+		lines += ['f -4/-4/-1 -3/-3/-1 -1/-1/-1']
+		fn.write('\n'.join(lines) + '\n')
+
+		params = read_obj(str(fn), chunk_size=16)
+		assert sorted_tris(params) == sorted_tris({'P': P, 'indices': TRIS})
+		assert params['P'].shape[0] == 5
+		assert_array_almost_equal(params['uv'], params['P'][:, 0:2])
+		assert_array_almost_equal(params['N'], np.tile([0., 0., 1.], (5, 1)))
+
+		# `v//vn` faces split vertices by normals
+		fn.write('\n'.join(['v {} {} {}'.format(*p) for p in P] +
+		                   ['vn 0 0 1', 'vn 1 0 0', 'f 1//1 2//1 3//1', 'f 1//2 2//2 3//2']) + '\n')
+		params = read_obj(str(fn))
+		assert len(params['P']) == 6 and 'uv' not in params
+
+	@pytest.mark.parametrize("fmt", ['ascii', 'binary_little_endian', 'binary_big_endian'])
+	def test_ply(self, tmpdir, fmt):
+		fn = tmpdir.join('mesh.ply')
+		header = ['ply', 'format {} 1.0'.format(fmt), 'comment test',
+		          'element vertex {}'.format(len(P)),
+		          'property float x', 'property float y', 'property float z',
+		          'property double u', 'property double v',
+		          'element face {}'.format(len(FACES)),
+		          'property list uchar int vertex_indices', 'end_header']
+		header = ('\n'.join(header) + '\n').encode('ascii')
+		if fmt == 'ascii':
+			body = ''.join('{} {} {} {} {}\n'.format(*p, *uv) for p, uv in zip(P, UV))
+			body += ''.join(' '.join(map(str, [len(f)] + f)) + '\n' for f in FACES)
+			body = body.encode('ascii')
+		else:
+			e = '<' if fmt == 'binary_little_endian' else '>'
+			body = b''.join(struct.pack(e + '3f2d', *p, *uv) for p, uv in zip(P, UV))
+			body += b''.join(struct.pack(e + 'B{}i'.format(len(f)), len(f), *f) for f in FACES)
+		fn.write_binary(header + body)
+
+		params = read_ply(str(fn))
+		assert_array_almost_equal(params['P'], P)
+		assert_array_almost_equal(params['uv'], UV)
+		assert np.array_equal(np.reshape(params['indices'], (-1, 3)), TRIS)
+		# native `FLOAT` fields are not copied
+		assert params['uv'].base is not None or fmt == 'binary_big_endian'
+
+		t = trans.Transform.translate(geo.Vector(1., 2., 3.))
+		mesh = load_mesh(str(fn), t, t.inverse(), False, dtype=np.float32)
+		assert isinstance(mesh, TriangleMesh)
+		assert mesh.ntris == 3 and mesh.p.dtype == np.float32
+		assert_array_almost_equal(mesh.p, P + [1., 2., 3.])
+
+	def test_ptm(self, tmpdir):
+		fn = tmpdir.join('mesh.ptm')
+		rng = np.random.RandomState(1)
+		P = rng.rand(60, 3) * 10.
+		t = trans.Transform.translate(geo.Vector(1., 2., 3.))
+		mesh = create_triangle_mesh(t, t.inverse(), False, {'P': P, 'indices': np.arange(60), 'uv': P[:, 0:2]},
+		                            dtype=np.float32)
+		prim = MeshPrimitive(mesh, None)
+		bvh = BVH([prim])
+		write_ptm(str(fn), mesh, bvh)
+
+		params = read_ptm(str(fn))
+		assert isinstance(params['P'], np.memmap) and params['P'].dtype == np.float32
+		assert 'bvh' in params
+
+		cached = create_triangle_mesh(t, t.inverse(), False, {'filename': str(fn)})
+		# used in place, i.e., read-only views of the file
+		assert not cached.p.flags.writeable and cached.p.dtype == np.float32
+		assert_array_almost_equal(cached.p, mesh.p)
+		assert_array_almost_equal(cached.uvs, mesh.uvs)
+
+		cached_bvh = BVH([MeshPrimitive(cached, None)])
+		assert len(cached_bvh.nodes) == len(bvh.nodes)
+		for _ in range(32):
+			o = geo.Point(*(rng.rand(3) * 20. - 5.))
+			d = geo.normalize(geo.Point(*(rng.rand(3) * 10. + [1., 2., 3.])) - o)
+			r0, r1 = geo.Ray(o, d), geo.Ray(o, d)
+			i0, i1 = Intersection(), Intersection()
+			assert bvh.intersect(r0, i0) == cached_bvh.intersect(r1, i1)
+			assert r0.maxt == pytest.approx(r1.maxt)
+
+		# rebuilt with other parameters
+		rebuilt = BVH([MeshPrimitive(cached, None)], max_prim_per_node=1, method='middle')
+		expected = BVH([prim], max_prim_per_node=1, method='middle').to_arrays()
+		for name, arr in rebuilt.to_arrays().items():
+			assert_array_almost_equal(arr, expected[name])
+		assert not np.array_equal(rebuilt.items, cached_bvh.items)
+
+		# other transformations are applied to the cached points
+		tt = trans.Transform.scale(2., 2., 2.)
+		moved = create_triangle_mesh(tt, tt.inverse(), False, {'filename': str(fn)})
+		assert moved.bvh_cache is None
+		assert_array_almost_equal(moved.p, P * 2., 5)